@@ -0,0 +1,131 @@
+"""
+Concurrency benchmark for the follow-up chat context lookup.
+
+Fires concurrent lookups at a local stand-in database with a fixed
+per-query latency and compares:
+
+  blocking   two sequential blocking queries (chat, then profile) run on the
+             event loop, as the follow-up handler used to do
+  joined     one async joined query per request
+  cached     the joined query behind ChatContextCache
+
+    python benchmarks/chat_context.py --requests 500 --chats 50 --latency-ms 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tiny_fastapi.chat_context import ChatContextCache  # noqa: E402
+
+
+class StandInDatabase:
+    """Chats and profiles in memory; every query costs `latency` seconds"""
+
+    def __init__(self, chats: int, latency: float):
+        self.latency = latency
+        self.queries = 0
+        self.chats = {
+            f"chat-{i}": {
+                "id": f"chat-{i}",
+                "user_id": f"user-{i % 10}",
+                "snapshot_id": f"im-{i}",
+                "github_repo_url": f"https://github.com/acme/repo-{i}",
+                "branch_name": f"tinygen-{i}",
+                "pr_url": None,
+            }
+            for i in range(chats)
+        }
+        self.profiles = {f"user-{i}": {"github_username": f"dev{i}"} for i in range(10)}
+
+    def chat_blocking(self, chat_id):
+        self.queries += 1
+        time.sleep(self.latency)
+        return self.chats.get(chat_id)
+
+    def profile_blocking(self, user_id):
+        self.queries += 1
+        time.sleep(self.latency)
+        return self.profiles.get(user_id)
+
+    async def chat_context(self, chat_id):
+        self.queries += 1
+        await asyncio.sleep(self.latency)
+        chat = self.chats.get(chat_id)
+        if chat is None:
+            return None
+        return {**chat, **self.profiles[chat["user_id"]]}
+
+
+async def run_scenario(name, lookup, chat_ids, db):
+    latencies = []
+
+    async def one(chat_id):
+        context = await lookup(chat_id)
+        assert context and context["github_username"]
+        # All requests arrive at once, so latency includes time spent queued
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(chat_id) for chat_id in chat_ids))
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "scenario": name,
+        "wall_s": wall,
+        "throughput_rps": len(chat_ids) / wall,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "db_queries": db.queries,
+    }
+
+
+async def main_async(args):
+    chat_ids = [f"chat-{i % args.chats}" for i in range(args.requests)]
+    latency = args.latency_ms / 1000
+    results = []
+
+    db = StandInDatabase(args.chats, latency)
+
+    async def blocking(chat_id):
+        chat = db.chat_blocking(chat_id)
+        profile = db.profile_blocking(chat["user_id"])
+        return {**chat, **profile}
+
+    results.append(await run_scenario("blocking", blocking, chat_ids, db))
+
+    db = StandInDatabase(args.chats, latency)
+    results.append(await run_scenario("joined", db.chat_context, chat_ids, db))
+
+    db = StandInDatabase(args.chats, latency)
+    cache = ChatContextCache(fetch=db.chat_context, ttl=30.0)
+    results.append(await run_scenario("cached", cache.get, chat_ids, db))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    for r in results:
+        print(
+            f"{r['scenario']:>9}: {r['wall_s'] * 1000:8.1f}ms wall  {r['throughput_rps']:9.1f} req/s  "
+            f"p50 {r['p50_ms']:7.1f}ms  p95 {r['p95_ms']:7.1f}ms  {r['db_queries']} queries"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "chat_context", "params": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
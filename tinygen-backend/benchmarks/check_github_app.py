@@ -0,0 +1,226 @@
+"""
+Load test for GET /check-github-app/{username}: p50/p95/p99 latency of
+requests arriving at --rps through the FastAPI app, against a local
+stand-in for the GitHub API (a threaded HTTP server in its own process on
+127.0.0.1 that sleeps --github-latency-ms per request). Latency runs from
+each request's scheduled arrival, so time spent queued behind a stalled
+event loop counts.
+
+  blocking   the handler as it was: a one-off blocking requests.get inside
+             the async handler, which stalls the event loop for everyone
+  pooled     the real route on the shared async GitHubClient, with every
+             login unknown to the installation index (one GitHub call each)
+  indexed    the real route with the index built: the common case, a
+             single store read per request
+
+With --max-p99-ms the run exits with status 1 when the pooled or indexed
+p99 is above it.
+
+    python benchmarks/check_github_app.py --requests 1000 --rps 200
+    python benchmarks/check_github_app.py --github-latency-ms 150 --max-p99-ms 400
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "tiny-functions"))
+
+# Read by the route and the app at import time
+os.environ.setdefault("GITHUB_CLIENT_ID", "bench")
+os.environ.setdefault("GITHUB_PRIVATE_KEY", "bench")
+os.environ["TINYGEN_WARM_START"] = "0"
+
+
+def installation(i: int):
+    return {
+        "id": 100000 + i,
+        "account": {"login": f"dev{i}", "type": "User"},
+        "repository_selection": "all",
+        "suspended_at": None,
+    }
+
+
+class StandInGitHub(ThreadingHTTPServer):
+    """/app/installations and /users/{login}/installation; dev<i> has the app installed for even i"""
+
+    daemon_threads = True
+
+    def __init__(self, latency: float, accounts: int, requests):
+        self.latency = latency
+        self.accounts = accounts
+        # A multiprocessing.Value, read by the benchmark process
+        self.requests = requests
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+
+
+def serve_stand_in(latency: float, accounts: int, requests, ports):
+    server = StandInGitHub(latency, accounts, requests)
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.requests.get_lock():
+            server.requests.value += 1
+        time.sleep(server.latency)
+        path = self.path.split("?", 1)[0]
+        account = re.fullmatch(r"/users/dev(\d+)/installation", path)
+        if path == "/app/installations":
+            self._send(200, [installation(i) for i in range(0, server.accounts, 2)])
+        elif account and int(account.group(1)) % 2 == 0:
+            self._send(200, installation(int(account.group(1))))
+        else:
+            self._send(404, {"message": "Not Found"})
+
+    def _send(self, status: int, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def blocking_app(api_url: str):
+    """The route before the shared client: blocking requests in an async handler"""
+    import requests
+    from fastapi import FastAPI
+
+    app = FastAPI()
+
+    @app.get("/check-github-app/{username}")
+    async def check_github_app_installation(username: str):
+        response = requests.get(
+            f"{api_url}/users/{username}/installation",
+            headers={"Accept": "application/vnd.github.v3+json", "Authorization": "Bearer jwt"},
+            timeout=15,
+        )
+        if response.status_code == 200:
+            return {"installed": True, "installation_id": response.json()["id"]}
+        return {"installed": False}
+
+    return app
+
+
+def install_index(api_url: str, built: bool, clock=time.time):
+    """Point the route's installation index and GitHub client at the stand-in"""
+    import github_client
+    import installation_index
+    from installation_index import META_KEY, InstallationIndex
+
+    github_client._client = github_client.GitHubClient(api_url=api_url)
+    # miss_ttl=0: unknown logins always go to GitHub, so `pooled` measures the client
+    index = InstallationIndex({}, get_jwt=lambda: "jwt", miss_ttl=0 if not built else 60, clock=clock)
+    if built:
+        index.rebuild()
+    else:
+        index.store[META_KEY] = clock()
+    installation_index._index = index
+    return index
+
+
+def percentile(ordered, p: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+async def fire(app, logins, rps: float):
+    import httpx
+
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://api") as client:
+        async def one(login: str, arrival: float):
+            await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+            response = await client.get(f"/check-github-app/{login}")
+            latencies.append(time.perf_counter() - arrival)
+            body = response.json()
+            assert response.status_code == 200 and "error" not in body, body
+            assert body["installed"] == (int(login[3:]) % 2 == 0), body
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(login, started + i / rps) for i, login in enumerate(logins)))
+        wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "wall_s": wall,
+        "throughput_rps": len(logins) / wall,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+async def run_scenarios(args, api_url: str, github_requests):
+    from tiny_fastapi.app import fastapi_client
+
+    results = []
+    # Distinct logins, so neither the old handler nor the index can reuse an answer
+    fresh = [f"dev{i}" for i in range(args.requests)]
+    scenarios = [("blocking", blocking_app(api_url), fresh, None), ("pooled", fastapi_client, fresh, False)]
+    scenarios.append(("indexed", fastapi_client, [f"dev{i % args.accounts}" for i in range(args.requests)], True))
+    for name, app, logins, built in scenarios:
+        if built is not None:
+            install_index(api_url, built)
+        github_requests.value = 0
+        result = await fire(app, logins, args.rps)
+        result.update(scenario=name, github_requests=github_requests.value)
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--rps", type=float, default=100, help="Request arrival rate")
+    parser.add_argument("--accounts", type=int, default=200, help="Distinct logins in the indexed scenario")
+    parser.add_argument("--github-latency-ms", type=float, default=50)
+    parser.add_argument("--max-p99-ms", type=float, help="Fail when the pooled or indexed p99 is above this")
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    args = parser.parse_args()
+
+    # Its own process, so serving GitHub doesn't compete with the API for the GIL
+    github_requests, ports = multiprocessing.Value("i", 0), multiprocessing.Queue()
+    github = multiprocessing.Process(
+        target=serve_stand_in, args=(args.github_latency_ms / 1000, args.accounts, github_requests, ports), daemon=True
+    )
+    github.start()
+    try:
+        api_url = f"http://127.0.0.1:{ports.get(timeout=10)}"
+        results = asyncio.run(run_scenarios(args, api_url, github_requests))
+    finally:
+        github.terminate()
+
+    for r in results:
+        print(
+            f"{r['scenario']:>9}: {r['throughput_rps']:8.1f} req/s  p50 {r['p50_ms']:7.1f}ms  "
+            f"p95 {r['p95_ms']:7.1f}ms  p99 {r['p99_ms']:7.1f}ms  {r['github_requests']} GitHub requests"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "check_github_app", "params": vars(args), "results": results}, f, indent=2)
+
+    if args.max_p99_ms is not None:
+        slow = [r for r in results if r["scenario"] != "blocking" and r["p99_ms"] > args.max_p99_ms]
+        for r in slow:
+            print(f"REGRESSION {r['scenario']}: p99 {r['p99_ms']:.1f}ms > {args.max_p99_ms:.1f}ms")
+        if slow:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Cold-start benchmark for the FastAPI app.
+
+Each sample runs in a fresh interpreter and measures how long importing
+tiny_fastapi.app takes and how long the first request (GET /hello) takes to
+get a response, startup included.
+
+    python benchmarks/cold_start.py --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE = r"""
+import json, time
+started = time.perf_counter()
+from tiny_fastapi.app import fastapi_client
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(fastapi_client) as client:
+    ready = time.perf_counter()
+    response = client.get("/hello")
+    responded = time.perf_counter()
+    response.raise_for_status()
+print(json.dumps({
+    "import_s": imported - started,
+    "startup_s": ready - imported,
+    "first_response_s": responded - ready,
+    "total_s": responded - started,
+}))
+"""
+
+
+def run_sample(env):
+    output = subprocess.run(
+        [sys.executable, "-c", SAMPLE],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(samples):
+    summary = {}
+    for key in samples[0]:
+        values = sorted(sample[key] for sample in samples)
+        summary[key] = {
+            "median": statistics.median(values),
+            "min": values[0],
+            "max": values[-1],
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warm-start", action="store_true", help="Resolve clients and functions at startup (needs credentials)")
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    args = parser.parse_args()
+
+    env = {**os.environ, "TINYGEN_WARM_START": "1" if args.warm_start else "0"}
+    samples = [run_sample(env) for _ in range(args.runs)]
+    results = {"benchmark": "cold_start", "runs": args.runs, "summary": summarize(samples), "samples": samples}
+
+    for key, stats in results["summary"].items():
+        print(f"{key:>18}: median {stats['median'] * 1000:7.1f}ms  (min {stats['min'] * 1000:.1f}, max {stats['max'] * 1000:.1f})")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
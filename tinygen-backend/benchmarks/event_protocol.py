@@ -0,0 +1,155 @@
+"""
+Parser throughput benchmark for the runner event protocol.
+
+Decodes a large transcript of NDJSON frames with the host's EventReader
+and compares it with the legacy line protocol (CHAT_MESSAGE:<chat>:<text>
+with TOOL_USE_JSON: payloads) carrying the same messages. Also measures
+encoding. Uses a recorded transcript when given (one frame per line, e.g.
+a spilled raw log), otherwise synthesizes one.
+
+    python benchmarks/event_protocol.py --events 200000
+    python benchmarks/event_protocol.py --transcript run.ndjson
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tiny-functions"))
+
+from tinygen_runner import events as protocol  # noqa: E402
+from tinygen_runner.events import (  # noqa: E402
+    EventReader, EventWriter, TextEvent, ToolResultEvent, ToolUseEvent, UsageEvent,
+)
+from tinygen_runner.formatting import describe_tool_use  # noqa: E402
+
+WORDS = "the agent reads files edits code runs tests and explains what changed in the repository".split()
+
+
+def synthesize(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    result = []
+    for i in range(count):
+        kind = rng.random()
+        if kind < 0.5:
+            lines = [" ".join(rng.choices(WORDS, k=rng.randint(5, 30))) for _ in range(rng.randint(1, 6))]
+            result.append(TextEvent("\n".join(lines)))
+        elif kind < 0.75:
+            tool_input = {"file_path": f"src/module_{i % 97}.py", "content": "x = 1\n" * rng.randint(1, 60)}
+            result.append(ToolUseEvent(f"tool_{i}", "Write", tool_input, describe_tool_use("Write", f"tool_{i}", tool_input)))
+        elif kind < 0.98:
+            result.append(ToolResultEvent(f"tool_{i}", False, "ok\n" * rng.randint(1, 40)))
+        else:
+            result.append(UsageEvent(input_tokens=rng.randint(100, 5000), output_tokens=rng.randint(10, 800), num_turns=1))
+    return result
+
+
+def legacy_lines(events):
+    """The same messages in the old CHAT_MESSAGE line protocol (text split on newlines)"""
+    lines = []
+    for event in events:
+        if isinstance(event, TextEvent):
+            lines.extend(f"CHAT_MESSAGE:chat:{line}" for line in event.text.split("\n"))
+        elif isinstance(event, ToolUseEvent):
+            lines.append("CHAT_MESSAGE:chat:TOOL_USE_JSON:" + json.dumps(event.display, ensure_ascii=False))
+    return lines
+
+
+def parse_legacy(lines):
+    count = 0
+    for line in lines:
+        line = line.strip()
+        if line.startswith("CHAT_MESSAGE:") and ":" in line[13:]:
+            parts = line.split(":", 2)
+            if len(parts) >= 3:
+                content = parts[2]
+                if content.startswith("TOOL_USE_JSON:"):
+                    json.loads(content[len("TOOL_USE_JSON:"):])
+                count += 1
+    return count
+
+
+def parse_frames(lines):
+    reader = EventReader()
+    count = 0
+    for line in lines:
+        if reader.feed(line) is not None:
+            count += 1
+    return count, reader.gaps
+
+
+def timed(fn, *args, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--transcript", help="Recorded NDJSON transcript to decode instead of a synthetic one")
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    args = parser.parse_args()
+
+    if args.transcript:
+        with open(args.transcript) as f:
+            frames = f.readlines()
+        events = [e for e in (protocol.decode(line) for line in frames) if e is not None]
+    else:
+        events = synthesize(args.events)
+        frames = []
+        writer = EventWriter(frames.append)
+        encode_s, _ = timed(lambda: [writer.emit(e) for e in events], repeat=1)
+
+    if args.transcript:
+        writer = EventWriter(lambda frame: None)
+        encode_s, _ = timed(lambda: [writer.emit(e) for e in events], repeat=1)
+
+    frame_bytes = sum(len(line.encode()) for line in frames)
+    decode_s, (decoded, gaps) = timed(parse_frames, frames)
+
+    legacy = legacy_lines(events)
+    legacy_bytes = sum(len(line.encode()) for line in legacy)
+    legacy_s, legacy_messages = timed(parse_legacy, legacy)
+
+    results = {
+        "benchmark": "event_protocol",
+        "serializer": "orjson" if protocol.orjson is not None else "json",
+        "events": len(events),
+        "frames": {
+            "bytes": frame_bytes,
+            "encode_events_per_s": len(events) / encode_s,
+            "decode_s": decode_s,
+            "decode_events_per_s": decoded / decode_s,
+            "decode_mb_per_s": frame_bytes / decode_s / 1e6,
+            "seq_gaps": gaps,
+        },
+        "legacy": {
+            "bytes": legacy_bytes,
+            "lines": len(legacy),
+            "decode_s": legacy_s,
+            # Multi-line text arrives as several fragments in the old protocol
+            "messages_seen": legacy_messages,
+            "lines_per_s": len(legacy) / legacy_s,
+            "decode_mb_per_s": legacy_bytes / legacy_s / 1e6,
+        },
+    }
+
+    f, l = results["frames"], results["legacy"]
+    print(f"serializer: {results['serializer']}, {len(events)} events")
+    print(f"frames: encode {f['encode_events_per_s']:,.0f} ev/s, decode {f['decode_events_per_s']:,.0f} ev/s ({f['decode_mb_per_s']:.1f} MB/s), gaps {f['seq_gaps']}")
+    print(f"legacy: decode {l['lines_per_s']:,.0f} lines/s ({l['decode_mb_per_s']:.1f} MB/s), {l['messages_seen']} fragments for {len(events)} events")
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(results, out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Clone latency through the mirror cache (git_cache.MirrorCache): a cold
+clone that creates the mirror, a warm clone that reuses the mirror and its
+cached bundle, a warm clone after upstream commits (fetch + rebundle), and
+a plain `git clone` from the origin for comparison.
+
+The origin is a synthetic bare repository served over file://, and both
+sides of the cache (the function's mirror volume and the sandbox's clone)
+are directories on this machine, so the numbers are git's own cost
+without network; --origin-latency-ms adds a fixed delay to each command
+that talks to the origin.
+
+    python benchmarks/git_cache.py --files 2000 --file-kb 4
+    python benchmarks/git_cache.py --runs 10 --output git_cache.json
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tiny-functions"))
+
+from commands import local_runner  # noqa: E402
+from git_cache import MirrorCache  # noqa: E402
+from locks import LocalLocks  # noqa: E402
+
+GIT = ["git", "-c", "user.email=bench@tinygen", "-c", "user.name=bench"]
+
+
+def git(*args: str, cwd=None):
+    subprocess.run([*GIT, *args], cwd=cwd, check=True, capture_output=True)
+
+
+def create_origin(path: str, files: int, file_kb: int) -> str:
+    work = tempfile.mkdtemp()
+    try:
+        git("init", "-q", "-b", "main", cwd=work)
+        for i in range(files):
+            os.makedirs(os.path.join(work, f"pkg{i % 40}"), exist_ok=True)
+            with open(os.path.join(work, f"pkg{i % 40}", f"module_{i}.py"), "w") as f:
+                f.write("".join(f"def f_{i}_{n}(x):\n    return x * {n} + {i}\n\n" for n in range(max(1, file_kb * 1024 // 40))))
+        git("add", "-A", cwd=work)
+        git("commit", "-qm", "initial", cwd=work)
+        git("clone", "-q", "--bare", work, path)
+    finally:
+        shutil.rmtree(work)
+    return path
+
+
+def push_commits(origin: str, commits: int):
+    work = tempfile.mkdtemp()
+    try:
+        git("clone", "-q", origin, work)
+        for i in range(commits):
+            with open(os.path.join(work, f"change_{time.time_ns()}_{i}.py"), "w") as f:
+                f.write(f"VALUE = {i}\n")
+            git("add", "-A", cwd=work)
+            git("commit", "-qm", f"change {i}", cwd=work)
+        git("push", "-q", "origin", "main", cwd=work)
+    finally:
+        shutil.rmtree(work)
+
+
+def host_runner(latency: float):
+    """local_runner for the mirror side, sleeping `latency` before git commands that reach the origin"""
+    def run(*args: str, timeout=None):
+        if latency and args[0] == "git" and ("fetch" in args or "clone" in args):
+            time.sleep(latency)
+        return local_runner(*args, timeout=timeout)
+    return run
+
+
+def timed_clone(cache: MirrorCache, origin: str, sandbox_root: str) -> float:
+    dest = tempfile.mkdtemp(dir=sandbox_root)
+    os.rmdir(dest)
+    started = time.perf_counter()
+    used_mirror = cache.clone(f"file://{origin}", dest, "acme", "widgets")
+    elapsed = time.perf_counter() - started
+    assert used_mirror, "the clone did not go through the mirror"
+    shutil.rmtree(dest)
+    return elapsed
+
+
+def timed_direct_clone(origin: str, sandbox_root: str, latency: float) -> float:
+    dest = os.path.join(sandbox_root, "direct")
+    started = time.perf_counter()
+    if latency:
+        time.sleep(latency)
+    git("clone", "-q", f"file://{origin}", dest)
+    elapsed = time.perf_counter() - started
+    shutil.rmtree(dest)
+    return elapsed
+
+
+def measure(args, origin: str, root: str):
+    latency = args.origin_latency_ms / 1000
+    run = host_runner(latency)
+    sandbox_root = os.path.join(root, "sandbox")
+    os.makedirs(sandbox_root, exist_ok=True)
+    results = {"cold": [], "warm": [], "warm_after_push": [], "direct": []}
+    for i in range(args.runs):
+        mirrors = os.path.join(root, f"git-cache-{i}")
+        cache = MirrorCache(run, locks=LocalLocks(), root=mirrors, clone_run=local_runner)
+        results["cold"].append(timed_clone(cache, origin, sandbox_root))
+        results["warm"].append(timed_clone(cache, origin, sandbox_root))
+        push_commits(origin, args.new_commits)
+        results["warm_after_push"].append(timed_clone(cache, origin, sandbox_root))
+        results["direct"].append(timed_direct_clone(origin, sandbox_root, latency))
+        shutil.rmtree(mirrors)
+    return {
+        name: {
+            "median_ms": statistics.median(times) * 1000,
+            "min_ms": min(times) * 1000,
+            "max_ms": max(times) * 1000,
+        }
+        for name, times in results.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--file-kb", type=int, default=4)
+    parser.add_argument("--new-commits", type=int, default=3, help="Commits pushed to the origin between warm clones")
+    parser.add_argument("--origin-latency-ms", type=float, default=0)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="tinygen-git-cache-") as root:
+        origin = create_origin(os.path.join(root, "origin.git"), args.files, args.file_kb)
+        results = measure(args, origin, root)
+
+    for name, result in results.items():
+        print(f"{name}: median {result['median_ms']:.0f} ms (min {result['min_ms']:.0f}, max {result['max_ms']:.0f})")
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump({
+                "benchmark": "git_cache",
+                "files": args.files,
+                "file_kb": args.file_kb,
+                "new_commits": args.new_commits,
+                "origin_latency_ms": args.origin_latency_ms,
+                "results": results,
+            }, out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
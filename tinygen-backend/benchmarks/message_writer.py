@@ -0,0 +1,110 @@
+"""
+Transcript write throughput: MessageWriter's batched upserts against one
+blocking insert per message, the way agent output used to be stored.
+
+Writes --messages rows to an in-memory Supabase (fake_backends.FakeSupabase)
+that sleeps --db-latency-ms per request, and reports rows/s as seen by the
+producer (the agent's stdout reader), rows/s until everything is durable,
+database requests, and the enqueue-to-written latency of each row.
+
+    python benchmarks/message_writer.py --messages 2000 --db-latency-ms 30
+    python benchmarks/message_writer.py --batch-sizes 10 50 200 --flush-intervals 0.05 0.25 2
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tiny-functions"))
+
+from fake_backends import FakeSupabase  # noqa: E402
+from message_writer import MessageWriter  # noqa: E402
+
+
+def percentile(values, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def per_message_inserts(messages: int, latency: float, interval: float):
+    db = FakeSupabase(latency=latency)
+    latencies = []
+    started = time.perf_counter()
+    for i in range(messages):
+        enqueued = time.perf_counter()
+        db.table("messages").insert({"chat_id": "bench", "content": f"message {i}", "role": "assistant"}).execute()
+        latencies.append(time.perf_counter() - enqueued)
+        if interval:
+            time.sleep(interval)
+    elapsed = time.perf_counter() - started
+    return {
+        "mode": "insert per message",
+        "producer_rows_per_s": messages / elapsed,
+        "durable_rows_per_s": messages / elapsed,
+        "db_requests": db.writes["messages"],
+        "latency_p50_ms": percentile(latencies, 0.5) * 1000,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def batched(messages: int, latency: float, interval: float, batch_size: int, flush_interval: float):
+    db = FakeSupabase(latency=latency)
+    writer = MessageWriter(db, "bench", batch_size=batch_size, flush_interval=flush_interval).start()
+    started = time.perf_counter()
+    for i in range(messages):
+        writer.write(f"message {i}")
+        if interval:
+            time.sleep(interval)
+    produced = time.perf_counter() - started
+    writer.close()
+    durable = time.perf_counter() - started
+    assert len(db.tables["messages"]) == messages
+    return {
+        "mode": f"MessageWriter batch={batch_size} interval={flush_interval}s",
+        "producer_rows_per_s": messages / produced,
+        "durable_rows_per_s": messages / durable,
+        "db_requests": db.writes["messages"],
+        "latency_p50_ms": statistics.median(writer.latencies) * 1000,
+        "latency_p99_ms": percentile(writer.latencies, 0.99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--db-latency-ms", type=float, default=20)
+    parser.add_argument("--interval-ms", type=float, default=0, help="Delay between agent messages")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[50])
+    parser.add_argument("--flush-intervals", type=float, nargs="+", default=[0.25, 2.0])
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    args = parser.parse_args()
+
+    latency, interval = args.db_latency_ms / 1000, args.interval_ms / 1000
+    results = [per_message_inserts(args.messages, latency, interval)]
+    for batch_size in args.batch_sizes:
+        for flush_interval in args.flush_intervals:
+            results.append(batched(args.messages, latency, interval, batch_size, flush_interval))
+
+    for result in results:
+        print(
+            f"{result['mode']}: {result['producer_rows_per_s']:.0f} rows/s to the producer, "
+            f"{result['durable_rows_per_s']:.0f} rows/s durable, {result['db_requests']} requests, "
+            f"latency p50 {result['latency_p50_ms']:.1f} ms / p99 {result['latency_p99_ms']:.1f} ms"
+        )
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump({
+                "benchmark": "message_writer",
+                "messages": args.messages,
+                "db_latency_ms": args.db_latency_ms,
+                "interval_ms": args.interval_ms,
+                "results": results,
+            }, out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
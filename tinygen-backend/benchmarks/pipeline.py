@@ -0,0 +1,244 @@
+"""
+End-to-end benchmark of run_claude_agent's own orchestration cost.
+
+Drives the real pipeline (main._run_claude_agent) against the in-memory
+fakes in fake_backends.py: Supabase tables, GitHub as local bare repos,
+and sandboxes that run git and the indexer on this machine with a scripted
+agent daemon. Each scenario is a clone strategy x repository size x agent
+output size, and reports the run's per-phase wall time (its run_timings
+spans), database requests and rows per table, sandbox execs, and the
+host's peak traced memory (measured on one extra run, as tracing slows
+the others down). Latency flags add a fixed delay per fake call to model
+the network round trips.
+
+Runs start cold (no mirror cache, no repository index), so the clone
+phase shows how each strategy scales with repository size.
+
+With --baseline, results are compared against an earlier --output file and
+the run exits with status 1 when a scenario got slower, wrote more, or
+used more memory than the baseline allows (--tolerance, plus --min-delta-ms
+of absolute slack for timings).
+
+    python benchmarks/pipeline.py --output base.json
+    python benchmarks/pipeline.py --baseline base.json
+    python benchmarks/pipeline.py --sizes 20 2000 --repo-files 200 5000 --clone-strategies full blobless sparse
+    python benchmarks/pipeline.py --db-latency-ms 20 --exec-latency-ms 30 --github-latency-ms 80
+"""
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+FUNCTIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tiny-functions")
+sys.path.insert(0, FUNCTIONS_DIR)
+
+CHAT_ID = "bench-chat-0001"
+OWNER, REPO, USER = "acme", "widgets", "bench-user"
+PROMPT = "Add input validation to pkg0/module_0.py and document it in the README"
+
+
+def synthesize_files(files: int, file_kb: int):
+    contents = {"README.md": "# widgets\n\nA synthetic repository for the pipeline benchmark.\n"}
+    for i in range(files):
+        body = "".join(f"def f_{i}_{n}(x):\n    return x * {n} + {i}\n\n" for n in range(max(1, file_kb * 1024 // 40)))
+        contents[f"pkg{i % 40}/module_{i}.py"] = body
+    return contents
+
+
+def run_once(args, strategy: str, repo_files: int, events: int, traced: bool):
+    import main
+    from fake_backends import FakeGitHub, FakeSupabase, ScriptedAgent, fake_backends
+    from event_publisher import EventPublisher
+    from metrics import Metrics
+    from run_status import CancellationWatcher, RunReporter
+
+    with tempfile.TemporaryDirectory(prefix="tinygen-pipeline-") as root:
+        github = FakeGitHub(os.path.join(root, "github"), latency=args.github_latency_ms / 1000)
+        github.create_repo(f"{OWNER}/{REPO}", synthesize_files(repo_files, args.file_kb), collaborators=[USER])
+        supabase = FakeSupabase(latency=args.db_latency_ms / 1000)
+        supabase.tables["chats"].append({"id": CHAT_ID})
+        run_id = f"bench-run-{strategy}-{repo_files}-{events}"
+        supabase.tables["runs"].append({"id": run_id, "status": "queued"})
+        agent = ScriptedAgent(
+            events=events,
+            files_changed=args.files_changed,
+            text_chars=args.text_chars,
+            turn_latency=args.turn_latency_ms / 1000,
+        )
+        backends = fake_backends(
+            root, supabase=supabase, github=github, agent=agent,
+            exec_latency=args.exec_latency_ms / 1000, metrics=Metrics()
+        )
+        reporter = RunReporter(run_id, supabase=supabase, function="run_claude_agent", metrics=backends.metrics)
+        publisher = EventPublisher(None, None, CHAT_ID)
+        cancellation = CancellationWatcher(None)
+
+        quiet = open(os.devnull, "w") if not args.verbose else None
+        if traced:
+            tracemalloc.start()
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(quiet) if quiet else contextlib.nullcontext():
+            reporter.started()
+            result = reporter.finish(main._run_claude_agent(
+                f"https://github.com/{OWNER}/{REPO}", USER, CHAT_ID, PROMPT,
+                strategy, args.clone_depth, reporter, publisher, cancellation, backends
+            ))
+        wall = time.perf_counter() - started
+        peak = None
+        if traced:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        if quiet:
+            quiet.close()
+
+        phases = {}
+        for row in supabase.tables["run_timings"]:
+            phases[row["phase"]] = phases.get(row["phase"], 0) + row["seconds"]
+        return {
+            "status": result["status"],
+            "error": result.get("error"),
+            "wall_s": wall,
+            "phases": phases,
+            "db_requests": dict(supabase.writes),
+            "db_rows": dict(supabase.rows_written),
+            "messages": len(supabase.tables["messages"]),
+            "sandbox_execs": sum(sandbox.execs for sandbox in backends.sandboxes.leased),
+            "github_calls": github.api_calls,
+            "peak_kb": None if peak is None else peak / 1024,
+        }
+
+
+def measure(args, strategy: str, repo_files: int, events: int):
+    runs = [run_once(args, strategy, repo_files, events, traced=False) for _ in range(args.runs)]
+    traced = run_once(args, strategy, repo_files, events, traced=True)
+    failed = [run for run in runs + [traced] if run["status"] != "success"]
+    phases = sorted({name for run in runs for name in run["phases"]})
+    tables = sorted({table for run in runs for table in run["db_requests"]})
+    return {
+        "name": f"{strategy}/files={repo_files}/events={events}",
+        "strategy": strategy,
+        "repo_files": repo_files,
+        "events": events,
+        "status": failed[0]["status"] if failed else "success",
+        "error": failed[0]["error"] if failed else None,
+        "wall_s": statistics.median(run["wall_s"] for run in runs),
+        "phases": {name: statistics.median(run["phases"].get(name, 0) for run in runs) for name in phases},
+        # Counts can vary with batching timing; keep the largest seen
+        "db_requests": {table: max(run["db_requests"].get(table, 0) for run in runs) for table in tables},
+        "db_rows": {table: max(run["db_rows"].get(table, 0) for run in runs) for table in tables},
+        "messages": runs[0]["messages"],
+        "sandbox_execs": max(run["sandbox_execs"] for run in runs),
+        "github_calls": max(run["github_calls"] for run in runs),
+        "peak_kb": traced["peak_kb"],
+    }
+
+
+def compare(results, baseline, tolerance: float, min_delta: float):
+    """Regressions of `results` against `baseline`, as printable lines"""
+    previous = {scenario["name"]: scenario for scenario in baseline["scenarios"]}
+    regressions = []
+
+    def check(name, what, value, base, slack=0.0):
+        if base is None or value is None:
+            return
+        if value > base * (1 + tolerance) and value - base > slack:
+            regressions.append(f"{name}: {what} {base:.4g} -> {value:.4g} (+{(value / base - 1) * 100 if base else float('inf'):.0f}%)")
+
+    for scenario in results["scenarios"]:
+        base = previous.get(scenario["name"])
+        if base is None:
+            continue
+        name = scenario["name"]
+        if scenario["status"] != "success" and base["status"] == "success":
+            regressions.append(f"{name}: run {scenario['status']} ({scenario['error']})")
+            continue
+        check(name, "wall s", scenario["wall_s"], base["wall_s"], min_delta)
+        for phase, seconds in scenario["phases"].items():
+            check(name, f"{phase} s", seconds, base["phases"].get(phase), min_delta)
+        check(name, "db requests", sum(scenario["db_requests"].values()), sum(base["db_requests"].values()))
+        check(name, "db rows", sum(scenario["db_rows"].values()), sum(base["db_rows"].values()))
+        check(name, "sandbox execs", scenario["sandbox_execs"], base["sandbox_execs"])
+        check(name, "peak KB", scenario["peak_kb"], base["peak_kb"])
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 500], help="Tool calls the scripted agent makes per phase")
+    parser.add_argument("--repo-files", type=int, nargs="+", default=[200, 2000])
+    parser.add_argument("--file-kb", type=int, default=2)
+    parser.add_argument("--clone-strategies", nargs="+", default=["full", "shallow", "blobless", "sparse"])
+    parser.add_argument("--clone-depth", type=int, default=1)
+    parser.add_argument("--files-changed", type=int, default=5, help="Files the scripted agent edits")
+    parser.add_argument("--text-chars", type=int, default=200, help="Length of each agent text event")
+    parser.add_argument("--snapshot-mode", choices=["bundle", "filesystem"], default="bundle")
+    parser.add_argument("--no-index", action="store_true", help="Skip the repository context index")
+    parser.add_argument("--db-latency-ms", type=float, default=0)
+    parser.add_argument("--github-latency-ms", type=float, default=0)
+    parser.add_argument("--exec-latency-ms", type=float, default=0)
+    parser.add_argument("--turn-latency-ms", type=float, default=0)
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per scenario (the median is reported)")
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    parser.add_argument("--baseline", help="JSON results to compare against; regressions exit with status 1")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative increase over the baseline")
+    parser.add_argument("--min-delta-ms", type=float, default=50, help="Timing increases smaller than this never count")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own output")
+    args = parser.parse_args()
+
+    # Read by config at import time
+    os.environ["TINYGEN_SNAPSHOT_MODE"] = args.snapshot_mode
+    os.environ["TINYGEN_REPO_INDEX"] = "0" if args.no_index else "1"
+
+    scenarios = []
+    for strategy in args.clone_strategies:
+        for repo_files in args.repo_files:
+            for events in args.sizes:
+                scenario = measure(args, strategy, repo_files, events)
+                scenarios.append(scenario)
+                phases = " ".join(f"{name}={seconds * 1000:.0f}" for name, seconds in scenario["phases"].items())
+                print(
+                    f"{scenario['name']}: {scenario['status']} in {scenario['wall_s'] * 1000:.0f} ms "
+                    f"[{phases}], {sum(scenario['db_requests'].values())} db writes / "
+                    f"{sum(scenario['db_rows'].values())} rows, {scenario['sandbox_execs']} execs, "
+                    f"peak {scenario['peak_kb'] / 1024:.1f} MB"
+                    + (f" ({scenario['error']})" if scenario["error"] else "")
+                )
+
+    results = {
+        "benchmark": "pipeline",
+        "config": {
+            key: getattr(args, key) for key in (
+                "file_kb", "clone_depth", "files_changed", "text_chars", "snapshot_mode", "no_index",
+                "db_latency_ms", "github_latency_ms", "exec_latency_ms", "turn_latency_ms", "runs",
+            )
+        },
+        "scenarios": scenarios,
+    }
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(results, out, indent=2)
+
+    failed = [scenario["name"] for scenario in scenarios if scenario["status"] != "success"]
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != results["config"]:
+            print("warning: baseline was recorded with different settings")
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms / 1000)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+    if failed:
+        print(f"Failed scenarios: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
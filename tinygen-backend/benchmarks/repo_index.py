@@ -0,0 +1,167 @@
+"""
+Repository context index: build cost, and what it saves the agent.
+
+Indexing (always): builds the index of a repository (synthetic, or --repo)
+from scratch, then again incrementally after --changed files are edited in a
+new commit, and renders the prompt context for --prompt:
+
+    python benchmarks/repo_index.py --files 5000 --changed 20
+    python benchmarks/repo_index.py --repo ~/src/some-repo --prompt "fix the login redirect"
+
+Agent savings (with recorded runs): compares the raw daemon logs of the same
+tasks run without and with the context, one run directory per task named
+the same in both (<dir>/<task>/stdout.ndjson.gz, as written under the
+tinygen-run-logs volume). Reports turns, exploration tool calls (LS, Glob,
+Grep, Read) and agent wall time per task and in total:
+
+    python benchmarks/repo_index.py --baseline runs/plain --indexed runs/context
+"""
+import argparse
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tiny-functions"))
+
+from tinygen_runner.events import ProtocolError, parse_frame  # noqa: E402
+from tinygen_runner.repo_index import build_index, render_context, save_index  # noqa: E402
+
+GIT = ["git", "-c", "user.email=bench@tinygen", "-c", "user.name=bench"]
+EXPLORATION_TOOLS = {"LS", "Glob", "Grep", "Read"}
+
+WORDS = ["user", "session", "token", "invoice", "payment", "report", "cache", "queue", "render", "parser"]
+
+
+def git(*args, cwd=None):
+    subprocess.run([*GIT, *args], cwd=cwd, check=True, capture_output=True)
+
+
+def synthesize_repo(path: str, files: int):
+    os.makedirs(path)
+    git("init", "-q", "-b", "main", cwd=path)
+    for i in range(files):
+        word = WORDS[i % len(WORDS)]
+        directory = os.path.join(path, "src", f"{word}s", f"part{i % 7}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"{word}_{i}.py"), "w") as f:
+            f.write(f"class {word.title()}Handler{i}:\n    def handle(self, {word}):\n        return {word}\n\n")
+            f.write("".join(f"def {word}_step_{n}(value):\n    return value + {n}\n\n" for n in range(30)))
+    git("add", "-A", cwd=path)
+    git("commit", "-qm", "initial", cwd=path)
+
+
+def edit_files(path: str, changed: int):
+    tracked = subprocess.run(["git", "-C", path, "ls-files"], capture_output=True, text=True).stdout.split()
+    for name in tracked[:changed]:
+        with open(os.path.join(path, name), "a") as f:
+            f.write("\n\ndef added_by_agent(value):\n    return value\n")
+    git("commit", "-qam", "changes", cwd=path)
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, result
+
+
+def run_stats(path: str) -> dict:
+    """Turns, exploration tool calls and duration of one recorded run"""
+    stats = {"num_turns": 0, "tool_calls": 0, "exploration_calls": 0, "duration_ms": 0}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            try:
+                frame = parse_frame(line)
+            except ProtocolError:
+                continue
+            if frame is None:
+                continue
+            if frame.get("t") == "tool_use":
+                stats["tool_calls"] += 1
+                stats["exploration_calls"] += frame.get("name") in EXPLORATION_TOOLS
+            elif frame.get("t") == "usage":
+                stats["num_turns"] += frame.get("num_turns") or 0
+                stats["duration_ms"] += frame.get("duration_ms") or 0
+    return stats
+
+
+def compare_runs(baseline: str, indexed: str) -> dict:
+    tasks = {}
+    for task in sorted(os.listdir(baseline)):
+        before = os.path.join(baseline, task, "stdout.ndjson.gz")
+        after = os.path.join(indexed, task, "stdout.ndjson.gz")
+        if os.path.exists(before) and os.path.exists(after):
+            tasks[task] = {"baseline": run_stats(before), "indexed": run_stats(after)}
+    totals = {
+        side: {key: sum(t[side][key] for t in tasks.values()) for key in ("num_turns", "tool_calls", "exploration_calls", "duration_ms")}
+        for side in ("baseline", "indexed")
+    }
+    saved = {key: totals["baseline"][key] - totals["indexed"][key] for key in totals["baseline"]}
+    return {"tasks": tasks, "totals": totals, "saved": saved}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repo", help="Existing repository to index instead of a synthetic one")
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--changed", type=int, default=20, help="Files edited before the incremental build")
+    parser.add_argument("--prompt", default="Add retry handling to the payment token refresh")
+    parser.add_argument("--budget", type=int, default=6000)
+    parser.add_argument("--baseline", help="Recorded runs without the repository context")
+    parser.add_argument("--indexed", help="Recorded runs of the same tasks with the context")
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = os.path.join(tmp, "repo")
+        if args.repo:
+            git("clone", "-q", os.path.abspath(args.repo), repo)
+        else:
+            synthesize_repo(repo, args.files)
+
+        full_s, full = timed(lambda: build_index(repo))
+        index_path = os.path.join(tmp, "index.json.gz")
+        save_index(full, index_path)
+        edit_files(repo, args.changed)
+        incremental_s, incremental = timed(lambda: build_index(repo, full))
+        render_s, context = timed(lambda: render_context(incremental, args.prompt, args.budget))
+
+        results = {
+            "benchmark": "repo_index",
+            "repo": args.repo or f"synthetic {args.files} files",
+            "files": len(full["files"]),
+            "index_bytes": os.path.getsize(index_path),
+            "full": {"seconds": full_s, "reindexed": full["reindexed"]},
+            "incremental": {"seconds": incremental_s, "reindexed": incremental["reindexed"], "changed": args.changed},
+            "context": {"seconds": render_s, "chars": len(context)},
+        }
+
+    print(f"index: {results['files']} files, {results['index_bytes'] / 1024:.0f} KB compressed")
+    print(f"full build:        {full_s * 1000:.0f} ms")
+    print(f"incremental build: {incremental_s * 1000:.0f} ms ({incremental['reindexed']} files reindexed)")
+    print(f"context:           {render_s * 1000:.0f} ms, {len(context)} chars")
+
+    if args.baseline and args.indexed:
+        results["runs"] = compare_runs(args.baseline, args.indexed)
+        for task, sides in results["runs"]["tasks"].items():
+            b, i = sides["baseline"], sides["indexed"]
+            print(
+                f"{task}: turns {b['num_turns']} -> {i['num_turns']}, exploration calls "
+                f"{b['exploration_calls']} -> {i['exploration_calls']}, {b['duration_ms'] / 1000:.0f}s -> {i['duration_ms'] / 1000:.0f}s"
+            )
+        saved = results["runs"]["saved"]
+        print(
+            f"saved over {len(results['runs']['tasks'])} tasks: {saved['num_turns']} turns, "
+            f"{saved['exploration_calls']} exploration calls, {saved['duration_ms'] / 1000:.0f}s"
+        )
+
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(results, out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
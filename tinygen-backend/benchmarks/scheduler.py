@@ -0,0 +1,200 @@
+"""
+Run scheduler under a burst: simulated clock, fake workers, no cloud services.
+
+One team (--burst-users members) submits --burst initial runs at once
+while --users other users submit initial runs and follow-ups over --span
+seconds. The same workload is replayed under three policies:
+
+- unbounded: every run is spawned on arrival (the behaviour before the
+  scheduler)
+- fifo: a global cap of --max-running, first come first served
+- scheduler: RunScheduler with the global cap, per-user cap, fair queuing
+  and the priority lane
+
+and reports peak concurrency, wait times (p50/p95/max) of the burst team,
+the other users' initial runs and all follow-ups, and how far the queue's
+estimated wait at submission was from the actual wait.
+
+    python benchmarks/scheduler.py --burst 40 --users 10 --max-running 20
+"""
+import argparse
+import asyncio
+import heapq
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tiny_fastapi.scheduler import InMemoryQueueStore, RunScheduler  # noqa: E402
+
+
+class SimClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def workload(args) -> list:
+    """(arrival, run_id, function_name, user, duration) sorted by arrival"""
+    rng = random.Random(args.seed)
+    runs = []
+    for i in range(args.burst):
+        user = f"burst-team-{i % args.burst_users}"
+        runs.append((0.0, f"burst-{i}", "run_claude_agent", user, max(60.0, rng.gauss(600, 150))))
+    for u in range(args.users):
+        user = f"user-{u}"
+        for i in range(args.runs_per_user):
+            arrival = rng.uniform(0, args.span)
+            runs.append((arrival, f"{user}-run-{i}", "run_claude_agent", user, max(60.0, rng.gauss(600, 150))))
+            followup_at = arrival + rng.uniform(600, 1200)
+            runs.append((followup_at, f"{user}-followup-{i}", "run_followup_agent", user, max(30.0, rng.gauss(200, 50))))
+    return sorted(runs)
+
+
+def group(run_id: str) -> str:
+    if run_id.startswith("burst-"):
+        return "burst_team"
+    return "followups" if "-followup-" in run_id else "other_initial"
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {"p50": 0, "p95": 0, "max": 0}
+    values = sorted(values)
+    return {
+        "p50": values[len(values) // 2],
+        "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+        "max": values[-1],
+    }
+
+
+def summarize(waits: dict, peak: int, extra: dict = None) -> dict:
+    groups = {}
+    for run_id, wait in waits.items():
+        groups.setdefault(group(run_id), []).append(wait)
+    return {"peak_running": peak, **{name: percentiles(values) for name, values in sorted(groups.items())}, **(extra or {})}
+
+
+def simulate_unbounded(runs: list) -> dict:
+    ends, peak = [], 0
+    for arrival, *_rest, duration in runs:
+        while ends and ends[0] <= arrival:
+            heapq.heappop(ends)
+        heapq.heappush(ends, arrival + duration)
+        peak = max(peak, len(ends))
+    return summarize({run_id: 0.0 for _, run_id, *_ in runs}, peak)
+
+
+def simulate_fifo(runs: list, max_running: int) -> dict:
+    waits, ends, queue, peak = {}, [], [], 0
+    events = [(arrival, 1, run_id, duration) for arrival, run_id, _, _, duration in runs]
+    heapq.heapify(events)
+    while events:
+        now, kind, run_id, duration = heapq.heappop(events)
+        if kind == 0:
+            ends.remove(run_id)
+        else:
+            queue.append((now, run_id, duration))
+        while queue and len(ends) < max_running:
+            arrival, queued_id, queued_duration = queue.pop(0)
+            waits[queued_id] = now - arrival
+            ends.append(queued_id)
+            heapq.heappush(events, (now + queued_duration, 0, queued_id, 0))
+        peak = max(peak, len(ends))
+    return summarize(waits, peak)
+
+
+async def simulate_scheduler(runs: list, args) -> dict:
+    clock = SimClock()
+    store = InMemoryQueueStore()
+    durations = {run_id: duration for _, run_id, _, _, duration in runs}
+    events = []
+    started = {}
+
+    async def dispatch(entry):
+        # Fake worker: finishes after its scripted duration
+        started[entry.run_id] = clock.now
+        heapq.heappush(events, (clock.now + durations[entry.run_id], 0, entry.run_id))
+
+    scheduler = RunScheduler(
+        store,
+        dispatch,
+        max_running=args.max_running,
+        max_per_user=args.max_per_user,
+        priority_reserve=args.priority_reserve,
+        reconcile_interval=float("inf"),
+        clock=clock,
+    )
+    scheduler.load()
+
+    arrivals, estimates, peak = {}, {}, 0
+    info = {run_id: (function_name, user) for _, run_id, function_name, user, _ in runs}
+    for arrival, run_id, *_ in runs:
+        heapq.heappush(events, (arrival, 1, run_id))
+    while events:
+        clock.now, kind, run_id = heapq.heappop(events)
+        if kind == 0:
+            store.statuses[run_id] = "succeeded"
+            await scheduler.finished(run_id, "succeeded")
+            await scheduler.tick()
+        else:
+            arrivals[run_id] = clock.now
+            function_name, user = info[run_id]
+            await scheduler.submit(run_id, function_name, {}, user=user)
+            status = scheduler.status(run_id)
+            if status is not None and status["estimated_wait_seconds"] is not None:
+                estimates[run_id] = status["estimated_wait_seconds"]
+        peak = max(peak, len(scheduler.running()))
+
+    waits = {run_id: started[run_id] - arrivals[run_id] for run_id in started}
+    errors = [abs(estimates[run_id] - waits[run_id]) for run_id in estimates if run_id in waits]
+    return summarize(waits, peak, {
+        "queued_on_arrival": len(estimates),
+        "eta_abs_error": percentiles(errors),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--burst", type=int, default=40, help="Initial runs the burst team submits at t=0")
+    parser.add_argument("--burst-users", type=int, default=4, help="Team members the burst is spread over")
+    parser.add_argument("--users", type=int, default=10, help="Other users")
+    parser.add_argument("--runs-per-user", type=int, default=2)
+    parser.add_argument("--span", type=float, default=1800, help="Seconds over which other users arrive")
+    parser.add_argument("--max-running", type=int, default=20)
+    parser.add_argument("--max-per-user", type=int, default=3)
+    parser.add_argument("--priority-reserve", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    args = parser.parse_args()
+
+    runs = workload(args)
+    results = {
+        "benchmark": "scheduler",
+        "runs": len(runs),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "unbounded": simulate_unbounded(runs),
+        "fifo": simulate_fifo(runs, args.max_running),
+        "scheduler": asyncio.run(simulate_scheduler(runs, args)),
+    }
+
+    for policy in ("unbounded", "fifo", "scheduler"):
+        r = results[policy]
+        waits = ", ".join(
+            f"{name} p50 {r[name]['p50']:.0f}s p95 {r[name]['p95']:.0f}s"
+            for name in ("burst_team", "other_initial", "followups")
+        )
+        print(f"{policy:>9}: peak {r['peak_running']:>3} running | {waits}")
+    eta = results["scheduler"]["eta_abs_error"]
+    print(f"estimated wait error: p50 {eta['p50']:.0f}s p95 {eta['p95']:.0f}s ({results['scheduler']['queued_on_arrival']} runs queued on arrival)")
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(results, out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Snapshot size and restore time: git bundle snapshots against full copies.
+
+Builds a repository (or uses --repo), makes an agent-sized change on a
+tinygen branch with an .agent-metadata directory, then measures:
+
+- bundle: create_bundle_snapshot / restore_bundle_snapshot, with the
+  restore cloning from a local mirror the way a pooled sandbox clones
+  through the mirror cache
+- full: a compressed archive of the whole checkout (working tree + .git),
+  a lower bound for what a filesystem snapshot has to capture and restore
+  on top of the base image
+
+Modal's own filesystem snapshot numbers come from the snapshot_seconds and
+snapshot_restore_seconds metrics, labelled by mode, in production.
+
+    python benchmarks/snapshots.py --files 2000 --changed 20
+    python benchmarks/snapshots.py --repo ~/src/some-repo
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tiny-functions"))
+
+from commands import local_copy, local_runner  # noqa: E402
+from repo_snapshots import BundleSnapshotStore, create_bundle_snapshot, restore_bundle_snapshot  # noqa: E402
+
+GIT = ["git", "-c", "user.email=bench@tinygen", "-c", "user.name=bench"]
+
+
+def git(*args, cwd=None):
+    subprocess.run([*GIT, *args], cwd=cwd, check=True, capture_output=True)
+
+
+def synthesize_repo(path: str, files: int, file_kb: int):
+    os.makedirs(path)
+    git("init", "-q", "-b", "main", cwd=path)
+    for i in range(files):
+        directory = os.path.join(path, f"pkg{i % 40}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"module_{i}.py"), "w") as f:
+            f.write("".join(f"def f_{i}_{n}(x):\n    return x * {n} + {i}\n\n" for n in range(file_kb * 1024 // 40)))
+    git("add", "-A", cwd=path)
+    git("commit", "-qm", "initial", cwd=path)
+
+
+def make_change(work: str, changed: int):
+    git("checkout", "-qb", "tinygen-bench", cwd=work)
+    edited = 0
+    for root, _, names in os.walk(work):
+        if ".git" in root:
+            continue
+        for name in sorted(names):
+            if edited >= changed:
+                break
+            with open(os.path.join(root, name), "a") as f:
+                f.write("\n# edited by the agent\ndef added_helper():\n    return 42\n")
+            edited += 1
+    git("commit", "-qam", "agent changes", cwd=work)
+    os.makedirs(os.path.join(work, ".agent-metadata"), exist_ok=True)
+    with open(os.path.join(work, ".agent-metadata", "notes.md"), "w") as f:
+        f.write("Plan and notes kept by the agent between turns.\n" * 50)
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repo", help="Existing repository to snapshot instead of a synthetic one")
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--file-kb", type=int, default=4)
+    parser.add_argument("--changed", type=int, default=20, help="Files the simulated agent edits")
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        origin = os.path.join(tmp, "origin")
+        if args.repo:
+            git("clone", "-q", "--bare", os.path.abspath(args.repo), origin)
+        else:
+            synthesize_repo(origin, args.files, args.file_kb)
+        mirror = os.path.join(tmp, "mirror.git")
+        git("clone", "-q", "--mirror", origin, mirror)
+
+        work = os.path.join(tmp, "work")
+        git("clone", "-q", origin, work)
+        base = subprocess.run(["git", "-C", work, "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip()
+        make_change(work, args.changed)
+
+        store = BundleSnapshotStore(os.path.join(tmp, "snapshots"))
+        create_s, manifest = timed(lambda: create_bundle_snapshot(
+            local_runner, local_copy, store, "bench", origin, "bench/repo", base, "tinygen-bench", work,
+            session_dir=None
+        ))
+
+        def clone(clone_url, dest):
+            git("clone", "-q", "--reference", mirror, "--dissociate", clone_url, dest)
+
+        restored = os.path.join(tmp, "restored")
+        restore_s, _ = timed(lambda: restore_bundle_snapshot(
+            local_runner, local_copy, store, manifest["id"], clone, restored
+        ))
+
+        archive = os.path.join(tmp, "full.tar.gz")
+
+        def pack():
+            with tarfile.open(archive, "w:gz") as tar:
+                tar.add(work, arcname="repo")
+
+        def unpack():
+            with tarfile.open(archive) as tar:
+                tar.extractall(os.path.join(tmp, "full"))
+
+        full_create_s, _ = timed(pack)
+        full_restore_s, _ = timed(unpack)
+
+        results = {
+            "benchmark": "snapshots",
+            "repo": args.repo or f"synthetic {args.files} files x {args.file_kb} KB",
+            "changed_files": args.changed,
+            "bundle": {"bytes": manifest["bytes"], "create_s": create_s, "restore_s": restore_s},
+            "full": {"bytes": os.path.getsize(archive), "create_s": full_create_s, "restore_s": full_restore_s},
+        }
+
+    b, f = results["bundle"], results["full"]
+    print(f"bundle: {b['bytes'] / 1024:.1f} KB, create {b['create_s'] * 1000:.0f} ms, restore {b['restore_s'] * 1000:.0f} ms (clone from mirror + apply)")
+    print(f"full:   {f['bytes'] / 1024:.1f} KB, create {f['create_s'] * 1000:.0f} ms, restore {f['restore_s'] * 1000:.0f} ms (archive of the checkout)")
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(results, out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
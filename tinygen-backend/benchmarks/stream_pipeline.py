@@ -0,0 +1,183 @@
+"""
+Memory and throughput benchmark for the host-side agent stream pipeline.
+
+Feeds a simulated daemon process (stdout frames generated on the fly, plus
+a chatty stderr) through AgentStreamPipeline at several transcript sizes
+and reports throughput and peak traced memory. With raw logs spilling to
+gzip files the peak should stay roughly flat as the transcript grows;
+--keep-lines shows the alternative of holding every raw line in memory.
+
+    python benchmarks/stream_pipeline.py --events 20000 100000
+    python benchmarks/stream_pipeline.py --handler-delay-ms 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tiny-functions"))
+
+from stream_pipeline import AgentStreamPipeline, SpillingLog  # noqa: E402
+from tinygen_runner.events import EventWriter, PhaseEvent, TextEvent, ToolResultEvent  # noqa: E402
+
+
+class SimulatedStream:
+    """Async iterator of output chunks produced on demand"""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            raise StopAsyncIteration
+        await asyncio.sleep(0)
+        return chunk
+
+
+class SimulatedStdin:
+    def __init__(self, process):
+        self.process = process
+
+    def write(self, data: str):
+        frame = json.loads(data)
+        if frame["command"] == "run":
+            self.process.command = frame["id"]
+            self.process.started.set()
+
+    def drain(self):
+        pass
+
+    def write_eof(self):
+        pass
+
+
+class SimulatedProcess:
+    """A daemon that answers one run command with `events` frames"""
+
+    def __init__(self, events: int, stderr_lines: int):
+        self.events = events
+        self.command = None
+        self.started = asyncio.Event()
+        self.stdin = SimulatedStdin(self)
+        self.stdout = self._stdout()
+        self.stderr = SimulatedStream(f"debug line {i}: " + "x" * 80 for i in range(stderr_lines))
+
+    def _stdout(self):
+        process = self
+
+        class Stdout:
+            def __aiter__(self):
+                return self._frames()
+
+            async def _frames(self):
+                frames = []
+                writer = EventWriter(frames.append)
+                writer.emit(PhaseEvent("ready", version="bench"))
+                yield frames.pop()
+                await process.started.wait()
+                writer.command, writer.phase = process.command, "main"
+                for i in range(process.events):
+                    if i % 2:
+                        writer.emit(TextEvent(f"step {i}: " + "the agent explains what changed " * 4))
+                    else:
+                        writer.emit(ToolResultEvent(f"tool_{i}", False, "ok\n" * 20))
+                    yield frames.pop()
+                writer.emit(PhaseEvent("finished", ok=True, session_id="bench"))
+                yield frames.pop()
+
+        return Stdout()
+
+    def poll(self):
+        return None
+
+
+async def run_once(events: int, stderr_lines: int, log_dir, handler_delay: float, keep_lines: bool):
+    process = SimulatedProcess(events, stderr_lines)
+    kept = []
+
+    def log(name):
+        if keep_lines:
+            log = SpillingLog(None)
+            append = log.append
+            log.append = lambda line: (kept.append(line), append(line))
+            return log
+        return SpillingLog(os.path.join(log_dir, name))
+
+    pipeline = AgentStreamPipeline(process, stdout_log=log("stdout.ndjson.gz"), stderr_log=log("stderr.log.gz")).start()
+    await pipeline.ready
+    delivered = 0
+
+    def handler(event):
+        nonlocal delivered
+        delivered += 1
+        if handler_delay:
+            time.sleep(handler_delay)
+
+    result = await pipeline.call(1, {"id": 1, "command": "run", "args": {}}, handler)
+    await pipeline.close()
+    return {
+        "ok": result.ok,
+        "delivered": delivered,
+        "seq_gaps": pipeline.reader.gaps,
+        "max_line_queue": pipeline.max_line_queue,
+        "max_event_queue": pipeline.max_event_queue,
+        "spilled_lines": pipeline.stdout_log.spilled_lines + pipeline.stderr_log.spilled_lines,
+        "kept_lines": len(kept),
+    }
+
+
+def measure(events: int, stderr_lines: int, handler_delay: float, keep_lines: bool):
+    with tempfile.TemporaryDirectory() as log_dir:
+        tracemalloc.start()
+        started = time.perf_counter()
+        stats = asyncio.run(run_once(events, stderr_lines, log_dir, handler_delay, keep_lines))
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        log_bytes = sum(os.path.getsize(os.path.join(log_dir, name)) for name in os.listdir(log_dir))
+    return {
+        "events": events,
+        "stderr_lines": stderr_lines,
+        "seconds": elapsed,
+        "events_per_s": events / elapsed,
+        "peak_mb": peak / 1e6,
+        "log_bytes": log_bytes,
+        **stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, nargs="+", default=[10000, 50000, 200000])
+    parser.add_argument("--stderr-ratio", type=float, default=0.5, help="stderr lines per stdout event")
+    parser.add_argument("--handler-delay-ms", type=float, default=0.0, help="Simulated time to store each event")
+    parser.add_argument("--keep-lines", action="store_true", help="Hold every raw line in memory instead of spilling")
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    args = parser.parse_args()
+
+    runs = []
+    for events in args.events:
+        run = measure(events, int(events * args.stderr_ratio), args.handler_delay_ms / 1000, args.keep_lines)
+        runs.append(run)
+        print(
+            f"{events:>8} events: {run['events_per_s']:,.0f} ev/s, peak {run['peak_mb']:.1f} MB, "
+            f"queues {run['max_line_queue']}/{run['max_event_queue']}, logs {run['log_bytes'] / 1e6:.1f} MB gz"
+        )
+
+    results = {"benchmark": "stream_pipeline", "keep_lines": args.keep_lines, "runs": runs}
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(results, out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from modal import App, Image, asgi_app
+from modal import App, Image, Secret, Volume, asgi_app, concurrent
 from tiny_fastapi.app import fastapi_client
 
 fastapi_image = (
@@ -6,19 +6,41 @@ fastapi_image = (
     .pip_install(
         "fastapi",
         "uvicorn",
-        "httpx",
+        "httpx[http2]",
         "pydantic>=2.0",
         "supabase",
+        "pyjwt[crypto]",
+        "requests",
     )
     .add_local_dir("tiny_fastapi", remote_path="/root/tiny_fastapi")
+    # Shared with the Modal functions: GitHub auth and the installation index
+    .add_local_file("tiny-functions/config.py", "/root/config.py")
+    .add_local_file("tiny-functions/locks.py", "/root/locks.py")
+    .add_local_file("tiny-functions/github_client.py", "/root/github_client.py")
+    .add_local_file("tiny-functions/github_auth.py", "/root/github_auth.py")
+    .add_local_file("tiny-functions/installation_index.py", "/root/installation_index.py")
+    # Diff artifacts written by agent runs, read by the diffs router
+    .add_local_file("tiny-functions/commands.py", "/root/commands.py")
+    .add_local_file("tiny-functions/diff_artifacts.py", "/root/diff_artifacts.py")
+    # Counters and phase timings published by the functions, served on /metrics
+    .add_local_file("tiny-functions/metrics.py", "/root/metrics.py")
 )
 
 app = App(name="tinygen-backend")
 
+diff_volume = Volume.from_name("tinygen-diff-artifacts", create_if_missing=True)
 
+
+# The chat stream hub is in-process: publishers and SSE subscribers must
+# reach the same container, so the API runs as one concurrent container
 @app.function(
-    image=fastapi_image
+    image=fastapi_image,
+    secrets=[Secret.from_name("all-tinygen")],
+    volumes={"/diff-artifacts": diff_volume},
+    min_containers=1,
+    max_containers=1
     )
+@concurrent(max_inputs=1000)
 @asgi_app()
 def serve():
     return fastapi_client
\ No newline at end of file
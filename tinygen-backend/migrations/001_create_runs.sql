@@ -0,0 +1,29 @@
+-- Background jobs spawned by the API (create-sandbox, agent runs, follow-ups).
+-- Written by the Modal functions with the service role key; read through
+-- GET /runs/{id} and GET /runs?ids=...
+create table if not exists public.runs (
+    id uuid primary key default gen_random_uuid(),
+    chat_id uuid references public.chats(id) on delete cascade,
+    kind text not null,
+    status text not null default 'queued',  -- queued | running | succeeded | failed | cancelled
+    phase text,
+    progress real not null default 0,
+    params jsonb not null default '{}'::jsonb,
+    result jsonb,
+    error text,
+    function_call_id text,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now(),
+    started_at timestamptz,
+    finished_at timestamptz
+);
+
+create index if not exists runs_chat_id_created_at_idx on public.runs (chat_id, created_at desc);
+
+alter table public.runs enable row level security;
+
+-- Users can read the runs of their own chats
+create policy "runs_select_own" on public.runs
+    for select using (
+        exists (select 1 from public.chats c where c.id = runs.chat_id and c.user_id = auth.uid())
+    );
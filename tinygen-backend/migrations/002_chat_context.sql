@@ -0,0 +1,22 @@
+-- Chat row plus the owner's GitHub username in one round trip, for
+-- POST /run-followup-agent. Runs with the caller's privileges, so the
+-- same RLS policies apply as to reading chats and profiles directly.
+create or replace function public.get_chat_context(p_chat_id uuid)
+returns table (
+    id uuid,
+    user_id uuid,
+    snapshot_id text,
+    github_repo_url text,
+    branch_name text,
+    pr_url text,
+    github_username text
+)
+language sql
+stable
+security invoker
+as $$
+    select c.id, c.user_id, c.snapshot_id, c.github_repo_url, c.branch_name, c.pr_url, p.github_username
+    from public.chats c
+    left join public.profiles p on p.id = c.user_id
+    where c.id = p_chat_id
+$$;
@@ -0,0 +1,27 @@
+-- Claude session of a chat's latest agent run, resumed by follow-ups
+alter table public.chats add column if not exists agent_session_id text;
+
+-- get_chat_context gains agent_session_id; the return type changes, so
+-- the function is recreated
+drop function if exists public.get_chat_context(uuid);
+
+create function public.get_chat_context(p_chat_id uuid)
+returns table (
+    id uuid,
+    user_id uuid,
+    snapshot_id text,
+    github_repo_url text,
+    branch_name text,
+    pr_url text,
+    agent_session_id text,
+    github_username text
+)
+language sql
+stable
+security invoker
+as $$
+    select c.id, c.user_id, c.snapshot_id, c.github_repo_url, c.branch_name, c.pr_url, c.agent_session_id, p.github_username
+    from public.chats c
+    left join public.profiles p on p.id = c.user_id
+    where c.id = p_chat_id
+$$;
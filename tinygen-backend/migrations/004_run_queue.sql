@@ -0,0 +1,24 @@
+-- Runs admitted by the API's scheduler and not finished yet. A row is
+-- added when a run is requested, gets dispatched_at when its Modal function
+-- is spawned, and is deleted once the run reaches a terminal status, so a
+-- restarted API picks up both the waiting and the running runs.
+-- Times are epoch seconds (the scheduler's clock); start_tag/finish_tag
+-- are the fair-queuing virtual times of the run's user.
+create table if not exists public.run_queue (
+    run_id uuid primary key references public.runs(id) on delete cascade,
+    function_name text not null,
+    kwargs jsonb not null default '{}'::jsonb,
+    "user" text not null,
+    repo text,
+    lane text not null default 'standard',  -- priority | standard
+    cost double precision not null,
+    start_tag double precision not null,
+    finish_tag double precision not null,
+    enqueued_at double precision not null,
+    dispatched_at double precision
+);
+
+create index if not exists run_queue_user_idx on public.run_queue ("user");
+
+-- Only the API (service role) reads and writes the queue
+alter table public.run_queue enable row level security;
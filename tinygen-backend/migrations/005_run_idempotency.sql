@@ -0,0 +1,9 @@
+-- Idempotency for the endpoints that start runs: the client's
+-- Idempotency-Key (or "auto:<fingerprint>" for requests sent without one)
+-- and a hash of the request, so a repeated request returns the existing run
+alter table public.runs add column if not exists idempotency_key text;
+alter table public.runs add column if not exists request_fingerprint text;
+
+create index if not exists runs_kind_idempotency_key_idx
+    on public.runs (kind, idempotency_key, created_at desc)
+    where idempotency_key is not null;
@@ -0,0 +1,5 @@
+-- Run cancellation: the sandbox a run is working in, so POST /runs/{id}/cancel
+-- can terminate it even when the run's function is gone, and when the
+-- cancel was requested
+alter table public.runs add column if not exists sandbox_id text;
+alter table public.runs add column if not exists cancel_requested_at timestamptz;
@@ -0,0 +1,25 @@
+-- Per-phase timings of runs (token fetch, sandbox, clone, agent, review,
+-- commit/push, PR, snapshot), written by the Modal functions when a run
+-- finishes; read through GET /runs/{id}/timings. The same spans are summed
+-- into the run_phase_seconds histogram on /metrics
+create table if not exists public.run_timings (
+    id bigint generated always as identity primary key,
+    run_id uuid not null references public.runs(id) on delete cascade,
+    function text,
+    phase text not null,
+    started_at timestamptz not null,
+    seconds double precision not null
+);
+
+create index if not exists run_timings_run_id_idx on public.run_timings (run_id, started_at);
+
+alter table public.run_timings enable row level security;
+
+-- Users can read the timings of their own chats' runs
+create policy "run_timings_select_own" on public.run_timings
+    for select using (
+        exists (
+            select 1 from public.runs r join public.chats c on c.id = r.chat_id
+            where r.id = run_timings.run_id and c.user_id = auth.uid()
+        )
+    );
@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+from fake_backends import FakeGitHub, FakeSandbox, ScriptedAgent
+
+
+class Clock:
+    """A clock that only moves when a test sets or advances `now`"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+class FakeSandboxBackend:
+    """Creates FakeSandboxes under `root` and finds them by id, like Sandbox.create / Sandbox.from_id"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.github = FakeGitHub(os.path.join(root, "github"))
+        self.agent = ScriptedAgent()
+        self.sandboxes = {}
+
+    def create(self):
+        sandbox = FakeSandbox(os.path.join(self.root, f"sandbox-{len(self.sandboxes) + 1}"), self.github, self.agent)
+        self.sandboxes[sandbox.object_id] = sandbox
+        return sandbox
+
+    def from_id(self, sandbox_id: str):
+        if sandbox_id not in self.sandboxes:
+            raise LookupError(sandbox_id)
+        return self.sandboxes[sandbox_id]
+
+
+@pytest.fixture
+def sandbox_backend(tmp_path):
+    return FakeSandboxBackend(str(tmp_path))
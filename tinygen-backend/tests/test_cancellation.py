@@ -0,0 +1,96 @@
+import asyncio
+
+from tiny_fastapi.cancellation import RunCanceller
+
+
+class Runner:
+    """A run's side of cancellation: its status advances one second per poll"""
+
+    def __init__(self, clock, stops_after=None, status="cancelled"):
+        self.clock = clock
+        self.stops_after = stops_after
+        self.final_status = status
+        self.signalled, self.forced, self.released = [], [], []
+
+    async def signal(self, run_id):
+        self.signalled.append(run_id)
+
+    async def status(self, run_id):
+        self.clock.now += 1
+        if self.stops_after is not None and self.clock.now - 1000 >= self.stops_after:
+            return self.final_status
+        return "running"
+
+    async def force(self, run):
+        self.forced.append(run["id"])
+
+    async def release(self, run_id, status):
+        self.released.append((run_id, status))
+
+
+def canceller(runner, clock, grace=15):
+    return RunCanceller(runner.signal, runner.status, runner.force, runner.release, grace=grace, poll_interval=0, clock=clock)
+
+
+async def cancel_and_wait(cancel, run):
+    await cancel.cancel(run)
+    while cancel.pending(run["id"]):
+        await asyncio.sleep(0)
+
+
+def test_a_run_that_stops_within_the_grace_period_is_not_forced(clock):
+    runner = Runner(clock, stops_after=5, status="succeeded")
+    cancel = canceller(runner, clock)
+    asyncio.run(cancel_and_wait(cancel, {"id": "run-1"}))
+    assert runner.signalled == ["run-1"] and runner.forced == []
+    # Released with the status the run actually ended in
+    assert runner.released == [("run-1", "succeeded")]
+    assert (cancel.requested, cancel.stopped, cancel.forced) == (1, 1, 0)
+
+
+def test_a_run_still_going_after_the_grace_period_is_forced(clock):
+    runner = Runner(clock)
+    cancel = canceller(runner, clock)
+    asyncio.run(cancel_and_wait(cancel, {"id": "run-1", "sandbox_id": "sb-1"}))
+    assert runner.forced == ["run-1"] and runner.released == [("run-1", "cancelled")]
+    assert clock.now == 1015
+    assert (cancel.stopped, cancel.forced) == (0, 1)
+
+
+def test_repeated_cancels_enforce_once(clock):
+    runner = Runner(clock, stops_after=3)
+    cancel = canceller(runner, clock)
+
+    async def scenario():
+        await cancel.cancel({"id": "run-1"})
+        await cancel_and_wait(cancel, {"id": "run-1"})
+
+    asyncio.run(scenario())
+    assert runner.signalled == ["run-1", "run-1"]
+    assert runner.released == [("run-1", "cancelled")]
+    assert cancel.requested == 2 and cancel.stopped == 1
+
+
+def test_a_failing_force_leaves_the_slot_to_the_schedulers_reconcile(clock):
+    runner = Runner(clock)
+
+    async def broken(run):
+        raise RuntimeError("modal unavailable")
+
+    runner.force = broken
+    cancel = canceller(runner, clock, grace=2)
+    asyncio.run(cancel_and_wait(cancel, {"id": "run-1"}))
+    assert runner.released == [] and not cancel.pending("run-1")
+
+
+def test_close_stops_pending_enforcement(clock):
+    runner = Runner(clock)
+    cancel = RunCanceller(runner.signal, runner.status, runner.force, runner.release, grace=60, poll_interval=10, clock=clock)
+
+    async def scenario():
+        await cancel.cancel({"id": "run-1"})
+        await asyncio.sleep(0)
+        await cancel.close()
+
+    asyncio.run(scenario())
+    assert runner.forced == [] and runner.released == []
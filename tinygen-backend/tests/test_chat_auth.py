@@ -0,0 +1,129 @@
+import gzip
+import time
+
+import jwt
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from tiny_fastapi import auth
+from tiny_fastapi.chat_context import ChatContextCache
+from tiny_fastapi.routers import diffs, runs, stream
+
+SECRET = "test-jwt-secret-at-least-32-bytes-long"
+OWNER = "6f1c2d2e-0000-4000-8000-000000000001"
+OTHER = "6f1c2d2e-0000-4000-8000-000000000002"
+
+
+def token(user_id: str, secret: str = SECRET, **claims) -> str:
+    payload = {"sub": user_id, "aud": "authenticated", "exp": time.time() + 3600, **claims}
+    return jwt.encode(payload, secret, algorithm="HS256")
+
+
+class FakeDiffStore:
+    def read_manifest(self, chat_id, artifact_id):
+        return {"id": artifact_id, "base": "a" * 40, "tree": "b" * 40, "files": [], "totals": {}, "diffstat": ""}
+
+    def read_patch(self, chat_id, artifact_id, index):
+        return gzip.compress(b"+hello\n")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def fetch(chat_id):
+        return {"id": chat_id, "user_id": OWNER} if chat_id == "chat-1" else None
+
+    monkeypatch.setenv("SUPABASE_JWT_SECRET", SECRET)
+    monkeypatch.setattr(auth, "chat_contexts", ChatContextCache(fetch=fetch))
+    monkeypatch.setattr(diffs, "_store", FakeDiffStore())
+    app = FastAPI()
+    app.include_router(diffs.router)
+    app.include_router(stream.router)
+    return TestClient(app)
+
+
+def bearer(user_id: str, **kwargs):
+    return {"Authorization": f"Bearer {token(user_id, **kwargs)}"}
+
+
+def test_owner_reads_diffs(client):
+    response = client.get("/chats/chat-1/diffs/abc", headers=bearer(OWNER))
+    assert response.status_code == 200 and response.json()["id"] == "abc"
+    response = client.get("/chats/chat-1/diffs/abc/files/0", headers=bearer(OWNER))
+    assert response.status_code == 200 and response.text == "+hello\n"
+
+
+@pytest.mark.parametrize("path", ["/chats/chat-1/stream", "/chats/chat-1/diffs/abc", "/chats/chat-1/diffs/abc/files/0"])
+def test_missing_or_invalid_tokens_are_rejected(client, path):
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers=bearer(OWNER, secret="a-different-secret-of-32-bytes-or-more")).status_code == 401
+    assert client.get(path, headers=bearer(OWNER, exp=time.time() - 10)).status_code == 401
+    assert client.get(path, headers=bearer(OWNER, aud="anon")).status_code == 401
+
+
+@pytest.mark.parametrize("path", ["/chats/chat-1/stream", "/chats/chat-1/diffs/abc", "/chats/chat-2/diffs/abc"])
+def test_other_users_and_unknown_chats_look_the_same(client, path):
+    response = client.get(path, headers=bearer(OTHER))
+    assert response.status_code == 404 and response.json()["detail"] == "Chat not found"
+
+
+def test_stream_accepts_the_token_as_a_query_parameter(client):
+    response = client.get(f"/chats/chat-1/stream?access_token={token(OTHER)}")
+    assert response.status_code == 404
+    response = client.get(f"/chats/chat-1/diffs/abc?access_token={token(OWNER)}")
+    assert response.status_code == 200
+
+
+class FakeCanceller:
+    def __init__(self):
+        self.cancelled = []
+
+    def pending(self, run_id):
+        return False
+
+    async def cancel(self, row):
+        self.cancelled.append(row["id"])
+
+
+@pytest.fixture
+def runs_client(monkeypatch):
+    rows = {
+        "run-1": {"id": "run-1", "chat_id": "chat-1", "kind": "run_claude_agent", "status": "running"},
+        "run-2": {"id": "run-2", "chat_id": "chat-2", "kind": "run_claude_agent", "status": "running"},
+    }
+
+    async def fetch(chat_id):
+        owner = {"chat-1": OWNER, "chat-2": OTHER}.get(chat_id)
+        return {"id": chat_id, "user_id": owner} if owner else None
+
+    canceller = FakeCanceller()
+    monkeypatch.setenv("SUPABASE_JWT_SECRET", SECRET)
+    monkeypatch.setattr(auth, "chat_contexts", ChatContextCache(fetch=fetch))
+    monkeypatch.setattr(runs, "get_runs", lambda run_ids: [dict(rows[run_id]) for run_id in run_ids if run_id in rows])
+    monkeypatch.setattr(runs, "get_run_timings", lambda run_id: [])
+    monkeypatch.setattr(runs, "request_cancel", lambda run_id: None)
+    monkeypatch.setattr(runs, "get_scheduler", lambda: None)
+    monkeypatch.setattr(runs, "get_canceller", lambda: canceller)
+    app = FastAPI()
+    app.include_router(runs.router)
+    client = TestClient(app)
+    client.canceller = canceller
+    return client
+
+
+def test_runs_are_visible_to_their_chat_owner_only(runs_client):
+    assert runs_client.get("/runs/run-1").status_code == 401
+    assert runs_client.get("/runs/run-1", headers=bearer(OWNER)).json()["status"] == "running"
+    assert runs_client.get("/runs/run-1/timings", headers=bearer(OWNER)).json() == []
+    for path in ("/runs/run-2", "/runs/run-2/timings", "/runs/missing"):
+        response = runs_client.get(path, headers=bearer(OWNER))
+        assert response.status_code == 404 and response.json()["detail"] == "Run not found"
+    response = runs_client.get("/runs?ids=run-2,run-1,missing", headers=bearer(OWNER))
+    assert [run["id"] for run in response.json()] == ["run-1"]
+
+
+def test_only_the_owner_can_cancel_a_run(runs_client):
+    assert runs_client.post("/runs/run-2/cancel").status_code == 401
+    assert runs_client.post("/runs/run-2/cancel", headers=bearer(OWNER)).status_code == 404
+    assert runs_client.post("/runs/run-1/cancel", headers=bearer(OWNER)).status_code == 200
+    assert runs_client.canceller.cancelled == ["run-1"]
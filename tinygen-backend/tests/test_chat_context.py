@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from tiny_fastapi.chat_context import ChatContextCache
+from tiny_fastapi.routers import stream
+
+
+class Chats:
+    def __init__(self):
+        self.rows = {"chat-1": {"id": "chat-1", "user_id": "u1", "snapshot_id": "snap-1"}}
+        self.fetches = 0
+
+    async def fetch(self, chat_id):
+        self.fetches += 1
+        row = self.rows.get(chat_id)
+        return dict(row) if row else None
+
+
+def test_finished_run_drops_the_entry_once():
+    chats = Chats()
+    cache = ChatContextCache(fetch=chats.fetch)
+
+    async def scenario():
+        assert (await cache.get("chat-1"))["snapshot_id"] == "snap-1"
+        chats.rows["chat-1"]["snapshot_id"] = "snap-2"
+        cache.run_finished("chat-1", "run-1")
+        assert (await cache.get("chat-1"))["snapshot_id"] == "snap-2"
+        # Reported again (another poll of the same run): the entry stays
+        cache.run_finished("chat-1", "run-1")
+        await cache.get("chat-1")
+        cache.run_finished(None, "run-2")
+
+    asyncio.run(scenario())
+    assert chats.fetches == 2
+
+
+@pytest.fixture
+def client(monkeypatch):
+    chats = Chats()
+    cache = ChatContextCache(fetch=chats.fetch)
+    monkeypatch.setenv("TINYGEN_STREAM_TOKEN", "stream-token")
+    monkeypatch.setattr(stream, "chat_contexts", cache)
+    monkeypatch.setattr(stream, "get_scheduler", lambda: None)
+    app = FastAPI()
+    app.include_router(stream.router)
+    client = TestClient(app)
+    client.chats, client.cache = chats, cache
+    return client
+
+
+def publish(client, *events):
+    response = client.post(
+        "/chats/chat-1/events",
+        json={"events": [{"event": event, "data": data} for event, data in events]},
+        headers={"Authorization": "Bearer stream-token"},
+    )
+    assert response.status_code == 200
+
+
+def test_terminal_status_invalidates_without_chat_updated(client):
+    asyncio.run(client.cache.get("chat-1"))
+    client.chats.rows["chat-1"]["snapshot_id"] = "snap-2"
+
+    publish(client, ("status", {"run_id": "run-1", "status": "running"}))
+    assert asyncio.run(client.cache.get("chat-1"))["snapshot_id"] == "snap-1"
+
+    # The run's chat_updated event was lost; its terminal status still arrives
+    publish(client, ("status", {"run_id": "run-1", "status": "succeeded"}))
+    assert asyncio.run(client.cache.get("chat-1"))["snapshot_id"] == "snap-2"
+
+
+def test_waiters_survive_a_cancelled_fetch():
+    chats = Chats()
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def fetch(chat_id):
+        chats.fetches += 1
+        if chats.fetches == 1:
+            started.set()
+            await release.wait()
+        return dict(chats.rows[chat_id])
+
+    cache = ChatContextCache(fetch=fetch)
+
+    async def scenario():
+        first = asyncio.create_task(cache.get("chat-1"))
+        await started.wait()
+        waiter = asyncio.create_task(cache.get("chat-1"))
+        await asyncio.sleep(0)
+        first.cancel()
+        context = await asyncio.wait_for(waiter, 5)
+        assert first.cancelled()
+        return context
+
+    assert asyncio.run(scenario())["snapshot_id"] == "snap-1"
+    assert chats.fetches == 2
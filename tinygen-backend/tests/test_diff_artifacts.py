@@ -0,0 +1,88 @@
+import gzip
+import os
+import subprocess
+
+import pytest
+
+from commands import local_runner, local_streamer
+from diff_artifacts import DiffArtifactStore, capture_staged_diff, parse_numstat, split_patch
+
+GIT = ["git", "-c", "user.email=test@tinygen", "-c", "user.name=test"]
+
+
+def git(*args, cwd=None):
+    return subprocess.run([*GIT, *args], cwd=cwd, check=True, capture_output=True, text=True).stdout
+
+
+def test_parse_numstat_renames_and_binary_files():
+    output = "3\t1\tREADME.md\0" "0\t0\t\0old/name.py\0new/name.py\0" "-\t-\tlogo.png\0" "0\t0\trun.sh\0"
+    assert parse_numstat(output) == [
+        {"index": 0, "path": "README.md", "old_path": None, "added": 3, "deleted": 1, "binary": False},
+        {"index": 1, "path": "new/name.py", "old_path": "old/name.py", "added": 0, "deleted": 0, "binary": False},
+        {"index": 2, "path": "logo.png", "old_path": None, "added": 0, "deleted": 0, "binary": True},
+        {"index": 3, "path": "run.sh", "old_path": None, "added": 0, "deleted": 0, "binary": False},
+    ]
+    assert parse_numstat("") == []
+
+
+def test_split_patch_across_chunk_boundaries():
+    patch = (
+        "diff --git a/a.py b/a.py\n--- a/a.py\n+++ b/a.py\n@@ -1 +1 @@\n-x\n+y\n"
+        "diff --git a/run.sh b/run.sh\nold mode 100644\nnew mode 100755\n"
+        "diff --git a/b.py b/b.py\n+no newline at end"
+    )
+    chunks = [patch[i:i + 7] for i in range(0, len(patch), 7)]
+    sections = ["".join(section) for section in split_patch(chunks)]
+    assert [section.splitlines()[0] for section in sections] == [
+        "diff --git a/a.py b/a.py", "diff --git a/run.sh b/run.sh", "diff --git a/b.py b/b.py",
+    ]
+    assert "".join(sections) == patch
+    assert list(split_patch([])) == []
+
+
+@pytest.fixture
+def repo(tmp_path):
+    work = tmp_path / "repo"
+    work.mkdir()
+    git("init", "-q", "-b", "main", cwd=work)
+    (work / "README.md").write_text("widgets\n")
+    (work / "billing.py").write_text("".join(f"line {i}\n" for i in range(20)))
+    (work / "run.sh").write_text("echo hi\n")
+    (work / "logo.png").write_bytes(b"\x89PNG\0\1\2")
+    git("add", "-A", cwd=work)
+    git("commit", "-qm", "initial", cwd=work)
+    return work
+
+
+def test_capture_staged_diff_with_renames_binary_and_mode_changes(repo, tmp_path):
+    git("mv", "billing.py", "invoices.py", cwd=repo)
+    (repo / "README.md").write_text("widgets\nand gadgets\n")
+    os.chmod(repo / "run.sh", 0o755)
+    (repo / "logo.png").write_bytes(b"\x89PNG\0\3\4\5")
+    git("add", "-A", cwd=repo)
+    store = DiffArtifactStore(str(tmp_path / "artifacts"))
+
+    manifest = capture_staged_diff(local_runner, local_streamer, store, "chat-1", str(repo))
+    files = {f["path"]: f for f in manifest["files"]}
+    assert files["invoices.py"]["old_path"] == "billing.py"
+    assert files["logo.png"]["binary"]
+    assert (files["run.sh"]["added"], files["run.sh"]["deleted"]) == (0, 0)
+    assert manifest["totals"] == {"files": 4, "added": 1, "deleted": 0}
+    assert store.read_manifest("chat-1", manifest["id"]) == manifest
+
+    # File N of the numstat is patch N, including entries without hunks
+    for f in manifest["files"]:
+        patch = gzip.decompress(store.read_patch("chat-1", manifest["id"], f["index"])).decode()
+        assert patch.startswith("diff --git ") and f" b/{f['path']}\n" in patch.splitlines(True)[0]
+        assert f["patch_bytes"] == len(patch)
+    mode = gzip.decompress(store.read_patch("chat-1", manifest["id"], files["run.sh"]["index"])).decode()
+    assert "new mode 100755" in mode
+
+    # The same staged tree is not diffed again
+    assert capture_staged_diff(local_runner, None, store, "chat-1", str(repo), previous=manifest) is manifest
+    assert capture_staged_diff(local_runner, None, store, "chat-1", str(repo)) == manifest
+
+
+def test_nothing_staged(repo, tmp_path):
+    store = DiffArtifactStore(str(tmp_path / "artifacts"))
+    assert capture_staged_diff(local_runner, local_streamer, store, "chat-1", str(repo)) is None
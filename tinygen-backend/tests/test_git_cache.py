@@ -0,0 +1,77 @@
+import os
+import subprocess
+
+import pytest
+
+from commands import local_runner
+from git_cache import MirrorCache
+from locks import LocalLocks
+
+GIT = ["git", "-c", "user.email=test@tinygen", "-c", "user.name=test"]
+
+
+def git(*args, cwd=None):
+    return subprocess.run([*GIT, *args], cwd=cwd, check=True, capture_output=True, text=True).stdout
+
+
+@pytest.fixture
+def origin(tmp_path):
+    work = tmp_path / "work"
+    work.mkdir()
+    git("init", "-q", "-b", "main", cwd=work)
+    (work / "README.md").write_text("hello\n")
+    git("add", "-A", cwd=work)
+    git("commit", "-qm", "initial", cwd=work)
+    git("clone", "-q", "--bare", str(work), str(tmp_path / "origin.git"))
+    return tmp_path / "origin.git"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    sandbox_calls = []
+
+    def sandbox_run(*args, timeout=None):
+        sandbox_calls.append(args)
+        return local_runner(*args, timeout=timeout)
+
+    cache = MirrorCache(local_runner, locks=LocalLocks(), root=str(tmp_path / "git-cache"), clone_run=sandbox_run)
+    cache.sandbox_calls = sandbox_calls
+    return cache
+
+
+def test_sandbox_never_touches_the_mirror_root(cache, origin, tmp_path):
+    url = f"file://{origin}"
+    assert cache.clone(url, str(tmp_path / "first"), "acme", "widgets")
+    assert cache.clone(url, str(tmp_path / "second"), "acme", "widgets")
+
+    assert os.path.isdir(cache.mirror_path("acme", "widgets"))
+    assert not any(cache.root in arg for args in cache.sandbox_calls for arg in args)
+    clone = tmp_path / "second"
+    assert (clone / "README.md").read_text() == "hello\n"
+    assert git("-C", str(clone), "remote", "get-url", "origin").strip() == url
+    # The clone owns its objects: no alternates into the mirror
+    assert not (clone / ".git" / "objects" / "info" / "alternates").exists()
+
+
+def test_bundle_is_rebuilt_only_when_refs_change(cache, origin, tmp_path):
+    url = f"file://{origin}"
+    bundle = cache.transfer_bundle(url, "acme", "widgets")
+    built = os.stat(bundle).st_mtime_ns
+    assert cache.transfer_bundle(url, "acme", "widgets") == bundle
+    assert os.stat(bundle).st_mtime_ns == built
+
+    work = tmp_path / "push"
+    git("clone", "-q", url, str(work))
+    (work / "NEW.md").write_text("new\n")
+    git("add", "-A", cwd=work)
+    git("commit", "-qm", "new", cwd=work)
+    git("push", "-q", "origin", "main", cwd=work)
+
+    cache.clone(url, str(tmp_path / "fresh"), "acme", "widgets")
+    assert (tmp_path / "fresh" / "NEW.md").exists()
+
+
+def test_falls_back_to_a_direct_clone_when_the_mirror_fails(cache, origin, tmp_path):
+    cache.transfer_bundle = lambda *args: None
+    assert not cache.clone(f"file://{origin}", str(tmp_path / "direct"), "acme", "widgets")
+    assert (tmp_path / "direct" / "README.md").exists()
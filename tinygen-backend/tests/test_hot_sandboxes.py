@@ -0,0 +1,107 @@
+import threading
+
+import pytest
+
+from hot_sandboxes import HotSandboxRegistry
+from metrics import Metrics
+
+
+@pytest.fixture
+def registry(sandbox_backend, clock):
+    return HotSandboxRegistry({}, sandbox_backend, idle_window=600, metrics=Metrics(), clock=clock)
+
+
+def counter(registry, name):
+    return registry.metrics.totals().get((name, ""), 0)
+
+
+def test_claim_within_the_window(registry):
+    sandbox = registry.backend.create()
+    registry.park("chat-1", sandbox, branch_name="tinygen/1")
+    claimed, state = registry.claim("chat-1")
+    assert claimed is sandbox and state["branch_name"] == "tinygen/1"
+    # Claimed once; the next follow-up restores from the snapshot
+    assert registry.claim("chat-1") == (None, None)
+    assert counter(registry, "hot_sandbox_hits") == 1 and counter(registry, "hot_sandbox_misses") == 1
+
+
+def test_expired_and_dead_sandboxes_are_not_claimed(registry):
+    expired, dead = registry.backend.create(), registry.backend.create()
+    registry.park("chat-1", expired, deadline=registry.clock() + 30)
+    registry.park("chat-2", dead)
+    dead.returncode = 1
+    registry.clock.now += 31
+
+    assert registry.claim("chat-1") == (None, None) and expired.terminated
+    assert registry.claim("chat-2") == (None, None)
+    assert counter(registry, "hot_sandbox_expired") == 1 and counter(registry, "hot_sandbox_dead") == 1
+
+
+def test_parking_again_replaces_the_previous_sandbox(registry):
+    first, second = registry.backend.create(), registry.backend.create()
+    registry.park("chat-1", first)
+    registry.park("chat-1", second)
+    assert first.terminated and not second.terminated
+    assert registry.claim("chat-1")[0] is second
+
+
+def test_concurrent_claims_hand_the_sandbox_to_one_run(registry):
+    registry.park("chat-1", registry.backend.create())
+    start = threading.Barrier(8)
+    claimed = []
+
+    def claim():
+        start.wait()
+        claimed.append(registry.claim("chat-1")[0])
+
+    threads = [threading.Thread(target=claim) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len([sandbox for sandbox in claimed if sandbox is not None]) == 1
+
+
+class RacingStore(dict):
+    """Runs `during_pop` the first time the reaper pops an entry, as another container would"""
+
+    def __init__(self, during_pop):
+        super().__init__()
+        self.during_pop = during_pop
+
+    def pop(self, key, *default):
+        during_pop, self.during_pop = self.during_pop, None
+        if during_pop:
+            during_pop()
+        return super().pop(key, *default)
+
+
+def test_an_expired_sandbox_is_terminated_once_when_a_claim_races_the_reaper(sandbox_backend, clock):
+    store = RacingStore(None)
+    registry = HotSandboxRegistry(store, sandbox_backend, idle_window=600, metrics=Metrics(), clock=clock)
+    sandbox = sandbox_backend.create()
+    registry.park("chat-1", sandbox)
+    clock.now += 601
+    claimed = []
+    store.during_pop = lambda: claimed.append(registry.claim("chat-1"))
+
+    # The claim pops the entry between the reaper listing and popping it
+    assert registry.reap() == 0
+    assert claimed == [(None, None)] and sandbox.terminated and store == {}
+    assert counter(registry, "hot_sandbox_expired") == 1
+
+
+def test_a_sandbox_parked_during_a_reap_is_kept(sandbox_backend, clock):
+    old, new = sandbox_backend.create(), sandbox_backend.create()
+    store = RacingStore(None)
+    registry = HotSandboxRegistry(store, sandbox_backend, idle_window=600, clock=clock)
+    registry.park("chat-1", old)
+    clock.now += 601
+
+    def repark():
+        store["chat-1"] = {"sandbox_id": new.object_id, "expires_at": clock() + 600}
+
+    store.during_pop = repark
+    assert registry.reap() == 0
+    assert not new.terminated and store["chat-1"]["sandbox_id"] == new.object_id
+    assert registry.claim("chat-1")[0] is new
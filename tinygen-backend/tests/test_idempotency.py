@@ -0,0 +1,152 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from tiny_fastapi.chat_context import ChatContextCache
+from tiny_fastapi.idempotency import RunDeduplicator
+from tiny_fastapi.routers import agents
+
+
+class Runs:
+    """The runs table: status by run id"""
+
+    def __init__(self):
+        self.statuses = {}
+        self.created = []
+
+    async def find(self, kind, key, since):
+        return None
+
+    async def status(self, run_id):
+        return self.statuses.get(run_id)
+
+    def create(self, kind, chat_id, params, idempotency_key=None, request_fingerprint=None):
+        run_id = f"run-{len(self.created) + 1}"
+        self.created.append((run_id, params, idempotency_key, request_fingerprint))
+        self.statuses[run_id] = "queued"
+        return run_id
+
+
+@pytest.mark.parametrize("status, reused", [
+    ("queued", True), ("running", True), ("succeeded", False), ("failed", False), ("cancelled", False),
+])
+def test_duplicates_without_a_key_reuse_only_runs_in_progress(status, reused, clock):
+    runs = Runs()
+    dedupe = RunDeduplicator(runs.find, runs.status, clock=clock)
+
+    async def create(stored_key):
+        return runs.create("kind", None, {}, stored_key)
+
+    async def scenario():
+        first, _ = await dedupe.run_once("kind", None, "fp", create)
+        runs.statuses[first] = status
+        clock.now += 10
+        return first, await dedupe.run_once("kind", None, "fp", create)
+
+    first, (second, was_reused) = asyncio.run(scenario())
+    assert was_reused is reused
+    assert (second == first) is reused
+
+
+@pytest.mark.parametrize("status, reused", [("running", True), ("succeeded", True), ("failed", False)])
+def test_an_idempotency_key_reuses_finished_runs(status, reused, clock):
+    runs = Runs()
+    dedupe = RunDeduplicator(runs.find, runs.status, clock=clock)
+
+    async def create(stored_key):
+        return runs.create("kind", None, {}, stored_key)
+
+    async def scenario():
+        first, _ = await dedupe.run_once("kind", "key-1", "fp", create)
+        runs.statuses[first] = status
+        clock.now += 3600
+        return await dedupe.run_once("kind", "key-1", "fp", create)
+
+    assert asyncio.run(scenario())[1] is reused
+
+
+class Scheduler:
+    def __init__(self):
+        self.submitted = []
+
+    async def submit(self, run_id, function_name, kwargs, user, repo):
+        self.submitted.append((run_id, kwargs))
+
+
+@pytest.fixture
+def client(monkeypatch):
+    chat = {
+        "id": "chat-1",
+        "user_id": "u1",
+        "snapshot_id": "snap-1",
+        "github_repo_url": "https://github.com/acme/widgets",
+        "github_username": "dev",
+        "branch_name": "tinygen/1",
+        "pr_url": "https://github.com/acme/widgets/pull/1",
+        "agent_session_id": "session-1",
+    }
+
+    async def fetch(chat_id):
+        return dict(chat) if chat_id == "chat-1" else None
+
+    runs, scheduler = Runs(), Scheduler()
+    dedupe = RunDeduplicator(runs.find, runs.status)
+    monkeypatch.setattr(agents, "chat_contexts", ChatContextCache(fetch=fetch, ttl=0))
+    monkeypatch.setattr(agents, "create_run", runs.create)
+    monkeypatch.setattr(agents, "get_scheduler", lambda: scheduler)
+    monkeypatch.setattr(agents, "get_deduplicator", lambda: dedupe)
+    app = FastAPI()
+    app.include_router(agents.router)
+    client = TestClient(app)
+    client.chat, client.runs, client.scheduler = chat, runs, scheduler
+    return client
+
+
+def followup(client, prompt="fix the tests"):
+    response = client.post("/run-followup-agent", json={"chat_id": "chat-1", "prompt": prompt})
+    assert response.status_code == 200 and response.json()["status"] == "started"
+    return response.json()
+
+
+def test_followup_retry_is_recognised_after_the_chat_changes(client):
+    first = followup(client)
+    # The chat's session and snapshot move on while the run is in progress
+    client.chat.update(agent_session_id="session-2", snapshot_id="snap-2")
+    retry = followup(client)
+    assert retry == {**first, "reused": True}
+    assert len(client.scheduler.submitted) == 1
+
+    assert followup(client, "and the docs")["reused"] is False
+    client.runs.statuses[first["run_id"]] = "succeeded"
+    assert followup(client)["reused"] is False
+    assert len(client.scheduler.submitted) == 3
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/create-sandbox", {"chat_id": "chat-1", "repo_url": "not a repo", "user_github_username": "dev"}),
+    ("/run-claude-agent", {"chat_id": "chat-1", "repo_url": "https://example.com/x", "user_github_username": "dev", "prompt": "hi"}),
+])
+def test_malformed_repo_urls_are_rejected_before_a_run_is_created(client, path, body):
+    response = client.post(path, json=body)
+    assert response.json()["status"] == "error" and "Invalid GitHub repository URL" in response.json()["error"]
+    assert client.runs.created == [] and client.scheduler.submitted == []
+
+
+@pytest.mark.parametrize("chat_repo, reused", [
+    ("https://github.com/acme/widgets", True),
+    # Forked on create: the chat records the user's fork
+    ("https://github.com/Dev/widgets", True),
+    ("https://github.com/dev/gadgets", False),
+    ("https://github.com/someone-else/widgets", False),
+])
+def test_create_sandbox_reuses_the_chats_snapshot_of_the_repo_or_its_fork(client, chat_repo, reused):
+    client.chat["github_repo_url"] = chat_repo
+    body = {"chat_id": "chat-1", "repo_url": "https://github.com/acme/widgets", "user_github_username": "dev"}
+    response = client.post("/create-sandbox", json=body).json()
+    if reused:
+        assert response == {**response, "status": "ready", "snapshot_id": "snap-1", "reused": True}
+        assert client.runs.created == []
+    else:
+        assert response["status"] == "started" and len(client.runs.created) == 1
@@ -0,0 +1,129 @@
+import asyncio
+import re
+from collections import Counter
+
+import httpx
+import pytest
+
+from github_client import GitHubClient
+from installation_index import InstallationIndex
+
+INSTALLATIONS = 5000
+
+
+class FakeGitHubAPI:
+    """The two installation endpoints the index uses, over httpx.MockTransport"""
+
+    def __init__(self, installations: int):
+        self.installations = {
+            f"account-{i}": {
+                "id": 100000 + i,
+                "account": {"login": f"Account-{i}", "type": "Organization" if i % 3 else "User"},
+                "repository_selection": "selected",
+                "suspended_at": None,
+            }
+            for i in range(installations)
+        }
+        self.requests = Counter()
+
+    def install(self, login: str, installation_id: int):
+        self.installations[login.lower()] = {
+            "id": installation_id,
+            "account": {"login": login, "type": "User"},
+            "repository_selection": "all",
+            "suspended_at": None,
+        }
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path == "/app/installations":
+            self.requests["list"] += 1
+            per_page = int(request.url.params.get("per_page", 30))
+            page = int(request.url.params.get("page", 1))
+            everything = list(self.installations.values())
+            items = everything[(page - 1) * per_page:page * per_page]
+            headers = {}
+            if page * per_page < len(everything):
+                headers["Link"] = f'<https://api.github.com/app/installations?per_page={per_page}&page={page + 1}>; rel="next"'
+            return httpx.Response(200, json=items, headers=headers)
+        account = re.fullmatch(r"/users/([^/]+)/installation", path)
+        if account:
+            self.requests["account"] += 1
+            installation = self.installations.get(account.group(1).lower())
+            if installation is None:
+                return httpx.Response(404, json={"message": "Not Found"})
+            return httpx.Response(200, json=installation)
+        return httpx.Response(404)
+
+
+@pytest.fixture
+def github():
+    return FakeGitHubAPI(INSTALLATIONS)
+
+
+@pytest.fixture
+def index(github, clock):
+    transport = httpx.MockTransport(github.handle)
+    client = GitHubClient()
+    client._sync_client = httpx.Client(transport=transport)
+    client._async_client = httpx.AsyncClient(transport=transport)
+    client._async_slots = asyncio.Semaphore(client.max_concurrency)
+    return InstallationIndex({}, get_jwt=lambda: "jwt", ttl=3600, miss_ttl=60, client=client, clock=clock)
+
+
+def test_first_lookup_paginates_every_installation(index, github):
+    entry = index.lookup("account-4999")
+    assert entry["id"] == 100000 + 4999
+    assert github.requests["list"] == INSTALLATIONS // 100
+    assert len(list(index.entries())) == INSTALLATIONS
+
+    # Every other account is now a single index read
+    for i in range(0, INSTALLATIONS, 7):
+        assert index.lookup(f"ACCOUNT-{i}")["id"] == 100000 + i
+    assert github.requests["account"] == 0
+
+
+def test_refresh_picks_up_new_installations_and_drops_removed_ones(index, github):
+    index.rebuild()
+    github.install("NewCo", 999999)
+    del github.installations["account-17"]
+    index.clock.now += 3601
+
+    index.rebuild()
+    assert index.lookup("newco")["id"] == 999999
+    assert github.requests["account"] == 0
+    # Removed accounts fall through to GitHub once, then hit the miss cache
+    assert index.lookup("account-17") is None
+    assert index.lookup("account-17") is None
+    assert github.requests["account"] == 1
+
+
+def test_miss_is_filled_from_github_without_a_rebuild(index, github):
+    index.rebuild()
+    github.install("Latecomer", 424242)
+    assert index.lookup("latecomer")["id"] == 424242
+    assert github.requests == Counter(list=INSTALLATIONS // 100, account=1)
+    assert index.lookup("latecomer")["id"] == 424242
+    assert github.requests["account"] == 1
+
+
+def test_uninstall_webhook_removes_the_entry(index, github):
+    index.rebuild()
+    installation = github.installations.pop("account-42")
+    assert index.apply_webhook("installation", {"action": "deleted", "installation": installation})
+    assert not any(entry["login"] == "Account-42" for entry in index.entries())
+    assert len(list(index.entries())) == INSTALLATIONS - 1
+
+    assert index.lookup("account-42") is None
+    assert github.requests["account"] == 1
+
+
+def test_async_lookup_uses_the_same_index(index, github):
+    index.rebuild()
+
+    async def lookups():
+        return await asyncio.gather(*(index.alookup(f"account-{i}") for i in range(0, INSTALLATIONS, 50)))
+
+    entries = asyncio.run(lookups())
+    assert [entry["id"] for entry in entries] == [100000 + i for i in range(0, INSTALLATIONS, 50)]
+    assert github.requests["account"] == 0
@@ -0,0 +1,27 @@
+import pytest
+
+import main
+from fake_backends import FakeGitHub, fake_backends
+
+
+class BrokenGitHub(FakeGitHub):
+    def has_push_access(self, owner, repo_name, user_github_username, access_token):
+        raise RuntimeError("GitHub is down")
+
+
+def test_sandbox_is_released_when_the_access_check_fails(tmp_path):
+    backends = fake_backends(str(tmp_path), github=BrokenGitHub(str(tmp_path / "github")))
+    with pytest.raises(RuntimeError, match="GitHub is down"):
+        main.lease_sandbox_for(backends, "acme", "widgets", "dev", "ghs_token")
+    [sandbox] = backends.sandboxes.leased
+    assert sandbox.terminated
+    assert backends.sandboxes.released == 1
+
+
+def test_sandbox_is_returned_with_the_access_check(tmp_path):
+    github = FakeGitHub(str(tmp_path / "github"))
+    github.collaborators.add(("acme/widgets", "dev"))
+    backends = fake_backends(str(tmp_path), github=github)
+    sandbox, has_access = main.lease_sandbox_for(backends, "acme", "widgets", "dev", "ghs_token")
+    assert has_access and not sandbox.terminated
+    assert backends.sandboxes.released == 0
@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+from locks import DictLocks, LockTimeout
+
+
+class Store(dict):
+    """modal.Dict's put(skip_if_exists) over a plain dict"""
+
+    def put(self, key, value, skip_if_exists=False):
+        if skip_if_exists and key in self:
+            return False
+        self[key] = value
+        return True
+
+
+def test_a_held_lock_outlives_its_lease():
+    locks = DictLocks(Store(), lease_seconds=0.3, poll_interval=0.02)
+    with locks.hold("mirror:acme/widgets"):
+        time.sleep(1.0)
+        with pytest.raises(LockTimeout):
+            locks.acquire("mirror:acme/widgets", timeout=0.1)
+    assert locks.store == {}
+    token = locks.acquire("mirror:acme/widgets", timeout=0.1)
+    assert locks.store["lock:mirror:acme/widgets"]["token"] == token
+
+
+class RacingStore(Store):
+    """Another waiter breaks the expired lock and takes it right after we read it"""
+
+    def get(self, key, default=None):
+        value = super().get(key, default)
+        if value and value["token"] == "crashed":
+            self[key] = {"token": "rival", "expires_at": time.time() + 600}
+        return value
+
+
+def test_breaking_an_expired_lock_never_pops_a_new_holder():
+    store = RacingStore({"lock:x": {"token": "crashed", "expires_at": time.time() - 1}})
+    locks = DictLocks(store, poll_interval=0.01)
+    with pytest.raises(LockTimeout):
+        locks.acquire("x", timeout=0.05)
+    assert store["lock:x"]["token"] == "rival"
+
+
+def test_renewal_stops_once_the_lock_is_lost():
+    locks = DictLocks(Store(), lease_seconds=0.15)
+    with locks.hold("x"):
+        locks.store["lock:x"] = {"token": "thief", "expires_at": time.time() + 600}
+        time.sleep(0.2)
+    # Neither renewed over nor released by the old holder
+    assert locks.store["lock:x"]["token"] == "thief"
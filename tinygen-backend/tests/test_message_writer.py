@@ -0,0 +1,60 @@
+from fake_backends import FakeSupabase
+from message_writer import MessageWriter
+
+
+def test_rows_are_batched_and_ordered():
+    db = FakeSupabase()
+    with MessageWriter(db, "chat-1", batch_size=10, flush_interval=0.01) as writer:
+        for i in range(25):
+            writer.write(f"message {i}")
+    rows = db.tables["messages"]
+    assert [row["content"] for row in rows] == [f"message {i}" for i in range(25)]
+    assert [row["metadata"]["seq"] for row in rows] == list(range(1, 26))
+    assert writer.rows_written == 25 and writer.batches_written >= 3
+
+
+def test_only_recent_latencies_are_kept():
+    with MessageWriter(FakeSupabase(), "chat-1", batch_size=10, flush_interval=0.01, latency_samples=8) as writer:
+        for i in range(25):
+            writer.write(f"message {i}")
+    assert writer.rows_written == 25 and len(writer.latencies) == 8
+
+
+def test_seq_continues_across_writers_of_a_chat():
+    db = FakeSupabase()
+    # A user message without a seq must not reset the sequence
+    db.tables["messages"].append({"id": "u", "chat_id": "chat-1", "content": "hi", "metadata": None})
+    with MessageWriter(db, "chat-1", flush_interval=0.01) as first:
+        first.write("run 1")
+        first.write("run 1 again")
+    with MessageWriter(db, "chat-1", flush_interval=0.01) as second:
+        second.write("follow-up")
+    with MessageWriter(db, "chat-2", flush_interval=0.01) as other:
+        other.write("another chat")
+
+    seqs = {row["content"]: (row["metadata"] or {}).get("seq") for row in db.tables["messages"]}
+    assert seqs["run 1"] == 1 and seqs["run 1 again"] == 2
+    assert seqs["follow-up"] == 3
+    assert seqs["another chat"] == 1
+
+
+def test_retried_batch_does_not_duplicate_rows():
+    db = FakeSupabase()
+    execute = db._execute
+    failures = []
+
+    def flaky(query):
+        result = execute(query)
+        if query.action == "upsert" and not failures:
+            # The batch landed, but the response was lost
+            failures.append(query)
+            raise ConnectionError("connection reset")
+        return result
+
+    db._execute = flaky
+    writer = MessageWriter(db, "chat-1", flush_interval=0.01, retry_backoff=0).start()
+    for i in range(5):
+        writer.write(f"message {i}")
+    writer.close()
+    assert len(db.tables["messages"]) == 5
+    assert writer.failed_batches == 1 and writer.dropped_rows == 0
@@ -0,0 +1,109 @@
+import metrics
+from metrics import FOLDED_KEY, Metrics, compact_counters, read_counters, render_prometheus
+
+
+class Store(dict):
+    """modal.Dict's update() over a plain dict"""
+
+
+def test_compaction_folds_idle_containers_without_losing_counts(monkeypatch):
+    store, now = Store(), [1000.0]
+    monkeypatch.setattr(metrics.time, "time", lambda: now[0])
+    finished, live = Metrics(store, source="task-1"), Metrics(store, source="task-2")
+    finished.incr("runs", phase="clone")
+    finished.incr("runs", phase="clone")
+    now[0] = 3000
+    live.incr("runs", phase="clone")
+    live.incr("runs", phase="agent")
+
+    before = read_counters(store)
+    assert before == {("runs", "phase=clone"): 3, ("runs", "phase=agent"): 1}
+    assert compact_counters(store, idle_after=1800, clock=lambda: now[0]) == 1
+    assert read_counters(store) == before
+    assert not any(key.endswith("task-1") for key in store)
+    # Listed until the next run sees its keys are gone
+    assert store[FOLDED_KEY]["sources"] == ["task-1"]
+
+    # Later compactions keep adding to the same aggregate
+    now[0] = 6000
+    assert compact_counters(store, idle_after=1800, clock=lambda: now[0]) == 1
+    assert read_counters(store) == before
+    assert set(store) == {FOLDED_KEY}
+
+
+def test_a_read_between_folding_and_deleting_counts_each_container_once():
+    class Interrupted(Store):
+        def pop(self, key, default=None):
+            raise RuntimeError("compaction died")
+
+    store = Interrupted({"counter|runs||task-1": 2, "seen|task-1": 0, "counter|runs||task-2": 1, "seen|task-2": 5000})
+    try:
+        compact_counters(store, idle_after=1800, clock=lambda: 5000)
+    except RuntimeError:
+        pass
+    assert read_counters(store) == {("runs", ""): 3}
+
+    # The next run finishes the job
+    store = Store(store)
+    assert compact_counters(store, idle_after=1800, clock=lambda: 5000) == 0
+    assert read_counters(store) == {("runs", ""): 3}
+    assert "counter|runs||task-1" not in store and "seen|task-1" not in store
+    compact_counters(store, idle_after=1800, clock=lambda: 5000)
+    assert store[FOLDED_KEY] == {"sources": [], "totals": {"runs|": 2}}
+
+
+def test_a_container_that_wakes_up_after_being_folded_starts_a_new_source(monkeypatch):
+    store, now = Store(), [0.0]
+    monkeypatch.setattr(metrics.time, "time", lambda: now[0])
+    container = Metrics(store, source="task-1", idle_after=1800)
+    container.incr("runs")
+    now[0] = 2000
+    compact_counters(store, idle_after=1800, clock=lambda: now[0])
+    container.incr("runs")
+
+    assert read_counters(store) == {("runs", ""): 2}
+    assert store["counter|runs||task-1.1"] == 1
+    # The process still counts everything it recorded
+    assert container.totals() == {("runs", ""): 2}
+
+
+def test_histogram_buckets_are_rendered_cumulatively():
+    recorded = Metrics()
+    for seconds in (0.05, 0.3, 0.4, 7):
+        recorded.observe("phase_seconds", seconds, buckets=(0.1, 0.5, 10), phase="clone")
+    recorded.observe("phase_seconds", 20, buckets=(0.1, 0.5, 10), phase="agent")
+    recorded.incr("runs", status="ok")
+
+    lines = render_prometheus(recorded.totals(), {("queue_depth", ""): 3}).splitlines()
+    assert lines == [
+        "# TYPE tinygen_phase_seconds histogram",
+        'tinygen_phase_seconds_count{phase="agent"} 1',
+        'tinygen_phase_seconds_count{phase="clone"} 4',
+        'tinygen_phase_seconds_sum{phase="agent"} 20',
+        'tinygen_phase_seconds_sum{phase="clone"} 7.75',
+        # Every series gets every bound seen in any series, and +Inf equals the count
+        'tinygen_phase_seconds_bucket{le="0.1",phase="agent"} 0',
+        'tinygen_phase_seconds_bucket{le="0.5",phase="agent"} 0',
+        'tinygen_phase_seconds_bucket{le="10",phase="agent"} 0',
+        'tinygen_phase_seconds_bucket{le="+Inf",phase="agent"} 1',
+        'tinygen_phase_seconds_bucket{le="0.1",phase="clone"} 1',
+        'tinygen_phase_seconds_bucket{le="0.5",phase="clone"} 3',
+        'tinygen_phase_seconds_bucket{le="10",phase="clone"} 4',
+        'tinygen_phase_seconds_bucket{le="+Inf",phase="clone"} 4',
+        "# TYPE tinygen_queue_depth gauge",
+        "tinygen_queue_depth 3",
+        "# TYPE tinygen_runs counter",
+        'tinygen_runs{status="ok"} 1',
+    ]
+
+
+def test_buckets_summed_across_containers_stay_cumulative():
+    store = Store()
+    containers = {source: Metrics(store, source=source) for source in ("task-1", "task-2")}
+    for source, seconds in (("task-1", 0.2), ("task-2", 0.2), ("task-2", 5)):
+        containers[source].observe("phase_seconds", seconds, buckets=(1, 10))
+    text = render_prometheus(read_counters(store))
+    assert 'tinygen_phase_seconds_bucket{le="1"} 2' in text
+    assert 'tinygen_phase_seconds_bucket{le="10"} 3' in text
+    assert 'tinygen_phase_seconds_bucket{le="+Inf"} 3' in text
+    assert "tinygen_phase_seconds_count 3" in text
@@ -0,0 +1,61 @@
+import httpx
+import pytest
+
+from github_auth import RepoAccessResolver
+
+
+class FakeClient:
+    """GitHub REST responses by path; a status code or a (status, json) pair"""
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.calls = []
+
+    def get(self, path, token):
+        self.calls.append(path)
+        route = self.routes.get(path, 404)
+        status, body = route if isinstance(route, tuple) else (route, {})
+        headers = {"x-ratelimit-remaining": "0"} if status == 403 else {}
+        return httpx.Response(status, json=body, headers=headers)
+
+
+COLLABORATOR = "/repos/acme/widgets/collaborators/dev/permission"
+
+
+def resolver(routes, clock=lambda: 1000.0):
+    return RepoAccessResolver(FakeClient(routes), ttl=120, clock=clock)
+
+
+def test_write_permission_is_cached():
+    access = resolver({COLLABORATOR: (200, {"permission": "write"})})
+    assert access.has_write_access("acme", "widgets", "dev", "token")
+    calls = len(access.client.calls)
+    assert access.has_write_access("Acme", "Widgets", "Dev", "token")
+    assert len(access.client.calls) == calls
+
+
+def test_org_member_with_push_has_access():
+    access = resolver({
+        "/orgs/acme/members/dev": 204,
+        "/repos/acme/widgets": (200, {"permissions": {"push": True}}),
+    })
+    assert access.has_write_access("acme", "widgets", "dev", "token")
+
+
+@pytest.mark.parametrize("status", [502, 429, 403])
+def test_a_failed_probe_raises_and_is_not_cached(status):
+    access = resolver({COLLABORATOR: status})
+    with pytest.raises(RuntimeError, match=str(status)):
+        access.has_write_access("acme", "widgets", "dev", "token")
+    # GitHub recovers; the next run gets the real answer
+    access.client.routes[COLLABORATOR] = (200, {"permission": "admin"})
+    assert access.has_write_access("acme", "widgets", "dev", "token")
+
+
+def test_no_access_is_cached_until_the_ttl(clock):
+    access = resolver({}, clock)
+    assert not access.has_write_access("acme", "widgets", "dev", "token")
+    access.client.routes[COLLABORATOR] = (200, {"permission": "write"})
+    assert not access.has_write_access("acme", "widgets", "dev", "token")
+    clock.now += 121
+    assert access.has_write_access("acme", "widgets", "dev", "token")
@@ -0,0 +1,127 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from commands import local_copy, local_runner
+from repo_context import RepoIndexCache, build_repo_context
+from tinygen_runner.repo_index import BM25, build_index
+
+GIT = ["git", "-c", "user.email=test@tinygen", "-c", "user.name=test"]
+TINY_FUNCTIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tiny-functions")
+
+
+def git(*args, cwd=None):
+    return subprocess.run([*GIT, *args], cwd=cwd, check=True, capture_output=True, text=True).stdout
+
+
+def run(*args, timeout=None):
+    """local_runner, with the sandbox's `python -m tinygen_runner` resolved here"""
+    if args[0] == "python":
+        args = (sys.executable, *args[1:])
+    return local_runner(*args, timeout=timeout)
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    monkeypatch.setenv("PYTHONPATH", TINY_FUNCTIONS)
+    work = tmp_path / "work"
+    (work / "lib").mkdir(parents=True)
+    git("init", "-q", "-b", "main", cwd=work)
+    (work / "README.md").write_text("widgets\n")
+    (work / "lib" / "billing.py").write_text("def charge_invoice(invoice):\n    return invoice.total\n")
+    git("add", "-A", cwd=work)
+    git("commit", "-qm", "initial", cwd=work)
+    return work
+
+
+def context(cache, repo_dir, partial=False):
+    return build_repo_context(run, local_copy, local_copy, cache, "acme/widgets", "fix invoice charges", repo_dir=str(repo_dir), partial=partial)
+
+
+def test_sparse_checkout_indexes_are_not_cached(repo, tmp_path):
+    cache = RepoIndexCache(str(tmp_path / "index"))
+    sparse = tmp_path / "sparse"
+    git("clone", "-q", "--sparse", str(repo), str(sparse))
+    assert not (sparse / "lib" / "billing.py").exists()
+
+    _, stats = context(cache, sparse, partial=True)
+    assert stats["source"] == "full"
+    assert cache.find("acme/widgets", stats["sha"]) is None and cache.latest("acme/widgets") is None
+
+    # A full clone of the same commit builds (and caches) a complete index
+    rendered, stats = context(cache, repo)
+    assert stats["source"] == "full"
+    assert "charge_invoice" in rendered
+    assert cache.latest("acme/widgets") == cache.find("acme/widgets", stats["sha"])
+
+    # ...which a later sparse run may reuse as is
+    rendered, stats = context(cache, sparse, partial=True)
+    assert stats["source"] == "cached" and "charge_invoice" in rendered
+
+
+def commit(repo, message, files=(), removed=()):
+    for path, text in dict(files).items():
+        (repo / path).parent.mkdir(parents=True, exist_ok=True)
+        (repo / path).write_text(text)
+    for path in removed:
+        git("rm", "-q", path, cwd=repo)
+    git("add", "-A", cwd=repo)
+    git("commit", "-qm", message, cwd=repo)
+
+
+def test_incremental_build_matches_a_full_build(repo):
+    first = build_index(str(repo))
+    assert first["base"] is None and first["reindexed"] == 2
+    commit(repo, "second", {"lib/refunds.py": "def refund_invoice(invoice):\n    pass\n", "README.md": "widgets and refunds\n"})
+    commit(repo, "third", removed=["lib/billing.py"])
+
+    incremental = build_index(str(repo), first)
+    assert incremental["base"] == first["sha"] and incremental["reindexed"] == 2
+    assert incremental["files"] == build_index(str(repo))["files"]
+    assert set(incremental["files"]) == {"README.md", "lib/refunds.py"}
+
+
+@pytest.mark.parametrize("previous", [
+    {"version": 1, "sha": "0" * 40, "files": {"stale.py": {}}},
+    {"version": 0, "sha": None, "files": {}},
+])
+def test_an_unusable_previous_index_means_a_full_build(repo, previous):
+    index = build_index(str(repo), previous)
+    assert index["base"] is None and set(index["files"]) == {"README.md", "lib/billing.py"}
+
+
+def test_later_commits_build_on_the_cached_index(repo, tmp_path):
+    cache = RepoIndexCache(str(tmp_path / "index"))
+    _, stats = context(cache, repo)
+    commit(repo, "refunds", {"lib/refunds.py": "def refund_invoice(invoice):\n    pass\n"})
+    rendered, stats = context(cache, repo)
+    assert (stats["source"], stats["reindexed"], stats["files"]) == ("incremental", 1, 3)
+    assert "lib/refunds.py" in rendered
+
+
+def entry(terms):
+    return {"terms": terms, "length": sum(terms.values())}
+
+
+def test_bm25_ranks_files_by_matching_terms():
+    files = {
+        "billing.py": entry({"invoice": 4, "charge": 2, "total": 1}),
+        "refunds.py": entry({"invoice": 1, "refund": 3}),
+        "README.md": entry({"widgets": 5}),
+    }
+    bm25 = BM25(files)
+    ranked = bm25.search("charge the invoice")
+    assert [path for path, _ in ranked] == ["billing.py", "refunds.py"]
+    assert ranked[0][1] > ranked[1][1] > 0
+    # Rarer terms weigh more
+    assert bm25.idf["refund"] > bm25.idf["invoice"]
+    assert bm25.search("refund", limit=1)[0][0] == "refunds.py"
+    assert bm25.search("the and") == [] and bm25.search("unrelated") == []
+    assert BM25({}).search("invoice") == []
+
+
+def test_bm25_favours_shorter_files_for_the_same_count():
+    files = {"short.py": entry({"invoice": 2}), "long.py": entry({"invoice": 2, "other": 50}), "x.py": entry({"x": 1})}
+    assert [path for path, _ in BM25(files).search("invoice")] == ["short.py", "long.py"]
@@ -0,0 +1,160 @@
+import threading
+import time
+
+import pytest
+
+from metrics import Metrics
+from sandbox_pool import LocalQueue, SandboxPool
+
+
+def prepare(sandbox):
+    sandbox.prepared = True
+
+
+@pytest.fixture
+def pool(sandbox_backend, clock):
+    refills = []
+    pool = SandboxPool(
+        sandbox_backend,
+        prepare=prepare,
+        size=2,
+        idle_ttl=60,
+        idle_queue=LocalQueue(),
+        metrics=Metrics(),
+        request_refill=lambda: refills.append(1),
+        clock=clock,
+    )
+    pool.refills = refills
+    return pool
+
+
+def counter(pool, name):
+    return pool.metrics.totals().get((name, ""), 0)
+
+
+def test_refill_tops_up_to_size(pool):
+    assert pool.refill() == 2
+    assert pool.idle_queue.len() == 2
+    assert pool.refill() == 0
+    assert all(sandbox.prepared for sandbox in pool.backend.sandboxes.values())
+    assert counter(pool, "sandbox_pool_created") == 2
+
+
+def test_lease_hands_out_a_warm_sandbox_and_requests_a_refill(pool):
+    pool.refill()
+    sandbox, from_pool = pool.lease()
+    assert from_pool and sandbox.prepared
+    assert pool.idle_queue.len() == 1
+    assert pool.refills == [1]
+    assert counter(pool, "sandbox_pool_leases") == 1
+
+
+def test_miss_creates_and_prepares_inline(pool):
+    sandbox, from_pool = pool.lease()
+    assert not from_pool and sandbox.prepared
+    assert counter(pool, "sandbox_pool_misses") == 1
+    # The pool is still asked to fill up for the next run
+    assert pool.refills == [1]
+
+
+def test_expired_and_dead_entries_are_skipped(pool):
+    pool.refill()
+    first, second = pool.backend.sandboxes.values()
+    pool.clock.now += 61
+    # Both old entries are past the TTL; the newer ones are usable
+    third, fourth = pool.create_warm(), pool.create_warm()
+    for sandbox in (third, fourth):
+        pool.idle_queue.put({"sandbox_id": sandbox.object_id, "ready_at": pool.clock()})
+    fourth.returncode = 1
+
+    leased, from_pool = pool.lease()
+    assert leased is third and from_pool
+    assert first.terminated and second.terminated
+    assert counter(pool, "sandbox_pool_reaped") == 2
+
+    leased, from_pool = pool.lease()
+    assert not from_pool and leased is not fourth
+    assert counter(pool, "sandbox_pool_dead") == 1
+
+
+def test_vanished_sandbox_is_skipped(pool):
+    pool.idle_queue.put({"sandbox_id": "sb-gone", "ready_at": pool.clock()})
+    sandbox, from_pool = pool.lease()
+    assert not from_pool
+
+
+def test_reap_terminates_expired_dead_and_surplus(pool):
+    pool.refill()
+    expired = list(pool.backend.sandboxes.values())
+    pool.clock.now += 61
+    for _ in range(4):
+        sandbox = pool.backend.create()
+        pool.idle_queue.put({"sandbox_id": sandbox.object_id, "ready_at": pool.clock()})
+    fresh = list(pool.backend.sandboxes.values())[2:]
+    fresh[0].returncode = 1
+
+    assert pool.reap() == 4
+    assert all(sandbox.terminated for sandbox in expired)
+    assert fresh[3].terminated
+    assert pool.idle_queue.len() == 2
+    kept = [pool.idle_queue.get()["sandbox_id"] for _ in range(2)]
+    assert kept == [fresh[1].object_id, fresh[2].object_id]
+
+
+def test_failed_prepare_terminates_the_sandbox(pool):
+    def broken(sandbox):
+        raise RuntimeError("claude CLI missing")
+
+    pool.prepare = broken
+    with pytest.raises(RuntimeError):
+        pool.lease()
+    assert all(sandbox.terminated for sandbox in pool.backend.sandboxes.values())
+    assert pool.refill() == 0
+
+
+def test_disabled_pool_never_refills(pool):
+    pool.size = 0
+    sandbox, from_pool = pool.lease()
+    assert not from_pool
+    assert pool.refills == []
+
+
+def test_concurrent_refills_boot_at_most_size(pool):
+    booting = threading.Event()
+    create = pool.backend.create
+
+    def slow_create():
+        booting.set()
+        time.sleep(0.05)
+        return create()
+
+    pool.backend.create = slow_create
+    first = threading.Thread(target=pool.refill)
+    first.start()
+    booting.wait()
+    # Leases during the refill each ask for one; they are skipped
+    assert [pool.refill() for _ in range(5)] == [0] * 5
+    first.join()
+    assert len(pool.backend.sandboxes) == 2
+    assert counter(pool, "sandbox_pool_refills_skipped") == 5
+
+
+def test_a_lease_during_a_reap_still_finds_a_sandbox(pool):
+    pool.refill()
+    backend = pool.backend
+    leased = []
+
+    class LeasingBackend:
+        """Leases from the pool while the reaper is checking its first entry"""
+
+        def from_id(self, sandbox_id):
+            if not leased:
+                leased.append(None)
+                leased[0] = pool.lease()
+            return backend.from_id(sandbox_id)
+
+    pool.backend = LeasingBackend()
+    assert pool.reap() == 0
+    [(sandbox, from_pool)] = leased
+    assert from_pool
+    assert pool.idle_queue.len() == 1
@@ -0,0 +1,190 @@
+import asyncio
+
+from tiny_fastapi.scheduler import InMemoryQueueStore, RunScheduler
+
+
+class SimClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Workers:
+    """Dispatcher that records which runs were spawned, in order"""
+
+    def __init__(self):
+        self.spawned = []
+
+    async def __call__(self, entry):
+        self.spawned.append(entry.run_id)
+
+
+def scheduler(**kwargs) -> RunScheduler:
+    clock, workers, store = SimClock(), Workers(), InMemoryQueueStore()
+    sched = RunScheduler(store, workers, clock=clock, **kwargs)
+    sched.clock_, sched.workers = clock, workers
+    return sched
+
+
+async def submit(sched, run_id, user, function_name="run_claude_agent", repo=None):
+    return await sched.submit(run_id, function_name, {"prompt": run_id}, user, repo)
+
+
+def test_global_user_and_lane_limits():
+    sched = scheduler(max_running=4, max_per_user=2, priority_reserve=1)
+
+    async def scenario():
+        for i in range(3):
+            await submit(sched, f"alice-{i}", "alice")
+        await submit(sched, "bob-0", "bob")
+        await submit(sched, "carol-0", "carol")
+        # The standard lane is full (4 - 1 reserved); a follow-up still starts
+        await submit(sched, "dave-followup", "dave", "run_followup_agent")
+        await submit(sched, "erin-followup", "erin", "run_followup_agent")
+
+    asyncio.run(scenario())
+    assert sched.workers.spawned == ["alice-0", "alice-1", "bob-0", "dave-followup"]
+    assert [entry.run_id for entry in sched.queued()] == ["erin-followup", "carol-0", "alice-2"]
+    assert sched.depth() == {"running": 4, "queued": 3, "queued_priority": 1}
+    assert set(sched.store.rows) == {"alice-0", "alice-1", "alice-2", "bob-0", "carol-0", "dave-followup", "erin-followup"}
+
+    async def finish():
+        await sched.finished("bob-0", "succeeded")
+        await sched.tick()
+
+    # The freed slot goes to the priority lane first
+    asyncio.run(finish())
+    assert sched.workers.spawned[-1] == "erin-followup"
+    assert "bob-0" not in sched.store.rows
+
+
+def test_per_repo_limit():
+    sched = scheduler(max_running=10, max_per_user=0, max_per_repo=1)
+
+    async def scenario():
+        await submit(sched, "a", "alice", repo="acme/widgets")
+        await submit(sched, "b", "bob", repo="acme/widgets")
+        await submit(sched, "c", "carol", repo="acme/gadgets")
+        await submit(sched, "d", "dave")
+        await sched.finished("a", "failed")
+        await sched.tick()
+
+    asyncio.run(scenario())
+    assert sched.workers.spawned == ["a", "c", "d", "b"]
+
+
+def drain(sched, count):
+    """Finish the running run, one at a time, `count` times"""
+
+    async def scenario():
+        for _ in range(count):
+            [entry] = sched.running()
+            sched.clock_.now += 60
+            await sched.finished(entry.run_id, "succeeded")
+            await sched.tick()
+
+    asyncio.run(scenario())
+
+
+def test_a_burst_is_interleaved_with_other_users():
+    sched = scheduler(max_running=1, max_per_user=0, priority_reserve=0)
+
+    async def scenario():
+        for i in range(4):
+            await submit(sched, f"alice-{i}", "alice")
+        for i in range(2):
+            await submit(sched, f"bob-{i}", "bob")
+
+    asyncio.run(scenario())
+    drain(sched, 5)
+    assert sched.workers.spawned == ["alice-0", "bob-0", "alice-1", "bob-1", "alice-2", "alice-3"]
+
+
+def test_weights_give_a_larger_share():
+    sched = scheduler(max_running=1, max_per_user=0, priority_reserve=0, weights={"bob": 2})
+
+    async def scenario():
+        await submit(sched, "first", "carol")
+        for i in range(3):
+            await submit(sched, f"alice-{i}", "alice")
+        for i in range(4):
+            await submit(sched, f"bob-{i}", "bob")
+
+    asyncio.run(scenario())
+    drain(sched, 7)
+    assert sched.workers.spawned[1:] == ["alice-0", "bob-0", "bob-1", "alice-1", "bob-2", "bob-3", "alice-2"]
+
+
+def test_cancel_a_queued_run():
+    sched = scheduler(max_running=1, max_per_user=0, priority_reserve=0)
+
+    async def scenario():
+        for run_id in ("a", "b", "c"):
+            await submit(sched, run_id, run_id)
+        assert sched.status("c")["queue_position"] == 2
+        assert await sched.cancel("b")
+        # Already running, or not queued here
+        assert not await sched.cancel("a")
+        assert not await sched.cancel("missing")
+
+    asyncio.run(scenario())
+    assert sched.status("b") is None
+    assert sched.status("c")["queue_position"] == 1
+    assert "b" not in sched.store.rows
+    drain(sched, 1)
+    assert sched.workers.spawned == ["a", "c"]
+
+
+def test_queue_position_and_estimated_wait():
+    sched = scheduler(max_running=2, max_per_user=0, priority_reserve=0)
+
+    async def scenario():
+        for run_id in ("r1", "r2", "r3", "r4", "r5"):
+            await submit(sched, run_id, run_id)
+
+    asyncio.run(scenario())
+    assert sched.workers.spawned == ["r1", "r2"]
+    assert sched.status("r1") is None
+    assert sched.status("r3") == {"queue_position": 1, "estimated_wait_seconds": 600.0, "lane": "standard"}
+    assert sched.status("r4")["estimated_wait_seconds"] == 600.0
+    assert sched.status("r5") == {"queue_position": 3, "estimated_wait_seconds": 1200.0, "lane": "standard"}
+
+    sched.clock_.now = 100
+    asyncio.run(sched.tick())
+    assert sched.status("r3")["estimated_wait_seconds"] == 500.0
+
+    async def finish_early():
+        sched.clock_.now = 300
+        await sched.finished("r1", "succeeded")
+        await sched.tick()
+
+    # A run that took 300s pulls the expected duration down to 540s
+    asyncio.run(finish_early())
+    assert sched.duration("run_claude_agent") == 540.0
+    assert sched.workers.spawned[-1] == "r3"
+    assert sched.status("r4") == {"queue_position": 1, "estimated_wait_seconds": 240.0, "lane": "standard"}
+    assert sched.status("r5")["estimated_wait_seconds"] == 540.0
+
+
+def test_reconcile_frees_finished_and_lost_runs():
+    finished = []
+    sched = scheduler(max_running=2, max_per_user=0, priority_reserve=0, max_run_seconds=1000, on_finished=finished.append)
+
+    async def scenario():
+        for run_id in ("a", "b", "c", "d"):
+            await submit(sched, run_id, run_id)
+        # "a" finished without telling the scheduler; "b" never reports back
+        sched.store.statuses["a"] = "succeeded"
+        sched.clock_.now = 20
+        await sched.tick()
+        assert sched.workers.spawned == ["a", "b", "c"]
+        sched.clock_.now = 1010
+        await sched.tick()
+
+    asyncio.run(scenario())
+    assert sched.workers.spawned == ["a", "b", "c", "d"]
+    assert [entry.run_id for entry in finished] == ["a"]
+    assert (sched.completed, sched.expired) == (1, 1)
+    assert set(sched.store.rows) == {"c", "d"}
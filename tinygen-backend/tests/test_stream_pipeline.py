@@ -0,0 +1,103 @@
+import asyncio
+import json
+
+import pytest
+
+from stream_pipeline import AgentStreamPipeline, _lines
+from tinygen_runner.events import EventWriter, PhaseEvent, TextEvent
+
+
+class Chunks:
+    """Async stream of fixed chunks"""
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            await asyncio.sleep(0)
+            yield chunk
+
+
+async def collect(stream):
+    return [line async for line in _lines(stream)]
+
+
+@pytest.mark.parametrize("make_stream", [Chunks, list], ids=["async", "sync"])
+def test_lines_are_reassembled_across_chunks(make_stream):
+    chunks = ['{"a": 1', ', "b": "x y\u0085z"}\n{"c"', ': 2}\r\n', "\n", "tail without newline"]
+    assert asyncio.run(collect(make_stream(chunks))) == [
+        '{"a": 1, "b": "x y\u0085z"}',
+        '{"c": 2}',
+        "",
+        "tail without newline",
+    ]
+
+
+def split(output: str, size: int):
+    return [output[i:i + size] for i in range(0, len(output), size)]
+
+
+class SplitProcess:
+    """
+    A daemon whose stdout arrives in `size`-character chunks, ignoring frame
+    boundaries: `ready` at once, then `reply` once a command is written
+    """
+
+    def __init__(self, ready: str, reply: str, size: int):
+        self.ready, self.reply, self.size = ready, reply, size
+        self.commanded = asyncio.Event()
+        self.stdout = self
+        self.stderr = Chunks([])
+        self.stdin = self
+
+    async def __aiter__(self):
+        for chunk in split(self.ready, self.size):
+            yield chunk
+        await self.commanded.wait()
+        for chunk in split(self.reply, self.size):
+            await asyncio.sleep(0)
+            yield chunk
+
+    def write(self, data: str):
+        json.loads(data)
+        self.commanded.set()
+
+    def drain(self):
+        pass
+
+    def write_eof(self):
+        pass
+
+    def poll(self):
+        return None
+
+
+@pytest.mark.parametrize("size", [1, 7, 64])
+def test_frames_split_across_chunks_are_delivered_whole(size):
+    text = "line one line two \u0085 and a long tail " * 5
+    written = []
+    writer = EventWriter(written.append)
+    writer.emit(PhaseEvent("ready", version="test"))
+    writer.command, writer.phase = 1, "main"
+    for event in (TextEvent(text), TextEvent("second"), PhaseEvent("finished", ok=True)):
+        writer.emit(event)
+    ready, reply = written[0], "".join(written[1:])
+
+    async def scenario():
+        pipeline = AgentStreamPipeline(SplitProcess(ready, reply, size)).start()
+        await pipeline.ready
+        received = []
+        call = pipeline.call(1, {"id": 1, "command": "run", "args": {}}, received.append)
+        finished = await asyncio.wait_for(call, 5)
+        await pipeline.close()
+        return pipeline, received, finished
+
+    pipeline, received, finished = asyncio.run(scenario())
+    assert finished.ok
+    assert [event.text for event in received] == [text, "second"]
+    assert pipeline.reader.gaps == 0
+    assert pipeline.stdout_log.lines == 4
@@ -0,0 +1,39 @@
+import pytest
+
+import github_auth
+from github_auth import TokenCache
+
+
+@pytest.fixture
+def minted(monkeypatch, clock):
+    minted = []
+
+    def request_installation_token(installation_id, jwt_token):
+        minted.append(installation_id)
+        return f"ghs_{len(minted)}", clock() + 3600
+
+    monkeypatch.setattr(github_auth, "request_installation_token", request_installation_token)
+    monkeypatch.setattr(github_auth, "generate_jwt_token", lambda client_id, private_key: "jwt")
+    return minted
+
+
+def test_stale_local_token_is_replaced_from_the_store(minted, clock):
+    store = {}
+    here = TokenCache(store=store, clock=clock)
+    elsewhere = TokenCache(store=store, clock=clock)
+
+    assert here.get_installation_token("42", "app", "key") == "ghs_1"
+    clock.now += 3600 - 200  # inside the refresh margin
+    assert elsewhere.get_installation_token("42", "app", "key") == "ghs_2"
+    # `here` still holds ghs_1 locally, but takes the store's newer token
+    assert here.get_installation_token("42", "app", "key") == "ghs_2"
+    assert minted == ["42", "42"]
+
+
+def test_stale_store_entry_is_refreshed(minted, clock):
+    store = {}
+    cache = TokenCache(store=store, clock=clock)
+    cache.get_installation_token("42", "app", "key")
+    clock.now += 3600
+    assert cache.get_installation_token("42", "app", "key") == "ghs_2"
+    assert store["gh-token:42"]["token"] == "ghs_2"
@@ -0,0 +1,129 @@
+"""Host side of the in-sandbox agent daemon (python -m tinygen_runner --daemon)"""
+import asyncio
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from stream_pipeline import AgentStreamPipeline, DaemonError, SpillingLog
+from tinygen_runner.events import Event, PhaseEvent
+
+DAEMON_COMMAND = ("python", "-u", "-m", "tinygen_runner", "--daemon")
+
+__all__ = ["AgentDaemonClient", "DaemonError", "DAEMON_COMMAND"]
+
+
+class AgentDaemonClient:
+    """
+    Starts the agent daemon once in a sandbox and sends it phase commands
+    (run, reflect, followup). Commands are handled one at a time: call()
+    writes a command frame and blocks until that command's `finished` phase
+    event, after every earlier event has been handed to `on_event`.
+
+    The daemon's stdout and stderr are drained concurrently by an
+    AgentStreamPipeline on a private event loop thread. With `log_dir` set,
+    the raw output of both streams is kept in compressed files there
+    (<log_dir>/stdout.ndjson.gz and stderr.log.gz) instead of memory.
+
+    The sandbox only needs `exec(*args, workdir=...)` returning a process
+    with stdin (write/drain/write_eof), iterable stdout and stderr, and
+    poll(), so a local subprocess wrapper works for testing.
+    """
+
+    def __init__(
+        self,
+        sandbox,
+        workdir: str = "/tmp/repo",
+        command=DAEMON_COMMAND,
+        log_dir: Optional[str] = None,
+        queue_size: int = 1000,
+    ):
+        self.sandbox = sandbox
+        self.workdir = workdir
+        self.command = command
+        self.log_dir = log_dir
+        self.queue_size = queue_size
+        self.process = None
+        self.pipeline: Optional[AgentStreamPipeline] = None
+        self.version: Optional[str] = None
+        self._next_id = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self, coro):
+        """Run a coroutine on the pipeline's loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def _log(self, name: str) -> SpillingLog:
+        return SpillingLog(os.path.join(self.log_dir, name) if self.log_dir else None)
+
+    def start(self) -> "AgentDaemonClient":
+        if self.process is not None:
+            return self
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="agent-daemon-stream", daemon=True)
+        self._thread.start()
+
+        # Line-buffered, so stdout chunks tend to end at frame boundaries
+        # (the pipeline reassembles lines that don't)
+        self.process = self.sandbox.exec(*self.command, workdir=self.workdir, bufsize=1)
+
+        async def start_pipeline():
+            self.pipeline = AgentStreamPipeline(
+                self.process,
+                stdout_log=self._log("stdout.ndjson.gz"),
+                stderr_log=self._log("stderr.log.gz"),
+                queue_size=self.queue_size,
+            ).start()
+            return await self.pipeline.ready
+
+        ready = self._run(start_pipeline())
+        self.version = ready.version
+        print(f"Agent daemon {self.version} ready")
+        return self
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def call(self, command: str, args: Optional[Dict[str, Any]] = None, on_event: Optional[Callable[[Event], None]] = None) -> PhaseEvent:
+        """Run a command to completion; returns its finished event (ok, session_id, error)"""
+        self.start()
+        self._next_id += 1
+        command_id = self._next_id
+        frame = {"id": command_id, "command": command, "args": args or {}}
+        return self._run(self.pipeline.call(command_id, frame, on_event))
+
+    def interrupt(self):
+        """
+        Stop the phase in progress at its next turn boundary; the blocked
+        call() then returns its finished event. Safe to call from any thread.
+        """
+        if self.pipeline is None or not self.alive:
+            return
+        try:
+            self._run(self.pipeline.send({"command": "interrupt"}))
+        except Exception as e:
+            print(f"Failed to interrupt agent daemon: {str(e)}")
+
+    def close(self):
+        """Ask the daemon to shut down (disconnecting its SDK clients) and flush the raw logs"""
+        if self.pipeline is None:
+            return
+        try:
+            if self.alive:
+                self.call("shutdown")
+        except Exception as e:
+            print(f"Failed to stop agent daemon cleanly: {str(e)}")
+        try:
+            self._run(self.pipeline.close())
+            stdout, stderr = self.pipeline.stdout_log, self.pipeline.stderr_log
+            print(
+                f"Agent daemon streams: {stdout.lines} stdout / {stderr.lines} stderr lines, "
+                f"max queue {self.pipeline.max_line_queue}/{self.pipeline.max_event_queue}"
+            )
+        except Exception as e:
+            print(f"Failed to flush agent daemon logs: {str(e)}")
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self.pipeline = None
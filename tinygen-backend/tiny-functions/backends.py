@@ -0,0 +1,65 @@
+"""The external services an agent run uses, behind one small interface"""
+from typing import Any, Callable, NamedTuple, Optional
+
+
+def _noop():
+    pass
+
+
+class Storage(NamedTuple):
+    """A directory on a volume, and how to persist / refresh it"""
+    root: str
+    # Persist / refresh the backing volume; no-ops for a plain directory
+    commit: Callable[[], Any] = _noop
+    reload: Optional[Callable[[], Any]] = None
+
+
+class RunBackends:
+    """
+    Everything outside the function's own process that a run touches, so
+    the pipeline can be driven against in-memory fakes (fake_backends.py)
+    as well as Modal, Supabase and GitHub. Interfaces are duck-typed:
+
+    - database(): a Supabase client (messages, chats, runs, run_timings)
+    - github: installation_token(owner, repo, user) and
+      has_push_access(owner, repo, user, token), the host-side REST calls;
+      the gh CLI runs in the sandbox
+    - sandboxes: lease() -> (sandbox, from_pool) and
+      release(sandbox, chat_id, hot_state). A sandbox has object_id,
+      exec(*args, timeout=, workdir=, text=) returning a Modal-like process,
+      snapshot_filesystem() and terminate()
+    - locks: named locks shared by every run (DictLocks or LocalLocks)
+    - run_logs, diffs, snapshots, repo_index: Storage for the raw daemon
+      logs, diff artifacts, bundle snapshots and repository indexes
+    - mirrors: Storage for the bare-mirror cache, on the function's side
+      only; sandboxes get a copy of the one repository they clone
+    - host_run: a commands.Runner on the function's own container, for
+      git commands against `mirrors`
+    - metrics: a metrics.Metrics
+    """
+
+    def __init__(
+        self,
+        database: Callable[[], Any],
+        github,
+        sandboxes,
+        locks,
+        run_logs: Storage,
+        diffs: Storage,
+        snapshots: Storage,
+        repo_index: Storage,
+        mirrors: Storage,
+        host_run,
+        metrics,
+    ):
+        self.database = database
+        self.github = github
+        self.sandboxes = sandboxes
+        self.locks = locks
+        self.run_logs = run_logs
+        self.diffs = diffs
+        self.snapshots = snapshots
+        self.repo_index = repo_index
+        self.mirrors = mirrors
+        self.host_run = host_run
+        self.metrics = metrics
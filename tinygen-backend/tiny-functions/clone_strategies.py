@@ -0,0 +1,124 @@
+"""Clone strategies: full, shallow, blobless partial and sparse checkout"""
+import re
+from typing import List, Optional
+
+from commands import Runner
+
+CLONE_STRATEGIES = ("full", "shallow", "blobless", "sparse")
+
+# Repo-level list of sparse checkout paths, one per line (# for comments)
+SPARSE_CONFIG_FILE = ".tinygen/sparse-checkout"
+
+# Path-looking tokens in a prompt: `src/app.py`, lib/utils/, README.md
+_PATH_RE = re.compile(r"(?<![\w@:/.-])((?:[\w.-]+/)+[\w.-]*|[\w-]+\.[A-Za-z0-9]{1,8})(?![\w/])")
+
+SPARSE_PROMPT_NOTE = (
+    "\n\nNote: this repository was cloned with a sparse checkout, so only some "
+    "paths are present in the working tree. If you need files elsewhere, run "
+    "`git sparse-checkout add <path>`; their contents are fetched on demand."
+)
+
+
+def validate_strategy(strategy: str) -> str:
+    if strategy not in CLONE_STRATEGIES:
+        raise ValueError(f"Unknown clone strategy '{strategy}', expected one of {', '.join(CLONE_STRATEGIES)}")
+    return strategy
+
+
+def sparse_paths_from_prompt(prompt: str) -> List[str]:
+    """Extract file and directory paths mentioned in a prompt"""
+    paths = []
+    for match in _PATH_RE.findall(prompt or ""):
+        path = (match[2:] if match.startswith("./") else match).rstrip(".")
+        # Skip URLs and version-like tokens (v1.2, 3.11)
+        if not path or "://" in path or re.fullmatch(r"v?[\d.]+", path):
+            continue
+        if path not in paths:
+            paths.append(path)
+    return paths
+
+
+def sparse_patterns(paths: List[str]) -> List[str]:
+    """Non-cone sparse-checkout patterns: top-level files plus each requested path"""
+    patterns = ["/*", "!/*/"]
+    for path in paths:
+        pattern = "/" + path.lstrip("/")
+        if pattern not in patterns:
+            patterns.append(pattern)
+    return patterns
+
+
+def clone_with_strategy(
+    run: Runner,
+    clone_url: str,
+    dest: str,
+    strategy: str = "full",
+    depth: int = 1,
+    prompt: str = "",
+    mirror_cache=None,
+    owner: Optional[str] = None,
+    repo: Optional[str] = None,
+) -> str:
+    """
+    Clone `clone_url` into `dest` with the given strategy and return the
+    strategy actually used (sparse falls back to blobless when there is
+    nothing to narrow the checkout to).
+    """
+    validate_strategy(strategy)
+
+    if strategy == "full":
+        if mirror_cache is not None and owner and repo:
+            mirror_cache.clone(clone_url, dest, owner, repo)
+        else:
+            _git_clone(run, clone_url, dest)
+        return "full"
+
+    if strategy == "shallow":
+        # History beyond `depth` can be pulled later with git fetch --deepen
+        _git_clone(run, "--depth", str(max(depth, 1)), clone_url, dest)
+        return "shallow"
+
+    if strategy == "blobless":
+        # File contents outside HEAD are fetched lazily from the promisor remote
+        _git_clone(run, "--filter=blob:none", clone_url, dest)
+        return "blobless"
+
+    # Sparse: a blobless clone without checkout, narrowed before checking out
+    _git_clone(run, "--filter=blob:none", "--no-checkout", clone_url, dest)
+    paths = read_sparse_config(run, dest) + sparse_paths_from_prompt(prompt)
+    if not paths:
+        print("No sparse paths in prompt or repo config, checking out the full tree")
+        _checkout(run, dest)
+        return "blobless"
+
+    print(f"Sparse checkout of {len(paths)} paths: {', '.join(paths[:10])}")
+    result = run("git", "-C", dest, "sparse-checkout", "set", "--no-cone", *sparse_patterns(paths))
+    if not result.ok:
+        raise Exception(f"Failed to configure sparse checkout: {result.stderr}")
+    _checkout(run, dest)
+    return "sparse"
+
+
+def read_sparse_config(run: Runner, dest: str) -> List[str]:
+    """Paths listed in the repository's sparse-checkout config file, if any"""
+    result = run("git", "-C", dest, "show", f"HEAD:{SPARSE_CONFIG_FILE}")
+    if not result.ok:
+        return []
+    paths = []
+    for line in result.stdout.splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            paths.append(line)
+    return paths
+
+
+def _git_clone(run: Runner, *args: str):
+    result = run("git", "clone", *args)
+    if not result.ok:
+        raise Exception(f"Failed to clone repo: {result.stderr}")
+
+
+def _checkout(run: Runner, dest: str):
+    result = run("git", "-C", dest, "checkout")
+    if not result.ok:
+        raise Exception(f"Failed to check out repo: {result.stderr}")
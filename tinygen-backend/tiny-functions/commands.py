@@ -0,0 +1,108 @@
+"""Run commands in a sandbox or locally behind one small interface"""
+import shutil
+import subprocess
+from typing import Callable, Iterator, NamedTuple, Optional
+
+
+class CommandResult(NamedTuple):
+    returncode: int
+    stdout: str
+    stderr: str
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+
+# A runner takes argv and returns a CommandResult
+Runner = Callable[..., CommandResult]
+
+
+def sandbox_runner(sandbox) -> Runner:
+    """Runner that executes commands inside a Modal sandbox"""
+    def run(*args: str, timeout: Optional[int] = None) -> CommandResult:
+        process = sandbox.exec(*args, timeout=timeout)
+        stdout = process.stdout.read()
+        stderr = process.stderr.read()
+        process.wait()
+        return CommandResult(process.returncode, stdout, stderr)
+    return run
+
+
+def local_runner(*args: str, timeout: Optional[int] = None) -> CommandResult:
+    """Runner that executes commands on the current machine"""
+    completed = subprocess.run(args, capture_output=True, text=True, timeout=timeout)
+    return CommandResult(completed.returncode, completed.stdout, completed.stderr)
+
+
+# A streamer takes argv and yields stdout chunks as they arrive, raising
+# CommandError at the end if the command failed
+Streamer = Callable[..., Iterator[str]]
+
+
+class CommandError(Exception):
+    pass
+
+
+def sandbox_streamer(sandbox) -> Streamer:
+    """Streamer that executes commands inside a Modal sandbox"""
+    def stream(*args: str, timeout: Optional[int] = None) -> Iterator[str]:
+        process = sandbox.exec(*args, timeout=timeout)
+        for chunk in process.stdout:
+            yield chunk
+        process.wait()
+        if process.returncode != 0:
+            raise CommandError(f"{args[0]} exited with {process.returncode}: {process.stderr.read()}")
+    return stream
+
+
+def local_streamer(*args: str, timeout: Optional[int] = None) -> Iterator[str]:
+    """Streamer that executes commands on the current machine"""
+    process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    for chunk in process.stdout:
+        yield chunk
+    stderr = process.stderr.read()
+    if process.wait(timeout=timeout) != 0:
+        raise CommandError(f"{args[0]} exited with {process.returncode}: {stderr}")
+
+
+# Copy a file out of / into the place commands run: (remote_path, local_path)
+# and (local_path, remote_path)
+Fetcher = Callable[[str, str], None]
+Pusher = Callable[[str, str], None]
+
+TRANSFER_CHUNK = 256 * 1024
+
+
+def sandbox_fetcher(sandbox) -> Fetcher:
+    """Copy a file out of a Modal sandbox by streaming it through `cat`"""
+    def fetch(remote_path: str, local_path: str):
+        process = sandbox.exec("cat", remote_path, text=False)
+        with open(local_path, "wb") as f:
+            for chunk in process.stdout:
+                f.write(chunk)
+        process.wait()
+        if process.returncode != 0:
+            raise CommandError(f"Failed to read {remote_path}: {process.stderr.read()!r}")
+    return fetch
+
+
+def sandbox_pusher(sandbox) -> Pusher:
+    """Copy a file into a Modal sandbox through the stdin of `cat`"""
+    def push(local_path: str, remote_path: str):
+        process = sandbox.exec("sh", "-c", 'cat > "$1"', "sh", remote_path, text=False)
+        with open(local_path, "rb") as f:
+            for chunk in iter(lambda: f.read(TRANSFER_CHUNK), b""):
+                process.stdin.write(chunk)
+                process.stdin.drain()
+        process.stdin.write_eof()
+        process.stdin.drain()
+        process.wait()
+        if process.returncode != 0:
+            raise CommandError(f"Failed to write {remote_path}: {process.stderr.read()!r}")
+    return push
+
+
+def local_copy(source: str, dest: str):
+    """Fetcher and pusher for commands that run on the current machine"""
+    shutil.copyfile(source, dest)
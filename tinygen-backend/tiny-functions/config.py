@@ -0,0 +1,96 @@
+"""Runtime configuration for TinyGen Modal functions, read from the environment"""
+import os
+
+# Maximum lifetime of a sandbox used for an agent run (seconds)
+SANDBOX_TIMEOUT = int(os.getenv("TINYGEN_SANDBOX_TIMEOUT", "1800"))
+
+# Warm sandbox pool: how many idle, pre-configured sandboxes to keep booted
+# and how long one may sit idle before it is reaped (0 disables the pool)
+SANDBOX_POOL_SIZE = int(os.getenv("TINYGEN_SANDBOX_POOL_SIZE", "2"))
+SANDBOX_POOL_IDLE_TTL = int(os.getenv("TINYGEN_SANDBOX_POOL_IDLE_TTL", "900"))
+
+# Names of the shared Modal objects backing the pool and metrics
+SANDBOX_POOL_QUEUE = os.getenv("TINYGEN_SANDBOX_POOL_QUEUE", "tinygen-sandbox-pool")
+METRICS_DICT = os.getenv("TINYGEN_METRICS_DICT", "tinygen-metrics")
+# Seconds the API's /metrics reuses what it last read from METRICS_DICT
+SHARED_METRICS_TTL = float(os.getenv("TINYGEN_SHARED_METRICS_TTL", "10"))
+# Seconds without a write after which a container's counters are folded
+# into one aggregate by maintain_sandbox_pool, keeping METRICS_DICT small
+METRICS_SOURCE_IDLE = float(os.getenv("TINYGEN_METRICS_SOURCE_IDLE", "3600"))
+
+# Persistent bare-mirror cache for repository clones, on the tinygen-git-mirrors volume
+MIRROR_CACHE_ENABLED = os.getenv("TINYGEN_MIRROR_CACHE", "1") == "1"
+MIRROR_CACHE_ROOT = "/git-cache"
+MIRROR_CACHE_BUDGET_GB = float(os.getenv("TINYGEN_MIRROR_CACHE_BUDGET_GB", "50"))
+
+# Cross-container locks (mirror updates, eviction, follow-ups per chat)
+LOCKS_DICT = os.getenv("TINYGEN_LOCKS_DICT", "tinygen-locks")
+
+# Default clone strategy when a run doesn't pick one: full | shallow | blobless | sparse
+CLONE_STRATEGY = os.getenv("TINYGEN_CLONE_STRATEGY", "full")
+CLONE_DEPTH = int(os.getenv("TINYGEN_CLONE_DEPTH", "1"))
+
+# Optional modal.Dict for sharing GitHub installation tokens between warm
+# containers; set to an empty string to keep tokens in-process only
+GITHUB_TOKEN_STORE = os.getenv("TINYGEN_GITHUB_TOKEN_STORE", "tinygen-github-tokens")
+
+# Shared owner login -> GitHub App installation index and its full-rebuild TTL
+INSTALLATION_INDEX_DICT = os.getenv("TINYGEN_INSTALLATION_INDEX_DICT", "tinygen-github-installations")
+INSTALLATION_INDEX_TTL = int(os.getenv("TINYGEN_INSTALLATION_INDEX_TTL", "3600"))
+
+# Base URL of the TinyGen API; live agent events are published to its chat
+# stream hub (requires TINYGEN_STREAM_TOKEN in the secret). Empty disables it
+STREAM_API_URL = os.getenv("TINYGEN_API_URL", "")
+
+# Per-file diff patches of agent runs, on the tinygen-diff-artifacts volume
+DIFF_ARTIFACT_ROOT = os.getenv("TINYGEN_DIFF_ARTIFACT_ROOT", "/diff-artifacts")
+
+# How a finished run's repository is saved for follow-ups: "filesystem"
+# (Modal filesystem snapshot of the whole sandbox) or "bundle" (git bundle of
+# the branch on the tinygen-snapshots volume, restored onto a pooled sandbox)
+SNAPSHOT_MODE = os.getenv("TINYGEN_SNAPSHOT_MODE", "filesystem")
+
+# Hot sandbox reuse for follow-ups: after a run the sandbox is kept for this
+# many seconds (0 disables it) so the chat's next follow-up can continue in
+# place; a sandbox is only handed out with at least FOLLOWUP_MIN_SANDBOX_TIME
+# seconds of its lifetime left
+FOLLOWUP_IDLE_WINDOW = int(os.getenv("TINYGEN_FOLLOWUP_IDLE_WINDOW", "600"))
+FOLLOWUP_MIN_SANDBOX_TIME = int(os.getenv("TINYGEN_FOLLOWUP_MIN_SANDBOX_TIME", "600"))
+HOT_SANDBOX_DICT = os.getenv("TINYGEN_HOT_SANDBOX_DICT", "tinygen-hot-sandboxes")
+
+# Follow-ups on one chat run one at a time, each continuing from what the
+# previous one left; a follow-up waits at most this many seconds for its turn
+FOLLOWUP_LOCK_TIMEOUT = int(os.getenv("TINYGEN_FOLLOWUP_LOCK_TIMEOUT", "900"))
+
+# Repository context index: built right after clone (cached per commit on the
+# tinygen-repo-index volume) and added to the agent's system prompt, within
+# REPO_CONTEXT_BUDGET characters
+REPO_INDEX_ENABLED = os.getenv("TINYGEN_REPO_INDEX", "1") == "1"
+REPO_CONTEXT_BUDGET = int(os.getenv("TINYGEN_REPO_CONTEXT_BUDGET", "6000"))
+
+# Run scheduler in the API: agent runs are queued in the run_queue table and
+# spawned when they fit under the global and per-user (and optional per-repo,
+# 0 = unlimited) caps. PRIORITY_RESERVE of the global slots only take
+# follow-ups and create-sandbox runs. USER_WEIGHTS ("login=2,other=0.5")
+# gives users a larger or smaller fair share. TINYGEN_SCHEDULER=0 spawns
+# every run immediately
+SCHEDULER_ENABLED = os.getenv("TINYGEN_SCHEDULER", "1") == "1"
+SCHEDULER_MAX_RUNNING = int(os.getenv("TINYGEN_SCHEDULER_MAX_RUNNING", "20"))
+SCHEDULER_MAX_PER_USER = int(os.getenv("TINYGEN_SCHEDULER_MAX_PER_USER", "3"))
+SCHEDULER_MAX_PER_REPO = int(os.getenv("TINYGEN_SCHEDULER_MAX_PER_REPO", "0"))
+SCHEDULER_PRIORITY_RESERVE = int(os.getenv("TINYGEN_SCHEDULER_PRIORITY_RESERVE", "2"))
+SCHEDULER_USER_WEIGHTS = os.getenv("TINYGEN_SCHEDULER_USER_WEIGHTS", "")
+
+# Repeated requests to the run endpoints return the existing run: for
+# IDEMPOTENCY_WINDOW seconds with the same Idempotency-Key header, and for
+# DUPLICATE_RUN_WINDOW seconds for an identical request sent without one
+IDEMPOTENCY_WINDOW = int(os.getenv("TINYGEN_IDEMPOTENCY_WINDOW", "86400"))
+DUPLICATE_RUN_WINDOW = int(os.getenv("TINYGEN_DUPLICATE_RUN_WINDOW", "300"))
+
+# Run cancellation: POST /runs/{id}/cancel puts the run id in this dict;
+# running functions poll it every RUN_CANCEL_POLL_INTERVAL seconds and stop
+# after the current agent turn. If a run hasn't stopped RUN_CANCEL_GRACE
+# seconds later, the API cancels its Modal call and terminates its sandbox
+RUN_CANCEL_DICT = os.getenv("TINYGEN_RUN_CANCEL_DICT", "tinygen-run-cancellations")
+RUN_CANCEL_POLL_INTERVAL = float(os.getenv("TINYGEN_RUN_CANCEL_POLL_INTERVAL", "2"))
+RUN_CANCEL_GRACE = float(os.getenv("TINYGEN_RUN_CANCEL_GRACE", "15"))
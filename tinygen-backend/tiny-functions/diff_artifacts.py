@@ -0,0 +1,234 @@
+"""Staged diffs stored as per-file compressed patches with a numstat manifest"""
+import gzip
+import json
+import os
+import re
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from commands import Runner, Streamer
+
+# Same flags for the numstat and the patch, so file N of one is file N of the other
+DIFF_ARGS = ("diff", "--staged", "--no-color", "--no-ext-diff", "-M")
+
+# Files listed in the chat message's diffstat before it says "and N more"
+DIFFSTAT_FILES = 30
+
+ARTIFACT_ID = re.compile(r"^[0-9a-f]{8,40}-[0-9a-f]{8,40}$")
+
+
+def parse_numstat(output: str) -> List[Dict[str, Any]]:
+    """
+    Parse `git diff --numstat -z`. Each entry is "added<TAB>deleted<TAB>path\\0",
+    or for a rename "added<TAB>deleted<TAB>\\0old\\0new\\0"; binary files
+    report "-" for both counts.
+    """
+    files = []
+    tokens = iter(output.split("\0"))
+    for token in tokens:
+        if not token:
+            continue
+        added, deleted, path = token.split("\t", 2)
+        old_path = None
+        if not path:
+            old_path, path = next(tokens), next(tokens)
+        binary = added == "-"
+        files.append({
+            "index": len(files),
+            "path": path,
+            "old_path": old_path,
+            "added": 0 if binary else int(added),
+            "deleted": 0 if binary else int(deleted),
+            "binary": binary,
+        })
+    return files
+
+
+def diffstat(files: List[Dict[str, Any]], limit: int = DIFFSTAT_FILES) -> str:
+    """A compact diffstat for display, like `git diff --stat`"""
+    names = [f"{f['old_path']} => {f['path']}" if f["old_path"] else f["path"] for f in files[:limit]]
+    width = max(map(len, names), default=0)
+    lines = []
+    for f, name in zip(files, names):
+        change = "Bin" if f["binary"] else f"+{f['added']} -{f['deleted']}"
+        lines.append(f"{name.ljust(width)} | {change}")
+    if len(files) > limit:
+        lines.append(f"... and {len(files) - limit} more files")
+    added = sum(f["added"] for f in files)
+    deleted = sum(f["deleted"] for f in files)
+    lines.append(f"{len(files)} files changed, {added} insertions(+), {deleted} deletions(-)")
+    return "\n".join(lines)
+
+
+def split_patch(chunks: Iterable[str]) -> Iterator[Iterator[str]]:
+    """
+    Split a streamed `git diff` into one line iterator per file, without
+    holding more than a line in memory. Each inner iterator must be consumed
+    before the next one is requested.
+    """
+    lines = _lines(chunks)
+    line = next(lines, None)
+    while line is not None:
+        first = line
+
+        def section():
+            nonlocal line
+            yield first
+            line = next(lines, None)
+            while line is not None and not line.startswith("diff --git "):
+                yield line
+                line = next(lines, None)
+
+        yield section()
+
+
+def _lines(chunks: Iterable[str]) -> Iterator[str]:
+    pending = ""
+    for chunk in chunks:
+        pending += chunk
+        *complete, pending = pending.split("\n")
+        for line in complete:
+            yield line + "\n"
+    if pending:
+        yield pending
+
+
+class DiffArtifactStore:
+    """
+    Diff artifacts under `root` (normally a Modal Volume), one directory per
+    chat and artifact:
+
+        <root>/<chat_id>/<artifact_id>/manifest.json
+        <root>/<chat_id>/<artifact_id>/files/<index>.patch.gz
+
+    An artifact id is "<base commit>-<staged tree>", so it names exactly one
+    diff and an artifact is written once. The manifest holds the numstat of
+    every file and the diffstat; patches are only read when a file is opened.
+    """
+
+    def __init__(
+        self,
+        root: str = "/diff-artifacts",
+        commit: Optional[Callable[[], None]] = None,
+        reload: Optional[Callable[[], None]] = None,
+    ):
+        self.root = root.rstrip("/")
+        # Persist / refresh the backing volume; no-ops for a plain directory
+        self.commit = commit or (lambda: None)
+        self.reload = reload or (lambda: None)
+
+    @staticmethod
+    def artifact_id(base: str, tree: str) -> str:
+        return f"{base[:16]}-{tree[:16]}"
+
+    def path(self, chat_id: str, artifact_id: str) -> str:
+        if not ARTIFACT_ID.match(artifact_id) or "/" in chat_id or chat_id in ("", ".", ".."):
+            raise ValueError(f"Invalid diff artifact {chat_id}/{artifact_id}")
+        return os.path.join(self.root, chat_id, artifact_id)
+
+    def patch_path(self, chat_id: str, artifact_id: str, index: int) -> str:
+        return os.path.join(self.path(chat_id, artifact_id), "files", f"{index:05d}.patch.gz")
+
+    def read_manifest(self, chat_id: str, artifact_id: str) -> Optional[Dict[str, Any]]:
+        """The manifest, reloading the volume once if it isn't there yet"""
+        path = os.path.join(self.path(chat_id, artifact_id), "manifest.json")
+        if not os.path.exists(path):
+            self.reload()
+            if not os.path.exists(path):
+                return None
+        with open(path) as f:
+            return json.load(f)
+
+    def read_patch(self, chat_id: str, artifact_id: str, index: int) -> Optional[bytes]:
+        """The gzip-compressed patch of one file, or None"""
+        path = self.patch_path(chat_id, artifact_id, index)
+        if not os.path.exists(path):
+            self.reload()
+            if not os.path.exists(path):
+                return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def write(self, chat_id: str, manifest: Dict[str, Any], patch: Iterable[str]) -> Dict[str, Any]:
+        """Write the per-file patches of a streamed diff, then the manifest"""
+        artifact_id = manifest["id"]
+        os.makedirs(os.path.join(self.path(chat_id, artifact_id), "files"), exist_ok=True)
+        files = manifest["files"]
+        written = 0
+        for index, section in enumerate(split_patch(patch)):
+            size = 0
+            with gzip.open(self.patch_path(chat_id, artifact_id, index), "wt", encoding="utf-8") as out:
+                for line in section:
+                    out.write(line)
+                    size += len(line)
+            if index < len(files):
+                files[index]["patch_bytes"] = size
+            written += 1
+        if written != len(files):
+            print(f"Diff artifact {artifact_id}: {written} patches for {len(files)} numstat entries")
+
+        with open(os.path.join(self.path(chat_id, artifact_id), "manifest.json"), "w") as f:
+            json.dump(manifest, f)
+        self.commit()
+        return manifest
+
+
+def staged_tree(run: Runner, repo_dir: str) -> str:
+    """Tree hash of the index: equal trees mean equal staged content"""
+    result = run("git", "-C", repo_dir, "write-tree")
+    if not result.ok:
+        raise Exception(f"git write-tree failed: {result.stderr}")
+    return result.stdout.strip()
+
+
+def capture_staged_diff(
+    run: Runner,
+    stream: Streamer,
+    store: DiffArtifactStore,
+    chat_id: str,
+    repo_dir: str = "/tmp/repo",
+    previous: Optional[Dict[str, Any]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Store the staged diff of `repo_dir` as an artifact and return its
+    manifest (None when nothing is staged). If the staged tree is the same as
+    `previous`'s, nothing is read and `previous` comes back unchanged.
+    """
+    tree = staged_tree(run, repo_dir)
+    if previous is not None and previous["tree"] == tree:
+        return previous
+
+    base = run("git", "-C", repo_dir, "rev-parse", "HEAD").stdout.strip()
+    artifact_id = store.artifact_id(base, tree)
+    existing = store.read_manifest(chat_id, artifact_id)
+    if existing is not None:
+        return existing
+
+    numstat = run("git", "-C", repo_dir, *DIFF_ARGS, "--numstat", "-z")
+    if not numstat.ok:
+        raise Exception(f"git diff --numstat failed: {numstat.stderr}")
+    files = parse_numstat(numstat.stdout)
+    if not files:
+        return None
+
+    manifest = {
+        "id": artifact_id,
+        "base": base,
+        "tree": tree,
+        "files": files,
+        "totals": {
+            "files": len(files),
+            "added": sum(f["added"] for f in files),
+            "deleted": sum(f["deleted"] for f in files),
+        },
+        "diffstat": diffstat(files),
+    }
+    return store.write(chat_id, manifest, stream("git", "-C", repo_dir, *DIFF_ARGS))
+
+
+def diff_message_metadata(manifest: Dict[str, Any]) -> Dict[str, Any]:
+    """What a chat message needs to show a diff and load its files"""
+    return {
+        "id": manifest["id"],
+        "tree": manifest["tree"],
+        "totals": manifest["totals"],
+    }
@@ -0,0 +1,142 @@
+"""Background publisher of live agent events to the API's chat stream hub"""
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+
+class EventPublisher:
+    """
+    Sends live events for a chat to `POST {api_url}/chats/{chat_id}/events`,
+    from which the API fans them out to SSE subscribers.
+
+    Publishing is best effort and never blocks the caller: events are
+    buffered in a bounded queue and posted in small batches from a
+    background thread. Each event carries a per-publisher sequence number so
+    the hub can drop duplicates when a batch is retried. The durable
+    transcript still goes to the database through MessageWriter; anything
+    lost here is recovered by the client reloading it.
+
+    With no api_url or token every call is a no-op.
+    """
+
+    def __init__(
+        self,
+        api_url: Optional[str],
+        token: Optional[str],
+        chat_id: str,
+        batch_size: int = 50,
+        flush_interval: float = 0.05,
+        max_buffer: int = 10000,
+        max_retries: int = 2,
+        timeout: float = 5.0,
+    ):
+        self.enabled = bool(api_url and token)
+        self.url = f"{(api_url or '').rstrip('/')}/chats/{chat_id}/events"
+        self.token = token
+        self.chat_id = chat_id
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.timeout = timeout
+        # Identifies this publisher's sequence numbers to the hub
+        self.source = str(uuid.uuid4())
+
+        self._queue: queue.Queue = queue.Queue(max_buffer)
+        self._seq = 0
+        self._seq_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+        # Counters, useful for logging and benchmarks
+        self.events_sent = 0
+        self.batches_sent = 0
+        self.dropped_events = 0
+
+    def start(self) -> "EventPublisher":
+        if self.enabled and self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name=f"event-publisher-{self.chat_id[:8]}", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def publish(self, event: str, data: Any = None):
+        """Queue an event for the chat's live stream"""
+        if not self.enabled or self._closed:
+            return
+        with self._seq_lock:
+            self._seq += 1
+            item = {"event": event, "data": data, "seq": self._seq}
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped_events += 1
+
+    def close(self, timeout: Optional[float] = 10.0):
+        """Send what is buffered and stop the background thread"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        with httpx.Client(timeout=self.timeout, headers={"Authorization": f"Bearer {self.token}"}) as client:
+            stopping = False
+            while not stopping:
+                batch, stopping = self._collect_batch()
+                if batch:
+                    self._send(client, batch)
+
+    def _collect_batch(self):
+        batch: List[Dict[str, Any]] = []
+        item = self._queue.get()
+        if item is None:
+            return batch, True
+        batch.append(item)
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _send(self, client: httpx.Client, batch: List[Dict[str, Any]]):
+        payload = {"source": self.source, "events": batch}
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = client.post(self.url, json=payload)
+                if response.status_code < 500:
+                    if response.status_code != 200:
+                        print(f"Event stream rejected {len(batch)} events: {response.status_code} {response.text}")
+                        self.dropped_events += len(batch)
+                    else:
+                        self.events_sent += len(batch)
+                        self.batches_sent += 1
+                    return
+            except httpx.HTTPError as e:
+                print(f"Failed to publish {len(batch)} events (attempt {attempt + 1}): {str(e)}")
+            time.sleep(0.2 * (2 ** attempt))
+        self.dropped_events += len(batch)
+
+
+def get_event_publisher(chat_id: str) -> EventPublisher:
+    """Publisher for a chat, configured from the environment"""
+    from config import STREAM_API_URL
+    import os
+
+    return EventPublisher(STREAM_API_URL, os.getenv("TINYGEN_STREAM_TOKEN"), chat_id).start()
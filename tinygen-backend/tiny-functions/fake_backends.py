@@ -0,0 +1,699 @@
+"""
+In-memory stand-ins for Supabase, GitHub and Modal sandboxes, for driving
+the agent pipeline on one machine (benchmarks/pipeline.py). Each fake can
+add a fixed latency per call to model the network round trip it replaces.
+"""
+import copy
+import itertools
+import json
+import os
+import queue
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from backends import RunBackends, Storage
+from tinygen_runner.events import EventWriter, PhaseEvent, TextEvent, ToolResultEvent, ToolUseEvent, UsageEvent
+
+FUNCTIONS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+GIT = ["git", "-c", "user.email=fake@tinygen", "-c", "user.name=fake"]
+
+
+def _git(*args: str, cwd: Optional[str] = None):
+    subprocess.run([*GIT, *args], cwd=cwd, check=True, capture_output=True)
+
+
+class FakeResponse:
+    def __init__(self, data: List[Dict[str, Any]], count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+    """The subset of the postgrest query builder the pipeline uses"""
+
+    def __init__(self, db: "FakeSupabase", table: str):
+        self.db = db
+        self.table = table
+        self.action = "select"
+        self.payload: Any = None
+        self.on_conflict: Optional[str] = None
+        self.ignore_duplicates = False
+        self.filters: List[Tuple[str, str, Any]] = []
+        self.ordering: List[Tuple[str, bool, bool]] = []
+        self.row_limit: Optional[int] = None
+        self.single = False
+
+    def select(self, columns: str = "*", **_):
+        self.action = "select"
+        return self
+
+    def insert(self, rows, **_):
+        self.action, self.payload = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict: Optional[str] = None, ignore_duplicates: bool = False, **_):
+        self.action, self.payload = "upsert", rows
+        self.on_conflict, self.ignore_duplicates = on_conflict, ignore_duplicates
+        return self
+
+    def update(self, fields: Dict[str, Any]):
+        self.action, self.payload = "update", fields
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    def _filter(self, op: str, column: str, value):
+        self.filters.append((op, column, value))
+        return self
+
+    def eq(self, column: str, value):
+        return self._filter("eq", column, value)
+
+    def neq(self, column: str, value):
+        return self._filter("neq", column, value)
+
+    def in_(self, column: str, values):
+        return self._filter("in", column, list(values))
+
+    def gte(self, column: str, value):
+        return self._filter("gte", column, value)
+
+    def lte(self, column: str, value):
+        return self._filter("lte", column, value)
+
+    def is_(self, column: str, value):
+        return self._filter("is", column, None if value in (None, "null") else value)
+
+    def order(self, column: str, desc: bool = False, nullsfirst: Optional[bool] = None, **_):
+        # Postgres puts nulls first when descending, unless told otherwise
+        self.ordering.append((column, desc, desc if nullsfirst is None else nullsfirst))
+        return self
+
+    def limit(self, count: int):
+        self.row_limit = count
+        return self
+
+    def maybe_single(self):
+        self.single = True
+        return self.limit(1)
+
+    def execute(self) -> FakeResponse:
+        return self.db._execute(self)
+
+
+def _value(row: Dict[str, Any], column: str):
+    """A column, or a JSON path into one (metadata->seq)"""
+    value: Any = row
+    for key in column.replace("->>", "->").split("->"):
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def _matches(row: Dict[str, Any], filters) -> bool:
+    for op, column, value in filters:
+        actual = _value(row, column)
+        if op == "eq" and actual != value:
+            return False
+        if op == "neq" and actual == value:
+            return False
+        if op == "in" and actual not in value:
+            return False
+        if op == "is" and actual is not value:
+            return False
+        if op == "gte" and (actual is None or actual < value):
+            return False
+        if op == "lte" and (actual is None or actual > value):
+            return False
+    return True
+
+
+class FakeSupabase:
+    """
+    Tables as lists of dicts behind a Supabase-client-shaped API, sleeping
+    `latency` seconds per request. Counts requests and rows written per
+    table, which is what a run costs the real database.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.tables: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+        # Counters, useful for logging and benchmarks
+        self.reads: Dict[str, int] = defaultdict(int)
+        self.writes: Dict[str, int] = defaultdict(int)
+        self.rows_written: Dict[str, int] = defaultdict(int)
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def reset_counters(self):
+        self.reads.clear()
+        self.writes.clear()
+        self.rows_written.clear()
+
+    def _execute(self, query: FakeQuery) -> FakeResponse:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            rows = self.tables[query.table]
+            if query.action == "select":
+                self.reads[query.table] += 1
+                found = [copy.deepcopy(row) for row in rows if _matches(row, query.filters)]
+                for column, desc, nullsfirst in reversed(query.ordering):
+                    present = [row for row in found if _value(row, column) is not None]
+                    missing = [row for row in found if _value(row, column) is None]
+                    present.sort(key=lambda row: _value(row, column), reverse=desc)
+                    found = missing + present if nullsfirst else present + missing
+                if query.row_limit is not None:
+                    found = found[:query.row_limit]
+                if query.single:
+                    return FakeResponse(found[0] if found else None)
+                return FakeResponse(found)
+
+            self.writes[query.table] += 1
+            if query.action in ("insert", "upsert"):
+                written = []
+                for row in query.payload if isinstance(query.payload, list) else [query.payload]:
+                    row = {"id": row.get("id") or str(next(self._ids)), **row}
+                    if query.action == "upsert":
+                        key = query.on_conflict or "id"
+                        existing = next((r for r in rows if r.get(key) == row.get(key)), None)
+                        if existing is not None:
+                            if not query.ignore_duplicates:
+                                existing.update(row)
+                                written.append(copy.deepcopy(existing))
+                            continue
+                    rows.append(row)
+                    written.append(copy.deepcopy(row))
+                self.rows_written[query.table] += len(written)
+                return FakeResponse(written)
+            if query.action == "update":
+                updated = []
+                for row in rows:
+                    if _matches(row, query.filters):
+                        row.update(query.payload)
+                        updated.append(copy.deepcopy(row))
+                self.rows_written[query.table] += len(updated)
+                return FakeResponse(updated)
+            if query.action == "delete":
+                kept = [row for row in rows if not _matches(row, query.filters)]
+                deleted = len(rows) - len(kept)
+                self.tables[query.table] = kept
+                self.rows_written[query.table] += deleted
+                return FakeResponse([])
+        raise ValueError(f"Unsupported query action '{query.action}'")
+
+
+class FakeGitHub:
+    """
+    GitHub as bare repositories under `root` (<root>/<owner>/<repo>.git),
+    served to sandboxes over file:// in place of https://github.com/. The
+    host-side REST calls and the sandbox's gh commands sleep `latency`
+    seconds each.
+    """
+
+    def __init__(self, root: str, latency: float = 0.0):
+        self.root = root
+        self.latency = latency
+        # (owner/repo, user) pairs that can push without a fork
+        self.collaborators = set()
+        self.pull_requests: List[Dict[str, Any]] = []
+        # Installation tokens handed out, and the user each one acts as
+        self.tokens: Dict[str, str] = {}
+
+        # Counters, useful for logging and benchmarks
+        self.api_calls = 0
+
+    def _call(self):
+        self.api_calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def repo_path(self, full_name: str) -> str:
+        return os.path.join(self.root, f"{full_name}.git")
+
+    def create_repo(self, full_name: str, files: Dict[str, str], collaborators: Iterable[str] = ()) -> str:
+        """Create a repository with one commit of `files` on main; returns its bare path"""
+        with tempfile.TemporaryDirectory() as work:
+            _git("init", "-q", "-b", "main", cwd=work)
+            for path, content in files.items():
+                os.makedirs(os.path.dirname(os.path.join(work, path)), exist_ok=True)
+                with open(os.path.join(work, path), "w") as f:
+                    f.write(content)
+            _git("add", "-A", cwd=work)
+            _git("commit", "-qm", "initial", cwd=work)
+            bare = self.repo_path(full_name)
+            os.makedirs(os.path.dirname(bare), exist_ok=True)
+            _git("clone", "-q", "--bare", work, bare)
+        self._configure(bare)
+        for user in collaborators:
+            self.collaborators.add((full_name, user))
+        return bare
+
+    def _configure(self, bare: str):
+        # What github.com allows: partial clones, and fetching any reachable commit
+        _git("--git-dir", bare, "config", "uploadpack.allowFilter", "true")
+        _git("--git-dir", bare, "config", "uploadpack.allowAnySHA1InWant", "true")
+
+    def host_runner(self, home: str):
+        """
+        A commands.Runner for the function's own container (the mirror cache),
+        with https://github.com/ resolving to these repositories
+        """
+        os.makedirs(home, exist_ok=True)
+        gitconfig = os.path.join(home, ".gitconfig")
+        with open(gitconfig, "w") as f:
+            f.write(f"[url \"file://{self.root}/\"]\n\tinsteadOf = https://github.com/\n")
+        env = {**os.environ, "GIT_CONFIG_GLOBAL": gitconfig, "GIT_CONFIG_NOSYSTEM": "1", "GIT_TERMINAL_PROMPT": "0"}
+
+        def run(*args: str, timeout: Optional[int] = None):
+            from commands import CommandResult
+            completed = subprocess.run(args, capture_output=True, text=True, timeout=timeout, env=env)
+            return CommandResult(completed.returncode, completed.stdout, completed.stderr)
+        return run
+
+    def installation_token(self, owner: str, repo_name: str, user_github_username: str) -> str:
+        self._call()
+        token = f"ghs_fake_{len(self.tokens) + 1}"
+        # gh acts as this user in the sandbox: forks go to their account
+        self.tokens[token] = user_github_username
+        return token
+
+    def has_push_access(self, owner: str, repo_name: str, user_github_username: str, access_token: str) -> bool:
+        self._call()
+        return (f"{owner}/{repo_name}", user_github_username) in self.collaborators
+
+    def gh(self, args: List[str], token: Optional[str]) -> Tuple[int, str, str]:
+        """The gh CLI commands a run uses, authenticated with `token`; returns (returncode, stdout, stderr)"""
+        self._call()
+        command = args[:2]
+        if command == ["auth", "login"]:
+            return (0, "", "") if token in self.tokens else (1, "", "error validating token\n")
+        if token not in self.tokens:
+            return 4, "", "To get started with GitHub CLI, please run:  gh auth login\n"
+        if command == ["auth", "setup-git"]:
+            return 0, "", ""
+        if command == ["repo", "view"]:
+            if os.path.isdir(self.repo_path(args[2])):
+                return 0, json.dumps({"name": args[2].split("/")[1]}) + "\n", ""
+            return 1, "", f"GraphQL: Could not resolve to a Repository with the name '{args[2]}'.\n"
+        if command == ["repo", "fork"]:
+            source = args[2]
+            fork = self.repo_path(f"{self.tokens[token]}/{source.split('/')[1]}")
+            if not os.path.isdir(fork):
+                os.makedirs(os.path.dirname(fork), exist_ok=True)
+                _git("clone", "-q", "--bare", self.repo_path(source), fork)
+                self._configure(fork)
+            return 0, "", f"Created fork {self.tokens[token]}/{source.split('/')[1]}\n"
+        if command == ["pr", "create"]:
+            options = dict(zip(args[2::2], args[3::2]))
+            repo, head = options["--repo"], options["--head"]
+            branches = subprocess.run(
+                ["git", "--git-dir", self.repo_path(repo), "branch", "--list", head],
+                capture_output=True, text=True
+            ).stdout
+            if not branches.strip():
+                return 1, "", f"pull request create failed: No commits between main and {head}\n"
+            self.pull_requests.append({"repo": repo, "head": head, "title": options.get("--title")})
+            return 0, f"https://github.com/{repo}/pull/{len(self.pull_requests)}\n", ""
+        return 1, "", f"unknown command: gh {' '.join(args)}\n"
+
+
+class _Output:
+    """stdout or stderr of a FakeProcess: read() or iterate over chunks"""
+
+    def __init__(self, process: "FakeProcess", index: int):
+        self.process = process
+        self.index = index
+
+    def read(self):
+        data = self.process._result()[self.index]
+        return data.decode(errors="replace") if self.process.text else data
+
+    def __iter__(self):
+        data = self.read()
+        if self.process.text:
+            return iter(data.splitlines(keepends=True))
+        return (data[i:i + 65536] for i in range(0, len(data), 65536))
+
+
+class _Input:
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def write(self, data):
+        self.chunks.append(data.encode() if isinstance(data, str) else data)
+
+    def drain(self):
+        pass
+
+    def write_eof(self):
+        pass
+
+
+class FakeProcess:
+    """
+    A Modal-like process for a one-shot command. The command runs when its
+    output or exit code is first asked for, with everything written to
+    stdin by then as its input.
+    """
+
+    def __init__(self, run, text: bool = True):
+        self._run = run
+        self.text = text
+        self.stdin = _Input()
+        self.stdout = _Output(self, 1)
+        self.stderr = _Output(self, 2)
+        self._done: Optional[Tuple[int, bytes, bytes]] = None
+
+    def _result(self) -> Tuple[int, bytes, bytes]:
+        if self._done is None:
+            self._done = self._run(b"".join(self.stdin.chunks))
+        return self._done
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return None if self._done is None else self._done[0]
+
+    def wait(self) -> int:
+        return self._result()[0]
+
+    def poll(self) -> Optional[int]:
+        return self.returncode
+
+
+class ScriptedAgent:
+    """
+    Agent output for the fake daemon: each phase emits `events` tool calls
+    (tool use, result and a `text_chars` explanation each), edits up to
+    `files_changed` files of the repository (`review_files` for a review),
+    then reports usage and finishes. `turn_latency` is slept per tool call.
+    """
+
+    def __init__(self, events: int = 20, files_changed: int = 3, review_files: int = 1, text_chars: int = 200, turn_latency: float = 0.0):
+        self.events = events
+        self.files_changed = files_changed
+        self.review_files = review_files
+        self.text_chars = text_chars
+        self.turn_latency = turn_latency
+        self.sessions = itertools.count(1)
+
+    def _files(self, workdir: str, count: int) -> List[str]:
+        found = []
+        for root, dirs, names in os.walk(workdir):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            for name in sorted(names):
+                found.append(os.path.join(root, name))
+                if len(found) >= count:
+                    return found
+        return found
+
+    def run_phase(self, writer: EventWriter, workdir: str, phase: str, interrupted: threading.Event) -> str:
+        writer.emit(PhaseEvent("started"))
+        edits = self._files(workdir, self.review_files if phase == "reflection" else self.files_changed)
+        filler = ("The agent explains what it is doing next. " * (self.text_chars // 42 + 1))[:self.text_chars]
+        for i in range(self.events):
+            if interrupted.is_set():
+                break
+            if self.turn_latency:
+                time.sleep(self.turn_latency)
+            path = edits[i % len(edits)] if edits and i < len(edits) else None
+            tool_id = f"toolu_{phase}_{i}"
+            if path is not None:
+                writer.emit(ToolUseEvent(tool_id, "Edit", {"file_path": path}))
+                with open(path, "a") as f:
+                    f.write(f"\n# {phase} edit {i}\n")
+            else:
+                writer.emit(ToolUseEvent(tool_id, "Read", {"file_path": os.path.join(workdir, "README.md")}))
+            writer.emit(ToolResultEvent(tool_id, False, "ok\n" * 5))
+            writer.emit(TextEvent(f"Step {i}: {filler}"))
+        writer.emit(UsageEvent(input_tokens=1000 * self.events, output_tokens=100 * self.events, num_turns=self.events))
+        return f"fake-session-{next(self.sessions)}"
+
+
+class _Lines:
+    """Blocking iterator over a queue of output chunks, ended by None"""
+
+    def __init__(self):
+        self.queue: "queue.Queue[Optional[str]]" = queue.Queue()
+
+    def __iter__(self):
+        return iter(self.queue.get, None)
+
+
+class FakeDaemonProcess:
+    """`python -m tinygen_runner --daemon` answered by a ScriptedAgent, speaking the daemon's protocol"""
+
+    def __init__(self, agent: ScriptedAgent, workdir: str):
+        self.agent = agent
+        self.workdir = workdir
+        self.stdout = _Lines()
+        self.stderr = _Lines()
+        self.stdin = self
+        self.returncode: Optional[int] = None
+        self.writer = EventWriter(self.stdout.queue.put)
+        self._pending = b""
+        self._commands: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._interrupted = threading.Event()
+        self.writer.emit(PhaseEvent("ready", version="fake"))
+        self._thread = threading.Thread(target=self._serve, name="fake-agent-daemon", daemon=True)
+        self._thread.start()
+
+    # stdin
+    def write(self, data):
+        self._pending += data.encode() if isinstance(data, str) else data
+        *lines, self._pending = self._pending.split(b"\n")
+        for line in lines:
+            if not line.strip():
+                continue
+            frame = json.loads(line)
+            if frame.get("command") == "interrupt":
+                self._interrupted.set()
+            else:
+                self._commands.put(frame)
+
+    def drain(self):
+        pass
+
+    def write_eof(self):
+        self._commands.put(None)
+
+    def _serve(self):
+        from tinygen_runner.daemon import COMMANDS
+
+        while True:
+            frame = self._commands.get()
+            if frame is None:
+                break
+            self.writer.command, self.writer.phase = frame.get("id"), None
+            command = frame.get("command")
+            if command == "shutdown":
+                self.writer.emit(PhaseEvent("finished", ok=True))
+                break
+            if command not in COMMANDS:
+                self.writer.emit(PhaseEvent("finished", ok=False, error=f"Unknown command '{command}'"))
+                continue
+            self.writer.phase = COMMANDS[command]
+            self._interrupted.clear()
+            session_id = self.agent.run_phase(self.writer, self.workdir, COMMANDS[command], self._interrupted)
+            self.writer.emit(PhaseEvent("finished", ok=True, session_id=session_id))
+        self.kill()
+
+    def kill(self):
+        if self.returncode is None:
+            self.returncode = 0
+            self.stdout.queue.put(None)
+            self.stderr.queue.put(None)
+
+    def poll(self) -> Optional[int]:
+        return self.returncode
+
+
+class FakeImage:
+    def __init__(self, object_id: str):
+        self.object_id = object_id
+
+
+# Sandbox paths that live under the fake sandbox's root (argv, sh -c scripts)
+_SANDBOX_PATH = re.compile(r"(?<![\w./-])/(tmp|root)(?=[/\"'\s]|$)")
+_GH_LOGIN = re.compile(r"echo '([^']*)' \| gh auth login --with-token")
+
+
+class FakeSandbox:
+    """
+    A Modal-like sandbox whose commands run on this machine under `root`:
+    /tmp and /root (HOME) are remapped into it, https://github.com/
+    resolves to `github`'s bare repositories, gh commands go to `github`, and the agent
+    daemon is `agent`. Every exec sleeps `exec_latency` seconds first.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, root: str, github: FakeGitHub, agent: ScriptedAgent, exec_latency: float = 0.0):
+        self.object_id = f"sb-fake-{next(self._ids)}"
+        self.root = root
+        self.github = github
+        self.agent = agent
+        self.exec_latency = exec_latency
+        self.paths = {
+            "tmp": os.path.join(root, "tmp"),
+            "root": os.path.join(root, "root"),
+        }
+        for path in self.paths.values():
+            os.makedirs(path, exist_ok=True)
+        with open(os.path.join(self.paths["root"], ".gitconfig"), "w") as f:
+            f.write(
+                "[user]\n\tname = tinygen[bot]\n\temail = tinygen[bot]@users.noreply.github.com\n"
+                f"[url \"file://{github.root}/\"]\n\tinsteadOf = https://github.com/\n"
+                "[init]\n\tdefaultBranch = main\n"
+            )
+        self.env = {
+            **os.environ,
+            "HOME": self.paths["root"],
+            "TMPDIR": self.paths["tmp"],
+            "GIT_CONFIG_NOSYSTEM": "1",
+            "GIT_TERMINAL_PROMPT": "0",
+            "PYTHONPATH": FUNCTIONS_DIR,
+        }
+        self.token: Optional[str] = None
+        self.daemons: List[FakeDaemonProcess] = []
+        self.snapshots = 0
+        self.terminated = False
+        # Exit code once the sandbox has stopped, as Modal's poll() reports it
+        self.returncode: Optional[int] = None
+
+        # Counters, useful for logging and benchmarks
+        self.execs = 0
+
+    def path(self, sandbox_path: str) -> str:
+        """Where a sandbox path lives on this machine"""
+        return _SANDBOX_PATH.sub(lambda m: self.paths[m.group(1)], sandbox_path)
+
+    def _gh(self, args: List[str], text: bool) -> FakeProcess:
+        def run(_):
+            returncode, stdout, stderr = self.github.gh(args, self.token)
+            return returncode, stdout.encode(), stderr.encode()
+        return FakeProcess(run, text)
+
+    def exec(self, *args: str, timeout: Optional[int] = None, workdir: Optional[str] = None, text: bool = True, **_):
+        if self.terminated:
+            raise Exception(f"Sandbox {self.object_id} has been terminated")
+        self.execs += 1
+        if self.exec_latency:
+            time.sleep(self.exec_latency)
+        cwd = self.path(workdir) if workdir else self.root
+
+        if args[0] == "python" and "--daemon" in args:
+            daemon = FakeDaemonProcess(self.agent, cwd)
+            self.daemons.append(daemon)
+            return daemon
+        if args[0] == "gh":
+            return self._gh(list(args[1:]), text)
+        if args[0] in ("sh", "bash") and len(args) > 2:
+            login = _GH_LOGIN.search(args[2])
+            if login:
+                self.token = login.group(1)
+                return self._gh(["auth", "login"], text)
+
+        argv = [self.path(arg) for arg in args]
+        if argv[0] == "python":
+            argv[0] = sys.executable
+
+        def run(stdin: bytes):
+            try:
+                completed = subprocess.run(argv, input=stdin, capture_output=True, cwd=cwd, env=self.env, timeout=timeout)
+            except subprocess.TimeoutExpired as e:
+                return 124, e.stdout or b"", (e.stderr or b"") + b"timed out\n"
+            except FileNotFoundError as e:
+                return 127, b"", f"{str(e)}\n".encode()
+            return completed.returncode, completed.stdout, completed.stderr
+        return FakeProcess(run, text)
+
+    def snapshot_filesystem(self) -> FakeImage:
+        self.snapshots += 1
+        return FakeImage(f"im-fake-{self.object_id}-{self.snapshots}")
+
+    def poll(self) -> Optional[int]:
+        return self.returncode
+
+    def terminate(self):
+        if self.terminated:
+            return
+        self.terminated = True
+        self.returncode = 137
+        for daemon in self.daemons:
+            daemon.kill()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+class FakeSandboxes:
+    """Leases fresh FakeSandboxes under `root` and terminates them on release"""
+
+    def __init__(self, root: str, github: FakeGitHub, agent: ScriptedAgent, exec_latency: float = 0.0):
+        self.root = root
+        self.github = github
+        self.agent = agent
+        self.exec_latency = exec_latency
+        self.leased: List[FakeSandbox] = []
+
+        # Counters, useful for logging and benchmarks
+        self.released = 0
+
+    def lease(self) -> Tuple[FakeSandbox, bool]:
+        sandbox = FakeSandbox(
+            tempfile.mkdtemp(prefix="sandbox-", dir=self.root), self.github, self.agent,
+            exec_latency=self.exec_latency
+        )
+        self.leased.append(sandbox)
+        return sandbox, True
+
+    def release(self, sandbox: FakeSandbox, chat_id: str, hot_state: Optional[Dict] = None):
+        self.released += 1
+        sandbox.terminate()
+
+
+def fake_backends(
+    root: str,
+    supabase: Optional[FakeSupabase] = None,
+    github: Optional[FakeGitHub] = None,
+    agent: Optional[ScriptedAgent] = None,
+    exec_latency: float = 0.0,
+    metrics=None,
+) -> RunBackends:
+    """RunBackends on the fakes, with every volume a directory under `root`"""
+    from locks import LocalLocks
+    from metrics import Metrics
+
+    supabase = supabase or FakeSupabase()
+    github = github or FakeGitHub(os.path.join(root, "github"))
+
+    def directory(name: str) -> str:
+        path = os.path.join(root, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    return RunBackends(
+        database=lambda: supabase,
+        github=github,
+        sandboxes=FakeSandboxes(directory("sandboxes"), github, agent or ScriptedAgent(), exec_latency=exec_latency),
+        locks=LocalLocks(),
+        run_logs=Storage(directory("run-logs")),
+        diffs=Storage(directory("diff-artifacts")),
+        snapshots=Storage(directory("snapshots")),
+        repo_index=Storage(directory("repo-index")),
+        mirrors=Storage(directory("git-cache")),
+        host_run=github.host_runner(directory("host")),
+        metrics=metrics or Metrics(),
+    )
@@ -0,0 +1,209 @@
+"""Persistent bare-mirror cache for repository clones"""
+import base64
+import hashlib
+import time
+import uuid
+from typing import Callable, List, Optional, Tuple
+
+from commands import Pusher, Runner, local_copy
+
+LAST_USED_FILE = "tinygen-last-used"
+# Bundle of a mirror's branches and tags, and the refs it was made from
+TRANSFER_BUNDLE = "tinygen-transfer.bundle"
+TRANSFER_REFS = "tinygen-transfer.refs"
+
+
+def github_auth_args(token: Optional[str]) -> List[str]:
+    """git -c options authenticating HTTPS requests to GitHub, without storing the token"""
+    if not token:
+        return []
+    credentials = base64.b64encode(f"x-access-token:{token}".encode()).decode()
+    return ["-c", f"http.https://github.com/.extraheader=AUTHORIZATION: basic {credentials}"]
+
+
+class MirrorCache:
+    """
+    Keeps a `git clone --mirror` of each repository under `root` (a Modal
+    Volume mounted on the functions only), keyed by owner/repo. The mirrors
+    are run with `run`, on the function container, and fetched with
+    `token`; sandboxes never see the cache, since it holds every user's
+    private repositories and agents run arbitrary commands.
+
+    A clone fetches new objects into the mirror, then copies one bundle of
+    the mirror's HEAD, branches and tags into the sandbox with `push` and
+    clones from it with `clone_run`. The bundle is kept next to the mirror
+    and rebuilt only when the mirror's refs change.
+
+    Mirror updates are serialized per repository through `locks`; eviction
+    removes least-recently-used mirrors once the cache exceeds `budget_kb`.
+    Any failure in the cache path falls back to a plain clone in the sandbox.
+    """
+
+    def __init__(
+        self,
+        run: Runner,
+        locks,
+        root: str = "/git-cache",
+        budget_kb: int = 50 * 1024 * 1024,
+        commit: Optional[Callable[[], None]] = None,
+        reload: Optional[Callable[[], None]] = None,
+        lock_timeout: float = 600,
+        clone_run: Optional[Runner] = None,
+        push: Pusher = local_copy,
+        token: Optional[str] = None,
+    ):
+        self.run = run
+        self.clone_run = clone_run or run
+        self.push = push
+        self.token = token
+        self.locks = locks
+        self.root = root.rstrip("/")
+        self.budget_kb = budget_kb
+        # Persist / refresh the backing volume; no-ops for a plain directory
+        self.commit = commit or (lambda: None)
+        self.reload = reload or (lambda: None)
+        self.lock_timeout = lock_timeout
+
+    @staticmethod
+    def key(owner: str, repo: str) -> str:
+        return f"{owner.lower()}/{repo.lower()}"
+
+    def mirror_path(self, owner: str, repo: str) -> str:
+        return f"{self.root}/{self.key(owner, repo)}.git"
+
+    def clone(self, clone_url: str, dest: str, owner: str, repo: str) -> bool:
+        """
+        Clone `clone_url` into `dest` (on the clone_run side), using the
+        mirror when possible. Returns True if the mirror was used. The clone
+        has its own objects and `origin` pointing at `clone_url`, as if it
+        had been cloned from GitHub.
+        """
+        started = time.time()
+        bundle = None
+        try:
+            bundle = self.transfer_bundle(clone_url, owner, repo)
+        except Exception as e:
+            print(f"Mirror cache unavailable for {owner}/{repo}: {str(e)}")
+
+        if bundle:
+            remote_bundle = f"/tmp/tinygen-{uuid.uuid4().hex[:8]}.bundle"
+            try:
+                self.push(bundle, remote_bundle)
+                result = self.clone_run("git", "clone", "--quiet", remote_bundle, dest)
+                if result.ok:
+                    result = self.clone_run("git", "-C", dest, "remote", "set-url", "origin", clone_url)
+            except Exception as e:
+                result = None
+                print(f"Copying the mirror failed: {str(e)}")
+            finally:
+                self.clone_run("rm", "-f", remote_bundle)
+            if result is not None and result.ok:
+                print(f"Cloned {owner}/{repo} from mirror in {time.time() - started:.1f}s")
+                self.evict(keep=self.key(owner, repo))
+                return True
+            if result is not None:
+                print(f"Clone from mirror failed, falling back: {result.stderr}")
+            self.clone_run("rm", "-rf", dest)
+
+        result = self.clone_run("git", "clone", clone_url, dest)
+        if not result.ok:
+            raise Exception(f"Failed to clone repo: {result.stderr}")
+        print(f"Cloned {owner}/{repo} without cache in {time.time() - started:.1f}s")
+        return False
+
+    def transfer_bundle(self, clone_url: str, owner: str, repo: str) -> Optional[str]:
+        """Update the mirror and return the path of its up-to-date bundle, or None"""
+        with self.locks.hold(f"mirror:{self.key(owner, repo)}", timeout=self.lock_timeout):
+            mirror = self.update_mirror(clone_url, owner, repo)
+            if mirror is None:
+                return None
+            bundle = f"{mirror}/{TRANSFER_BUNDLE}"
+            refs = self.run("git", "--git-dir", mirror, "for-each-ref", "--format=%(objectname) %(refname)", "refs/heads", "refs/tags")
+            head = self.run("git", "--git-dir", mirror, "symbolic-ref", "HEAD")
+            if not refs.ok or not refs.stdout.strip():
+                print(f"Mirror {mirror} has no branches")
+                return None
+            digest = hashlib.sha256((head.stdout + refs.stdout).encode()).hexdigest()
+            stored = self.run("cat", f"{mirror}/{TRANSFER_REFS}")
+            if stored.ok and stored.stdout.strip() == digest and self.run("test", "-f", bundle).ok:
+                return bundle
+            created = self.run("git", "--git-dir", mirror, "bundle", "create", "--quiet", f"{bundle}.tmp", "HEAD", "--branches", "--tags")
+            if not created.ok:
+                print(f"Failed to bundle mirror {mirror}: {created.stderr}")
+                self.run("rm", "-f", f"{bundle}.tmp")
+                return None
+            self.run("mv", f"{bundle}.tmp", bundle)
+            self.run("sh", "-c", 'printf "%s\\n" "$1" > "$2"', "sh", digest, f"{mirror}/{TRANSFER_REFS}")
+            self.commit()
+            return bundle
+
+    def update_mirror(self, clone_url: str, owner: str, repo: str) -> Optional[str]:
+        """Create or fetch the mirror for owner/repo (holding its lock); returns its path, or None"""
+        mirror = self.mirror_path(owner, repo)
+        auth = github_auth_args(self.token)
+        self.reload()
+        if self.run("test", "-f", f"{mirror}/HEAD").ok:
+            self.run("git", "--git-dir", mirror, "remote", "set-url", "origin", clone_url)
+            fetch = self.run("git", *auth, "--git-dir", mirror, "fetch", "--prune", "--quiet", "origin")
+            if fetch.ok:
+                self._touch(mirror)
+                self.commit()
+                return mirror
+            # Treat a failing fetch as a corrupt mirror and rebuild it once
+            print(f"Mirror fetch failed, rebuilding {mirror}: {fetch.stderr}")
+            self.run("rm", "-rf", mirror)
+
+        self.run("mkdir", "-p", mirror.rsplit("/", 1)[0])
+        created = self.run("git", *auth, "clone", "--mirror", "--quiet", clone_url, mirror)
+        if not created.ok:
+            print(f"Failed to create mirror {mirror}: {created.stderr}")
+            self.run("rm", "-rf", mirror)
+            self.commit()
+            return None
+        self._touch(mirror)
+        self.commit()
+        return mirror
+
+    def _touch(self, mirror: str):
+        self.run("touch", f"{mirror}/{LAST_USED_FILE}")
+
+    def list_mirrors(self) -> List[Tuple[float, int, str]]:
+        """(last_used, size_kb, path) for every mirror, oldest first"""
+        script = (
+            f'for d in "{self.root}"/*/*.git; do '
+            f'[ -d "$d" ] || continue; '
+            f'printf "%s %s %s\\n" "$(stat -c %Y "$d/{LAST_USED_FILE}" 2>/dev/null || echo 0)" '
+            f'"$(du -sk "$d" | cut -f1)" "$d"; done'
+        )
+        result = self.run("sh", "-c", script)
+        mirrors = []
+        for line in result.stdout.splitlines():
+            parts = line.split(" ", 2)
+            if len(parts) == 3:
+                mirrors.append((float(parts[0]), int(parts[1]), parts[2]))
+        return sorted(mirrors)
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """Remove least-recently-used mirrors until the cache fits the budget"""
+        try:
+            with self.locks.hold("mirror-eviction", timeout=5):
+                mirrors = self.list_mirrors()
+                total = sum(size for _, size, _ in mirrors)
+                evicted = 0
+                for _, size, path in mirrors:
+                    if total <= self.budget_kb:
+                        break
+                    key = path[len(self.root) + 1:-len(".git")]
+                    if key == keep or self.locks.is_held(f"mirror:{key}"):
+                        continue
+                    print(f"Evicting mirror {key} ({size} KB)")
+                    self.run("rm", "-rf", path)
+                    total -= size
+                    evicted += 1
+                if evicted:
+                    self.commit()
+                return evicted
+        except Exception as e:
+            # Eviction is best effort; another run will get to it
+            print(f"Skipping mirror eviction: {str(e)}")
+            return 0
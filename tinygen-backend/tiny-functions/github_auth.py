@@ -2,10 +2,16 @@
 import os
 import jwt
 import time
-import requests
 import textwrap
-from typing import Tuple, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Tuple, Optional
 from modal import Sandbox
+from github_client import get_github_client
+
+# GitHub App JWTs may live at most 10 minutes; we issue them for 9
+JWT_LIFETIME = 540
 
 def format_private_key(private_key: str) -> str:
     """Format private key with PEM headers if needed"""
@@ -22,77 +28,172 @@ def generate_jwt_token(client_id: str, private_key: str) -> str:
     now = int(time.time())
     payload = {
         "iat": now - 60,  # 60 seconds in the past for clock drift
-        "exp": now + 540,  # 9 minutes in the future (less than 10 min max)
+        "exp": now + JWT_LIFETIME,  # 9 minutes in the future (less than 10 min max)
         "iss": client_id
     }
     
     return jwt.encode(payload, formatted_key, algorithm="RS256")
 
-def get_installation_id(owner: str, repo: str, jwt_token: str) -> Tuple[Optional[str], Optional[str]]:
+def get_installation_id(owner: str, repo: str, jwt_token: str, index=None) -> Tuple[Optional[str], Optional[str]]:
     """Get installation ID for a repository
     
+    Resolves the owner through the installation index when one is given
+    (a single key lookup), otherwise asks GitHub for the repo's installation.
+    
     Returns:
         Tuple of (installation_id, error_message)
     """
-    headers = {
-        "Authorization": f"Bearer {jwt_token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
+    if index is not None:
+        try:
+            entry = index.lookup(owner)
+            if entry:
+                print(f"Found installation for {owner} in index: {entry['id']}")
+                return str(entry["id"]), None
+        except Exception as e:
+            print(f"Installation index lookup failed for {owner}: {str(e)}")
     
     # Try to get installation for specific repo
-    install_url = f"https://api.github.com/repos/{owner}/{repo}/installation"
-    print(f"Getting installation from: {install_url}")
-    install_response = requests.get(install_url, headers=headers)
+    install_path = f"/repos/{owner}/{repo}/installation"
+    print(f"Getting installation from: {install_path}")
+    install_response = get_github_client().get(install_path, jwt_token)
     
     if install_response.status_code == 200:
         installation_id = install_response.json()["id"]
         print(f"Found installation ID: {installation_id}")
+        if index is not None:
+            index.upsert(install_response.json())
         return str(installation_id), None
     
-    # If that fails, list all installations and find the right one
-    print("Repo-specific installation not found, listing all installations...")
-    list_response = requests.get(
-        "https://api.github.com/app/installations",
-        headers=headers
-    )
-    
-    if list_response.status_code == 200:
-        installations = list_response.json()
-        print(f"Found {len(installations)} installations")
-        
-        # Try to find installation for the owner
-        for inst in installations:
-            if inst['account']['login'].lower() == owner.lower():
-                installation_id = str(inst['id'])
-                print(f"Found installation for {owner}: {installation_id}")
-                return installation_id, None
-        
-        # If no specific match, use the first one (for personal repos)
-        if installations:
-            installation_id = str(installations[0]['id'])
-            print(f"Using first available installation: {installation_id}")
-            return installation_id, None
-    
     return None, f"GitHub App not installed or accessible for {owner}/{repo}"
 
-def get_installation_access_token(installation_id: str, jwt_token: str) -> str:
-    """Get installation access token"""
-    headers = {
-        "Authorization": f"Bearer {jwt_token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
-    
-    token_response = requests.post(
-        f"https://api.github.com/app/installations/{installation_id}/access_tokens",
-        headers=headers
+def request_installation_token(installation_id: str, jwt_token: str) -> Tuple[str, float]:
+    """Create an installation access token; returns (token, expires_at epoch seconds)"""
+    token_response = get_github_client().post(
+        f"/app/installations/{installation_id}/access_tokens",
+        jwt_token
     )
     
     if token_response.status_code != 201:
         raise Exception(f"Failed to get access token: {token_response.text}")
     
-    access_token = token_response.json()["token"]
+    data = token_response.json()
+    expires_at = datetime.fromisoformat(data["expires_at"].replace("Z", "+00:00")).timestamp()
     print("Generated installation access token")
-    return access_token
+    return data["token"], expires_at
+
+def get_installation_access_token(installation_id: str, jwt_token: str) -> str:
+    """Get installation access token"""
+    return request_installation_token(installation_id, jwt_token)[0]
+
+
+class TokenCache:
+    """
+    Caches GitHub App JWTs and installation access tokens until shortly
+    before they expire. Concurrent callers needing the same token wait on one
+    refresh instead of each hitting GitHub.
+
+    An optional shared `store` (e.g. a modal.Dict) lets warm containers reuse
+    tokens minted elsewhere; `locks` (locks.DictLocks) extends the
+    single-refresh guarantee across containers.
+    """
+
+    def __init__(self, store=None, locks=None, refresh_margin: float = 300, jwt_margin: float = 60, clock=time.time):
+        self.store = store
+        self.locks = locks
+        self.refresh_margin = refresh_margin
+        self.jwt_margin = jwt_margin
+        self.clock = clock
+        self._jwts: Dict[str, Tuple[str, float]] = {}
+        self._tokens: Dict[str, Tuple[str, float]] = {}
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        with self._guard:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get_jwt(self, client_id: str, private_key: str) -> str:
+        """App JWT, re-signed only when the cached one is about to expire"""
+        cached = self._jwts.get(client_id)
+        if cached and cached[1] - self.jwt_margin > self.clock():
+            return cached[0]
+        with self._lock_for(f"jwt:{client_id}"):
+            cached = self._jwts.get(client_id)
+            if cached and cached[1] - self.jwt_margin > self.clock():
+                return cached[0]
+            token = generate_jwt_token(client_id, private_key)
+            self._jwts[client_id] = (token, self.clock() + JWT_LIFETIME)
+            return token
+
+    def get_installation_token(self, installation_id: str, client_id: str, private_key: str) -> str:
+        """Installation access token, refreshed once shortly before expires_at"""
+        installation_id = str(installation_id)
+        token = self._fresh_token(installation_id)
+        if token:
+            return token
+        with self._lock_for(f"installation:{installation_id}"):
+            token = self._fresh_token(installation_id)
+            if token:
+                return token
+            if self.locks is not None:
+                with self.locks.hold(f"gh-token:{installation_id}", timeout=60):
+                    # Another container may have refreshed while we waited
+                    token = self._fresh_token(installation_id)
+                    if token:
+                        return token
+                    return self._refresh(installation_id, client_id, private_key)
+            return self._refresh(installation_id, client_id, private_key)
+
+    def _is_fresh(self, cached: Optional[Tuple[str, float]]) -> bool:
+        return bool(cached) and cached[1] - self.refresh_margin > self.clock()
+
+    def _fresh_token(self, installation_id: str) -> Optional[str]:
+        cached = self._tokens.get(installation_id)
+        if self._is_fresh(cached):
+            return cached[0]
+        # Missing or stale here; another container may have refreshed it
+        if self.store is not None:
+            try:
+                shared = self.store.get(f"gh-token:{installation_id}")
+            except Exception as e:
+                print(f"Token store unavailable: {str(e)}")
+                shared = None
+            if shared and (not cached or shared["expires_at"] > cached[1]):
+                cached = (shared["token"], shared["expires_at"])
+                self._tokens[installation_id] = cached
+        if self._is_fresh(cached):
+            return cached[0]
+        return None
+
+    def _refresh(self, installation_id: str, client_id: str, private_key: str) -> str:
+        jwt_token = self.get_jwt(client_id, private_key)
+        token, expires_at = request_installation_token(installation_id, jwt_token)
+        self._tokens[installation_id] = (token, expires_at)
+        if self.store is not None:
+            try:
+                self.store[f"gh-token:{installation_id}"] = {"token": token, "expires_at": expires_at}
+            except Exception as e:
+                print(f"Failed to share installation token: {str(e)}")
+        return token
+
+    def invalidate(self, installation_id: str):
+        """Drop a token GitHub rejected so the next call mints a new one"""
+        installation_id = str(installation_id)
+        self._tokens.pop(installation_id, None)
+        if self.store is not None:
+            try:
+                self.store.pop(f"gh-token:{installation_id}", None)
+            except Exception:
+                pass
+
+
+# Process-wide cache; warm containers keep it between runs
+token_cache = TokenCache()
+
+def configure_token_store(store, locks=None):
+    """Back the process-wide token cache with a shared store"""
+    token_cache.store = store
+    token_cache.locks = locks
 
 def authenticate_gh_cli(sandbox: Sandbox, access_token: str):
     """Authenticate gh CLI with the token"""
@@ -132,56 +233,97 @@ def setup_git_config(sandbox: Sandbox, bot_username: str = "tinygen[bot]"):
     git_config_name.wait()
     print(f"Git configured to commit as {bot_username}")
 
-def check_repo_access(sandbox: Sandbox, owner: str, repo_name: str, username: str) -> bool:
+class RepoAccessResolver:
     """
-    Check if user has write access to the repository.
-    Returns True if user can push to the repo (owner, org member, or collaborator).
+    Decides whether a user can push to a repository using the GitHub REST
+    API from the host, so the fork-or-direct decision doesn't need a booted
+    sandbox. The independent probes run concurrently and results are cached
+    per (owner, repo, user) for `ttl` seconds. A probe that fails (network
+    error, rate limit, 5xx) raises instead of answering "no access", and
+    nothing is cached: a guess would fork the repository for the run and
+    stick for the whole TTL.
     """
-    print(f"Checking access for {username} to {owner}/{repo_name}...")
-    
-    # Method 1: Check if user owns the repo
-    if owner.lower() == username.lower():
-        print(f"User {username} owns the repository")
-        return True
-    
-    # Method 2: Use gh CLI to check repo access
-    # This will check if user has push access (collaborator or org member with write)
-    check_access = sandbox.exec(
-        "gh", "api", 
-        f"/repos/{owner}/{repo_name}/collaborators/{username}/permission",
-        "--jq", ".permission"
-    )
-    check_access.wait()
-    
-    if check_access.returncode == 0:
-        permission = check_access.stdout.read().strip()
-        print(f"User {username} has {permission} permission")
-        # admin, maintain, or write permissions mean we can push
-        if permission in ["admin", "maintain", "write"]:
-            return True
-    
-    # Method 3: Check if it's an org repo and user is a member with access
-    check_org_membership = sandbox.exec(
-        "gh", "api", 
-        f"/orgs/{owner}/members/{username}",
-        "--silent"
-    )
-    check_org_membership.wait()
-    
-    if check_org_membership.returncode == 0:
-        # User is an org member, now check if they have repo access
-        check_repo_teams = sandbox.exec(
-            "gh", "api",
-            f"/repos/{owner}/{repo_name}",
-            "--jq", ".permissions.push"
+
+    PUSH_PERMISSIONS = ("admin", "maintain", "write")
+
+    def __init__(self, client=None, ttl: float = 120, clock=time.time):
+        self.client = client
+        self.ttl = ttl
+        self.clock = clock
+        self._cache: Dict[Tuple[str, str, str], Tuple[bool, float]] = {}
+        self._executor = ThreadPoolExecutor(max_workers=6, thread_name_prefix="repo-access")
+
+    def _get(self, path: str, token: str):
+        response = (self.client or get_github_client()).get(path, token)
+        rate_limited = response.status_code == 429 or (
+            response.status_code == 403 and response.headers.get("x-ratelimit-remaining") == "0"
         )
-        check_repo_teams.wait()
-        
-        if check_repo_teams.returncode == 0:
-            has_push = check_repo_teams.stdout.read().strip()
-            if has_push == "true":
+        if rate_limited or response.status_code >= 500:
+            raise RuntimeError(f"GitHub returned {response.status_code} for {path}")
+        return response
+
+    def _collaborator_permission(self, owner: str, repo_name: str, username: str, token: str) -> bool:
+        response = self._get(f"/repos/{owner}/{repo_name}/collaborators/{username}/permission", token)
+        if response.status_code != 200:
+            return False
+        permission = response.json().get("permission")
+        print(f"User {username} has {permission} permission")
+        return permission in self.PUSH_PERMISSIONS
+
+    def _org_member(self, owner: str, username: str, token: str) -> bool:
+        # 204 = member; 302/404 = not a member or not visible to us
+        return self._get(f"/orgs/{owner}/members/{username}", token).status_code == 204
+
+    def _repo_push(self, owner: str, repo_name: str, token: str) -> bool:
+        response = self._get(f"/repos/{owner}/{repo_name}", token)
+        if response.status_code != 200:
+            return False
+        return bool((response.json().get("permissions") or {}).get("push"))
+
+    def has_write_access(self, owner: str, repo_name: str, username: str, token: str) -> bool:
+        key = (owner.lower(), repo_name.lower(), username.lower())
+        cached = self._cache.get(key)
+        if cached and cached[1] > self.clock():
+            return cached[0]
+
+        if key[0] == key[2]:
+            print(f"User {username} owns the repository")
+            result = True
+        else:
+            result = self._probe(owner, repo_name, username, token)
+        self._cache[key] = (result, self.clock() + self.ttl)
+        return result
+
+    def _probe(self, owner: str, repo_name: str, username: str, token: str) -> bool:
+        collaborator = self._executor.submit(self._collaborator_permission, owner, repo_name, username, token)
+        member = self._executor.submit(self._org_member, owner, username, token)
+        push = self._executor.submit(self._repo_push, owner, repo_name, token)
+        try:
+            # A direct write permission settles it without waiting on the org probes
+            if collaborator.result():
+                return True
+            if member.result() and push.result():
                 print(f"User {username} has push access via org membership")
                 return True
-    
-    print(f"User {username} does not have write access to {owner}/{repo_name}")
-    return False
+        except Exception as e:
+            print(f"Repo access check failed for {owner}/{repo_name}: {str(e)}")
+            raise
+        return False
+
+    def invalidate(self, owner: str, repo_name: str, username: str):
+        self._cache.pop((owner.lower(), repo_name.lower(), username.lower()), None)
+
+
+# Process-wide resolver; warm containers keep its cache between runs
+repo_access = RepoAccessResolver()
+
+def check_repo_access(owner: str, repo_name: str, username: str, access_token: str) -> bool:
+    """
+    Check if user has write access to the repository.
+    Returns True if user can push to the repo (owner, org member, or collaborator).
+    """
+    print(f"Checking access for {username} to {owner}/{repo_name}...")
+    has_access = repo_access.has_write_access(owner, repo_name, username, access_token)
+    if not has_access:
+        print(f"User {username} does not have write access to {owner}/{repo_name}")
+    return has_access
@@ -0,0 +1,134 @@
+"""Shared, pooled HTTP client for all GitHub API traffic"""
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+GITHUB_API = "https://api.github.com"
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class GitHubClient:
+    """
+    One keep-alive connection pool per process for GitHub, with a sync face
+    for the Modal functions and an async face for FastAPI handlers. Both use
+    the same limits: HTTP/2 when the h2 package is installed, per-request
+    timeouts, and a cap on in-flight requests so a burst of runs can't open
+    hundreds of sockets or trip GitHub's secondary rate limits.
+    """
+
+    def __init__(
+        self,
+        api_url: str = GITHUB_API,
+        timeout: float = 15.0,
+        max_connections: int = 20,
+        max_concurrency: int = 10,
+        http2: Optional[bool] = None,
+    ):
+        self.api_url = api_url.rstrip("/")
+        self.timeout = httpx.Timeout(timeout, connect=5.0)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.http2 = _http2_available() if http2 is None else http2
+        self.max_concurrency = max_concurrency
+
+        self._sync_client: Optional[httpx.Client] = None
+        self._sync_slots = threading.BoundedSemaphore(max_concurrency)
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_slots: Optional[asyncio.Semaphore] = None
+        self._guard = threading.Lock()
+
+    def _headers(self, token: Optional[str]) -> Dict[str, str]:
+        headers = {"Accept": "application/vnd.github.v3+json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        return headers
+
+    def _url(self, path: str) -> str:
+        return path if path.startswith("http") else f"{self.api_url}{path}"
+
+    # Sync API (Modal functions, background threads)
+
+    @property
+    def sync_client(self) -> httpx.Client:
+        with self._guard:
+            if self._sync_client is None:
+                self._sync_client = httpx.Client(
+                    http2=self.http2, timeout=self.timeout, limits=self.limits
+                )
+            return self._sync_client
+
+    def request(self, method: str, path: str, token: Optional[str] = None, **kwargs) -> httpx.Response:
+        with self._sync_slots:
+            return self.sync_client.request(method, self._url(path), headers=self._headers(token), **kwargs)
+
+    def get(self, path: str, token: Optional[str] = None, **kwargs) -> httpx.Response:
+        return self.request("GET", path, token, **kwargs)
+
+    def post(self, path: str, token: Optional[str] = None, **kwargs) -> httpx.Response:
+        return self.request("POST", path, token, **kwargs)
+
+    def paginate(self, path: str, token: Optional[str] = None, per_page: int = 100) -> List[Any]:
+        """All items of a list endpoint, following Link rel=next"""
+        items: List[Any] = []
+        url: Optional[str] = self._url(path)
+        params: Optional[Dict[str, Any]] = {"per_page": per_page}
+        while url:
+            response = self.get(url, token, params=params)
+            if response.status_code != 200:
+                raise Exception(f"GitHub request failed: {response.status_code} {response.text}")
+            items.extend(response.json())
+            url = response.links.get("next", {}).get("url")
+            # The next link already carries the query string
+            params = None
+        return items
+
+    # Async API (FastAPI handlers)
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                http2=self.http2, timeout=self.timeout, limits=self.limits
+            )
+            self._async_slots = asyncio.Semaphore(self.max_concurrency)
+        return self._async_client
+
+    async def arequest(self, method: str, path: str, token: Optional[str] = None, **kwargs) -> httpx.Response:
+        client = self.async_client
+        async with self._async_slots:
+            return await client.request(method, self._url(path), headers=self._headers(token), **kwargs)
+
+    async def aget(self, path: str, token: Optional[str] = None, **kwargs) -> httpx.Response:
+        return await self.arequest("GET", path, token, **kwargs)
+
+    async def apost(self, path: str, token: Optional[str] = None, **kwargs) -> httpx.Response:
+        return await self.arequest("POST", path, token, **kwargs)
+
+    def close(self):
+        if self._sync_client is not None:
+            self._sync_client.close()
+            self._sync_client = None
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+
+_client: Optional[GitHubClient] = None
+
+
+def get_github_client() -> GitHubClient:
+    """Process-wide GitHub client"""
+    global _client
+    if _client is None:
+        _client = GitHubClient()
+    return _client
@@ -0,0 +1,105 @@
+"""Sandboxes kept running after a run so the chat's next follow-up can continue in place"""
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class HotSandboxRegistry:
+    """
+    Maps chat id -> the sandbox its last run finished in, as
+    {sandbox_id, expires_at, ...state} entries in a shared dict (a
+    modal.Dict in production). A follow-up that arrives within the idle
+    window claims the entry with a single atomic pop, so only one run can
+    reuse a sandbox; later ones restore from the snapshot instead.
+
+    The backend only needs `from_id(id)`, and sandboxes only need `poll()`
+    and `terminate()`, so a plain dict and fakes work in tests.
+    """
+
+    def __init__(
+        self,
+        store,
+        backend,
+        idle_window: float = 600,
+        metrics=None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.store = store
+        self.backend = backend
+        self.idle_window = idle_window
+        self.metrics = metrics
+        self.clock = clock
+
+    def _incr(self, name: str, value: int = 1):
+        if self.metrics is not None and value:
+            self.metrics.incr(name, value)
+
+    @property
+    def enabled(self) -> bool:
+        return self.idle_window > 0
+
+    def park(self, chat_id: str, sandbox, deadline: Optional[float] = None, **state: Any) -> bool:
+        """
+        Keep `sandbox` for the chat's next follow-up, until the idle window
+        closes or `deadline` (when the sandbox itself would time out).
+        Replaces, and terminates, any sandbox the chat had parked before.
+        Returns False (and terminates the sandbox) when parking is disabled.
+        """
+        if not self.enabled:
+            sandbox.terminate()
+            return False
+        expires_at = self.clock() + self.idle_window
+        if deadline is not None:
+            expires_at = min(expires_at, deadline)
+        previous = self.store.pop(chat_id, None)
+        if previous and previous["sandbox_id"] != sandbox.object_id:
+            self._terminate(previous["sandbox_id"])
+        self.store[chat_id] = {"sandbox_id": sandbox.object_id, "expires_at": expires_at, **state}
+        self._incr("hot_sandbox_parked")
+        return True
+
+    def claim(self, chat_id: str) -> Tuple[Optional[Any], Optional[Dict[str, Any]]]:
+        """Take the chat's parked sandbox if it is still in its window: (sandbox, state) or (None, None)"""
+        entry = self.store.pop(chat_id, None)
+        if entry is None:
+            self._incr("hot_sandbox_misses")
+            return None, None
+        if entry["expires_at"] <= self.clock():
+            self._terminate(entry["sandbox_id"])
+            self._incr("hot_sandbox_expired")
+            return None, None
+        try:
+            sandbox = self.backend.from_id(entry["sandbox_id"])
+        except Exception as e:
+            print(f"Hot sandbox {entry['sandbox_id']} is gone: {str(e)}")
+            return None, None
+        if sandbox.poll() is not None:
+            self._incr("hot_sandbox_dead")
+            return None, None
+        self._incr("hot_sandbox_hits")
+        return sandbox, entry
+
+    def _terminate(self, sandbox_id: str):
+        try:
+            self.backend.from_id(sandbox_id).terminate()
+        except Exception as e:
+            print(f"Failed to terminate hot sandbox {sandbox_id}: {str(e)}")
+
+    def reap(self) -> int:
+        """Terminate parked sandboxes whose window has closed"""
+        reaped = 0
+        now = self.clock()
+        for chat_id, entry in list(self.store.items()):
+            if entry["expires_at"] > now:
+                continue
+            # Only the reaper that pops the entry terminates its sandbox
+            current = self.store.pop(chat_id, None)
+            if current is None:
+                continue
+            if current["sandbox_id"] != entry["sandbox_id"] or current["expires_at"] > now:
+                # Re-parked since we listed it; put it back
+                self.store[chat_id] = current
+                continue
+            self._terminate(current["sandbox_id"])
+            reaped += 1
+        self._incr("hot_sandbox_reaped", reaped)
+        return reaped
@@ -0,0 +1,218 @@
+"""Index of GitHub App installations keyed by lowercase account login"""
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from github_client import GitHubClient, get_github_client
+
+META_KEY = "meta:built_at"
+ENTRY_PREFIX = "inst:"
+MISS_PREFIX = "miss:"
+
+
+def list_all_installations(jwt_token: str, client: Optional[GitHubClient] = None) -> List[Dict[str, Any]]:
+    """Every installation of the app, following Link pagination"""
+    return (client or get_github_client()).paginate("/app/installations", jwt_token)
+
+
+def _account_installation(response, login: str) -> Optional[Dict[str, Any]]:
+    if response.status_code == 404:
+        return None
+    if response.status_code != 200:
+        raise Exception(f"Failed to get installation for {login}: {response.status_code} {response.text}")
+    return response.json()
+
+
+def fetch_account_installation(login: str, jwt_token: str, client: Optional[GitHubClient] = None) -> Optional[Dict[str, Any]]:
+    """The app's installation on a user or org account, or None if not installed"""
+    response = (client or get_github_client()).get(f"/users/{login}/installation", jwt_token)
+    return _account_installation(response, login)
+
+
+async def afetch_account_installation(login: str, jwt_token: str, client: Optional[GitHubClient] = None) -> Optional[Dict[str, Any]]:
+    """Async fetch_account_installation for FastAPI handlers"""
+    response = await (client or get_github_client()).aget(f"/users/{login}/installation", jwt_token)
+    return _account_installation(response, login)
+
+
+def summarize(installation: Dict[str, Any]) -> Dict[str, Any]:
+    """The fields of an installation payload we keep in the index"""
+    account = installation.get("account") or {}
+    return {
+        "id": installation["id"],
+        "login": account.get("login"),
+        "account_type": account.get("type"),
+        "repository_selection": installation.get("repository_selection"),
+        "suspended_at": installation.get("suspended_at"),
+    }
+
+
+class InstallationIndex:
+    """
+    Maps lowercase account login -> installation metadata in a shared
+    mapping (a modal.Dict in production, a plain dict in tests), so lookups
+    are a single key read instead of a scan of /app/installations.
+
+    The index is rebuilt with full pagination when older than `ttl`, and kept
+    current in between by webhook events and by per-account lookups on a miss.
+    Misses are remembered for `miss_ttl` so unknown logins don't hit GitHub on
+    every poll.
+    """
+
+    def __init__(
+        self,
+        store,
+        get_jwt: Callable[[], str],
+        ttl: float = 3600,
+        miss_ttl: float = 60,
+        client: Optional[GitHubClient] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.store = store
+        self.get_jwt = get_jwt
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.client = client
+        self.clock = clock
+        self._rebuilding = threading.Lock()
+
+    def lookup(self, login: str) -> Optional[Dict[str, Any]]:
+        """Installation for an account login, or None if the app isn't installed"""
+        login = login.lower()
+        found, entry = self._lookup_indexed(login)
+        if found:
+            return entry
+
+        installation = fetch_account_installation(login, self.get_jwt(), self.client)
+        return self._record_lookup(login, installation)
+
+    async def alookup(self, login: str) -> Optional[Dict[str, Any]]:
+        """lookup() for async handlers: store reads run off the event loop and
+        the miss path uses the async GitHub client"""
+        login = login.lower()
+        found, entry = await asyncio.to_thread(self._lookup_indexed, login)
+        if found:
+            return entry
+
+        installation = await afetch_account_installation(login, self.get_jwt(), self.client)
+        return await asyncio.to_thread(self._record_lookup, login, installation)
+
+    def _lookup_indexed(self, login: str):
+        """(found, entry) from the index alone; found is False when GitHub must be asked"""
+        built_at = self.store.get(META_KEY)
+        if built_at is None:
+            self.rebuild()
+        elif self.clock() - built_at > self.ttl:
+            # Serve from the stale index while a fresh one is built
+            self._rebuild_in_background()
+
+        entry = self.store.get(f"{ENTRY_PREFIX}{login}")
+        if entry is not None:
+            return True, entry
+
+        missed_at = self.store.get(f"{MISS_PREFIX}{login}")
+        if missed_at is not None and self.clock() - missed_at < self.miss_ttl:
+            return True, None
+        return False, None
+
+    def _record_lookup(self, login: str, installation: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if installation is None:
+            self.store[f"{MISS_PREFIX}{login}"] = self.clock()
+            return None
+        return self.upsert(installation)
+
+    def rebuild(self) -> int:
+        """Replace the index with a full, paginated listing of installations"""
+        with self._rebuilding:
+            started = self.clock()
+            installations = list_all_installations(self.get_jwt(), self.client)
+            entries = {}
+            for installation in installations:
+                entry = summarize(installation)
+                if entry["login"]:
+                    entries[f"{ENTRY_PREFIX}{entry['login'].lower()}"] = entry
+            self.store.update(entries)
+
+            # Drop accounts that no longer have the app installed
+            stale = [
+                key for key in list(self.store.keys())
+                if isinstance(key, str) and key.startswith(ENTRY_PREFIX) and key not in entries
+            ]
+            for key in stale:
+                self.store.pop(key, None)
+            self.store[META_KEY] = started
+            print(f"Installation index rebuilt: {len(entries)} accounts, {len(stale)} removed")
+            return len(entries)
+
+    def _rebuild_in_background(self):
+        if self._rebuilding.locked():
+            return
+
+        def rebuild():
+            try:
+                self.rebuild()
+            except Exception as e:
+                print(f"Installation index rebuild failed: {str(e)}")
+
+        threading.Thread(target=rebuild, name="installation-index-rebuild", daemon=True).start()
+
+    def upsert(self, installation: Dict[str, Any]) -> Dict[str, Any]:
+        entry = summarize(installation)
+        login = entry["login"].lower()
+        self.store[f"{ENTRY_PREFIX}{login}"] = entry
+        self.store.pop(f"{MISS_PREFIX}{login}", None)
+        return entry
+
+    def remove(self, login: str):
+        self.store.pop(f"{ENTRY_PREFIX}{login.lower()}", None)
+
+    def apply_webhook(self, event: str, payload: Dict[str, Any]) -> bool:
+        """Update the index from a GitHub webhook; returns True if it changed"""
+        installation = payload.get("installation") or {}
+        action = payload.get("action")
+        if event == "installation":
+            if action == "deleted":
+                login = (installation.get("account") or {}).get("login")
+                if login:
+                    self.remove(login)
+                    return True
+                return False
+            if installation.get("account"):
+                self.upsert(installation)
+                return True
+        elif event == "installation_target" and action == "renamed":
+            old_login = ((payload.get("changes") or {}).get("login") or {}).get("from")
+            if old_login:
+                self.remove(old_login)
+            if installation.get("account"):
+                self.upsert(installation)
+            return True
+        return False
+
+    def entries(self) -> Iterable[Dict[str, Any]]:
+        for key, value in self.store.items():
+            if isinstance(key, str) and key.startswith(ENTRY_PREFIX):
+                yield value
+
+
+_index: Optional[InstallationIndex] = None
+
+
+def get_installation_index() -> InstallationIndex:
+    """Process-wide index backed by the shared Modal dict, using app credentials from env"""
+    global _index
+    if _index is None:
+        import os
+        from modal import Dict as ModalDict
+        from github_auth import token_cache
+        from config import INSTALLATION_INDEX_DICT, INSTALLATION_INDEX_TTL
+
+        client_id = os.environ["GITHUB_CLIENT_ID"]
+        private_key = os.environ["GITHUB_PRIVATE_KEY"]
+        _index = InstallationIndex(
+            ModalDict.from_name(INSTALLATION_INDEX_DICT, create_if_missing=True),
+            get_jwt=lambda: token_cache.get_jwt(client_id, private_key),
+            ttl=INSTALLATION_INDEX_TTL,
+        )
+    return _index
@@ -0,0 +1,113 @@
+"""Named locks usable across containers (modal.Dict) or within one process"""
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict
+
+
+class LockTimeout(Exception):
+    pass
+
+
+class DictLocks:
+    """
+    Lease-style locks kept in a modal.Dict. A lock is a key written with
+    skip_if_exists; it carries an expiry so a crashed holder can't wedge
+    everyone else. hold() renews the lease every third of `lease_seconds`
+    for as long as the block runs, so a slow holder keeps its lock.
+    """
+
+    def __init__(self, store, lease_seconds: float = 600, poll_interval: float = 0.5):
+        self.store = store
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+
+    def acquire(self, name: str, timeout: float = 600) -> str:
+        key = f"lock:{name}"
+        token = str(uuid.uuid4())
+        deadline = time.time() + timeout
+        while True:
+            value = {"token": token, "expires_at": time.time() + self.lease_seconds}
+            if self.store.put(key, value, skip_if_exists=True):
+                return token
+            current = self.store.get(key)
+            if current and current["expires_at"] < time.time():
+                # Another waiter may have broken it and taken it since we
+                # read it; only pop the lease we saw expire
+                if self._token(key) == current["token"]:
+                    print(f"Breaking expired lock {name}")
+                    self.store.pop(key, None)
+                continue
+            if time.time() > deadline:
+                raise LockTimeout(f"Timed out waiting for lock {name}")
+            time.sleep(self.poll_interval)
+
+    def _token(self, key: str):
+        current = self.store.get(key)
+        return current["token"] if current else None
+
+    def renew(self, name: str, token: str) -> bool:
+        """Extend a held lock's lease; False if it is no longer ours"""
+        key = f"lock:{name}"
+        if self._token(key) != token:
+            return False
+        self.store.put(key, {"token": token, "expires_at": time.time() + self.lease_seconds})
+        return True
+
+    def release(self, name: str, token: str):
+        key = f"lock:{name}"
+        if self._token(key) == token:
+            self.store.pop(key, None)
+
+    def is_held(self, name: str) -> bool:
+        current = self.store.get(f"lock:{name}")
+        return bool(current) and current["expires_at"] >= time.time()
+
+    def _keep_alive(self, name: str, token: str, stop: threading.Event):
+        while not stop.wait(self.lease_seconds / 3):
+            try:
+                if not self.renew(name, token):
+                    print(f"Lost lock {name}")
+                    return
+            except Exception as e:
+                print(f"Failed to renew lock {name}: {str(e)}")
+
+    @contextmanager
+    def hold(self, name: str, timeout: float = 600):
+        token = self.acquire(name, timeout)
+        stop = threading.Event()
+        renewer = threading.Thread(target=self._keep_alive, args=(name, token, stop), name=f"lock-{name}", daemon=True)
+        renewer.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            # No renewal may land after the release
+            renewer.join()
+            self.release(name, token)
+
+
+class LocalLocks:
+    """Same interface as DictLocks, backed by threading locks"""
+
+    def __init__(self):
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def _lock(self, name: str) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def is_held(self, name: str) -> bool:
+        return self._lock(name).locked()
+
+    @contextmanager
+    def hold(self, name: str, timeout: float = 600):
+        lock = self._lock(name)
+        if not lock.acquire(timeout=timeout):
+            raise LockTimeout(f"Timed out waiting for lock {name}")
+        try:
+            yield
+        finally:
+            lock.release()
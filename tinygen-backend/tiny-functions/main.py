@@ -1,9 +1,10 @@
-from modal import App, Image, asgi_app, Sandbox, Secret
+from modal import App, Image, asgi_app, Sandbox, Secret, Queue, Period, Volume, Dict as ModalDict
 import subprocess
 import json
 import os
 import time
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
 from urllib.parse import urlparse
 
 # Base image for sandboxes
@@ -31,19 +32,64 @@ sandbox_base_image = (
         "modal",
         "pyjwt[crypto]", #github app jwt generation
         "requests",
+        "httpx[http2]",
+        "orjson",  # runner event protocol serializer
         "claude-code-sdk"
     )
+    # Agent runner, run inside sandboxes as `python -m tinygen_runner`
+    .add_local_dir("tiny-functions/tinygen_runner", "/opt/tinygen/tinygen_runner", copy=True)
+    .env({"PYTHONPATH": "/opt/tinygen"})
 )
 
 # Image with local files added
 sandbox_image = (
     sandbox_base_image
+    .add_local_file("tiny-functions/github_client.py", "/root/github_client.py")
     .add_local_file("tiny-functions/github_auth.py", "/root/github_auth.py")
     .add_local_file("tiny-functions/prompts.py", "/root/prompts.py")
+    .add_local_file("tiny-functions/message_writer.py", "/root/message_writer.py")
+    .add_local_file("tiny-functions/config.py", "/root/config.py")
+    .add_local_file("tiny-functions/metrics.py", "/root/metrics.py")
+    .add_local_file("tiny-functions/sandbox_pool.py", "/root/sandbox_pool.py")
+    .add_local_file("tiny-functions/commands.py", "/root/commands.py")
+    .add_local_file("tiny-functions/locks.py", "/root/locks.py")
+    .add_local_file("tiny-functions/git_cache.py", "/root/git_cache.py")
+    .add_local_file("tiny-functions/clone_strategies.py", "/root/clone_strategies.py")
+    .add_local_file("tiny-functions/installation_index.py", "/root/installation_index.py")
+    .add_local_file("tiny-functions/run_status.py", "/root/run_status.py")
+    .add_local_file("tiny-functions/event_publisher.py", "/root/event_publisher.py")
+    .add_local_file("tiny-functions/agent_daemon.py", "/root/agent_daemon.py")
+    .add_local_file("tiny-functions/stream_pipeline.py", "/root/stream_pipeline.py")
+    .add_local_file("tiny-functions/diff_artifacts.py", "/root/diff_artifacts.py")
+    .add_local_file("tiny-functions/repo_snapshots.py", "/root/repo_snapshots.py")
+    .add_local_file("tiny-functions/hot_sandboxes.py", "/root/hot_sandboxes.py")
+    .add_local_file("tiny-functions/repo_context.py", "/root/repo_context.py")
+    .add_local_file("tiny-functions/backends.py", "/root/backends.py")
 )
 
 app = App("tinygen-functions")
 
+# Bare mirrors of previously cloned repositories. Mounted on the functions
+# only, never into a sandbox (must match config.MIRROR_CACHE_ROOT)
+mirror_volume = Volume.from_name("tinygen-git-mirrors", create_if_missing=True)
+MIRROR_CACHE_ROOT = "/git-cache"
+
+# Compressed raw stdout/stderr of agent daemons, one directory per run
+run_log_volume = Volume.from_name("tinygen-run-logs", create_if_missing=True)
+RUN_LOG_ROOT = "/run-logs"
+
+# Per-file diff patches of agent runs, also mounted by the API (config.DIFF_ARTIFACT_ROOT)
+diff_volume = Volume.from_name("tinygen-diff-artifacts", create_if_missing=True)
+DIFF_ARTIFACT_ROOT = "/diff-artifacts"
+
+# Bundle snapshots of agent branches (TINYGEN_SNAPSHOT_MODE=bundle)
+snapshot_volume = Volume.from_name("tinygen-snapshots", create_if_missing=True)
+SNAPSHOT_ROOT = "/snapshots"
+
+# Per-commit repository context indexes (tree, languages, symbols, BM25)
+repo_index_volume = Volume.from_name("tinygen-repo-index", create_if_missing=True)
+REPO_INDEX_ROOT = "/repo-index"
+
 def parse_github_url(repo_url: str) -> tuple[str, str]:
     """Parse GitHub URL to get owner and repo name"""
     # Handle different URL formats
@@ -64,397 +110,789 @@ def parse_github_url(repo_url: str) -> tuple[str, str]:
         raise ValueError(f"Invalid GitHub URL format: {repo_url}")
 
 
+def prepare_sandbox(sandbox: Sandbox):
+    """Configure git and verify the agent toolchain on a freshly booted sandbox"""
+    from github_auth import setup_git_config
+    
+    setup_git_config(sandbox)
+    
+    # Test if claude CLI works at all
+    print("Testing claude CLI...")
+    test_claude = sandbox.exec("claude", "--version")
+    test_claude.wait()
+    if test_claude.returncode == 0:
+        print(f"Claude CLI version: {test_claude.stdout.read().strip()}")
+    else:
+        print(f"Claude CLI test failed: {test_claude.stderr.read()}")
+        
+    # Check environment
+    print("Checking environment variables...")
+    check_env = sandbox.exec("bash", "-c", "env | grep -E 'ANTHROPIC|PATH' | head -10")
+    check_env.wait()
+    for line in check_env.stdout:
+        print(f"ENV: {line.strip()}")
+        
+    # Check Python and packages
+    print("Checking Python environment...")
+    check_python = sandbox.exec("python", "-c", "import sys; print(f'Python: {sys.version}'); import claude_code_sdk; print(f'SDK: {claude_code_sdk.__file__}'); import tinygen_runner; print(f'Runner: {tinygen_runner.__version__}')")
+    check_python.wait()
+    for line in check_python.stdout:
+        print(f"PYTHON: {line.strip()}")
+    if check_python.returncode != 0:
+        raise Exception(f"Python check failed: {check_python.stderr.read()}")
+
+
+def get_sandbox_pool():
+    """Warm sandbox pool shared by every container of this app"""
+    from sandbox_pool import SandboxPool, ModalSandboxBackend
+    from locks import DictLocks
+    from metrics import get_metrics
+    from config import (
+        LOCKS_DICT,
+        SANDBOX_TIMEOUT,
+        SANDBOX_POOL_SIZE,
+        SANDBOX_POOL_IDLE_TTL,
+        SANDBOX_POOL_QUEUE,
+    )
+    
+    # No volumes: sandboxes run the agent's arbitrary commands, and the
+    # shared volumes hold other users' repositories
+    backend = ModalSandboxBackend(
+        image=sandbox_base_image,
+        secrets=[Secret.from_name("all-tinygen")],
+        # A pooled sandbox may sit idle for the whole TTL before its run starts
+        timeout=SANDBOX_TIMEOUT + SANDBOX_POOL_IDLE_TTL,
+    )
+    return SandboxPool(
+        backend,
+        prepare=prepare_sandbox,
+        size=SANDBOX_POOL_SIZE,
+        idle_ttl=SANDBOX_POOL_IDLE_TTL,
+        idle_queue=Queue.from_name(SANDBOX_POOL_QUEUE, create_if_missing=True),
+        metrics=get_metrics(),
+        request_refill=lambda: maintain_sandbox_pool.spawn(),
+        locks=DictLocks(ModalDict.from_name(LOCKS_DICT, create_if_missing=True)),
+    )
+
+
+def clone_repository(
+    sandbox: Sandbox,
+    clone_url: str,
+    owner: str,
+    repo_name: str,
+    strategy: str = "full",
+    depth: int = 1,
+    prompt: str = "",
+    dest: str = "/tmp/repo",
+    access_token: Optional[str] = None,
+    backends=None
+) -> str:
+    """
+    Clone a repository into the sandbox with the given strategy. Full clones
+    go through the mirror cache when it is enabled: the mirror is updated on
+    this function's container (with `access_token`) and only the repository
+    itself is copied into the sandbox. Returns the strategy used.
+    """
+    from commands import sandbox_runner, sandbox_pusher
+    from clone_strategies import clone_with_strategy
+    from git_cache import MirrorCache
+    from config import MIRROR_CACHE_ENABLED, MIRROR_CACHE_BUDGET_GB
+    
+    backends = backends or production_backends()
+    run = sandbox_runner(sandbox)
+    cache = None
+    if strategy == "full" and MIRROR_CACHE_ENABLED:
+        cache = MirrorCache(
+            backends.host_run,
+            locks=backends.locks,
+            root=backends.mirrors.root,
+            budget_kb=int(MIRROR_CACHE_BUDGET_GB * 1024 * 1024),
+            commit=backends.mirrors.commit,
+            reload=backends.mirrors.reload,
+            clone_run=run,
+            push=sandbox_pusher(sandbox),
+            token=access_token,
+        )
+    
+    return clone_with_strategy(
+        run,
+        clone_url,
+        dest,
+        strategy=strategy,
+        depth=depth,
+        prompt=prompt,
+        mirror_cache=cache,
+        owner=owner,
+        repo=repo_name,
+    )
+
+
+# Reviewer text is prefixed so it reads as a review in the chat
+REFLECTION_PREFIX = "🔍 REVIEW: "
+
+
+def store_agent_event(messages, event, metadata: Optional[Dict] = None, usage: Optional[Dict] = None):
+    """Route one runner protocol event to the transcript, the live stream or the usage totals"""
+    if event.type == "text":
+        prefix = REFLECTION_PREFIX if event.phase == "reflection" else ""
+        messages.write(prefix + event.text, metadata=metadata)
+    elif event.type == "tool_use":
+        tool_data = event.display or {"tool_name": event.name, "tool_id": event.tool_id, "input": event.input}
+        # Queue as a structured tool use message
+        messages.write(
+            f"Using tool: {tool_data.get('description', 'Unknown')}",
+            is_tool_use=True,
+            metadata={'tool_data': tool_data, **(metadata or {})}
+        )
+    elif event.type == "tool_result":
+        # Tool output is live-only; the transcript keeps the tool call
+        if messages.publisher is not None:
+            messages.publisher.publish("tool_result", {
+                "tool_id": event.tool_id,
+                "is_error": event.is_error,
+                "content": event.content
+            })
+    elif event.type == "usage":
+        if usage is not None:
+            for field in ("input_tokens", "output_tokens", "cache_read_tokens", "cost_usd", "num_turns"):
+                value = getattr(event, field)
+                if value is not None:
+                    usage[field] = usage.get(field, 0) + value
+    elif event.type == "error":
+        print(f"Agent error: {event.message}")
+
+
+def run_agent_phase(daemon, command: str, runner_args: Dict, messages, metadata: Optional[Dict] = None, usage: Optional[Dict] = None):
+    """
+    Run one phase (run, reflect or followup) on the sandbox's agent daemon
+    and store its events. Returns the finished phase event (ok, session_id, error).
+    """
+    event_count = 0
+    
+    def on_event(event):
+        nonlocal event_count
+        event_count += 1
+        store_agent_event(messages, event, metadata, usage)
+    
+    started = time.time()
+    result = daemon.call(command, runner_args, on_event=on_event)
+    print(f"Agent {command} finished in {time.time() - started:.1f}s with {event_count} events (ok={result.ok})")
+    return result
+
+
+def get_installation_access_token_for(owner: str, repo_name: str, user_github_username: str) -> str:
+    """Installation access token for the user's or the owner's installation"""
+    from github_auth import token_cache, configure_token_store, get_installation_id
+    from installation_index import get_installation_index
+    from locks import DictLocks
+    from config import GITHUB_TOKEN_STORE, LOCKS_DICT
+    
+    # Get GitHub App credentials
+    client_id = os.environ["GITHUB_CLIENT_ID"]
+    private_key = os.environ["GITHUB_PRIVATE_KEY"]
+    
+    # Share GitHub tokens with other warm containers when configured
+    if GITHUB_TOKEN_STORE and token_cache.store is None:
+        configure_token_store(
+            ModalDict.from_name(GITHUB_TOKEN_STORE, create_if_missing=True),
+            DictLocks(ModalDict.from_name(LOCKS_DICT, create_if_missing=True), lease_seconds=60)
+        )
+    
+    # App JWT, reused until shortly before it expires
+    jwt_token = token_cache.get_jwt(client_id, private_key)
+    
+    # Get installation ID from the shared owner -> installation index
+    installation_index = get_installation_index()
+    installation_id, error = get_installation_id(user_github_username, repo_name, jwt_token, installation_index)
+    if error:
+        installation_id, error = get_installation_id(owner, repo_name, jwt_token, installation_index)
+        if error:
+            raise Exception(error)
+    
+    # Get access token (cached per installation until near expires_at)
+    return token_cache.get_installation_token(installation_id, client_id, private_key)
+
+
+def resolve_clone_target(sandbox: Sandbox, owner: str, repo_name: str, user_github_username: str, has_access: bool) -> tuple[str, str]:
+    """Fork the repo if the user can't push to it; returns (clone_url, final_repo)"""
+    if has_access:
+        return f"https://github.com/{owner}/{repo_name}.git", f"{owner}/{repo_name}"
+    
+    # Check/create fork
+    check_fork = sandbox.exec(
+        "gh", "repo", "view", f"{user_github_username}/{repo_name}",
+        "--json", "name"
+    )
+    check_fork.wait()
+    
+    if check_fork.returncode != 0:
+        print(f"Creating fork of {owner}/{repo_name}...")
+        fork_process = sandbox.exec(
+            "gh", "repo", "fork", f"{owner}/{repo_name}", 
+            "--clone=false"
+        )
+        fork_process.wait()
+        if fork_process.returncode != 0:
+            raise Exception(f"Failed to fork repo: {fork_process.stderr.read()}")
+        time.sleep(3)
+    
+    return f"https://github.com/{user_github_username}/{repo_name}.git", f"{user_github_username}/{repo_name}"
+
+
+def lease_sandbox_for(backends, owner: str, repo_name: str, user_github_username: str, access_token: str) -> tuple[Sandbox, bool]:
+    """
+    Lease a booted, git-configured and verified sandbox from the warm pool
+    while the fork-or-direct decision is made from the host.
+    Returns (sandbox, has_access). If the access check fails, the sandbox
+    is released before the error is raised.
+    """
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        lease = executor.submit(backends.sandboxes.lease)
+        try:
+            has_access = backends.github.has_push_access(owner, repo_name, user_github_username, access_token)
+        except Exception:
+            try:
+                sandbox, _ = lease.result()
+                # No hot state: the sandbox is terminated, not parked
+                backends.sandboxes.release(sandbox, None)
+            except Exception as e:
+                print(f"Failed to release sandbox after access check error: {str(e)}")
+            raise
+        sandbox, from_pool = lease.result()
+    print(f"Using sandbox {sandbox.object_id} ({'warm pool' if from_pool else 'cold start'})")
+    return sandbox, has_access
+
+
+def get_snapshot_store():
+    from repo_snapshots import BundleSnapshotStore
+    return BundleSnapshotStore(SNAPSHOT_ROOT, commit=snapshot_volume.commit, reload=snapshot_volume.reload)
+
+
+def snapshot_repo(
+    backends,
+    sandbox: Sandbox,
+    chat_id: str,
+    clone_url: str,
+    final_repo: str,
+    base_commit: str,
+    branch_name: Optional[str] = None,
+    mode: Optional[str] = None
+) -> str:
+    """
+    Save the sandbox's repository for follow-ups in the configured snapshot
+    mode; returns the id to store in chats.snapshot_id
+    """
+    from commands import sandbox_runner, sandbox_fetcher
+    from repo_snapshots import BundleSnapshotStore, create_bundle_snapshot, validate_mode
+    from config import SNAPSHOT_MODE
+    
+    mode = validate_mode(mode or SNAPSHOT_MODE)
+    started = time.time()
+    size = None
+    if mode == "bundle":
+        manifest = create_bundle_snapshot(
+            sandbox_runner(sandbox),
+            sandbox_fetcher(sandbox),
+            BundleSnapshotStore(backends.snapshots.root, commit=backends.snapshots.commit, reload=backends.snapshots.reload),
+            chat_id,
+            clone_url,
+            final_repo,
+            base_commit,
+            branch_name
+        )
+        snapshot_id, size = manifest["id"], manifest["bytes"]
+    else:
+        snapshot_id = sandbox.snapshot_filesystem().object_id
+    elapsed = time.time() - started
+    
+    metrics = backends.metrics
+    metrics.incr("snapshots", mode=mode)
+    metrics.incr("snapshot_seconds", elapsed, mode=mode)
+    if size is not None:
+        metrics.incr("snapshot_bytes", size, mode=mode)
+    print(f"Saved {mode} snapshot {snapshot_id} in {elapsed:.1f}s" + (f" ({size} bytes)" if size is not None else ""))
+    return snapshot_id
+
+
+def repo_context_for(backends, sandbox: Sandbox, final_repo: str, prompt: str, partial: bool = False) -> str:
+    """
+    Repository overview for the agent's system prompt: the cached index of
+    /tmp/repo's commit (built in the sandbox if needed) rendered for the
+    prompt. Returns "" when indexing is disabled or fails. An index built
+    from a `partial` (sparse) checkout is not cached.
+    """
+    from commands import sandbox_runner, sandbox_fetcher, sandbox_pusher
+    from repo_context import RepoIndexCache, build_repo_context
+    from config import REPO_INDEX_ENABLED, REPO_CONTEXT_BUDGET
+    
+    if not REPO_INDEX_ENABLED:
+        return ""
+    try:
+        context, stats = build_repo_context(
+            sandbox_runner(sandbox),
+            sandbox_fetcher(sandbox),
+            sandbox_pusher(sandbox),
+            RepoIndexCache(backends.repo_index.root, commit=backends.repo_index.commit, reload=backends.repo_index.reload),
+            final_repo,
+            prompt,
+            budget=REPO_CONTEXT_BUDGET,
+            partial=partial
+        )
+    except Exception as e:
+        print(f"Skipping repository context: {str(e)}")
+        return ""
+    
+    metrics = backends.metrics
+    metrics.incr("repo_index", source=stats["source"])
+    metrics.incr("repo_index_seconds", stats["seconds"], source=stats["source"])
+    print(
+        f"Repository context for {final_repo}@{stats['sha'][:12]}: {stats['source']} index, "
+        f"{stats['files']} files ({stats['reindexed']} reindexed), {stats['chars']} chars in {stats['seconds']:.1f}s"
+    )
+    return context
+
+
+def restore_snapshot(snapshot_id: str, final_repo: str, access_token: str) -> Sandbox:
+    """
+    Start a sandbox with /tmp/repo as of a snapshot, authenticated for
+    final_repo. Filesystem snapshots boot from their image; bundle
+    snapshots take a warm pooled sandbox, clone through the mirror cache
+    (mounted on the calling function) and apply the bundle.
+    """
+    from commands import sandbox_runner, sandbox_pusher
+    from github_auth import authenticate_gh_cli
+    from repo_snapshots import is_bundle_snapshot, restore_bundle_snapshot
+    from metrics import get_metrics
+    from config import SANDBOX_TIMEOUT
+    
+    mode = "bundle" if is_bundle_snapshot(snapshot_id) else "filesystem"
+    started = time.time()
+    if mode == "bundle":
+        sandbox, _ = get_sandbox_pool().lease()
+    else:
+        sandbox = Sandbox.create(
+            image=Image.from_id(snapshot_id),
+            secrets=[Secret.from_name("all-tinygen")],
+            timeout=SANDBOX_TIMEOUT,
+        )
+    try:
+        authenticate_gh_cli(sandbox, access_token)
+        if mode == "bundle":
+            owner, repo_name = final_repo.split("/")
+            restore_bundle_snapshot(
+                sandbox_runner(sandbox),
+                sandbox_pusher(sandbox),
+                get_snapshot_store(),
+                snapshot_id,
+                clone=lambda clone_url, dest: clone_repository(sandbox, clone_url, owner, repo_name, dest=dest, access_token=access_token)
+            )
+    except Exception:
+        sandbox.terminate()
+        raise
+    elapsed = time.time() - started
+    
+    get_metrics().incr("snapshot_restore_seconds", elapsed, mode=mode)
+    get_metrics().incr("snapshot_restores", mode=mode)
+    print(f"Restored {mode} snapshot {snapshot_id} in {elapsed:.1f}s")
+    return sandbox
+
+
+def get_hot_sandboxes():
+    """Registry of sandboxes kept running for their chat's next follow-up"""
+    from hot_sandboxes import HotSandboxRegistry
+    from metrics import get_metrics
+    from config import HOT_SANDBOX_DICT, FOLLOWUP_IDLE_WINDOW
+    
+    return HotSandboxRegistry(
+        ModalDict.from_name(HOT_SANDBOX_DICT, create_if_missing=True),
+        backend=Sandbox,
+        idle_window=FOLLOWUP_IDLE_WINDOW,
+        metrics=get_metrics(),
+    )
+
+
+def release_sandbox(sandbox: Sandbox, chat_id: str, hot_state: Optional[Dict] = None):
+    """
+    After a run: park the sandbox for the chat's next follow-up if the run
+    succeeded (hot_state holds snapshot_id, session_id and the sandbox's
+    own deadline), otherwise terminate it. Terminating also stops the
+    agent daemon.
+    """
+    from config import FOLLOWUP_MIN_SANDBOX_TIME
+    
+    if hot_state is None:
+        sandbox.terminate()
+        return
+    try:
+        deadline = hot_state["sandbox_deadline"] - FOLLOWUP_MIN_SANDBOX_TIME
+        if get_hot_sandboxes().park(chat_id, sandbox, deadline=deadline, **hot_state):
+            print(f"Keeping sandbox {sandbox.object_id} for follow-ups")
+    except Exception as e:
+        print(f"Failed to keep sandbox for follow-ups: {str(e)}")
+        sandbox.terminate()
+
+
+class GitHubAppBackend:
+    """GitHub REST calls a run makes from the host, as the TinyGen GitHub App"""
+    
+    def installation_token(self, owner: str, repo_name: str, user_github_username: str) -> str:
+        return get_installation_access_token_for(owner, repo_name, user_github_username)
+    
+    def has_push_access(self, owner: str, repo_name: str, user_github_username: str, access_token: str) -> bool:
+        from github_auth import check_repo_access
+        return check_repo_access(owner, repo_name, user_github_username, access_token)
+
+
+class PooledSandboxes:
+    """Sandboxes leased from the warm pool, kept for follow-ups or terminated after the run"""
+    
+    def lease(self) -> tuple[Sandbox, bool]:
+        return get_sandbox_pool().lease()
+    
+    def release(self, sandbox: Sandbox, chat_id: str, hot_state: Optional[Dict] = None):
+        release_sandbox(sandbox, chat_id, hot_state)
+
+
+def production_backends():
+    """Modal sandboxes and volumes, the Supabase service client and the GitHub App"""
+    from backends import RunBackends, Storage
+    from commands import local_runner
+    from locks import DictLocks
+    from metrics import get_metrics
+    from run_status import get_service_client
+    from config import LOCKS_DICT
+    
+    return RunBackends(
+        database=get_service_client,
+        github=GitHubAppBackend(),
+        sandboxes=PooledSandboxes(),
+        locks=DictLocks(ModalDict.from_name(LOCKS_DICT, create_if_missing=True)),
+        run_logs=Storage(RUN_LOG_ROOT, run_log_volume.commit),
+        diffs=Storage(DIFF_ARTIFACT_ROOT, diff_volume.commit),
+        snapshots=Storage(SNAPSHOT_ROOT, snapshot_volume.commit, snapshot_volume.reload),
+        repo_index=Storage(REPO_INDEX_ROOT, repo_index_volume.commit, repo_index_volume.reload),
+        mirrors=Storage(MIRROR_CACHE_ROOT, mirror_volume.commit, mirror_volume.reload),
+        host_run=local_runner,
+        metrics=get_metrics(),
+    )
+
+
+@app.function(
+    image=sandbox_image,
+    secrets=[Secret.from_name("all-tinygen")],
+    schedule=Period(minutes=5),
+    timeout=900
+)
+def maintain_sandbox_pool() -> Dict:
+    """Reap expired idle and hot sandboxes, top the pool back up and compact the shared metrics"""
+    from locks import DictLocks, LockTimeout
+    from metrics import compact_counters
+    from config import LOCKS_DICT, METRICS_DICT, METRICS_SOURCE_IDLE
+
+    pool = get_sandbox_pool()
+    reaped = pool.reap()
+    created = pool.refill()
+    hot_reaped = get_hot_sandboxes().reap()
+    print(f"Sandbox pool: reaped {reaped}, created {created}; hot sandboxes reaped {hot_reaped}")
+
+    folded = 0
+    try:
+        with DictLocks(ModalDict.from_name(LOCKS_DICT, create_if_missing=True)).hold("metrics-compaction", timeout=0):
+            folded = compact_counters(ModalDict.from_name(METRICS_DICT, create_if_missing=True), idle_after=METRICS_SOURCE_IDLE)
+        print(f"Metrics: folded {folded} idle containers")
+    except LockTimeout:
+        print("Metrics compaction already running, skipping")
+    return {"reaped": reaped, "created": created, "hot_reaped": hot_reaped, "metrics_folded": folded}
+
+
+@app.function(
+    image=sandbox_image,
+    secrets=[Secret.from_name("all-tinygen")],
+    volumes={SNAPSHOT_ROOT: snapshot_volume, MIRROR_CACHE_ROOT: mirror_volume},
+    timeout=900
+)
+def fork_and_clone_repo(repo_url: str, user_github_username: str, chat_id: str, run_id: Optional[str] = None) -> Dict:
+    """
+    Fork a repo (if the user can't push to it), clone it into a sandbox and
+    snapshot the sandbox so later agent runs can start from it. Stores the
+    snapshot ID on the chat and reports progress on the run.
+    """
+    from run_status import RunReporter
+    from event_publisher import get_event_publisher
+    
+    backends = production_backends()
+    publisher = get_event_publisher(chat_id)
+    reporter = RunReporter(run_id, supabase=backends.database(), publisher=publisher, function="fork_and_clone_repo", metrics=backends.metrics)
+    reporter.started()
+    try:
+        return reporter.finish(_fork_and_clone_repo(repo_url, user_github_username, chat_id, reporter, publisher, backends))
+    except Exception as e:
+        # Anything that escapes (a malformed URL, a failed cleanup) still ends the run
+        reporter.failed(str(e))
+        raise
+    finally:
+        publisher.close()
+
+
+def _fork_and_clone_repo(repo_url: str, user_github_username: str, chat_id: str, reporter, publisher, backends) -> Dict:
+    from github_auth import authenticate_gh_cli
+    from commands import sandbox_runner
+    
+    try:
+        owner, repo_name = parse_github_url(repo_url)
+        
+        reporter.phase("authenticating", 0.1)
+        with reporter.span("token"):
+            access_token = backends.github.installation_token(owner, repo_name, user_github_username)
+        
+        reporter.phase("preparing_sandbox", 0.2)
+        with reporter.span("sandbox"):
+            sandbox, has_access = lease_sandbox_for(backends, owner, repo_name, user_github_username, access_token)
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {"status": "error", "error": str(e)}
+    
+    try:
+        with reporter.span("gh_auth"):
+            authenticate_gh_cli(sandbox, access_token)
+        
+        if has_access:
+            clone_url, final_repo = resolve_clone_target(sandbox, owner, repo_name, user_github_username, has_access)
+        else:
+            reporter.phase("forking", 0.4)
+            with reporter.span("fork"):
+                clone_url, final_repo = resolve_clone_target(sandbox, owner, repo_name, user_github_username, has_access)
+        
+        reporter.phase("cloning", 0.6)
+        print(f"Cloning {final_repo}...")
+        with reporter.span("clone"):
+            clone_repository(sandbox, clone_url, *final_repo.split("/"), access_token=access_token, backends=backends)
+        
+        reporter.phase("snapshotting", 0.9)
+        run = sandbox_runner(sandbox)
+        base_commit = run("git", "-C", "/tmp/repo", "rev-parse", "HEAD").stdout.strip()
+        run("git", "-C", "/tmp/repo", "config", "tinygen.base", base_commit)
+        with reporter.span("snapshot"):
+            snapshot_id = snapshot_repo(backends, sandbox, chat_id, clone_url, final_repo, base_commit)
+        
+        chat_update = {
+            'snapshot_id': snapshot_id,
+            'github_repo_url': f"https://github.com/{final_repo}"
+        }
+        backends.database().table('chats').update(chat_update).eq('id', chat_id).execute()
+        # Lets the API drop its cached chat context
+        publisher.publish("chat_updated", chat_update)
+        
+        return {
+            "status": "success",
+            "snapshot_id": snapshot_id,
+            "clone_url": clone_url,
+            "original_repo": f"{owner}/{repo_name}",
+            "forked": not has_access
+        }
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {"status": "error", "error": str(e)}
+    finally:
+        sandbox.terminate()
+
+
 @app.function(
     image=sandbox_image,
     secrets=[Secret.from_name("all-tinygen")],
+    volumes={
+        RUN_LOG_ROOT: run_log_volume,
+        DIFF_ARTIFACT_ROOT: diff_volume,
+        SNAPSHOT_ROOT: snapshot_volume,
+        REPO_INDEX_ROOT: repo_index_volume,
+        MIRROR_CACHE_ROOT: mirror_volume,
+    },
     timeout=1800  # 30 minutes timeout for running Claude
 )
-def run_claude_agent(repo_url: str, user_github_username: str, chat_id: str, prompt: str) -> Dict:
+def run_claude_agent(
+    repo_url: str,
+    user_github_username: str,
+    chat_id: str,
+    prompt: str,
+    clone_strategy: Optional[str] = None,
+    clone_depth: Optional[int] = None,
+    run_id: Optional[str] = None
+) -> Dict:
     """
     Fork a repo (if needed), clone it, run Claude Code SDK with the prompt,
-    stream output to Supabase Realtime, create a PR, and save the snapshot.
+    stream output to the chat's live stream, store the transcript, create a
+    PR, and save the snapshot. clone_strategy is one of full, shallow,
+    blobless or sparse.
     """
-    from github_auth import (
-        generate_jwt_token,
-        get_installation_id,
-        get_installation_access_token,
-        authenticate_gh_cli,
-        setup_git_config,
-        check_repo_access
-    )
-    from supabase import create_client
+    from run_status import RunReporter, get_cancellation_watcher
+    from event_publisher import get_event_publisher
+    
+    backends = production_backends()
+    publisher = get_event_publisher(chat_id)
+    reporter = RunReporter(run_id, supabase=backends.database(), publisher=publisher, function="run_claude_agent", metrics=backends.metrics)
+    reporter.started()
+    cancellation = get_cancellation_watcher(run_id)
+    try:
+        return reporter.finish(_run_claude_agent(
+            repo_url, user_github_username, chat_id, prompt, clone_strategy, clone_depth, reporter, publisher, cancellation, backends
+        ))
+    except Exception as e:
+        reporter.failed(str(e))
+        raise
+    finally:
+        cancellation.stop()
+        publisher.close()
+
+
+def _run_claude_agent(
+    repo_url: str,
+    user_github_username: str,
+    chat_id: str,
+    prompt: str,
+    clone_strategy: Optional[str],
+    clone_depth: Optional[int],
+    reporter,
+    publisher,
+    cancellation,
+    backends
+) -> Dict:
+    from github_auth import authenticate_gh_cli
     import json
     import tempfile
     from prompts import INITIAL_SYSTEM_PROMPT, REFLECTION_SYSTEM_PROMPT
+    from message_writer import MessageWriter
+    from agent_daemon import AgentDaemonClient
+    from commands import sandbox_runner, sandbox_streamer
+    from diff_artifacts import DiffArtifactStore, capture_staged_diff, diff_message_metadata
+    from run_status import RunCancelled
+    from clone_strategies import validate_strategy, SPARSE_PROMPT_NOTE
+    from config import CLONE_STRATEGY, CLONE_DEPTH, SANDBOX_TIMEOUT
+    
+    try:
+        clone_strategy = validate_strategy(clone_strategy or CLONE_STRATEGY)
+    except ValueError as e:
+        return {"status": "error", "error": str(e)}
+    clone_depth = clone_depth or CLONE_DEPTH
     
-    # Initialize Supabase client with service role key to bypass RLS
-    # This is needed because we're inserting messages on behalf of the user
-    supabase_url = os.environ["SUPABASE_URL"]
-    supabase_key = os.environ["SUPABASE_SERVICE_ROLE_KEY"]
-    supabase = create_client(supabase_url, supabase_key)
+    # Service role client (bypasses RLS): messages are inserted on behalf of the user
+    supabase = backends.database()
     
     # Test Supabase connection
     try:
         test_result = supabase.table('messages').select('id').limit(1).execute()
-        print(f"Supabase connection test successful. URL: {supabase_url}")
+        print("Supabase connection test successful")
     except Exception as e:
         print(f"ERROR: Failed to connect to Supabase: {str(e)}")
-        print(f"URL: {supabase_url}")
         return {"status": "error", "error": f"Supabase connection failed: {str(e)}"}
     
-    # Get GitHub App credentials
-    client_id = os.environ["GITHUB_CLIENT_ID"]
-    private_key = os.environ["GITHUB_PRIVATE_KEY"]
-    
     # Parse repo URL
     owner, repo_name = parse_github_url(repo_url)
     
-    # Generate JWT token
-    jwt_token = generate_jwt_token(client_id, private_key)
-    
-    # Get installation ID
-    installation_id, error = get_installation_id(user_github_username, repo_name, jwt_token)
-    if error:
-        installation_id, error = get_installation_id(owner, repo_name, jwt_token)
-        if error:
-            return {"status": "error", "error": error}
-    
-    # Get access token
-    access_token = get_installation_access_token(installation_id, jwt_token)
+    try:
+        reporter.phase("authenticating", 0.05)
+        with reporter.span("token"):
+            access_token = backends.github.installation_token(owner, repo_name, user_github_username)
+        
+        reporter.phase("preparing_sandbox", 0.1)
+        with reporter.span("sandbox"):
+            sandbox, has_access = lease_sandbox_for(backends, owner, repo_name, user_github_username, access_token)
+        sandbox_deadline = time.time() + SANDBOX_TIMEOUT
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {"status": "error", "error": str(e)}
+    reporter.attach_sandbox(sandbox.object_id)
     
-    # Create sandbox with secrets
-    sandbox = Sandbox.create(
-        image=sandbox_base_image,
-        secrets=[Secret.from_name("all-tinygen")],
-        timeout=1800
-    )
+    # Agent output goes to the live stream immediately and is bulk-inserted
+    # in the background as the durable transcript, so the stdout reader never
+    # blocks on a database round trip. With the stream up, the transcript
+    # can be written in larger, less frequent batches.
+    messages = MessageWriter(
+        supabase,
+        chat_id,
+        flush_interval=2.0 if publisher.enabled else 0.25,
+        publisher=publisher
+    ).start()
+    daemon = None
+    # Set on success: the sandbox is then kept for the chat's next follow-up
+    hot_state = None
     
     try:
-        # Authenticate gh CLI
-        authenticate_gh_cli(sandbox, access_token)
-        setup_git_config(sandbox)
-        
-        # Check if user has direct access
-        has_access = check_repo_access(sandbox, owner, repo_name, user_github_username)
+        cancellation.check()
+        # Authenticate gh CLI (tokens are per installation, so this can't be pooled)
+        with reporter.span("gh_auth"):
+            authenticate_gh_cli(sandbox, access_token)
         
         if has_access:
-            clone_url = f"https://github.com/{owner}/{repo_name}.git"
-            final_repo = f"{owner}/{repo_name}"
+            clone_url, final_repo = resolve_clone_target(sandbox, owner, repo_name, user_github_username, has_access)
         else:
-            # Check/create fork
-            check_fork = sandbox.exec(
-                "gh", "repo", "view", f"{user_github_username}/{repo_name}",
-                "--json", "name"
-            )
-            check_fork.wait()
-            
-            if check_fork.returncode != 0:
-                print(f"Creating fork of {owner}/{repo_name}...")
-                fork_process = sandbox.exec(
-                    "gh", "repo", "fork", f"{owner}/{repo_name}", 
-                    "--clone=false"
-                )
-                fork_process.wait()
-                if fork_process.returncode != 0:
-                    raise Exception(f"Failed to fork repo: {fork_process.stderr.read()}")
-                time.sleep(3)
-            
-            clone_url = f"https://github.com/{user_github_username}/{repo_name}.git"
-            final_repo = f"{user_github_username}/{repo_name}"
+            reporter.phase("forking", 0.15)
+            with reporter.span("fork"):
+                clone_url, final_repo = resolve_clone_target(sandbox, owner, repo_name, user_github_username, has_access)
         
         # Clone the repo
-        print(f"Cloning {final_repo}...")
-        clone_process = sandbox.exec("git", "clone", clone_url, "/tmp/repo")
-        clone_process.wait()
-        
-        if clone_process.returncode != 0:
-            raise Exception(f"Failed to clone repo: {clone_process.stderr.read()}")
+        reporter.phase("cloning", 0.2)
+        print(f"Cloning {final_repo} ({clone_strategy})...")
+        clone_owner, clone_repo = final_repo.split("/")
+        with reporter.span("clone"):
+            used_strategy = clone_repository(
+                sandbox,
+                clone_url,
+                clone_owner,
+                clone_repo,
+                strategy=clone_strategy,
+                depth=clone_depth,
+                prompt=prompt,
+                access_token=access_token,
+                backends=backends
+            )
+        system_prompt = INITIAL_SYSTEM_PROMPT
+        if used_strategy == "sparse":
+            system_prompt += SPARSE_PROMPT_NOTE
+        cancellation.check()
+        reporter.phase("indexing", 0.25)
+        with reporter.span("index"):
+            repo_context = repo_context_for(backends, sandbox, final_repo, prompt, partial=used_strategy == "sparse")
+        if repo_context:
+            system_prompt += "\n\n" + repo_context
         
-        # Create branch for changes
+        # Create branch for changes, remembering where it starts for bundle snapshots
+        base_commit = sandbox_runner(sandbox)("git", "-C", "/tmp/repo", "rev-parse", "HEAD").stdout.strip()
         branch_name = f"tinygen-{chat_id[:8]}-{int(time.time())}"
         sandbox.exec("git", "-C", "/tmp/repo", "checkout", "-b", branch_name).wait()
+        sandbox.exec("git", "-C", "/tmp/repo", "config", "tinygen.base", base_commit).wait()
         
         # Initialize pr_url
         pr_url = None
-        
-        # Create a simpler Claude runner script
-        claude_code = f'''
-import sys
-import os
-import asyncio
-import json
-from datetime import datetime, timezone
-
-# Change to the repo directory BEFORE importing Claude SDK
-os.chdir("/tmp/repo")
-
-from claude_code_sdk import query, ClaudeCodeOptions, Message
-from claude_code_sdk import AssistantMessage, UserMessage, TextBlock, ToolUseBlock
-
-CHAT_ID = "{chat_id}"
-
-def format_message_for_display(message):
-    """Convert claude-code-sdk messages to human-readable format"""
-    if isinstance(message, AssistantMessage):
-        outputs = []
-        
-        for block in message.content:
-            if isinstance(block, TextBlock):
-                if block.text.strip():
-                    outputs.append(block.text)
-            elif isinstance(block, ToolUseBlock):
-                tool_name = block.name
-                tool_input = block.input
-                
-                # Create structured tool use data
-                tool_data = {{
-                    "type": "tool_use",
-                    "tool_name": tool_name,
-                    "tool_id": block.id,
-                    "status": "calling",
-                    "input": {{}}
-                }}
-                
-                # Add formatted description and key parameters based on tool type
-                if tool_name == "Read":
-                    tool_data["description"] = "Read file"
-                    tool_data["icon"] = "📖"
-                    if "file_path" in tool_input:
-                        tool_data["summary"] = tool_input["file_path"]
-                        
-                elif tool_name == "Write":
-                    tool_data["description"] = "Wrote file"
-                    tool_data["icon"] = "✏️"
-                    if "file_path" in tool_input:
-                        tool_data["summary"] = tool_input["file_path"]
-                    if "content" in tool_input:
-                        content = tool_input["content"]
-                        lines = content.count('\\n') + 1
-                        chars = len(content)
-                        preview = content[:500] + "..." if len(content) > 500 else content
-                        tool_data["input"]["content_preview"] = preview
-                        tool_data["input"]["stats"] = str(lines) + " lines, " + str(chars) + " characters"
-                        
-                elif tool_name == "Edit":
-                    tool_data["description"] = "Edited file"
-                    tool_data["icon"] = "📝"
-                    if "file_path" in tool_input:
-                        tool_data["summary"] = tool_input["file_path"]
-                    if "old_string" in tool_input:
-                        tool_data["input"]["old_string"] = tool_input["old_string"][:50] + "..." if len(tool_input["old_string"]) > 50 else tool_input["old_string"]
-                    if "new_string" in tool_input:
-                        tool_data["input"]["new_string"] = tool_input["new_string"][:50] + "..." if len(tool_input["new_string"]) > 50 else tool_input["new_string"]
-                        
-                elif tool_name == "Bash":
-                    tool_data["description"] = "Ran command"
-                    tool_data["icon"] = "💻"
-                    if "command" in tool_input:
-                        tool_data["summary"] = tool_input["command"]
-                        
-                elif tool_name == "Grep":
-                    tool_data["description"] = "Searched files"
-                    tool_data["icon"] = "🔍"
-                    if "pattern" in tool_input:
-                        tool_data["summary"] = "Pattern: " + tool_input["pattern"]
-                    if "path" in tool_input:
-                        tool_data["input"]["path"] = tool_input["path"]
-                        
-                elif tool_name == "Glob":
-                    tool_data["description"] = "Found files"
-                    tool_data["icon"] = "🔍"
-                    if "pattern" in tool_input:
-                        tool_data["summary"] = tool_input["pattern"]
-                        
-                elif tool_name == "LS":
-                    tool_data["description"] = "Listed directory"
-                    tool_data["icon"] = "📁"
-                    if "path" in tool_input:
-                        tool_data["summary"] = tool_input["path"]
-                        
-                else:
-                    tool_data["description"] = "Using " + tool_name
-                    tool_data["icon"] = "🔧"
-                    tool_data["summary"] = tool_name
-                    tool_data["input"] = tool_input
-                
-                # Send as JSON string with special marker
-                outputs.append("TOOL_USE_JSON:" + json.dumps(tool_data, ensure_ascii=False))
-        
-        return outputs
-    
-    return []
-
-async def main():
-    try:
-        options = ClaudeCodeOptions(
-            model="claude-sonnet-4-20250514",
-            cwd=".",  # Use current directory since we already chdir'd
-            permission_mode="acceptEdits",
-            system_prompt={json.dumps(INITIAL_SYSTEM_PROMPT)},
-            max_turns=50,
-            allowed_tools=["Read", "Write", "Edit", "Bash", "Grep", "Glob", "LS"]
-        )
-        
-        # Query with the provided prompt
-        async for message in query(prompt="{prompt}", options=options):
-            # Format and print ONLY the actual messages
-            display_messages = format_message_for_display(message)
-            
-            for msg in display_messages:
-                print("CHAT_MESSAGE:" + CHAT_ID + ":" + msg, flush=True)
-                sys.stdout.flush()  # Force flush to ensure parent process sees it
-        
-    except Exception as e:
-        # Don't print errors - they'll just pollute the output
-        pass
-
-asyncio.run(main())
-'''
-        
-        # Write the Claude script using heredoc
-        print("Writing Claude script...")
-        write_script = sandbox.exec(
-            "sh", "-c", f"cat > /tmp/claude_runner.py << 'EOF'\n{claude_code}\nEOF"
-        )
-        write_script.wait()
-        print("Script written successfully")
-        
-        # Test if claude CLI works at all
-        print("Testing claude CLI...")
-        test_claude = sandbox.exec("claude", "--version")
-        test_claude.wait()
-        if test_claude.returncode == 0:
-            print(f"Claude CLI version: {test_claude.stdout.read().strip()}")
-        else:
-            print(f"Claude CLI test failed: {test_claude.stderr.read()}")
-            
-        # Check environment
-        print("Checking environment variables...")
-        check_env = sandbox.exec("bash", "-c", "env | grep -E 'ANTHROPIC|PATH' | head -10")
-        check_env.wait()
-        for line in check_env.stdout:
-            print(f"ENV: {line.strip()}")
-            
-        # Check Python and packages
-        print("Checking Python environment...")
-        check_python = sandbox.exec("python", "-c", "import sys; print(f'Python: {sys.version}'); import claude_code_sdk; print(f'SDK: {claude_code_sdk.__file__}')")
-        check_python.wait()
-        for line in check_python.stdout:
-            print(f"PYTHON: {line.strip()}")
-        if check_python.returncode != 0:
-            print(f"Python check failed: {check_python.stderr.read()}")
+        run = sandbox_runner(sandbox)
+        stream = sandbox_streamer(sandbox)
+        diff_store = DiffArtifactStore(backends.diffs.root, commit=backends.diffs.commit)
         
         # Run Claude in the repo directory
+        reporter.phase("running_agent", 0.3)
         print("Running Claude Code SDK...")
-        print(f"Working directory: /tmp/repo")
         print(f"Prompt: {prompt}")
         
-        # Run with unbuffered output - exactly like the working tangent-backend
-        claude_process = sandbox.exec(
-            "python", "-u", "/tmp/claude_runner.py"
-        )
+        # One agent daemon serves every phase of this run, keeping the SDK
+        # and the Claude CLI warm between the main run and the review
+        with reporter.span("agent"):
+            daemon = AgentDaemonClient(
+                sandbox,
+                log_dir=os.path.join(backends.run_logs.root, chat_id, reporter.run_id or branch_name)
+            ).start()
+            # A cancel stops the agent at its next turn boundary
+            cancellation.on_cancel(daemon.interrupt)
+            usage = {}
+            agent_result = run_agent_phase(daemon, "run", {
+                "chat_id": chat_id,
+                "prompt": prompt,
+                "system_prompt": system_prompt
+            }, messages, usage=usage)
+        session_id = agent_result.session_id
+        cancellation.check()
         
-        # Stream output - we'll send this via the database broadcast method
-        # The frontend will subscribe to changes on a messages table
-        output_lines = []
-        stderr_lines = []
-        
-        # Read stdout
-        print(f"Starting to read Claude output for chat {chat_id}...")
-        message_count = 0
-        for line in claude_process.stdout:
-            line = line.strip()
-            output_lines.append(line)
-            
-            # ONLY process lines that start with CHAT_MESSAGE: - everything else is debug crap
-            if line.startswith("CHAT_MESSAGE:") and ":" in line[13:]:
-                # Parse the message format CHAT_MESSAGE:chat_id:content
-                parts = line.split(":", 2)
-                if len(parts) >= 3:
-                    message_content = parts[2]
-                    message_count += 1
-                    print(f"Processing message #{message_count} for chat {chat_id}")
-                    
-                    # Check if this is a tool use message
-                    is_tool_use = message_content.startswith('TOOL_USE_JSON:')
-                    
-                    if is_tool_use:
-                        # Parse the tool use data
-                        try:
-                            tool_json = message_content[len('TOOL_USE_JSON:'):]
-                            tool_data = json.loads(tool_json)
-                            
-                            # Insert as a structured tool use message
-                            try:
-                                result = supabase.table('messages').insert({
-                                    'chat_id': chat_id,
-                                    'content': f"Using tool: {tool_data.get('description', 'Unknown')}",
-                                    'role': 'assistant',
-                                    'is_tool_use': True,
-                                    'metadata': {
-                                        'tool_data': tool_data
-                                    }
-                                }).execute()
-                                if result.data:
-                                    print(f"Successfully inserted tool use message: {result.data[0]['id']}")
-                                else:
-                                    print(f"Warning: Insert returned no data")
-                            except Exception as e:
-                                print(f"ERROR inserting tool use message: {str(e)}")
-                                print(f"Chat ID: {chat_id}")
-                                print(f"Tool data: {tool_data}")
-                        except json.JSONDecodeError:
-                            print(f"Failed to parse tool use JSON: {message_content}")
-                            # Fall back to regular message
-                            result = supabase.table('messages').insert({
-                                'chat_id': chat_id,
-                                'content': message_content,
-                                'role': 'assistant',
-                                'is_tool_use': False,
-                                'metadata': {}
-                            }).execute()
-                            print(f"Inserted fallback message: {result.data}")
-                    else:
-                        # Regular text message
-                        try:
-                            result = supabase.table('messages').insert({
-                                'chat_id': chat_id,
-                                'content': message_content,
-                                'role': 'assistant',
-                                'is_tool_use': False,
-                                'metadata': {}
-                            }).execute()
-                            if result.data:
-                                print(f"Successfully inserted regular message: {result.data[0]['id']}")
-                                print(f"Message preview: {message_content[:100]}...")
-                            else:
-                                print(f"Warning: Insert returned no data for regular message")
-                        except Exception as e:
-                            print(f"ERROR inserting regular message: {str(e)}")
-                            print(f"Chat ID: {chat_id}")
-                            print(f"Message content: {message_content[:200]}...")
-            # Ignore all non-CHAT_MESSAGE lines
-        
-        # Wait for process to complete
-        exit_code = claude_process.wait()
-        print(f"Claude process exited with code: {exit_code}")
-        print(f"Total messages processed: {message_count}")
-        
-        # Read any stderr
-        for line in claude_process.stderr:
-            stderr_lines.append(line.strip())
-            print(f"[Claude Stderr] {line.strip()}")
-        
-        # If we got no output, check stderr
-        if not output_lines:
-            print("No output from Claude process. Checking for errors...")
-            # The stderr is already being redirected to stdout with 2>&1
-        
-        if claude_process.returncode != 0:
-            stderr_output = claude_process.stderr.read()
-            print(f"Claude process failed with exit code {claude_process.returncode}")
-            print(f"Claude process stderr: {stderr_output}")
-            raise Exception(f"Claude process failed: {stderr_output}")
+        if not agent_result.ok:
+            print(f"Claude agent failed: {agent_result.error}")
+            raise Exception(f"Claude process failed: {agent_result.error}")
         
         # Create .gitignore for agent metadata (create directory first)
         print("Creating .agent-metadata directory...")
@@ -470,13 +908,7 @@ asyncio.run(main())
         if not status_output:
             print("No changes detected - Claude didn't modify any files")
             # Still create a message for the user
-            supabase.table('messages').insert({
-                'chat_id': chat_id,
-                'content': "I've analyzed your request but didn't need to make any changes to the repository.",
-                'role': 'assistant',
-                'is_tool_use': False,
-                'metadata': {}
-            }).execute()
+            messages.write("I've analyzed your request but didn't need to make any changes to the repository.")
             
             # Set pr_url to None when no changes
             pr_url = None
@@ -489,230 +921,67 @@ asyncio.run(main())
             add_process.wait()
             print(f"Git add exit code: {add_process.returncode}")
             
-            # Capture the diff after staging
+            # Store the staged diff as per-file patches; the chat message gets
+            # the diffstat and loads file patches on demand
             print("Capturing diff...")
-            diff_process = sandbox.exec("git", "-C", "/tmp/repo", "diff", "--staged")
-            diff_process.wait()
-            diff_output = diff_process.stdout.read()
-            
-            # Send a message with the diff
-            if diff_output:
-                # Truncate diff if it's too long
-                max_diff_length = 10000
-                if len(diff_output) > max_diff_length:
-                    diff_output = diff_output[:max_diff_length] + "\n\n... (diff truncated)"
-                
-                supabase.table('messages').insert({
-                    'chat_id': chat_id,
-                    'content': f"📝 **Changes to be committed:**\n\n```diff\n{diff_output}\n```",
-                    'role': 'assistant',
-                    'is_tool_use': False,
-                    'metadata': {
-                        'is_diff': True
-                    }
-                }).execute()
+            try:
+                diff_manifest = capture_staged_diff(run, stream, diff_store, chat_id)
+            except Exception as e:
+                print(f"Failed to store diff: {str(e)}")
+                diff_manifest = None
+            if diff_manifest:
+                messages.write(
+                    f"📝 **Changes to be committed:**\n\n```\n{diff_manifest['diffstat']}\n```",
+                    metadata={'is_diff': True, 'diff_artifact': diff_message_metadata(diff_manifest)}
+                )
             
             # Run reflection Claude to review changes before committing
+            reporter.phase("reviewing", 0.7)
             print("Running reflection review...")
-            supabase.table('messages').insert({
-                'chat_id': chat_id,
-                'content': "🔍 **Reviewing changes before creating PR...**\n\nRunning a final review to ensure code quality and completeness.",
-                'role': 'assistant',
-                'is_tool_use': False,
-                'metadata': {}
-            }).execute()
+            messages.write("🔍 **Reviewing changes before creating PR...**\n\nRunning a final review to ensure code quality and completeness.")
             
             # Create reflection Claude script
             reflection_prompt = f"Review the changes that were just made. The original request was: '{prompt}'. Check if the implementation is correct, complete, and follows best practices. Fix any issues you find."
             
-            reflection_code = f'''
-import sys
-import os
-import asyncio
-import json
-from datetime import datetime, timezone
-
-# Change to the repo directory BEFORE importing Claude SDK
-os.chdir("/tmp/repo")
-
-from claude_code_sdk import query, ClaudeCodeOptions, Message
-from claude_code_sdk import AssistantMessage, UserMessage, TextBlock, ToolUseBlock
-
-CHAT_ID = "{chat_id}"
-
-def format_message_for_display(message):
-    """Convert claude-code-sdk messages to human-readable format"""
-    if isinstance(message, AssistantMessage):
-        outputs = []
-        
-        for block in message.content:
-            if isinstance(block, TextBlock):
-                if block.text.strip():
-                    outputs.append(block.text)
-            elif isinstance(block, ToolUseBlock):
-                tool_name = block.name
-                tool_input = block.input
-                
-                # Create structured tool use data
-                tool_data = {{
-                    "type": "tool_use",
-                    "tool_name": tool_name,
-                    "tool_id": block.id,
-                    "status": "calling",
-                    "input": {{}}
-                }}
-                
-                # Add formatted description and key parameters based on tool type
-                if tool_name == "Read":
-                    tool_data["description"] = "Read file"
-                    tool_data["icon"] = "📖"
-                    if "file_path" in tool_input:
-                        tool_data["summary"] = tool_input["file_path"]
-                        
-                elif tool_name == "Write":
-                    tool_data["description"] = "Wrote file"
-                    tool_data["icon"] = "✏️"
-                    if "file_path" in tool_input:
-                        tool_data["summary"] = tool_input["file_path"]
-                        
-                elif tool_name == "Edit":
-                    tool_data["description"] = "Edited file"
-                    tool_data["icon"] = "📝"
-                    if "file_path" in tool_input:
-                        tool_data["summary"] = tool_input["file_path"]
-                        
-                elif tool_name == "Bash":
-                    tool_data["description"] = "Ran command"
-                    tool_data["icon"] = "💻"
-                    if "command" in tool_input:
-                        tool_data["summary"] = tool_input["command"]
-                        
-                else:
-                    tool_data["description"] = "Using " + tool_name
-                    tool_data["icon"] = "🔧"
-                    tool_data["summary"] = tool_name
-                
-                # Send as JSON string with special marker
-                outputs.append("TOOL_USE_JSON:" + json.dumps(tool_data, ensure_ascii=False))
-        
-        return outputs
-    
-    return []
-
-async def main():
-    try:
-        options = ClaudeCodeOptions(
-            model="claude-sonnet-4-20250514",
-            cwd=".",  # Use current directory since we already chdir'd
-            permission_mode="acceptEdits",
-            system_prompt={json.dumps(REFLECTION_SYSTEM_PROMPT)},
-            max_turns=20,
-            allowed_tools=["Read", "Write", "Edit", "Bash", "Grep", "Glob", "LS"]
-        )
-        
-        # Query with the reflection prompt
-        async for message in query(prompt="{reflection_prompt}", options=options):
-            # Format and print ONLY the actual messages
-            display_messages = format_message_for_display(message)
-            
-            for msg in display_messages:
-                print("CHAT_MESSAGE:" + CHAT_ID + ":🔍 REVIEW: " + msg, flush=True)
-                sys.stdout.flush()  # Force flush to ensure parent process sees it
-        
-    except Exception as e:
-        # Don't print errors - they'll just pollute the output
-        pass
-
-asyncio.run(main())
-'''
-            
-            # Write the reflection script
-            print("Writing reflection script...")
-            write_reflection = sandbox.exec(
-                "sh", "-c", f"cat > /tmp/reflection_runner.py << 'EOF'\\n{reflection_code}\\nEOF"
-            )
-            write_reflection.wait()
-            
-            # Run reflection Claude
+            # Run reflection Claude; a failed review doesn't fail the run
             print("Running reflection Claude...")
-            reflection_process = sandbox.exec(
-                "python", "-u", "/tmp/reflection_runner.py"
-            )
-            
-            # Stream reflection output
-            for line in reflection_process.stdout:
-                line = line.strip()
-                
-                if line.startswith("CHAT_MESSAGE:") and ":" in line[13:]:
-                    parts = line.split(":", 2)
-                    if len(parts) >= 3:
-                        message_content = parts[2]
-                        
-                        # Check if this is a tool use message
-                        is_tool_use = message_content.startswith('TOOL_USE_JSON:')
-                        
-                        if is_tool_use:
-                            try:
-                                tool_json = message_content[len('TOOL_USE_JSON:'):]
-                                tool_data = json.loads(tool_json)
-                                
-                                supabase.table('messages').insert({
-                                    'chat_id': chat_id,
-                                    'content': f"Using tool: {tool_data.get('description', 'Unknown')}",
-                                    'role': 'assistant',
-                                    'is_tool_use': True,
-                                    'metadata': {
-                                        'tool_data': tool_data,
-                                        'is_reflection': True
-                                    }
-                                }).execute()
-                            except json.JSONDecodeError:
-                                pass
-                        else:
-                            supabase.table('messages').insert({
-                                'chat_id': chat_id,
-                                'content': message_content,
-                                'role': 'assistant',
-                                'is_tool_use': False,
-                                'metadata': {
-                                    'is_reflection': True
-                                }
-                            }).execute()
-            
-            reflection_process.wait()
+            with reporter.span("reflection"):
+                reflection_result = run_agent_phase(daemon, "reflect", {
+                    "chat_id": chat_id,
+                    "prompt": reflection_prompt,
+                    "system_prompt": REFLECTION_SYSTEM_PROMPT
+                }, messages, metadata={'is_reflection': True}, usage=usage)
+            cancellation.check()
+            if not reflection_result.ok:
+                print(f"Reflection failed: {reflection_result.error}")
             print("Reflection review completed")
             
-            # Capture the final diff after reflection
+            # Stage the review's edits too; the final diff is only stored and
+            # sent if they changed the staged tree
             print("Capturing final diff after reflection...")
-            final_diff_process = sandbox.exec("git", "-C", "/tmp/repo", "diff", "--staged")
-            final_diff_process.wait()
-            final_diff_output = final_diff_process.stdout.read()
-            
-            # Send the final diff if it changed
-            if final_diff_output != diff_output:
+            sandbox.exec("git", "-C", "/tmp/repo", "add", "-A").wait()
+            try:
+                final_manifest = capture_staged_diff(run, stream, diff_store, chat_id, previous=diff_manifest)
+            except Exception as e:
+                print(f"Failed to store final diff: {str(e)}")
+                final_manifest = None
+            if final_manifest and final_manifest is not diff_manifest:
                 print("Diff changed after reflection, sending updated diff...")
-                max_diff_length = 10000
-                if len(final_diff_output) > max_diff_length:
-                    final_diff_output = final_diff_output[:max_diff_length] + "\n\n... (diff truncated)"
-                
-                supabase.table('messages').insert({
-                    'chat_id': chat_id,
-                    'content': f"📝 **Final changes after review:**\n\n```diff\n{final_diff_output}\n```",
-                    'role': 'assistant',
-                    'is_tool_use': False,
-                    'metadata': {
-                        'is_diff': True,
-                        'is_final': True
-                    }
-                }).execute()
+                messages.write(
+                    f"📝 **Final changes after review:**\n\n```\n{final_manifest['diffstat']}\n```",
+                    metadata={'is_diff': True, 'is_final': True, 'diff_artifact': diff_message_metadata(final_manifest)}
+                )
             
+            cancellation.check()
+            reporter.phase("committing", 0.85)
             print("Committing changes...")
             commit_message = f"Apply changes from Claude AI assistant\n\nPrompt: {prompt[:200]}...\n\nChat ID: {chat_id}"
-            commit_process = sandbox.exec(
-                "git", "-C", "/tmp/repo", "commit", 
-                "-m", commit_message
-            )
-            commit_process.wait()
+            with reporter.span("commit"):
+                commit_process = sandbox.exec(
+                    "git", "-C", "/tmp/repo", "commit", 
+                    "-m", commit_message
+                )
+                commit_process.wait()
             print(f"Git commit exit code: {commit_process.returncode}")
             
             if commit_process.returncode != 0:
@@ -721,29 +990,26 @@ asyncio.run(main())
                 # Could be no changes after all
                 if "nothing to commit" in commit_stderr:
                     print("Nothing to commit after all")
-                    supabase.table('messages').insert({
-                        'chat_id': chat_id,
-                        'content': "I've analyzed your request but no changes were needed.",
-                        'role': 'assistant',
-                        'is_tool_use': False,
-                        'metadata': {}
-                    }).execute()
+                    messages.write("I've analyzed your request but no changes were needed.")
                     return {
                         "status": "success",
                         "snapshot_id": None,
                         "repo_url": f"https://github.com/{final_repo}",
                         "pr_url": None,
                         "branch_name": branch_name,
-                        "forked": not has_access
+                        "forked": not has_access,
+                        "session_id": session_id,
+                        "usage": usage
                     }
             
             # Push changes
             print(f"Pushing to branch {branch_name}...")
-            push_process = sandbox.exec(
-                "git", "-C", "/tmp/repo", "push", 
-                "-u", "origin", branch_name
-            )
-            push_process.wait()
+            with reporter.span("push"):
+                push_process = sandbox.exec(
+                    "git", "-C", "/tmp/repo", "push", 
+                    "-u", "origin", branch_name
+                )
+                push_process.wait()
             print(f"Git push exit code: {push_process.returncode}")
             
             if push_process.returncode != 0:
@@ -752,6 +1018,7 @@ asyncio.run(main())
                 raise Exception(f"Failed to push changes: {push_stderr}")
         
             # Create PR only if we have changes
+            reporter.phase("creating_pr", 0.9)
             print("Creating pull request...")
             pr_title = f"Tinygen AI: {prompt[:60]}..."
             pr_body = f"""This PR was created by Tinygen AI assistant.
@@ -768,15 +1035,16 @@ asyncio.run(main())
             print(f"PR Branch: {branch_name}")
             print(f"PR Repo: {final_repo}")
             
-            pr_process = sandbox.exec(
-                "gh", "pr", "create",
-                "--repo", final_repo,
-                "--title", pr_title,
-                "--body", pr_body,
-                "--head", branch_name,
-                "--base", "main"
-            )
-            pr_process.wait()
+            with reporter.span("pr_create"):
+                pr_process = sandbox.exec(
+                    "gh", "pr", "create",
+                    "--repo", final_repo,
+                    "--title", pr_title,
+                    "--body", pr_body,
+                    "--head", branch_name,
+                    "--base", "main"
+                )
+                pr_process.wait()
             print(f"PR create exit code: {pr_process.returncode}")
             
             # Get PR URL from output
@@ -793,30 +1061,40 @@ asyncio.run(main())
             print(f"PR URL: {pr_url}")
             
             # Send a message with the PR link
-            supabase.table('messages').insert({
-                'chat_id': chat_id,
-                'content': f"🎉 **Pull Request Created!**\n\n[View PR on GitHub]({pr_url})\n\nYour changes have been pushed to `{branch_name}` and a pull request has been created.",
-                'role': 'assistant',
-                'is_tool_use': False,
-                'metadata': {
+            messages.write(
+                f"🎉 **Pull Request Created!**\n\n[View PR on GitHub]({pr_url})\n\nYour changes have been pushed to `{branch_name}` and a pull request has been created.",
+                metadata={
                     'is_pr_notification': True,
                     'pr_url': pr_url,
                     'branch_name': branch_name
                 }
-            }).execute()
+            )
         
         # Create final snapshot
+        reporter.phase("snapshotting", 0.95)
         print("Creating final snapshot...")
-        snapshot = sandbox.snapshot_filesystem()
-        snapshot_id = snapshot.object_id
+        with reporter.span("snapshot"):
+            snapshot_id = snapshot_repo(backends, sandbox, chat_id, clone_url, final_repo, base_commit, branch_name)
+        
+        # Make sure the transcript is complete before the chat is marked done
+        messages.flush()
         
         # Update chat with results
-        supabase.table('chats').update({
+        chat_update = {
             'snapshot_id': snapshot_id,
             'github_repo_url': f"https://github.com/{final_repo}",
             'pr_url': pr_url,
-            'branch_name': branch_name
-        }).eq('id', chat_id).execute()
+            'branch_name': branch_name,
+            'agent_session_id': session_id
+        }
+        supabase.table('chats').update(chat_update).eq('id', chat_id).execute()
+        # Lets the API drop its cached chat context
+        publisher.publish("chat_updated", chat_update)
+        hot_state = {
+            "snapshot_id": snapshot_id,
+            "session_id": session_id,
+            "sandbox_deadline": sandbox_deadline
+        }
         
         return {
             "status": "success",
@@ -824,9 +1102,21 @@ asyncio.run(main())
             "repo_url": f"https://github.com/{final_repo}",
             "pr_url": pr_url,
             "branch_name": branch_name,
-            "forked": not has_access
+            "forked": not has_access,
+            "session_id": session_id,
+            "usage": usage
         }
         
+    except RunCancelled:
+        print("Run cancelled")
+        messages.write("⏹️ **Run cancelled.**")
+        messages.flush()
+        # hot_state stays None: the sandbox is terminated, not kept
+        return {
+            "status": "cancelled",
+            "phase": reporter.current_phase,
+            "partial_transcript": True
+        }
     except Exception as e:
         print(f"Error: {str(e)}")
         return {
@@ -834,6 +1124,311 @@ asyncio.run(main())
             "error": str(e)
         }
     finally:
-        sandbox.terminate()
+        if daemon is not None:
+            daemon.close()
+            try:
+                backends.run_logs.commit()
+            except Exception as e:
+                print(f"Failed to commit run logs: {str(e)}")
+        # Flush any buffered messages before the container goes away
+        messages.close()
+        print(f"Message writer: {messages.rows_written} rows in {messages.batches_written} batches")
+        backends.sandboxes.release(sandbox, chat_id, hot_state)
 
 
+
+@app.function(
+    image=sandbox_image,
+    secrets=[Secret.from_name("all-tinygen")],
+    volumes={RUN_LOG_ROOT: run_log_volume, DIFF_ARTIFACT_ROOT: diff_volume, SNAPSHOT_ROOT: snapshot_volume, MIRROR_CACHE_ROOT: mirror_volume},
+    timeout=1800
+)
+def run_followup_agent(
+    chat_id: str,
+    prompt: str,
+    snapshot_id: str,
+    repo_url: str,
+    user_github_username: str,
+    branch_name: Optional[str] = None,
+    pr_url: Optional[str] = None,
+    session_id: Optional[str] = None,
+    run_id: Optional[str] = None
+) -> Dict:
+    """
+    Continue a chat: pick up its sandbox where the last run left it (or
+    restore the snapshot), resume the agent's session with the new prompt,
+    and push new commits to the chat's existing branch and PR. Follow-ups on
+    one chat run one at a time, and each reads the chat's snapshot, branch,
+    PR and session when it starts; the arguments are only fallbacks.
+    """
+    from run_status import RunReporter, get_cancellation_watcher
+    from event_publisher import get_event_publisher
+    from locks import LockTimeout
+    from config import FOLLOWUP_LOCK_TIMEOUT
+    
+    backends = production_backends()
+    publisher = get_event_publisher(chat_id)
+    reporter = RunReporter(run_id, supabase=backends.database(), publisher=publisher, function="run_followup_agent", metrics=backends.metrics)
+    reporter.started()
+    cancellation = get_cancellation_watcher(run_id)
+    lock = f"followup:{chat_id}"
+    try:
+        # One follow-up per chat at a time: the next one continues from the
+        # sandbox, snapshot and session this one leaves
+        if backends.locks.is_held(lock):
+            reporter.phase("waiting_for_chat", 0.0)
+        with backends.locks.hold(lock, timeout=FOLLOWUP_LOCK_TIMEOUT):
+            return reporter.finish(_run_followup_agent(
+                chat_id, prompt, snapshot_id, repo_url, user_github_username, branch_name, pr_url, session_id, reporter, publisher, cancellation, backends
+            ))
+    except LockTimeout:
+        return reporter.finish({"status": "error", "error": "The chat's previous follow-up is still running"})
+    except Exception as e:
+        reporter.failed(str(e))
+        raise
+    finally:
+        cancellation.stop()
+        publisher.close()
+
+
+def _run_followup_agent(
+    chat_id: str,
+    prompt: str,
+    snapshot_id: str,
+    repo_url: str,
+    user_github_username: str,
+    branch_name: Optional[str],
+    pr_url: Optional[str],
+    session_id: Optional[str],
+    reporter,
+    publisher,
+    cancellation,
+    backends
+) -> Dict:
+    from github_auth import authenticate_gh_cli
+    from prompts import FOLLOWUP_SYSTEM_PROMPT
+    from message_writer import MessageWriter
+    from agent_daemon import AgentDaemonClient
+    from commands import sandbox_runner, sandbox_streamer
+    from diff_artifacts import DiffArtifactStore, capture_staged_diff, diff_message_metadata
+    from run_status import RunCancelled
+    from config import SANDBOX_TIMEOUT
+    
+    supabase = backends.database()
+    owner, repo_name = parse_github_url(repo_url)
+    final_repo = f"{owner}/{repo_name}"
+    
+    try:
+        # The chat as the previous follow-up left it; what this run was
+        # queued with can be older than that
+        chat = supabase.table('chats').select('snapshot_id, branch_name, pr_url, agent_session_id').eq('id', chat_id).execute().data
+        if chat:
+            snapshot_id = chat[0].get('snapshot_id') or snapshot_id
+            branch_name = chat[0].get('branch_name') or branch_name
+            pr_url = chat[0].get('pr_url') or pr_url
+            session_id = chat[0].get('agent_session_id') or session_id
+        
+        reporter.phase("authenticating", 0.05)
+        with reporter.span("token"):
+            access_token = backends.github.installation_token(owner, repo_name, user_github_username)
+        
+        # The sandbox the chat's last run finished in, if it is still warm
+        # and nothing has run on the chat since; otherwise the snapshot
+        reporter.phase("restoring", 0.1)
+        with reporter.span("restore"):
+            sandbox, hot = get_hot_sandboxes().claim(chat_id)
+            if sandbox is not None and hot.get("snapshot_id") != snapshot_id:
+                sandbox.terminate()
+                sandbox, hot = None, None
+            if sandbox is not None:
+                try:
+                    authenticate_gh_cli(sandbox, access_token)
+                except Exception as e:
+                    # The claim took it out of the registry; nothing else will stop it
+                    print(f"Hot sandbox {sandbox.object_id} unusable, restoring the snapshot: {str(e)}")
+                    sandbox.terminate()
+                    sandbox, hot = None, None
+            if sandbox is not None:
+                print(f"Reusing hot sandbox {sandbox.object_id}")
+                sandbox_deadline = hot["sandbox_deadline"]
+                session_id = session_id or hot.get("session_id")
+            else:
+                sandbox = restore_snapshot(snapshot_id, final_repo, access_token)
+                sandbox_deadline = time.time() + SANDBOX_TIMEOUT
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {"status": "error", "error": str(e)}
+    reporter.attach_sandbox(sandbox.object_id)
+    
+    messages = MessageWriter(
+        supabase,
+        chat_id,
+        flush_interval=2.0 if publisher.enabled else 0.25,
+        publisher=publisher
+    ).start()
+    daemon = None
+    hot_state = None
+    
+    try:
+        cancellation.check()
+        run = sandbox_runner(sandbox)
+        base_commit = run("git", "-C", "/tmp/repo", "config", "--get", "tinygen.base").stdout.strip()
+        if not base_commit:
+            base_commit = run("git", "-C", "/tmp/repo", "rev-parse", "HEAD").stdout.strip()
+            run("git", "-C", "/tmp/repo", "config", "tinygen.base", base_commit)
+        
+        # Continue on the chat's branch; a chat whose first run changed
+        # nothing gets a branch (and PR) now
+        if not branch_name:
+            branch_name = f"tinygen-{chat_id[:8]}-{int(time.time())}"
+            checkout = run("git", "-C", "/tmp/repo", "checkout", "-B", branch_name)
+            if not checkout.ok:
+                raise Exception(f"Failed to create branch {branch_name}: {checkout.stderr}")
+        else:
+            checkout = run("git", "-C", "/tmp/repo", "checkout", branch_name)
+            if not checkout.ok:
+                raise Exception(f"Failed to check out {branch_name}: {checkout.stderr}")
+            # Pick up commits pushed to the PR since (best effort)
+            pulled = run("git", "-C", "/tmp/repo", "pull", "--ff-only", "--quiet", "origin", branch_name)
+            if not pulled.ok:
+                print(f"Could not fast-forward {branch_name}: {pulled.stderr}")
+        
+        # Resume only if the session's transcript is in this sandbox
+        if session_id and not run("find", "/root/.claude/projects", "-name", f"{session_id}.jsonl").stdout.strip():
+            print(f"Session {session_id} not found in sandbox, starting a new one")
+            session_id = None
+        
+        reporter.phase("running_agent", 0.3)
+        print(f"Running follow-up ({'resuming ' + session_id if session_id else 'new session'})...")
+        with reporter.span("agent"):
+            daemon = AgentDaemonClient(
+                sandbox,
+                log_dir=os.path.join(backends.run_logs.root, chat_id, reporter.run_id or f"followup-{int(time.time())}")
+            ).start()
+            cancellation.on_cancel(daemon.interrupt)
+            usage = {}
+            agent_result = run_agent_phase(daemon, "followup", {
+                "chat_id": chat_id,
+                "prompt": prompt,
+                "system_prompt": FOLLOWUP_SYSTEM_PROMPT,
+                "resume_session_id": session_id
+            }, messages, usage=usage)
+        cancellation.check()
+        if not agent_result.ok:
+            raise Exception(f"Claude process failed: {agent_result.error}")
+        session_id = agent_result.session_id or session_id
+        
+        reporter.phase("committing", 0.7)
+        run("mkdir", "-p", "/tmp/repo/.agent-metadata")
+        run("sh", "-c", "echo '*' > /tmp/repo/.agent-metadata/.gitignore")
+        run("git", "-C", "/tmp/repo", "add", "-A")
+        
+        if not run("git", "-C", "/tmp/repo", "diff", "--staged", "--quiet").ok:
+            diff_store = DiffArtifactStore(backends.diffs.root, commit=backends.diffs.commit)
+            try:
+                diff_manifest = capture_staged_diff(run, sandbox_streamer(sandbox), diff_store, chat_id)
+            except Exception as e:
+                print(f"Failed to store diff: {str(e)}")
+                diff_manifest = None
+            if diff_manifest:
+                messages.write(
+                    f"📝 **Follow-up changes:**\n\n```\n{diff_manifest['diffstat']}\n```",
+                    metadata={'is_diff': True, 'diff_artifact': diff_message_metadata(diff_manifest)}
+                )
+            
+            commit_message = f"Apply follow-up changes from Claude AI assistant\n\nPrompt: {prompt[:200]}...\n\nChat ID: {chat_id}"
+            with reporter.span("commit"):
+                committed = run("git", "-C", "/tmp/repo", "commit", "-m", commit_message)
+            if not committed.ok:
+                raise Exception(f"Failed to commit changes: {committed.stderr}")
+            
+            reporter.phase("pushing", 0.8)
+            with reporter.span("push"):
+                pushed = run("git", "-C", "/tmp/repo", "push", "-u", "origin", branch_name)
+            if not pushed.ok:
+                raise Exception(f"Failed to push changes: {pushed.stderr}")
+            
+            if pr_url:
+                messages.write(
+                    f"⬆️ **Pull Request Updated!**\n\n[View PR on GitHub]({pr_url})\n\nNew commits have been pushed to `{branch_name}`.",
+                    metadata={'is_pr_notification': True, 'pr_url': pr_url, 'branch_name': branch_name}
+                )
+            else:
+                reporter.phase("creating_pr", 0.9)
+                with reporter.span("pr_create"):
+                    created = run(
+                        "gh", "pr", "create",
+                        "--repo", final_repo,
+                        "--title", f"Tinygen AI: {prompt[:60]}...",
+                        "--body", f"This PR was created by Tinygen AI assistant.\n\n**Prompt**: {prompt}\n\n**Chat ID**: {chat_id}\n**Branch**: {branch_name}",
+                        "--head", branch_name,
+                        "--base", "main"
+                    )
+                pr_url = created.stdout.strip()
+                if not created.ok:
+                    if "https://github.com" not in created.stderr:
+                        raise Exception(f"Failed to create PR: {created.stderr}")
+                    pr_url = created.stderr.strip()
+                messages.write(
+                    f"🎉 **Pull Request Created!**\n\n[View PR on GitHub]({pr_url})\n\nYour changes have been pushed to `{branch_name}` and a pull request has been created.",
+                    metadata={'is_pr_notification': True, 'pr_url': pr_url, 'branch_name': branch_name}
+                )
+        else:
+            print("No changes detected in follow-up")
+        
+        reporter.phase("snapshotting", 0.95)
+        with reporter.span("snapshot"):
+            snapshot_id = snapshot_repo(backends, sandbox, chat_id, f"https://github.com/{final_repo}.git", final_repo, base_commit, branch_name)
+        messages.flush()
+        
+        chat_update = {
+            'snapshot_id': snapshot_id,
+            'pr_url': pr_url,
+            'branch_name': branch_name,
+            'agent_session_id': session_id
+        }
+        supabase.table('chats').update(chat_update).eq('id', chat_id).execute()
+        # Lets the API drop its cached chat context
+        publisher.publish("chat_updated", chat_update)
+        hot_state = {
+            "snapshot_id": snapshot_id,
+            "session_id": session_id,
+            "sandbox_deadline": sandbox_deadline
+        }
+        
+        return {
+            "status": "success",
+            "snapshot_id": snapshot_id,
+            "repo_url": f"https://github.com/{final_repo}",
+            "pr_url": pr_url,
+            "branch_name": branch_name,
+            "session_id": session_id,
+            "reused_sandbox": hot is not None,
+            "usage": usage
+        }
+        
+    except RunCancelled:
+        print("Run cancelled")
+        messages.write("⏹️ **Run cancelled.**")
+        messages.flush()
+        # hot_state stays None: the sandbox is terminated, not kept
+        return {
+            "status": "cancelled",
+            "phase": reporter.current_phase,
+            "partial_transcript": True
+        }
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {
+            "status": "error",
+            "error": str(e)
+        }
+    finally:
+        if daemon is not None:
+            daemon.close()
+            try:
+                backends.run_logs.commit()
+            except Exception as e:
+                print(f"Failed to commit run logs: {str(e)}")
+        messages.close()
+        backends.sandboxes.release(sandbox, chat_id, hot_state)
@@ -0,0 +1,238 @@
+"""Background, batched writer for chat messages streamed from the agent"""
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Deque, Dict, Optional
+
+
+class MessageWriter:
+    """
+    Buffers rows for the `messages` table and writes them in bulk from a
+    background thread, so the stdout reader never waits on the database.
+
+    Every row gets a client-generated id, a strictly increasing created_at and
+    a per-chat sequence number (metadata.seq) when it is enqueued. The
+    sequence continues from the highest seq already stored for the chat
+    (read once, when the writer starts), so it orders the chat's messages
+    across runs as long as one run writes to a chat at a time. Batches are
+    written with an upsert on `id` that ignores duplicates, so a retried batch
+    that partially landed the first time does not create duplicate messages.
+
+    With a `publisher`, every row is also published to the chat's live stream
+    as soon as it is enqueued, so the database write is only for the durable
+    transcript and can be batched more lazily.
+    """
+
+    def __init__(
+        self,
+        supabase,
+        chat_id: str,
+        batch_size: int = 50,
+        flush_interval: float = 0.25,
+        max_retries: int = 5,
+        retry_backoff: float = 0.5,
+        table: str = "messages",
+        publisher=None,
+        latency_samples: int = 10000,
+    ):
+        self.supabase = supabase
+        self.chat_id = chat_id
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.table = table
+        self.publisher = publisher
+
+        self._queue: queue.Queue = queue.Queue()
+        # Loaded from the database on start() / the first write
+        self._seq: Optional[int] = None
+        self._last_created_at: Optional[datetime] = None
+        self._seq_lock = threading.Lock()
+        self._pending = 0
+        self._pending_cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+        # Counters, useful for logging and benchmarks
+        self.rows_written = 0
+        self.batches_written = 0
+        self.failed_batches = 0
+        self.dropped_rows = 0
+        # Seconds between a row being enqueued and its batch being written,
+        # for the most recent `latency_samples` rows
+        self.latencies: Deque[float] = deque(maxlen=latency_samples)
+
+    def _load_seq(self) -> int:
+        """Highest metadata.seq stored for the chat, 0 if there is none"""
+        try:
+            result = (
+                self.supabase.table(self.table)
+                .select('metadata')
+                .eq('chat_id', self.chat_id)
+                .order('metadata->seq', desc=True, nullsfirst=False)
+                .limit(1)
+                .execute()
+            )
+        except Exception as e:
+            print(f"Failed to read the last message seq of chat {self.chat_id}: {str(e)}")
+            return 0
+        if not result.data:
+            return 0
+        return int((result.data[0].get("metadata") or {}).get("seq") or 0)
+
+    def start(self) -> "MessageWriter":
+        """Start the background flush thread"""
+        with self._seq_lock:
+            if self._seq is None:
+                self._seq = self._load_seq()
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name=f"message-writer-{self.chat_id[:8]}", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def __enter__(self) -> "MessageWriter":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write(
+        self,
+        content: str,
+        is_tool_use: bool = False,
+        metadata: Optional[Dict[str, Any]] = None,
+        role: str = "assistant",
+    ) -> Dict[str, Any]:
+        """Enqueue a message and return the row that will be inserted"""
+        if self._closed:
+            raise RuntimeError("MessageWriter is closed")
+
+        with self._seq_lock:
+            if self._seq is None:
+                self._seq = self._load_seq()
+            self._seq += 1
+            created_at = datetime.now(timezone.utc)
+            # Rows in one bulk insert can share a timestamp; keep them ordered
+            if self._last_created_at and created_at <= self._last_created_at:
+                created_at = self._last_created_at + timedelta(microseconds=1)
+            self._last_created_at = created_at
+
+            row = {
+                "id": str(uuid.uuid4()),
+                "chat_id": self.chat_id,
+                "content": content,
+                "role": role,
+                "is_tool_use": is_tool_use,
+                "created_at": created_at.isoformat(),
+                "metadata": {**(metadata or {}), "seq": self._seq},
+            }
+
+        with self._pending_cond:
+            self._pending += 1
+        # Remember when the row entered the buffer for latency accounting
+        self._queue.put((time.monotonic(), row))
+        if self.publisher is not None:
+            self.publisher.publish("message", row)
+        return row
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every enqueued row has been written (or given up on)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._pending_cond:
+            while self._pending > 0:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._pending_cond.wait(remaining)
+        return True
+
+    def close(self, timeout: Optional[float] = 30.0):
+        """Flush outstanding rows and stop the background thread"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is None:
+            # Never started - write synchronously so nothing is lost
+            self._drain_inline()
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print(f"MessageWriter: timed out flushing messages for chat {self.chat_id}")
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect_batch()
+            if batch:
+                self._write_batch(batch)
+
+    def _collect_batch(self):
+        """Collect rows until the batch is full or the flush interval elapses"""
+        batch = []
+        item = self._queue.get()
+        if item is None:
+            return batch, True
+        batch.append(item)
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _write_batch(self, batch):
+        rows = [row for _, row in batch]
+        attempt = 0
+        while True:
+            try:
+                self.supabase.table(self.table).upsert(
+                    rows, on_conflict="id", ignore_duplicates=True
+                ).execute()
+                now = time.monotonic()
+                self.latencies.extend(now - enqueued_at for enqueued_at, _ in batch)
+                self.rows_written += len(rows)
+                self.batches_written += 1
+                break
+            except Exception as e:
+                attempt += 1
+                self.failed_batches += 1
+                if attempt > self.max_retries:
+                    print(f"ERROR writing {len(rows)} messages for chat {self.chat_id}, giving up: {str(e)}")
+                    self.dropped_rows += len(rows)
+                    break
+                print(f"Retrying batch of {len(rows)} messages (attempt {attempt}): {str(e)}")
+                time.sleep(self.retry_backoff * (2 ** (attempt - 1)))
+
+        with self._pending_cond:
+            self._pending -= len(rows)
+            self._pending_cond.notify_all()
+
+    def _drain_inline(self):
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._write_batch(batch)
+                batch = []
+        if batch:
+            self._write_batch(batch)
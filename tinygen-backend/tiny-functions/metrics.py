@@ -0,0 +1,254 @@
+"""Lightweight counters and histograms shared across TinyGen containers"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Identifies this container so every writer owns its own keys in the shared
+# store; totals are summed on read, which avoids read-modify-write races
+SOURCE_ID = os.getenv("MODAL_TASK_ID", f"pid-{os.getpid()}")
+
+# Counters of containers that are gone, folded together by compact_counters():
+# {"sources": [folded source ids], "totals": {"name|labels": total}}
+FOLDED_KEY = "folded"
+# Seconds without a write after which a container's counters get folded
+SOURCE_IDLE = 3600
+
+
+# Upper bounds (seconds) of the histogram buckets: run phases take from
+# well under a second (token fetch) to half an hour (the agent)
+DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800)
+
+
+def _metric_key(name: str, labels: Dict[str, str]) -> str:
+    label_str = ",".join(f"{k}={labels[k]}" for k in sorted(labels))
+    return f"{name}|{label_str}"
+
+
+def parse_labels(labels: str) -> Dict[str, str]:
+    """"phase=clone,function=run" -> {"phase": "clone", "function": "run"}"""
+    return dict(item.split("=", 1) for item in labels.split(",") if item)
+
+
+def bucket_for(value: float, buckets: Iterable[float] = DEFAULT_BUCKETS) -> str:
+    """Upper bound of the bucket a value falls in, as the `le` label"""
+    for bound in buckets:
+        if value <= bound:
+            return str(bound)
+    return "+Inf"
+
+
+class Metrics:
+    """Counters kept in-process and mirrored into a shared mapping (e.g. a modal.Dict)"""
+
+    def __init__(self, store=None, source: str = SOURCE_ID, idle_after: float = SOURCE_IDLE):
+        self.store = store
+        self.base_source = source
+        self.source = source
+        self.idle_after = idle_after
+        self._counters: Dict[str, float] = {}
+        # Totals already published under an earlier, possibly folded, source
+        self._published: Dict[str, float] = {}
+        self._generation = 0
+        self._last_write: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _add(self, increments: List[Tuple[str, float]]):
+        """Apply increments and publish this container's totals in one write"""
+        updates = {}
+        now = time.time()
+        with self._lock:
+            # Quiet for long enough that compact_counters() may have folded
+            # our keys: carry on under a fresh source, counting from zero
+            if self._last_write is not None and now - self._last_write >= self.idle_after / 2:
+                self._generation += 1
+                self.source = f"{self.base_source}.{self._generation}"
+                self._published = dict(self._counters)
+            self._last_write = now
+            for key, value in increments:
+                total = self._counters.get(key, 0) + value
+                self._counters[key] = total
+                updates[f"counter|{key}|{self.source}"] = total - self._published.get(key, 0)
+            # When this container last wrote; compact_counters() folds idle ones
+            updates[f"seen|{self.source}"] = now
+        if self.store is not None:
+            try:
+                self.store.update(updates)
+            except Exception as e:
+                print(f"Failed to publish metrics {', '.join(key for key, _ in increments)}: {str(e)}")
+
+    def incr(self, name: str, value: float = 1, **labels: str):
+        """Increment a counter and publish this container's total"""
+        self._add([(_metric_key(name, labels), value)])
+
+    def observe(self, name: str, value: float, buckets: Iterable[float] = DEFAULT_BUCKETS, **labels: str):
+        """
+        Add an observation to a histogram, kept as three counters:
+        name_bucket (per bucket, not cumulative), name_sum and name_count
+        """
+        self._add([
+            (_metric_key(f"{name}_bucket", {**labels, "le": bucket_for(value, buckets)}), 1),
+            (_metric_key(f"{name}_sum", labels), value),
+            (_metric_key(f"{name}_count", labels), 1),
+        ])
+
+    def snapshot(self) -> Dict[str, float]:
+        """Counters recorded by this process"""
+        with self._lock:
+            return dict(self._counters)
+
+    def totals(self) -> Dict[Tuple[str, str], float]:
+        """Counters recorded by this process, keyed like read_counters()"""
+        return {tuple(key.split("|", 1)): value for key, value in self.snapshot().items()}
+
+
+def _counter_key(key: Any) -> Optional[Tuple[str, str, str]]:
+    """(name, labels, source) of a per-container counter key, or None"""
+    if not isinstance(key, str) or not key.startswith("counter|"):
+        return None
+    _, name, labels, source = key.split("|", 3)
+    return name, labels, source
+
+
+def read_counters(store) -> Dict[Tuple[str, str], float]:
+    """Sum counters across all containers, including folded ones: {(name, labels): total}"""
+    items = dict(store.items())
+    folded = items.get(FOLDED_KEY) or {"sources": [], "totals": {}}
+    skip = set(folded["sources"])
+    totals: Dict[Tuple[str, str], float] = {
+        tuple(key.split("|", 1)): value for key, value in folded["totals"].items()
+    }
+    for key, value in items.items():
+        parsed = _counter_key(key)
+        # A folded container's keys may still be there until compaction deletes them
+        if parsed is None or parsed[2] in skip:
+            continue
+        name, labels, _ = parsed
+        totals[(name, labels)] = totals.get((name, labels), 0) + value
+    return totals
+
+
+def compact_counters(store, idle_after: float = SOURCE_IDLE, clock: Callable[[], float] = time.time) -> int:
+    """
+    Fold the counters of containers that haven't written for `idle_after`
+    seconds (Modal has long since stopped them) into FOLDED_KEY and delete
+    their keys, so the store holds one set of keys per live container
+    instead of one per container ever started. The folded totals and the
+    list of folded sources are written together, so a read in between
+    never counts a container twice or drops it, and totals never go down.
+    A container that wakes up again writes under a new source (see
+    Metrics._add). Run by one process at a time; returns how many
+    containers were folded.
+    """
+    items = dict(store.items())
+    folded = items.get(FOLDED_KEY) or {"sources": [], "totals": {}}
+    now = clock()
+    idle = {
+        key.split("|", 1)[1]
+        for key, seen in items.items()
+        if isinstance(key, str) and key.startswith("seen|") and now - seen > idle_after
+    }
+    new = idle - set(folded["sources"])
+    # Folded before, but a failed run left some of their keys behind
+    leftover = set(folded["sources"])
+
+    totals = dict(folded["totals"])
+    pending = set()
+    stale_keys = [f"seen|{source}" for source in new | leftover]
+    for key, value in items.items():
+        parsed = _counter_key(key)
+        if parsed is None or parsed[2] not in new | leftover:
+            continue
+        name, labels, source = parsed
+        if source in new:
+            totals[f"{name}|{labels}"] = totals.get(f"{name}|{labels}", 0) + value
+        pending.add(source)
+        stale_keys.append(key)
+
+    # Sources stay listed (and skipped by read_counters) until their keys are gone
+    sources = sorted(new | pending)
+    if new or sources != sorted(folded["sources"]):
+        store[FOLDED_KEY] = {"sources": sources, "totals": totals}
+    for key in stale_keys:
+        store.pop(key, None)
+    return len(new)
+
+
+_metrics: Optional[Metrics] = None
+
+
+def get_metrics() -> Metrics:
+    """Process-wide Metrics backed by the shared Modal dict"""
+    global _metrics
+    if _metrics is None:
+        from modal import Dict as ModalDict
+        from config import METRICS_DICT, METRICS_SOURCE_IDLE
+        _metrics = Metrics(ModalDict.from_name(METRICS_DICT, create_if_missing=True), idle_after=METRICS_SOURCE_IDLE)
+    return _metrics
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in sorted(labels.items())) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _bound(le: str) -> float:
+    return float("inf") if le == "+Inf" else float(le)
+
+
+def render_prometheus(
+    totals: Dict[Tuple[str, str], float],
+    gauges: Optional[Dict[Tuple[str, str], float]] = None,
+    prefix: str = "tinygen_",
+) -> str:
+    """
+    Prometheus text exposition of summed counters (as from read_counters()),
+    with histograms recorded by Metrics.observe() made cumulative, and of
+    point-in-time gauges keyed the same way
+    """
+    histograms = {name[:-len("_bucket")] for name, _ in totals if name.endswith("_bucket")}
+    families: Dict[str, Dict[str, List[str]]] = {}
+
+    def emit(family: str, kind: str, line: str):
+        families.setdefault(family, {"type": kind, "lines": []})["lines"].append(line)
+
+    buckets: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Dict[str, float]] = {}
+    for (name, labels), value in sorted(totals.items()):
+        parsed = parse_labels(labels)
+        if name.endswith("_bucket") and name[:-len("_bucket")] in histograms:
+            le = parsed.pop("le", "+Inf")
+            series = (name[:-len("_bucket")], tuple(sorted(parsed.items())))
+            counts = buckets.setdefault(series, {})
+            counts[le] = counts.get(le, 0) + value
+        elif name.endswith(("_sum", "_count")) and name.rsplit("_", 1)[0] in histograms:
+            emit(prefix + name.rsplit("_", 1)[0], "histogram", f"{prefix}{name}{_format_labels(parsed)} {_format_value(value)}")
+        else:
+            emit(prefix + name, "counter", f"{prefix}{name}{_format_labels(parsed)} {_format_value(value)}")
+
+    # Every series of a histogram gets the same bounds, so they can be aggregated
+    bounds: Dict[str, set] = {}
+    for (name, _), counts in buckets.items():
+        bounds.setdefault(name, {"+Inf"}).update(counts)
+    for (name, labels), counts in sorted(buckets.items()):
+        cumulative = 0.0
+        for le in sorted(bounds[name], key=_bound):
+            cumulative += counts.get(le, 0)
+            emit(prefix + name, "histogram", f"{prefix}{name}_bucket{_format_labels({**dict(labels), 'le': le})} {_format_value(cumulative)}")
+
+    for (name, labels), value in sorted((gauges or {}).items()):
+        emit(prefix + name, "gauge", f"{prefix}{name}{_format_labels(parse_labels(labels))} {_format_value(value)}")
+
+    out = []
+    for family in sorted(families):
+        out.append(f"# TYPE {family} {families[family]['type']}")
+        out.extend(families[family]["lines"])
+    return "\n".join(out) + "\n"
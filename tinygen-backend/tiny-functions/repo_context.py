@@ -0,0 +1,130 @@
+"""Repository context indexes cached per commit, and the prompt section built from them"""
+import os
+import re
+import tempfile
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from commands import Fetcher, Pusher, Runner
+from tinygen_runner.repo_index import load_index, render_context
+
+_REPO = re.compile(r"^[\w.-]+/[\w.-]+$")
+_SHA = re.compile(r"^[0-9a-f]{40}$")
+
+
+class RepoIndexCache:
+    """
+    Indexes under `root` (normally a Modal Volume), one per repository commit:
+
+        <root>/<owner>/<repo>/<sha>.json.gz
+        <root>/<owner>/<repo>/latest           sha of the last index written
+
+    A commit that was indexed before is reused as is; a new commit is indexed
+    incrementally from `latest` when that is one of its ancestors.
+    """
+
+    def __init__(
+        self,
+        root: str = "/repo-index",
+        commit: Optional[Callable[[], None]] = None,
+        reload: Optional[Callable[[], None]] = None,
+    ):
+        self.root = root.rstrip("/")
+        # Persist / refresh the backing volume; no-ops for a plain directory
+        self.commit = commit or (lambda: None)
+        self.reload = reload or (lambda: None)
+
+    def path(self, repo: str, sha: str) -> str:
+        if not _REPO.match(repo) or ".." in repo or not _SHA.match(sha):
+            raise ValueError(f"Invalid repo index key {repo}@{sha}")
+        return os.path.join(self.root, repo, f"{sha}.json.gz")
+
+    def find(self, repo: str, sha: str) -> Optional[str]:
+        """Path of the commit's index, reloading the volume once if it isn't there yet"""
+        path = self.path(repo, sha)
+        if not os.path.exists(path):
+            self.reload()
+            if not os.path.exists(path):
+                return None
+        return path
+
+    def latest(self, repo: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, repo, "latest")) as f:
+                sha = f.read().strip()
+        except OSError:
+            return None
+        return self.find(repo, sha) if _SHA.match(sha) else None
+
+    def stored(self, repo: str, sha: str):
+        """Record a freshly written index as the repository's latest and persist it"""
+        with open(os.path.join(self.root, repo, "latest"), "w") as f:
+            f.write(sha)
+        self.commit()
+
+
+def build_repo_context(
+    run: Runner,
+    fetch: Fetcher,
+    push: Pusher,
+    cache: RepoIndexCache,
+    repo: str,
+    prompt: str,
+    repo_dir: str = "/tmp/repo",
+    budget: int = 6000,
+    partial: bool = False,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Index HEAD of `repo_dir` (or reuse the cached index of that commit) and
+    render the parts relevant to `prompt`. Returns (context, stats) where
+    stats says how the index was obtained: "cached", "incremental" or "full".
+
+    A `partial` checkout (sparse) lacks most files' contents, so an index
+    built from it is used for this run only and never cached: it would
+    otherwise be reused by full clones of the commit and inherited by
+    incremental builds of later ones.
+    """
+    started = time.time()
+    sha = run("git", "-C", repo_dir, "rev-parse", "HEAD").stdout.strip()
+    path = cache.find(repo, sha)
+    cached = path is not None
+    scratch = None
+
+    if not cached:
+        remote_index = f"/tmp/tinygen-{uuid.uuid4().hex[:8]}.json.gz"
+        remote_previous = f"/tmp/tinygen-{uuid.uuid4().hex[:8]}.json.gz"
+        command = ["python", "-m", "tinygen_runner", "--index", remote_index, "--root", repo_dir]
+        previous = cache.latest(repo)
+        if previous is not None:
+            push(previous, remote_previous)
+            command += ["--previous", remote_previous]
+        try:
+            built = run(*command)
+            if not built.ok:
+                raise Exception(f"Repository indexing failed: {built.stderr}")
+            if partial:
+                path = scratch = os.path.join(tempfile.gettempdir(), f"tinygen-index-{uuid.uuid4().hex[:8]}.json.gz")
+            else:
+                path = cache.path(repo, sha)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            fetch(remote_index, path)
+        finally:
+            run("rm", "-f", remote_index, remote_previous)
+        if not partial:
+            cache.stored(repo, sha)
+
+    try:
+        index = load_index(path)
+    finally:
+        if scratch is not None:
+            os.remove(scratch)
+    context = render_context(index, prompt, budget)
+    return context, {
+        "sha": sha,
+        "source": "cached" if cached else ("incremental" if index["base"] else "full"),
+        "files": len(index["files"]),
+        "reindexed": 0 if cached else index["reindexed"],
+        "chars": len(context),
+        "seconds": time.time() - started,
+    }
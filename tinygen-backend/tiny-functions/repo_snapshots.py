@@ -0,0 +1,201 @@
+"""Incremental repository snapshots: a git bundle of the run's branch plus agent metadata"""
+import json
+import os
+import re
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from commands import Fetcher, Pusher, Runner
+
+SNAPSHOT_MODES = ("filesystem", "bundle")
+
+# chats.snapshot_id of a bundle snapshot; anything else is a Modal image id
+BUNDLE_PREFIX = "bundle:"
+
+# Untracked directory the agent keeps its notes in, carried over with the bundle
+METADATA_DIR = ".agent-metadata"
+
+# Claude CLI session transcripts in the sandbox, so a follow-up can resume
+SESSION_DIR = "/root/.claude/projects"
+
+_SNAPSHOT_KEY = re.compile(r"^[\w-]+/[\w-]+$")
+
+
+def validate_mode(mode: str) -> str:
+    if mode not in SNAPSHOT_MODES:
+        raise ValueError(f"Unknown snapshot mode '{mode}', expected one of {', '.join(SNAPSHOT_MODES)}")
+    return mode
+
+
+def is_bundle_snapshot(snapshot_id: Optional[str]) -> bool:
+    return bool(snapshot_id) and snapshot_id.startswith(BUNDLE_PREFIX)
+
+
+class BundleSnapshotStore:
+    """
+    Bundle snapshots under `root` (normally a Modal Volume):
+
+        <root>/<chat_id>/<key>/manifest.json    clone URL, base commit, branch, head
+        <root>/<chat_id>/<key>/repo.bundle      commits base..branch (if any)
+        <root>/<chat_id>/<key>/metadata.tar.gz  the agent metadata directory (if any)
+        <root>/<chat_id>/<key>/sessions.tar.gz  Claude session transcripts (if any)
+
+    A snapshot is restored by cloning the repository (through the mirror
+    cache) and fetching the bundle on top, so it only stores what the agent
+    added. Its id is "bundle:<chat_id>/<key>".
+    """
+
+    def __init__(
+        self,
+        root: str = "/snapshots",
+        commit: Optional[Callable[[], None]] = None,
+        reload: Optional[Callable[[], None]] = None,
+    ):
+        self.root = root.rstrip("/")
+        # Persist / refresh the backing volume; no-ops for a plain directory
+        self.commit = commit or (lambda: None)
+        self.reload = reload or (lambda: None)
+
+    @staticmethod
+    def new_id(chat_id: str) -> str:
+        return f"{BUNDLE_PREFIX}{chat_id}/{int(time.time())}-{uuid.uuid4().hex[:8]}"
+
+    def path(self, snapshot_id: str, name: str = "") -> str:
+        key = snapshot_id[len(BUNDLE_PREFIX):] if is_bundle_snapshot(snapshot_id) else ""
+        if not _SNAPSHOT_KEY.match(key):
+            raise ValueError(f"Invalid bundle snapshot id '{snapshot_id}'")
+        return os.path.join(self.root, key, name)
+
+    def read_manifest(self, snapshot_id: str) -> Dict[str, Any]:
+        path = self.path(snapshot_id, "manifest.json")
+        if not os.path.exists(path):
+            self.reload()
+        with open(path) as f:
+            return json.load(f)
+
+    def write_manifest(self, manifest: Dict[str, Any]):
+        with open(self.path(manifest["id"], "manifest.json"), "w") as f:
+            json.dump(manifest, f)
+        self.commit()
+
+
+def create_bundle_snapshot(
+    run: Runner,
+    fetch: Fetcher,
+    store: BundleSnapshotStore,
+    chat_id: str,
+    clone_url: str,
+    repo: str,
+    base: str,
+    branch: Optional[str] = None,
+    repo_dir: str = "/tmp/repo",
+    session_dir: Optional[str] = SESSION_DIR,
+) -> Dict[str, Any]:
+    """
+    Snapshot `repo_dir` as the commits of `branch` since `base` plus the
+    agent metadata directory and the Claude session transcripts under
+    `session_dir`. Returns the manifest; its `id` goes in chats.snapshot_id
+    and `bytes` is the stored size.
+    """
+    snapshot_id = store.new_id(chat_id)
+    os.makedirs(store.path(snapshot_id), exist_ok=True)
+    head = run("git", "-C", repo_dir, "rev-parse", "HEAD").stdout.strip()
+    manifest = {
+        "id": snapshot_id,
+        "clone_url": clone_url,
+        "repo": repo,
+        "base": base,
+        "branch": branch,
+        "head": head,
+        "bundle": None,
+        "metadata": None,
+        "sessions": None,
+        "bytes": 0,
+    }
+
+    if branch and head != base:
+        remote_bundle = f"/tmp/tinygen-{uuid.uuid4().hex[:8]}.bundle"
+        created = run("git", "-C", repo_dir, "bundle", "create", remote_bundle, f"{base}..{branch}")
+        if not created.ok:
+            raise Exception(f"git bundle create failed: {created.stderr}")
+        fetch(remote_bundle, store.path(snapshot_id, "repo.bundle"))
+        run("rm", "-f", remote_bundle)
+        manifest["bundle"] = "repo.bundle"
+
+    manifest["metadata"] = _pack(run, fetch, store, snapshot_id, repo_dir, METADATA_DIR, "metadata.tar.gz")
+    if session_dir:
+        manifest["sessions"] = _pack(run, fetch, store, snapshot_id, "/", session_dir.lstrip("/"), "sessions.tar.gz")
+
+    for name in (manifest["bundle"], manifest["metadata"], manifest["sessions"]):
+        if name:
+            manifest["bytes"] += os.path.getsize(store.path(snapshot_id, name))
+    store.write_manifest(manifest)
+    return manifest
+
+
+def _pack(run: Runner, fetch: Fetcher, store: BundleSnapshotStore, snapshot_id: str, parent: str, directory: str, name: str) -> Optional[str]:
+    """Tar parent/directory into the snapshot as `name`; returns name, or None if there is nothing to keep"""
+    if not run("test", "-d", os.path.join(parent, directory)).ok:
+        return None
+    remote_tar = f"/tmp/tinygen-{uuid.uuid4().hex[:8]}.tar.gz"
+    try:
+        packed = run("tar", "czf", remote_tar, "-C", parent, directory)
+        if not packed.ok:
+            print(f"Skipping {directory} in snapshot: {packed.stderr}")
+            return None
+        fetch(remote_tar, store.path(snapshot_id, name))
+        return name
+    finally:
+        run("rm", "-f", remote_tar)
+
+
+def _unpack(run: Runner, push: Pusher, store: BundleSnapshotStore, snapshot_id: str, name: Optional[str], parent: str):
+    if not name:
+        return
+    remote_tar = f"/tmp/tinygen-{uuid.uuid4().hex[:8]}.tar.gz"
+    push(store.path(snapshot_id, name), remote_tar)
+    run("mkdir", "-p", parent)
+    unpacked = run("tar", "xzf", remote_tar, "-C", parent)
+    if not unpacked.ok:
+        print(f"Failed to unpack {name} from snapshot: {unpacked.stderr}")
+    run("rm", "-f", remote_tar)
+
+
+def restore_bundle_snapshot(
+    run: Runner,
+    push: Pusher,
+    store: BundleSnapshotStore,
+    snapshot_id: str,
+    clone: Callable[[str, str], Any],
+    repo_dir: str = "/tmp/repo",
+) -> Dict[str, Any]:
+    """
+    Rebuild a snapshot in `repo_dir`: `clone(clone_url, repo_dir)` the
+    repository, fetch the bundle's branch and check it out, then unpack the
+    agent metadata and session transcripts. Returns the manifest.
+    """
+    manifest = store.read_manifest(snapshot_id)
+    clone(manifest["clone_url"], repo_dir)
+
+    branch = manifest["branch"]
+    if manifest["bundle"]:
+        remote_bundle = f"/tmp/tinygen-{uuid.uuid4().hex[:8]}.bundle"
+        push(store.path(snapshot_id, manifest["bundle"]), remote_bundle)
+        fetched = run("git", "-C", repo_dir, "fetch", "--quiet", remote_bundle, f"refs/heads/{branch}:refs/heads/{branch}")
+        if not fetched.ok:
+            raise Exception(f"Failed to apply snapshot bundle: {fetched.stderr}")
+        run("rm", "-f", remote_bundle)
+        checkout = run("git", "-C", repo_dir, "checkout", "--quiet", branch)
+    elif branch:
+        checkout = run("git", "-C", repo_dir, "checkout", "--quiet", "-B", branch, manifest["base"])
+    else:
+        checkout = run("git", "-C", repo_dir, "checkout", "--quiet", "--detach", manifest["base"])
+    if not checkout.ok:
+        raise Exception(f"Failed to check out snapshot: {checkout.stderr}")
+    # Where the run's branch started, for the next snapshot of this repo
+    run("git", "-C", repo_dir, "config", "tinygen.base", manifest["base"])
+
+    _unpack(run, push, store, snapshot_id, manifest["metadata"], repo_dir)
+    _unpack(run, push, store, snapshot_id, manifest.get("sessions"), "/")
+    return manifest
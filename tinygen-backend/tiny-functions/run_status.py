@@ -0,0 +1,225 @@
+"""Progress reporting for background runs, persisted in the `runs` table"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_client = None
+
+
+def get_service_client():
+    """Supabase client with the service role key (bypasses RLS)"""
+    global _client
+    if _client is None:
+        from supabase import create_client
+        _client = create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_SERVICE_ROLE_KEY"])
+    return _client
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class RunReporter:
+    """
+    Records phase, progress and outcome of one run. Reporting is best
+    effort: a failed status write is logged and never fails the run. With no
+    run_id (direct `modal run` invocations) every call is a no-op.
+
+    Phase changes and the outcome are also sent to the chat's live stream
+    when a `publisher` is given.
+
+    span(name) times a step of the run. The spans are written to the
+    `run_timings` table when the run finishes, and added to the shared
+    run_phase_seconds histogram (labelled with `function`) when `metrics`
+    is given.
+    """
+
+    def __init__(self, run_id: Optional[str], supabase=None, publisher=None, function: Optional[str] = None, metrics=None):
+        self.run_id = run_id
+        self._supabase = supabase
+        self.publisher = publisher
+        self.function = function
+        self.metrics = metrics
+        self.current_phase: Optional[str] = None
+        # (name, started_at, seconds) of the spans not recorded yet
+        self.spans: List[Tuple[str, str, float]] = []
+
+    @property
+    def supabase(self):
+        if self._supabase is None:
+            self._supabase = get_service_client()
+        return self._supabase
+
+    def _publish(self, event: str, data: Dict[str, Any]):
+        if self.publisher is not None:
+            self.publisher.publish(event, {"run_id": self.run_id, **data})
+
+    def _update(self, fields: Dict[str, Any]):
+        if not self.run_id:
+            return
+        try:
+            self.supabase.table("runs").update({**fields, "updated_at": _now()}).eq("id", self.run_id).execute()
+        except Exception as e:
+            print(f"Failed to update run {self.run_id}: {str(e)}")
+
+    def started(self):
+        self._update({"status": "running", "started_at": _now()})
+
+    def attach_sandbox(self, sandbox_id: str):
+        """Remember the run's sandbox, so a cancel can terminate it even if this function is gone"""
+        self._update({"sandbox_id": sandbox_id})
+
+    def phase(self, name: str, progress: float):
+        """Enter a new phase; progress is 0..1 for the whole run"""
+        print(f"[run {self.run_id}] phase={name} progress={progress:.2f}")
+        self.current_phase = name
+        self._publish("phase", {"phase": name, "progress": progress})
+        self._update({"status": "running", "phase": name, "progress": progress})
+
+    @contextmanager
+    def span(self, name: str):
+        """Time the enclosed step; it is recorded even if the step raises"""
+        started_at = _now()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((name, started_at, time.perf_counter() - started))
+
+    def record_spans(self):
+        """Write the spans so far to run_timings and the phase histogram"""
+        spans, self.spans = self.spans, []
+        if not spans:
+            return
+        print(f"[run {self.run_id}] timings: " + " ".join(f"{name}={seconds:.1f}s" for name, _, seconds in spans))
+        if self.metrics is not None:
+            for name, _, seconds in spans:
+                self.metrics.observe("run_phase_seconds", seconds, function=self.function or "unknown", phase=name)
+        if not self.run_id:
+            return
+        try:
+            self.supabase.table("run_timings").insert([
+                {"run_id": self.run_id, "function": self.function, "phase": name, "started_at": started_at, "seconds": seconds}
+                for name, started_at, seconds in spans
+            ]).execute()
+        except Exception as e:
+            print(f"Failed to store timings of run {self.run_id}: {str(e)}")
+
+    def succeeded(self, result: Dict[str, Any]):
+        self._publish("status", {"status": "succeeded", "result": result})
+        self._update({
+            "status": "succeeded",
+            "phase": "done",
+            "progress": 1,
+            "result": result,
+            "finished_at": _now(),
+        })
+
+    def failed(self, error: str):
+        self._publish("status", {"status": "failed", "error": error})
+        self._update({"status": "failed", "error": error, "finished_at": _now()})
+
+    def cancelled(self, result: Dict[str, Any]):
+        self._publish("status", {"status": "cancelled", "result": result})
+        self._update({"status": "cancelled", "result": result, "error": "Cancelled", "finished_at": _now()})
+
+    def finish(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Record a function's {status, ...} result dict and pass it through"""
+        # Timings first, so they are complete once the run shows as finished
+        self.record_spans()
+        if result.get("status") == "success":
+            self.succeeded(result)
+        elif result.get("status") == "cancelled":
+            self.cancelled(result)
+        else:
+            self.failed(result.get("error") or "Unknown error")
+        return result
+
+
+class RunCancelled(Exception):
+    pass
+
+
+class CancellationWatcher:
+    """
+    Watches for a cancel request on a run: POST /runs/{id}/cancel puts the
+    run id in a shared dict (a modal.Dict in production), which a background
+    thread polls every `interval` seconds. Callbacks registered with
+    on_cancel() run once, on that thread, when the request is seen (the
+    agent daemon's interrupt); the run itself calls check() between steps
+    and stops with RunCancelled. With no run_id it never fires.
+    """
+
+    def __init__(self, run_id: Optional[str], store=None, interval: float = 2.0):
+        self.run_id = run_id
+        self.store = store
+        self.interval = interval
+        self._cancelled = threading.Event()
+        self._stopped = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def start(self) -> "CancellationWatcher":
+        if self.run_id and self.store is not None:
+            self._thread = threading.Thread(target=self._watch, name="run-cancellation", daemon=True)
+            self._thread.start()
+        return self
+
+    def _watch(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                requested = self.store.get(self.run_id)
+            except Exception as e:
+                print(f"Failed to check run {self.run_id} for cancellation: {str(e)}")
+                continue
+            if requested:
+                self._fire()
+                return
+
+    def _fire(self):
+        print(f"[run {self.run_id}] cancel requested")
+        with self._lock:
+            self._cancelled.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Cancellation callback failed: {str(e)}")
+
+    def on_cancel(self, callback: Callable[[], None]):
+        """Run `callback` when the run is cancelled (right away if it already is)"""
+        with self._lock:
+            if not self._cancelled.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def check(self):
+        if self._cancelled.is_set():
+            raise RunCancelled("Run cancelled")
+
+    def stop(self):
+        self._stopped.set()
+        if self.run_id and self.store is not None:
+            try:
+                self.store.pop(self.run_id, None)
+            except Exception:
+                pass
+
+
+def get_cancellation_watcher(run_id: Optional[str]) -> CancellationWatcher:
+    """A started watcher on the shared cancellation dict"""
+    from modal import Dict as ModalDict
+    from config import RUN_CANCEL_DICT, RUN_CANCEL_POLL_INTERVAL
+
+    store = ModalDict.from_name(RUN_CANCEL_DICT, create_if_missing=True) if run_id else None
+    return CancellationWatcher(run_id, store, RUN_CANCEL_POLL_INTERVAL).start()
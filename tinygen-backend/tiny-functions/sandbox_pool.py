@@ -0,0 +1,227 @@
+"""Pool of warm, pre-configured sandboxes shared by agent runs"""
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from locks import LocalLocks, LockTimeout
+
+
+class LocalQueue:
+    """In-process stand-in for modal.Queue (put / non-blocking get / len)"""
+
+    def __init__(self):
+        self._items = deque()
+        self._lock = threading.Lock()
+
+    def put(self, item: Any):
+        with self._lock:
+            self._items.append(item)
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> Optional[Any]:
+        with self._lock:
+            return self._items.popleft() if self._items else None
+
+    def len(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+
+class ModalSandboxBackend:
+    """Creates and looks up real Modal sandboxes"""
+
+    def __init__(self, image, secrets, timeout: int, volumes=None, app=None):
+        self.image = image
+        self.secrets = secrets
+        self.timeout = timeout
+        self.volumes = volumes or {}
+        self.app = app
+
+    def create(self):
+        from modal import Sandbox
+        return Sandbox.create(
+            app=self.app,
+            image=self.image,
+            secrets=self.secrets,
+            timeout=self.timeout,
+            volumes=self.volumes,
+        )
+
+    def from_id(self, sandbox_id: str):
+        from modal import Sandbox
+        return Sandbox.from_id(sandbox_id)
+
+
+class SandboxPool:
+    """
+    Keeps up to `size` idle sandboxes that have already booted and run
+    `prepare`. Idle sandboxes are tracked as {sandbox_id, ready_at} entries in
+    a queue, so any container can lease one with a single atomic pop.
+
+    Refills and reaps hold the pool's lock in `locks` (DictLocks across
+    containers), so a burst of leases boots at most `size` sandboxes: a
+    refill requested while another one runs is skipped, since the running
+    one keeps going until the pool is full.
+
+    The backend only needs `create()` and `from_id(id)`, and sandboxes only
+    need `object_id`, `poll()` and `terminate()`, so the pool can be driven by
+    a fake backend and a LocalQueue in tests.
+    """
+
+    LOCK = "sandbox-pool"
+
+    def __init__(
+        self,
+        backend,
+        prepare: Optional[Callable[[Any], None]] = None,
+        size: int = 2,
+        idle_ttl: float = 900,
+        idle_queue=None,
+        metrics=None,
+        request_refill: Optional[Callable[[], None]] = None,
+        locks=None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.backend = backend
+        self.prepare = prepare
+        self.size = size
+        self.idle_ttl = idle_ttl
+        self.idle_queue = idle_queue if idle_queue is not None else LocalQueue()
+        self.metrics = metrics
+        self.locks = locks if locks is not None else LocalLocks()
+        self.clock = clock
+        # How a refill is triggered after a lease; defaults to a local thread
+        self._request_refill = request_refill or self._refill_in_background
+
+    def _incr(self, name: str, value: int = 1):
+        if self.metrics is not None and value:
+            self.metrics.incr(name, value)
+
+    def create_warm(self):
+        """Boot a sandbox and run the prepare step on it"""
+        started = self.clock()
+        sandbox = self.backend.create()
+        try:
+            if self.prepare:
+                self.prepare(sandbox)
+        except Exception:
+            sandbox.terminate()
+            raise
+        print(f"Prepared sandbox {sandbox.object_id} in {self.clock() - started:.1f}s")
+        return sandbox
+
+    def lease(self) -> Tuple[Any, bool]:
+        """
+        Hand out a ready sandbox. Returns (sandbox, from_pool); on a miss a
+        sandbox is created and prepared inline.
+        """
+        if self.size > 0:
+            while True:
+                entry = self.idle_queue.get(block=False)
+                if entry is None:
+                    break
+                sandbox = self._claim(entry)
+                if sandbox is not None:
+                    self._incr("sandbox_pool_leases")
+                    self.request_refill()
+                    return sandbox, True
+
+        self._incr("sandbox_pool_misses")
+        if self.size > 0:
+            self.request_refill()
+        return self.create_warm(), False
+
+    def _claim(self, entry: Dict[str, Any]):
+        """Turn a queue entry into a live sandbox, or discard it"""
+        if self.clock() - entry["ready_at"] > self.idle_ttl:
+            self._terminate(entry["sandbox_id"])
+            self._incr("sandbox_pool_reaped")
+            return None
+        try:
+            sandbox = self.backend.from_id(entry["sandbox_id"])
+        except Exception as e:
+            print(f"Pooled sandbox {entry['sandbox_id']} is gone: {str(e)}")
+            return None
+        if sandbox.poll() is not None:
+            # Exited (timed out or crashed) while idle
+            self._incr("sandbox_pool_dead")
+            return None
+        return sandbox
+
+    def _terminate(self, sandbox_id: str):
+        try:
+            self.backend.from_id(sandbox_id).terminate()
+        except Exception as e:
+            print(f"Failed to terminate pooled sandbox {sandbox_id}: {str(e)}")
+
+    def request_refill(self):
+        """Ask for the pool to be topped up without blocking the caller"""
+        try:
+            self._request_refill()
+        except Exception as e:
+            print(f"Failed to request sandbox pool refill: {str(e)}")
+
+    def _refill_in_background(self):
+        threading.Thread(target=self.refill, name="sandbox-pool-refill", daemon=True).start()
+
+    def refill(self) -> int:
+        """Create sandboxes until the pool holds `size` idle ones (0 if another refill is running)"""
+        try:
+            with self.locks.hold(self.LOCK, timeout=0):
+                return self._refill()
+        except LockTimeout:
+            self._incr("sandbox_pool_refills_skipped")
+            return 0
+
+    def _refill(self) -> int:
+        created = 0
+        while self.idle_queue.len() < self.size:
+            try:
+                sandbox = self.create_warm()
+            except Exception as e:
+                print(f"Failed to create pooled sandbox: {str(e)}")
+                break
+            self.idle_queue.put({"sandbox_id": sandbox.object_id, "ready_at": self.clock()})
+            created += 1
+        self._incr("sandbox_pool_created", created)
+        return created
+
+    def reap(self) -> int:
+        """
+        Terminate idle sandboxes past their TTL, dead ones, and any above
+        `size` (0 if a refill or another reap is running)
+        """
+        try:
+            with self.locks.hold(self.LOCK, timeout=0):
+                return self._reap()
+        except LockTimeout:
+            return 0
+
+    def _reap(self) -> int:
+        reaped = 0
+        kept = set()
+        for _ in range(self.idle_queue.len()):
+            entry = self.idle_queue.get(block=False)
+            if entry is None:
+                break
+            if entry["sandbox_id"] in kept:
+                # Leases took the rest while we were checking; all seen
+                self.idle_queue.put(entry)
+                break
+            expired = self.clock() - entry["ready_at"] > self.idle_ttl
+            if expired or len(kept) >= self.size:
+                self._terminate(entry["sandbox_id"])
+                reaped += 1
+                continue
+            try:
+                alive = self.backend.from_id(entry["sandbox_id"]).poll() is None
+            except Exception:
+                alive = False
+            if alive:
+                # Straight back, so a lease meanwhile still finds it
+                self.idle_queue.put(entry)
+                kept.add(entry["sandbox_id"])
+            else:
+                reaped += 1
+        self._incr("sandbox_pool_reaped", reaped)
+        return reaped
@@ -0,0 +1,266 @@
+"""Asyncio pipeline that drains the agent daemon's output streams on the host"""
+import asyncio
+import gzip
+import os
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional
+
+from tinygen_runner.events import Event, EventReader, PhaseEvent, ProtocolError, dumps
+
+EventHandler = Callable[[Event], None]
+
+
+class DaemonError(Exception):
+    pass
+
+
+class SpillingLog:
+    """
+    Raw output lines of one stream. Lines collect in a buffer of at most
+    `capacity` entries that is appended to a gzip file whenever it fills,
+    so memory stays flat however long the run is; the last `tail_size`
+    lines are kept for error messages. Without a path the buffer is a
+    plain ring and old lines are discarded.
+    """
+
+    def __init__(self, path: Optional[str] = None, capacity: int = 2000, tail_size: int = 200):
+        self.path = path
+        self.capacity = capacity
+        self._buffer: List[str] = []
+        self._tail: Deque[str] = deque(maxlen=tail_size)
+        self._file = None
+
+        # Counters, useful for logging and benchmarks
+        self.lines = 0
+        self.spilled_lines = 0
+
+    def append(self, line: str):
+        self.lines += 1
+        self._tail.append(line)
+        if self.path is None:
+            return
+        self._buffer.append(line)
+        if len(self._buffer) >= self.capacity:
+            self.spill()
+
+    def spill(self):
+        """Append buffered lines to the compressed file"""
+        if not self._buffer or self.path is None:
+            return
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = gzip.open(self.path, "at", encoding="utf-8")
+        self._file.write("\n".join(self._buffer) + "\n")
+        self.spilled_lines += len(self._buffer)
+        self._buffer.clear()
+
+    def tail(self, count: Optional[int] = None) -> List[str]:
+        lines = list(self._tail)
+        return lines if count is None else lines[-count:]
+
+    def close(self):
+        self.spill()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+async def _chunks(stream) -> AsyncIterator[str]:
+    """Text chunks of a Modal stream reader (or any async/sync iterable of strings)"""
+    if hasattr(stream, "__aiter__"):
+        async for chunk in stream:
+            yield chunk
+    else:
+        iterator = iter(stream)
+        sentinel = object()
+        while True:
+            chunk = await asyncio.to_thread(next, iterator, sentinel)
+            if chunk is sentinel:
+                return
+            yield chunk
+
+
+async def _lines(stream) -> AsyncIterator[str]:
+    """
+    Lines of a stream whose chunks may end anywhere: a partial line is
+    carried over to the next chunk. Only "\n" ends a line; str.splitlines()
+    would also split inside a frame at U+2028, U+0085 and the like.
+    """
+    pending: List[str] = []
+    async for chunk in _chunks(stream):
+        pieces = chunk.split("\n")
+        if len(pieces) == 1:
+            pending.append(chunk)
+            continue
+        pending.append(pieces[0])
+        yield _strip_cr("".join(pending))
+        for line in pieces[1:-1]:
+            yield _strip_cr(line)
+        pending = [pieces[-1]] if pieces[-1] else []
+    if pending:
+        yield _strip_cr("".join(pending))
+
+
+def _strip_cr(line: str) -> str:
+    return line[:-1] if line.endswith("\r") else line
+
+
+async def _call(method, *args):
+    """Await a Modal method's .aio variant, or run a plain method in a thread"""
+    aio = getattr(method, "aio", None)
+    if aio is not None:
+        return await aio(*args)
+    return await asyncio.to_thread(method, *args)
+
+
+class AgentStreamPipeline:
+    """
+    Host side of one daemon process, with every stage running concurrently:
+
+        stdout -> raw log + bounded line queue -> parse -> bounded event queue -> deliver
+        stderr -> raw log
+
+    Both streams are always drained, so a chatty stderr can't fill its pipe
+    and stall the runner while the host is busy with stdout. Parsed events
+    are handed to the handler of the command they belong to (which writes
+    the transcript and live stream); a full queue pauses the stage feeding
+    it rather than growing memory.
+    """
+
+    def __init__(
+        self,
+        process,
+        stdout_log: Optional[SpillingLog] = None,
+        stderr_log: Optional[SpillingLog] = None,
+        queue_size: int = 1000,
+    ):
+        self.process = process
+        self.stdout_log = stdout_log or SpillingLog()
+        self.stderr_log = stderr_log or SpillingLog()
+        self.reader = EventReader()
+        self.lines: asyncio.Queue = asyncio.Queue(queue_size)
+        self.events: asyncio.Queue = asyncio.Queue(queue_size)
+        self.ready: asyncio.Future = asyncio.get_running_loop().create_future()
+
+        self._handlers: Dict[Any, Optional[EventHandler]] = {}
+        self._finished: Dict[Any, asyncio.Future] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._exited = False
+
+        # Counters, useful for logging and benchmarks
+        self.max_line_queue = 0
+        self.max_event_queue = 0
+        self.handler_errors = 0
+
+    def start(self) -> "AgentStreamPipeline":
+        self._tasks = [
+            asyncio.create_task(self._drain_stdout()),
+            asyncio.create_task(self._drain_stderr()),
+            asyncio.create_task(self._parse()),
+            asyncio.create_task(self._deliver()),
+        ]
+        return self
+
+    async def _drain_stdout(self):
+        try:
+            async for line in _lines(self.process.stdout):
+                self.stdout_log.append(line)
+                await self.lines.put(line)
+                self.max_line_queue = max(self.max_line_queue, self.lines.qsize())
+        finally:
+            await self.lines.put(None)
+
+    async def _drain_stderr(self):
+        async for line in _lines(self.process.stderr):
+            self.stderr_log.append(line)
+
+    async def _parse(self):
+        while True:
+            line = await self.lines.get()
+            if line is None:
+                break
+            try:
+                event = self.reader.feed(line)
+            except ProtocolError:
+                print(f"[agent daemon] {line}")
+                continue
+            if event is None:
+                continue
+            if isinstance(event, PhaseEvent) and event.state == "ready":
+                if not self.ready.done():
+                    self.ready.set_result(event)
+                continue
+            await self.events.put(event)
+            self.max_event_queue = max(self.max_event_queue, self.events.qsize())
+        await self.events.put(None)
+
+    async def _deliver(self):
+        while True:
+            event = await self.events.get()
+            try:
+                if event is None:
+                    self._on_exit()
+                    return
+                if isinstance(event, PhaseEvent) and event.state == "finished":
+                    future = self._finished.pop(event.command, None)
+                    self._handlers.pop(event.command, None)
+                    if future is not None and not future.done():
+                        future.set_result(event)
+                    continue
+                if event.type == "error" and event.command not in self._handlers:
+                    print(f"Agent daemon error: {event.message}")
+                    continue
+                handler = self._handlers.get(event.command)
+                if handler is not None:
+                    try:
+                        handler(event)
+                    except Exception as e:
+                        self.handler_errors += 1
+                        print(f"Failed to handle {event.type} event: {str(e)}")
+            finally:
+                self.events.task_done()
+
+    def _on_exit(self):
+        """The daemon's stdout closed: fail whoever is still waiting"""
+        self._exited = True
+        error = DaemonError("Agent daemon exited: " + "\n".join(self.stderr_log.tail(20)))
+        if not self.ready.done():
+            self.ready.set_exception(error)
+        for future in self._finished.values():
+            if not future.done():
+                future.set_exception(error)
+        self._finished.clear()
+
+    async def call(self, command_id: Any, frame: Dict[str, Any], on_event: Optional[EventHandler] = None) -> PhaseEvent:
+        """Send a command frame and wait for its finished event, with all earlier events delivered"""
+        if self._exited:
+            raise DaemonError("Agent daemon exited: " + "\n".join(self.stderr_log.tail(20)))
+        future = asyncio.get_running_loop().create_future()
+        self._finished[command_id] = future
+        self._handlers[command_id] = on_event
+
+        self.process.stdin.write(dumps(frame) + "\n")
+        await _call(self.process.stdin.drain)
+        return await future
+
+    async def send(self, frame: Dict[str, Any]):
+        """Write a frame that gets no reply (interrupt)"""
+        if self._exited:
+            return
+        self.process.stdin.write(dumps(frame) + "\n")
+        await _call(self.process.stdin.drain)
+
+    async def close(self, timeout: float = 10.0):
+        """Close stdin, let the stages finish, and flush the raw logs"""
+        try:
+            self.process.stdin.write_eof()
+            await _call(self.process.stdin.drain)
+        except Exception:
+            pass
+        try:
+            await asyncio.wait_for(asyncio.gather(*self._tasks, return_exceptions=True), timeout)
+        except asyncio.TimeoutError:
+            for task in self._tasks:
+                task.cancel()
+        self.stdout_log.close()
+        self.stderr_log.close()
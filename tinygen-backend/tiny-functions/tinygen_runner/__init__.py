@@ -0,0 +1,6 @@
+"""Agent runner baked into the sandbox image: runs one Claude Code SDK phase per invocation"""
+
+__version__ = "1.1.0"
+
+# Version of the JSON argument file the host writes
+ARGS_VERSION = 1
@@ -0,0 +1,38 @@
+"""python -m tinygen_runner <args.json | -> | --daemon | --index <out> [--previous <index>]"""
+import asyncio
+import sys
+import traceback
+
+from . import __version__
+from .events import EventWriter
+from .runner import load_args, run_phase
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "--version":
+        print(__version__)
+        return 0
+    if argv and argv[0] == "--daemon":
+        from .daemon import serve
+        return serve()
+    if argv and argv[0] == "--index" and len(argv) >= 2:
+        from .repo_index import main as build
+        return build(argv[1:])
+    if len(argv) != 1:
+        print("usage: python -m tinygen_runner <args.json | -> | --daemon | --index <out> [--previous <index>]", file=sys.stderr)
+        return 2
+
+    try:
+        args = load_args(argv[0])
+        writer = EventWriter(lambda frame: (sys.stdout.write(frame), sys.stdout.flush()))
+        asyncio.run(run_phase(args, writer))
+    except Exception:
+        # stdout carries event frames only; diagnostics go to stderr for the host
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""Long-lived agent process: one per sandbox, phase commands over stdin/stdout"""
+import asyncio
+import json
+import os
+import sys
+import traceback
+from typing import Any, Dict, Optional, Tuple
+
+from . import __version__
+from .events import ErrorEvent, EventWriter, PhaseEvent
+from .formatting import message_events
+from .runner import build_options, normalize_args
+
+# Daemon commands and the runner phase each one maps to
+COMMANDS = {"run": "main", "reflect": "reflection", "followup": "followup"}
+
+
+def client_options(args: Dict[str, Any]) -> Tuple:
+    """The phase arguments a connected SDK client is fixed to"""
+    return (
+        args["cwd"],
+        args["model"],
+        args["system_prompt"],
+        args["max_turns"],
+        tuple(args["allowed_tools"] or ()),
+    )
+
+
+class AgentDaemon:
+    """
+    Runs agent phases for the life of a sandbox. The SDK is imported once,
+    and each phase family keeps a connected ClaudeSDKClient, so the Claude
+    CLI process (and the files and context it has already read) stays warm:
+    a follow-up continues the main conversation in place, and a second
+    review reuses the reviewer's session. A phase whose options differ
+    from the ones its family's client was built with (model, tools, system
+    prompt, max turns, directory, or a different session to resume) gets a
+    new client, resuming the family's session where it can.
+
+    Commands arrive one JSON object per line on stdin:
+        {"id": 1, "command": "run" | "reflect" | "followup" | "ping" | "shutdown", "args": {...}}
+    and every event goes back as a protocol frame (see events.py) tagged
+    with the command id. Each command ends with a `phase` event whose state
+    is `finished`, carrying ok, session_id and error.
+
+    {"command": "interrupt"} is handled as soon as it is read, even while a
+    phase runs: the agent stops at its next turn boundary and the phase
+    finishes as usual. It has no reply.
+    """
+
+    def __init__(self, writer: EventWriter):
+        self.writer = writer
+        # Connected SDK clients: "agent" (main and follow-up) and "reflection"
+        self.clients: Dict[str, Any] = {}
+        # client_options() of each connected client
+        self.client_options: Dict[str, Tuple] = {}
+        # Latest SDK session id per client, reported back to the host
+        self.sessions: Dict[str, str] = {}
+        # Client family of the phase in progress, for interrupt()
+        self.active: Optional[str] = None
+        self.commands_handled = 0
+
+    def _finish(self, ok: bool, session_id: Optional[str] = None, error: Optional[str] = None):
+        self.writer.emit(PhaseEvent("finished", ok=ok, session_id=session_id, error=error))
+
+    async def handle(self, frame: Dict[str, Any]) -> bool:
+        """Run one command; returns False when the daemon should exit"""
+        command = frame.get("command")
+        self.writer.command = frame.get("id")
+        self.writer.phase = None
+
+        if command == "shutdown":
+            await self.close()
+            self._finish(True)
+            return False
+        if command == "ping":
+            self._finish(True)
+            return True
+
+        try:
+            if command not in COMMANDS:
+                raise ValueError(f"Unknown command '{command}'")
+            args = normalize_args({**frame.get("args", {}), "phase": COMMANDS[command]})
+            self.writer.phase = args["phase"]
+            session_id = await self.run_phase(args)
+            self._finish(True, session_id)
+        except Exception as e:
+            traceback.print_exc()
+            self._finish(False, error=str(e))
+        self.commands_handled += 1
+        return True
+
+    async def run_phase(self, args: Dict[str, Any]) -> Optional[str]:
+        from claude_code_sdk import ResultMessage
+
+        family = "reflection" if args["phase"] == "reflection" else "agent"
+        client = await self._client(family, args)
+
+        self.writer.emit(PhaseEvent("started"))
+        self.active = family
+        try:
+            await client.query(args["prompt"])
+            async for message in client.receive_response():
+                for event in message_events(message):
+                    self.writer.emit(event)
+                if isinstance(message, ResultMessage):
+                    self.sessions[family] = message.session_id
+        except Exception:
+            # The client may be mid-response; start a fresh one next time
+            await self._drop_client(family)
+            raise
+        finally:
+            self.active = None
+        return self.sessions.get(family)
+
+    async def interrupt(self):
+        """Stop the running phase after the current turn; a no-op between phases"""
+        client = self.clients.get(self.active) if self.active else None
+        if client is None:
+            return
+        try:
+            await client.interrupt()
+        except Exception:
+            traceback.print_exc()
+
+    async def _client(self, family: str, args: Dict[str, Any]):
+        options = client_options(args)
+        resume = args["resume_session_id"] if args["phase"] == "followup" else None
+        client = self.clients.get(family)
+        if client is not None:
+            if self.client_options.get(family) == options and resume in (None, self.sessions.get(family)):
+                return client
+            await self._drop_client(family)
+            if args["phase"] == "followup" and resume is None and self.sessions.get(family):
+                # Carry the conversation over to the new client
+                args = {**args, "resume_session_id": self.sessions[family]}
+
+        # Change to the repo directory BEFORE starting the CLI
+        os.chdir(args["cwd"])
+        from claude_code_sdk import ClaudeSDKClient
+
+        client = ClaudeSDKClient(build_options(args))
+        await client.connect()
+        self.clients[family] = client
+        self.client_options[family] = options
+        return client
+
+    async def _drop_client(self, family: str):
+        client = self.clients.pop(family, None)
+        self.client_options.pop(family, None)
+        if client is None:
+            return
+        try:
+            await client.disconnect()
+        except Exception:
+            traceback.print_exc()
+
+    async def close(self):
+        for family in list(self.clients):
+            await self._drop_client(family)
+
+
+def serve() -> int:
+    """Run the daemon on this process's stdin/stdout until shutdown or EOF"""
+    # Frames own stdout; anything else printed (SDK, tracebacks) goes to stderr
+    frames_out = os.fdopen(os.dup(sys.stdout.fileno()), "w", buffering=1)
+    sys.stdout = sys.stderr
+
+    def write(frame: str):
+        frames_out.write(frame)
+        frames_out.flush()
+
+    writer = EventWriter(write)
+
+    async def read(daemon: AgentDaemon, commands: asyncio.Queue):
+        # Reads ahead of the command being handled, so an interrupt gets
+        # through while a phase runs; everything else waits its turn
+        while True:
+            line = await asyncio.to_thread(sys.stdin.readline)
+            if not line:
+                await commands.put(None)
+                return
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                frame = json.loads(line)
+            except json.JSONDecodeError as e:
+                # Not part of the command that may be running
+                running, writer.command = writer.command, None
+                writer.emit(ErrorEvent(f"Bad command frame: {str(e)}"))
+                writer.command = running
+                continue
+            if frame.get("command") == "interrupt":
+                await daemon.interrupt()
+                continue
+            await commands.put(frame)
+
+    async def loop():
+        daemon = AgentDaemon(writer)
+        commands: asyncio.Queue = asyncio.Queue()
+        reader = asyncio.create_task(read(daemon, commands))
+        writer.emit(PhaseEvent("ready", version=__version__))
+        while True:
+            frame = await commands.get()
+            if frame is None:
+                await daemon.close()
+                return
+            if not await daemon.handle(frame):
+                reader.cancel()
+                return
+
+    asyncio.run(loop())
+    return 0
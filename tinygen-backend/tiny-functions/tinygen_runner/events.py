@@ -0,0 +1,248 @@
+"""
+Versioned event protocol between the runner and the host.
+
+Every event is one NDJSON frame: a compact JSON object on a single line
+(newlines inside model text are escaped, so a message is never split).
+Common keys are short: v (protocol version), t (event type), s (sequence
+number, strictly increasing per writer), c (daemon command id) and p
+(agent phase). The remaining keys are the event's own fields; fields that
+are None are left out.
+
+    {"v":1,"t":"text","s":7,"c":1,"p":"main","text":"Done.\nAll tests pass."}
+"""
+import json
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import orjson
+except ImportError:  # the stdlib encoder is fine, just slower
+    orjson = None
+
+PROTOCOL_VERSION = 1
+
+
+class ProtocolError(Exception):
+    pass
+
+
+if orjson is not None:
+    def dumps(obj: Dict[str, Any]) -> str:
+        return orjson.dumps(obj).decode()
+
+    loads = orjson.loads
+else:
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    dumps = _encoder.encode
+    loads = json.loads
+
+
+class Event:
+    """Base event: sequence number, daemon command id and phase"""
+
+    __slots__ = ("seq", "command", "phase")
+    type = ""
+    fields: tuple = ()
+
+    def __init__(self, seq: int = 0, command: Optional[int] = None, phase: Optional[str] = None):
+        self.seq = seq
+        self.command = command
+        self.phase = phase
+
+    def to_frame(self) -> Dict[str, Any]:
+        frame = {"v": PROTOCOL_VERSION, "t": self.type, "s": self.seq}
+        if self.command is not None:
+            frame["c"] = self.command
+        if self.phase is not None:
+            frame["p"] = self.phase
+        for name in self.fields:
+            value = getattr(self, name)
+            if value is not None:
+                frame[name] = value
+        return frame
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_frame()!r})"
+
+
+class TextEvent(Event):
+    __slots__ = ("text",)
+    type = "text"
+    fields = ("text",)
+
+    def __init__(self, text: str, **base):
+        super().__init__(**base)
+        self.text = text
+
+
+class ToolUseEvent(Event):
+    __slots__ = ("tool_id", "name", "input", "display")
+    type = "tool_use"
+    fields = ("tool_id", "name", "input", "display")
+
+    def __init__(self, tool_id: str, name: str, input: Dict[str, Any], display: Optional[Dict[str, Any]] = None, **base):
+        super().__init__(**base)
+        self.tool_id = tool_id
+        self.name = name
+        self.input = input
+        # Display-ready summary for the chat (description, icon, summary, previews)
+        self.display = display
+
+
+class ToolResultEvent(Event):
+    __slots__ = ("tool_id", "is_error", "content")
+    type = "tool_result"
+    fields = ("tool_id", "is_error", "content")
+
+    def __init__(self, tool_id: str, is_error: Optional[bool] = None, content: Optional[str] = None, **base):
+        super().__init__(**base)
+        self.tool_id = tool_id
+        self.is_error = is_error
+        self.content = content
+
+
+class PhaseEvent(Event):
+    """Lifecycle: state is ready (daemon up), started or finished"""
+
+    __slots__ = ("state", "ok", "session_id", "error", "version")
+    type = "phase"
+    fields = ("state", "ok", "session_id", "error", "version")
+
+    def __init__(
+        self,
+        state: str,
+        ok: Optional[bool] = None,
+        session_id: Optional[str] = None,
+        error: Optional[str] = None,
+        version: Optional[str] = None,
+        **base,
+    ):
+        super().__init__(**base)
+        self.state = state
+        self.ok = ok
+        self.session_id = session_id
+        self.error = error
+        # Runner version, sent with the ready event
+        self.version = version
+
+
+class UsageEvent(Event):
+    __slots__ = ("input_tokens", "output_tokens", "cache_read_tokens", "cost_usd", "duration_ms", "num_turns")
+    type = "usage"
+    fields = ("input_tokens", "output_tokens", "cache_read_tokens", "cost_usd", "duration_ms", "num_turns")
+
+    def __init__(
+        self,
+        input_tokens: Optional[int] = None,
+        output_tokens: Optional[int] = None,
+        cache_read_tokens: Optional[int] = None,
+        cost_usd: Optional[float] = None,
+        duration_ms: Optional[int] = None,
+        num_turns: Optional[int] = None,
+        **base,
+    ):
+        super().__init__(**base)
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.cache_read_tokens = cache_read_tokens
+        self.cost_usd = cost_usd
+        self.duration_ms = duration_ms
+        self.num_turns = num_turns
+
+
+class ErrorEvent(Event):
+    __slots__ = ("message", "fatal")
+    type = "error"
+    fields = ("message", "fatal")
+
+    def __init__(self, message: str, fatal: Optional[bool] = None, **base):
+        super().__init__(**base)
+        self.message = message
+        self.fatal = fatal
+
+
+EVENT_TYPES = {cls.type: cls for cls in (TextEvent, ToolUseEvent, ToolResultEvent, PhaseEvent, UsageEvent, ErrorEvent)}
+
+
+def encode(event: Event) -> str:
+    """One frame, including the trailing newline"""
+    return dumps(event.to_frame()) + "\n"
+
+
+def parse_frame(line) -> Optional[Dict[str, Any]]:
+    """The raw frame dict of a line, or None for a blank line"""
+    if not line or not line.strip():
+        return None
+    try:
+        frame = loads(line)
+    except ValueError as e:
+        raise ProtocolError(f"Not a frame: {str(line)[:200]!r}") from e
+    if not isinstance(frame, dict) or "t" not in frame:
+        raise ProtocolError(f"Not a frame: {str(line)[:200]!r}")
+    if frame.get("v", 0) > PROTOCOL_VERSION:
+        raise ProtocolError(f"Unsupported protocol version {frame.get('v')}, expected {PROTOCOL_VERSION}")
+    return frame
+
+
+def from_frame(frame: Dict[str, Any]) -> Optional[Event]:
+    """Build the event for a frame; None for types this version doesn't know"""
+    cls = EVENT_TYPES.get(frame["t"])
+    if cls is None:
+        return None
+    event = cls.__new__(cls)
+    event.seq = frame.get("s", 0)
+    event.command = frame.get("c")
+    event.phase = frame.get("p")
+    get = frame.get
+    for name in cls.fields:
+        setattr(event, name, get(name))
+    return event
+
+
+def decode(line) -> Optional[Event]:
+    """
+    Parse one frame. Returns None for blank lines and for event types this
+    version doesn't know (newer runners may add some); raises ProtocolError
+    for anything that isn't a frame or comes from a newer protocol version.
+    """
+    frame = parse_frame(line)
+    return None if frame is None else from_frame(frame)
+
+
+class EventWriter:
+    """Stamps events with sequence numbers and the current command/phase, and writes frames"""
+
+    def __init__(self, write: Callable[[str], Any]):
+        self.write = write
+        self.seq = 0
+        self.command: Optional[int] = None
+        self.phase: Optional[str] = None
+
+    def emit(self, event: Event) -> Event:
+        self.seq += 1
+        event.seq = self.seq
+        if event.command is None:
+            event.command = self.command
+        if event.phase is None:
+            event.phase = self.phase
+        self.write(encode(event))
+        return event
+
+
+class EventReader:
+    """Decodes frames in order and counts sequence gaps (lost or reordered frames)"""
+
+    def __init__(self):
+        self.last_seq = 0
+        self.gaps = 0
+        self.frames = 0
+
+    def feed(self, line) -> Optional[Event]:
+        frame = parse_frame(line)
+        if frame is None:
+            return None
+        self.frames += 1
+        seq = frame.get("s", 0)
+        if seq != self.last_seq + 1:
+            self.gaps += 1
+        self.last_seq = seq
+        return from_frame(frame)
@@ -0,0 +1,124 @@
+"""Turn Claude Code SDK messages into protocol events for the host"""
+from typing import Any, Dict, List, Optional
+
+from .events import Event, TextEvent, ToolResultEvent, ToolUseEvent, UsageEvent
+
+# Characters of tool output forwarded to the host per result
+TOOL_RESULT_LIMIT = 2000
+
+
+def _truncate(text: str, limit: int) -> str:
+    return text[:limit] + "..." if len(text) > limit else text
+
+
+def describe_tool_use(name: str, tool_id: str, tool_input: Dict[str, Any]) -> Dict[str, Any]:
+    """Structured, display-ready summary of a tool call"""
+    tool_data: Dict[str, Any] = {
+        "type": "tool_use",
+        "tool_name": name,
+        "tool_id": tool_id,
+        "status": "calling",
+        "input": {},
+    }
+
+    if name == "Read":
+        tool_data["description"] = "Read file"
+        tool_data["icon"] = "📖"
+        if "file_path" in tool_input:
+            tool_data["summary"] = tool_input["file_path"]
+
+    elif name == "Write":
+        tool_data["description"] = "Wrote file"
+        tool_data["icon"] = "✏️"
+        if "file_path" in tool_input:
+            tool_data["summary"] = tool_input["file_path"]
+        if "content" in tool_input:
+            content = tool_input["content"]
+            lines = content.count("\n") + 1
+            tool_data["input"]["content_preview"] = _truncate(content, 500)
+            tool_data["input"]["stats"] = f"{lines} lines, {len(content)} characters"
+
+    elif name == "Edit":
+        tool_data["description"] = "Edited file"
+        tool_data["icon"] = "📝"
+        if "file_path" in tool_input:
+            tool_data["summary"] = tool_input["file_path"]
+        if "old_string" in tool_input:
+            tool_data["input"]["old_string"] = _truncate(tool_input["old_string"], 50)
+        if "new_string" in tool_input:
+            tool_data["input"]["new_string"] = _truncate(tool_input["new_string"], 50)
+
+    elif name == "Bash":
+        tool_data["description"] = "Ran command"
+        tool_data["icon"] = "💻"
+        if "command" in tool_input:
+            tool_data["summary"] = tool_input["command"]
+
+    elif name == "Grep":
+        tool_data["description"] = "Searched files"
+        tool_data["icon"] = "🔍"
+        if "pattern" in tool_input:
+            tool_data["summary"] = "Pattern: " + tool_input["pattern"]
+        if "path" in tool_input:
+            tool_data["input"]["path"] = tool_input["path"]
+
+    elif name == "Glob":
+        tool_data["description"] = "Found files"
+        tool_data["icon"] = "🔍"
+        if "pattern" in tool_input:
+            tool_data["summary"] = tool_input["pattern"]
+
+    elif name == "LS":
+        tool_data["description"] = "Listed directory"
+        tool_data["icon"] = "📁"
+        if "path" in tool_input:
+            tool_data["summary"] = tool_input["path"]
+
+    else:
+        tool_data["description"] = "Using " + name
+        tool_data["icon"] = "🔧"
+        tool_data["summary"] = name
+        tool_data["input"] = tool_input
+
+    return tool_data
+
+
+def message_events(message) -> List[Event]:
+    """Protocol events for one claude-code-sdk message"""
+    from claude_code_sdk import AssistantMessage, ResultMessage, TextBlock, ToolResultBlock, ToolUseBlock, UserMessage
+
+    events: List[Event] = []
+    if isinstance(message, AssistantMessage):
+        for block in message.content:
+            if isinstance(block, TextBlock):
+                if block.text.strip():
+                    events.append(TextEvent(block.text))
+            elif isinstance(block, ToolUseBlock):
+                display = describe_tool_use(block.name, block.id, block.input)
+                events.append(ToolUseEvent(block.id, block.name, block.input, display))
+
+    elif isinstance(message, UserMessage) and isinstance(message.content, list):
+        for block in message.content:
+            if isinstance(block, ToolResultBlock):
+                events.append(ToolResultEvent(block.tool_use_id, block.is_error, _result_text(block.content)))
+
+    elif isinstance(message, ResultMessage):
+        usage = message.usage or {}
+        events.append(UsageEvent(
+            input_tokens=usage.get("input_tokens"),
+            output_tokens=usage.get("output_tokens"),
+            cache_read_tokens=usage.get("cache_read_input_tokens"),
+            cost_usd=message.total_cost_usd,
+            duration_ms=message.duration_ms,
+            num_turns=message.num_turns,
+        ))
+    return events
+
+
+def _result_text(content) -> Optional[str]:
+    """Tool output as text, capped so one huge result can't flood the stream"""
+    if content is None:
+        return None
+    if isinstance(content, list):
+        content = "\n".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return _truncate(str(content), TOOL_RESULT_LIMIT)
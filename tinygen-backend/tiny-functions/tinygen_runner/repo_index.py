@@ -0,0 +1,307 @@
+"""
+Repository context index: file tree, language breakdown, top-level symbols
+and a BM25 keyword index over the tracked files of a checkout.
+
+An index is a gzip JSON document for one commit:
+
+    {"version": 1, "sha": "...", "files": {path: {"lang", "lines", "bytes",
+     "symbols": [[kind, name, line], ...], "terms": {term: count}, "length"}}}
+
+Building from a previous commit's index only re-reads the files that
+changed between the two commits. Only the stdlib is used, so this runs in
+the sandbox (`python -m tinygen_runner --index`) and on the host alike.
+"""
+import gzip
+import json
+import math
+import os
+import re
+import subprocess
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+INDEX_VERSION = 1
+
+# Files larger than this are listed but not read
+MAX_FILE_BYTES = 512 * 1024
+# Distinct terms kept per file (the most frequent ones)
+MAX_TERMS_PER_FILE = 300
+MAX_SYMBOLS_PER_FILE = 200
+
+LANGUAGES = {
+    ".py": "Python", ".pyi": "Python",
+    ".js": "JavaScript", ".jsx": "JavaScript", ".mjs": "JavaScript", ".cjs": "JavaScript",
+    ".ts": "TypeScript", ".tsx": "TypeScript",
+    ".go": "Go", ".rs": "Rust", ".java": "Java", ".kt": "Kotlin", ".rb": "Ruby",
+    ".php": "PHP", ".cs": "C#", ".c": "C", ".h": "C", ".cc": "C++", ".cpp": "C++", ".hpp": "C++",
+    ".swift": "Swift", ".scala": "Scala", ".sh": "Shell", ".sql": "SQL",
+    ".html": "HTML", ".css": "CSS", ".scss": "CSS", ".vue": "Vue", ".svelte": "Svelte",
+    ".md": "Markdown", ".json": "JSON", ".yaml": "YAML", ".yml": "YAML", ".toml": "TOML",
+}
+
+_PY = [
+    (re.compile(r"^class\s+([A-Za-z_]\w*)"), "class"),
+    (re.compile(r"^(?:async\s+)?def\s+([A-Za-z_]\w*)"), "def"),
+]
+_JS = [
+    (re.compile(r"^export\s+(?:default\s+)?(?:async\s+)?(?:function\*?|class|const|let|var|interface|type|enum)\s+([A-Za-z_$][\w$]*)"), "export"),
+    (re.compile(r"^(?:async\s+)?function\*?\s+([A-Za-z_$][\w$]*)"), "function"),
+    (re.compile(r"^class\s+([A-Za-z_$][\w$]*)"), "class"),
+    (re.compile(r"^(?:interface|type|enum)\s+([A-Za-z_$][\w$]*)"), "type"),
+]
+SYMBOL_PATTERNS = {
+    "Python": _PY,
+    "JavaScript": _JS,
+    "TypeScript": _JS,
+    "Go": [
+        (re.compile(r"^func\s+(?:\([^)]*\)\s*)?([A-Za-z_]\w*)"), "func"),
+        (re.compile(r"^type\s+([A-Za-z_]\w*)"), "type"),
+    ],
+    "Rust": [
+        (re.compile(r"^(?:pub(?:\([^)]*\))?\s+)?(?:async\s+)?fn\s+([A-Za-z_]\w*)"), "fn"),
+        (re.compile(r"^(?:pub(?:\([^)]*\))?\s+)?(?:struct|enum|trait|mod|type)\s+([A-Za-z_]\w*)"), "type"),
+    ],
+    "Java": [(re.compile(r"^(?:public\s+|abstract\s+|final\s+)*(?:class|interface|enum|record)\s+([A-Za-z_]\w*)"), "class")],
+    "Kotlin": [(re.compile(r"^(?:(?:data|sealed|open|abstract)\s+)*(?:class|interface|object|fun)\s+([A-Za-z_]\w*)"), "def")],
+    "Ruby": [(re.compile(r"^(?:class|module|def)\s+([A-Za-z_][\w.]*)"), "def")],
+    "PHP": [(re.compile(r"^(?:abstract\s+|final\s+)?(?:class|interface|trait|function)\s+([A-Za-z_]\w*)"), "def")],
+}
+
+_WORD = re.compile(r"[A-Za-z][A-Za-z0-9]+")
+_CAMEL = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+STOPWORDS = frozenset(
+    "the and for with that this from are not but you your have has was were will can all any "
+    "self none true false null return import def class const let var function if else elif "
+    "then end new int str string bool void public private static final".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words, with identifiers also split on snake_case and camelCase"""
+    terms = []
+    for word in _WORD.findall(text):
+        lower = word.lower()
+        parts = [p.lower() for p in _CAMEL.findall(word)] if not word.islower() else lower.split("_")
+        for term in {lower, *parts}:
+            if len(term) > 2 and term not in STOPWORDS:
+                terms.append(term)
+    return terms
+
+
+def language_of(path: str) -> Optional[str]:
+    return LANGUAGES.get(os.path.splitext(path)[1].lower())
+
+
+def symbols_of(lang: Optional[str], text: str) -> List[List[Any]]:
+    """Top-level definitions: [kind, name, line] for lines that aren't indented"""
+    patterns = SYMBOL_PATTERNS.get(lang or "")
+    if not patterns:
+        return []
+    symbols = []
+    for number, line in enumerate(text.splitlines(), 1):
+        if not line or line[0] in " \t":
+            continue
+        for pattern, kind in patterns:
+            match = pattern.match(line)
+            if match:
+                symbols.append([kind, match.group(1), number])
+                break
+        if len(symbols) >= MAX_SYMBOLS_PER_FILE:
+            break
+    return symbols
+
+
+def index_file(root: str, path: str) -> Dict[str, Any]:
+    lang = language_of(path)
+    entry: Dict[str, Any] = {"lang": lang, "lines": 0, "bytes": 0, "symbols": [], "terms": {}, "length": 0}
+    full = os.path.join(root, path)
+    try:
+        size = os.path.getsize(full)
+    except OSError:
+        # Not checked out (sparse clone) or a broken symlink
+        return entry
+    entry["bytes"] = size
+    terms = Counter(tokenize(path.replace("/", " ")))
+    if size <= MAX_FILE_BYTES:
+        try:
+            with open(full, "rb") as f:
+                data = f.read()
+        except OSError:
+            data = b""
+        if b"\0" not in data[:8192]:
+            text = data.decode("utf-8", errors="replace")
+            entry["lines"] = text.count("\n") + (1 if text and not text.endswith("\n") else 0)
+            entry["symbols"] = symbols_of(lang, text)
+            terms.update(tokenize(text))
+            # Symbol names count extra: they are what a task usually refers to
+            for _, name, _ in entry["symbols"]:
+                terms.update(tokenize(name) * 3)
+    entry["length"] = sum(terms.values())
+    entry["terms"] = dict(terms.most_common(MAX_TERMS_PER_FILE))
+    return entry
+
+
+def _git(root: str, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(["git", "-C", root, *args], capture_output=True, text=True)
+
+
+def tracked_files(root: str) -> List[str]:
+    result = _git(root, "ls-files", "-z")
+    if result.returncode != 0:
+        raise RuntimeError(f"git ls-files failed: {result.stderr}")
+    return [path for path in result.stdout.split("\0") if path]
+
+
+def changed_files(root: str, since: str) -> Optional[Tuple[List[str], List[str]]]:
+    """(changed, deleted) paths between `since` and HEAD, or None if `since` isn't usable"""
+    if _git(root, "merge-base", "--is-ancestor", since, "HEAD").returncode != 0:
+        return None
+    result = _git(root, "diff", "--name-status", "--no-renames", "-z", since, "HEAD")
+    if result.returncode != 0:
+        return None
+    tokens = [t for t in result.stdout.split("\0") if t]
+    changed, deleted = [], []
+    for status, path in zip(tokens[::2], tokens[1::2]):
+        (deleted if status == "D" else changed).append(path)
+    return changed, deleted
+
+
+def build_index(root: str, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Index HEAD of the checkout at `root`. With the index of an ancestor
+    commit, only files changed since then are re-read; otherwise (or if the
+    ancestor isn't in this clone) every tracked file is.
+    """
+    sha = _git(root, "rev-parse", "HEAD").stdout.strip()
+    delta = None
+    if previous is not None and previous.get("version") == INDEX_VERSION and previous.get("sha"):
+        delta = changed_files(root, previous["sha"])
+
+    if delta is None:
+        files = {path: index_file(root, path) for path in tracked_files(root)}
+        return {"version": INDEX_VERSION, "sha": sha, "base": None, "reindexed": len(files), "files": files}
+
+    changed, deleted = delta
+    files = dict(previous["files"])
+    for path in deleted:
+        files.pop(path, None)
+    for path in changed:
+        files[path] = index_file(root, path)
+    return {"version": INDEX_VERSION, "sha": sha, "base": previous["sha"], "reindexed": len(changed), "files": files}
+
+
+def save_index(index: Dict[str, Any], path: str):
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(index, f, separators=(",", ":"))
+
+
+def load_index(path: str) -> Dict[str, Any]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class BM25:
+    """Okapi BM25 over the per-file term counts of an index"""
+
+    def __init__(self, files: Dict[str, Dict[str, Any]], k1: float = 1.2, b: float = 0.75):
+        self.files = files
+        self.k1 = k1
+        self.b = b
+        self.avg_length = (sum(f["length"] for f in files.values()) / len(files)) if files else 0
+        df: Counter = Counter()
+        for entry in files.values():
+            df.update(entry["terms"].keys())
+        count = len(files)
+        self.idf = {term: math.log(1 + (count - n + 0.5) / (n + 0.5)) for term, n in df.items()}
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, float]]:
+        terms = [t for t in set(tokenize(query)) if t in self.idf]
+        if not terms:
+            return []
+        scores = []
+        for path, entry in self.files.items():
+            tf = entry["terms"]
+            norm = self.k1 * (1 - self.b + self.b * entry["length"] / (self.avg_length or 1))
+            score = 0.0
+            for term in terms:
+                count = tf.get(term)
+                if count:
+                    score += self.idf[term] * count * (self.k1 + 1) / (count + norm)
+            if score > 0:
+                scores.append((path, score))
+        scores.sort(key=lambda item: -item[1])
+        return scores[:limit]
+
+
+def language_breakdown(files: Dict[str, Dict[str, Any]]) -> List[Tuple[str, int, int]]:
+    """(language, files, lines), largest first"""
+    totals: Dict[str, List[int]] = {}
+    for entry in files.values():
+        if entry["lang"]:
+            total = totals.setdefault(entry["lang"], [0, 0])
+            total[0] += 1
+            total[1] += entry["lines"]
+    return sorted(((lang, n, lines) for lang, (n, lines) in totals.items()), key=lambda item: -item[2])
+
+
+def tree_summary(files: Iterable[str], depth: int = 2, limit: int = 40) -> List[Tuple[str, int]]:
+    """Directories up to `depth` levels with their file counts, most files first"""
+    counts: Counter = Counter()
+    for path in files:
+        parts = path.split("/")[:-1]
+        for level in range(1, min(depth, len(parts)) + 1):
+            counts["/".join(parts[:level]) + "/"] += 1
+        if not parts:
+            counts["./"] += 1
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+def render_context(index: Dict[str, Any], prompt: str, budget: int = 6000, relevant: int = 12) -> str:
+    """The parts of the index most useful for `prompt`, as markdown of at most `budget` characters"""
+    files = index["files"]
+    if not files:
+        return ""
+    sections = [f"## Repository Overview (commit {index['sha'][:12]})\n\n{len(files)} tracked files."]
+
+    languages = language_breakdown(files)[:8]
+    if languages:
+        sections.append("### Languages\n" + "\n".join(f"- {lang}: {n} files, {lines} lines" for lang, n, lines in languages))
+
+    sections.append("### Layout\n" + "\n".join(f"- `{d}` ({n} files)" for d, n in tree_summary(files)))
+
+    matches = BM25(files).search(prompt, relevant)
+    if matches:
+        lines = []
+        for path, _ in matches:
+            symbols = files[path]["symbols"][:12]
+            names = ", ".join(f"{name} (L{line})" for _, name, line in symbols)
+            lines.append(f"- `{path}`" + (f": {names}" if names else ""))
+        sections.append("### Files Most Relevant to the Request\n" + "\n".join(lines))
+
+    text = ""
+    for section in sections:
+        if len(text) + len(section) + 2 > budget:
+            break
+        text += section + "\n\n"
+    return (
+        text
+        + "Use this overview to go straight to the relevant files instead of listing "
+        "and searching the whole repository first.\n"
+    )
+
+
+def main(argv: List[str]) -> int:
+    """python -m tinygen_runner --index <out.json.gz> [--previous <index.json.gz>] [--root <dir>]"""
+    out = argv[0]
+    options = dict(zip(argv[1::2], argv[2::2]))
+    root = options.get("--root", "/tmp/repo")
+    previous = None
+    if options.get("--previous") and os.path.exists(options["--previous"]):
+        try:
+            previous = load_index(options["--previous"])
+        except (OSError, ValueError):
+            previous = None
+    index = build_index(root, previous)
+    save_index(index, out)
+    print(json.dumps({"sha": index["sha"], "base": index["base"], "files": len(index["files"]), "reindexed": index["reindexed"]}))
+    return 0
@@ -0,0 +1,84 @@
+"""Run one agent phase (main, reflection or follow-up) from a JSON argument file"""
+import json
+import os
+import sys
+from typing import Any, Dict, Optional
+
+from . import ARGS_VERSION
+from .events import EventWriter, PhaseEvent
+from .formatting import message_events
+
+PHASES = ("main", "reflection", "followup")
+
+DEFAULT_MODEL = "claude-sonnet-4-20250514"
+DEFAULT_TOOLS = ["Read", "Write", "Edit", "Bash", "Grep", "Glob", "LS"]
+DEFAULT_MAX_TURNS = {"main": 50, "reflection": 20, "followup": 50}
+
+
+def load_args(path: str) -> Dict[str, Any]:
+    """Read the argument file ("-" for stdin) and fill in defaults"""
+    if path == "-":
+        args = json.load(sys.stdin)
+    else:
+        with open(path) as f:
+            args = json.load(f)
+    return normalize_args(args)
+
+
+def normalize_args(args: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate phase arguments and fill in defaults"""
+    version = args.get("version", ARGS_VERSION)
+    if version != ARGS_VERSION:
+        raise ValueError(f"Unsupported argument file version {version}, expected {ARGS_VERSION}")
+    phase = args.get("phase", "main")
+    if phase not in PHASES:
+        raise ValueError(f"Unknown phase '{phase}', expected one of {', '.join(PHASES)}")
+    for key in ("chat_id", "prompt"):
+        if not args.get(key):
+            raise ValueError(f"Missing '{key}' in phase arguments")
+
+    args["phase"] = phase
+    args.setdefault("cwd", "/tmp/repo")
+    args.setdefault("model", DEFAULT_MODEL)
+    args.setdefault("allowed_tools", DEFAULT_TOOLS)
+    args.setdefault("max_turns", DEFAULT_MAX_TURNS[phase])
+    args.setdefault("system_prompt", None)
+    args.setdefault("resume_session_id", None)
+    return args
+
+
+def build_options(args: Dict[str, Any]):
+    from claude_code_sdk import ClaudeCodeOptions
+
+    return ClaudeCodeOptions(
+        model=args["model"],
+        cwd=".",  # the runner has already chdir'd into the repo
+        permission_mode="acceptEdits",
+        system_prompt=args["system_prompt"],
+        max_turns=args["max_turns"],
+        allowed_tools=args["allowed_tools"],
+        # Follow-ups pick the conversation up where the previous run left it
+        resume=args["resume_session_id"] if args["phase"] == "followup" else None,
+    )
+
+
+async def run_phase(args: Dict[str, Any], writer: EventWriter) -> Optional[str]:
+    """Emit one phase's events (started, messages, usage, finished); returns the SDK session id"""
+    # Change to the repo directory BEFORE importing Claude SDK
+    os.chdir(args["cwd"])
+    from claude_code_sdk import query, ResultMessage
+
+    writer.phase = args["phase"]
+    writer.emit(PhaseEvent("started"))
+    session_id = None
+    try:
+        async for message in query(prompt=args["prompt"], options=build_options(args)):
+            for event in message_events(message):
+                writer.emit(event)
+            if isinstance(message, ResultMessage):
+                session_id = message.session_id
+    except Exception as e:
+        writer.emit(PhaseEvent("finished", ok=False, session_id=session_id, error=str(e)))
+        raise
+    writer.emit(PhaseEvent("finished", ok=True, session_id=session_id))
+    return session_id
@@ -1,11 +1,37 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import agents
+import asyncio
+import os
+import time
+from .routers import agents, diffs, github, metrics, runs, stream
+from .cancellation import get_canceller
+from .scheduler import get_scheduler
+from .services import services
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create clients and resolve Modal functions in the background so the
+    # first request doesn't pay for it; TINYGEN_WARM_START=0 keeps it all lazy
+    warm_up = None
+    if os.getenv("TINYGEN_WARM_START", "1") == "1":
+        warm_up = asyncio.create_task(services.warm_up(agents.AGENT_FUNCTIONS))
+    # Admission control for agent runs; loads the persisted queue on its first tick
+    scheduler = get_scheduler()
+    if scheduler is not None:
+        scheduler.start()
+    yield
+    if warm_up and not warm_up.done():
+        warm_up.cancel()
+    if scheduler is not None:
+        await scheduler.close()
+    await get_canceller().close()
+
 
 fastapi_client = FastAPI(
     title="TinyGen API",
+    lifespan=lifespan,
 )
 
 fastapi_client.add_middleware(
@@ -17,7 +43,32 @@ fastapi_client.add_middleware(
 )
 
 
+@fastapi_client.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # The route template, so /runs/{run_id} is one series
+    route = request.scope.get("route")
+    metrics.observe_request(request.method, getattr(route, "path", "unmatched"), response.status_code, time.perf_counter() - started)
+    return response
+
+
 fastapi_client.include_router(agents.router)
+fastapi_client.include_router(diffs.router)
+fastapi_client.include_router(github.router)
+fastapi_client.include_router(metrics.router)
+fastapi_client.include_router(runs.router)
+fastapi_client.include_router(stream.router)
+
+@fastapi_client.get("/health")
+def health():
+    """Liveness, the startup timing breakdown of clients and function handles, and the run queue"""
+    scheduler = get_scheduler()
+    return {
+        "status": "ok",
+        "timings": services.timings,
+        "scheduler": scheduler.depth() if scheduler is not None else None
+    }
 
 # @fastapi_client.get("/")
 # def read_root():
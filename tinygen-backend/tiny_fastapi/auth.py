@@ -0,0 +1,87 @@
+"""Supabase user authentication for the chat read routes"""
+import asyncio
+import os
+import threading
+from typing import Optional
+
+from fastapi import Depends, Header, HTTPException, Query
+
+from .chat_context import chat_contexts
+
+# Supabase issues access tokens for this audience to signed-in users
+AUDIENCE = "authenticated"
+
+_jwks_client = None
+_jwks_lock = threading.Lock()
+
+
+def _signing_key(token: str):
+    """
+    The key an access token was signed with: the project's JWT secret
+    (HS256) when SUPABASE_JWT_SECRET is set, otherwise the project's
+    published signing keys, fetched once and cached
+    """
+    global _jwks_client
+    secret = os.getenv("SUPABASE_JWT_SECRET")
+    if secret:
+        return secret, ["HS256"]
+    url = os.getenv("SUPABASE_URL")
+    if not url:
+        raise HTTPException(status_code=503, detail="Authentication not configured")
+    import jwt
+    with _jwks_lock:
+        if _jwks_client is None:
+            _jwks_client = jwt.PyJWKClient(f"{url.rstrip('/')}/auth/v1/.well-known/jwks.json")
+    return _jwks_client.get_signing_key_from_jwt(token).key, ["RS256", "ES256"]
+
+
+def verify_supabase_jwt(token: str) -> str:
+    """The user id (sub) of a valid Supabase access token; 401 otherwise"""
+    import jwt
+    try:
+        key, algorithms = _signing_key(token)
+        claims = jwt.decode(token, key, algorithms=algorithms, audience=AUDIENCE)
+    except jwt.PyJWTError as e:
+        raise HTTPException(status_code=401, detail=f"Invalid access token: {str(e)}")
+    if not claims.get("sub"):
+        raise HTTPException(status_code=401, detail="Access token has no subject")
+    return claims["sub"]
+
+
+def bearer_token(authorization: Optional[str]) -> Optional[str]:
+    scheme, _, token = (authorization or "").partition(" ")
+    return token.strip() if scheme.lower() == "bearer" and token.strip() else None
+
+
+async def current_user(
+    authorization: Optional[str] = Header(None),
+    access_token: Optional[str] = Query(None),
+) -> str:
+    """
+    Dependency: the caller's user id, from a valid Supabase access token in
+    the Authorization header, or the access_token query parameter for
+    EventSource, which can't set headers.
+    """
+    token = bearer_token(authorization) or access_token
+    if not token:
+        raise HTTPException(status_code=401, detail="Missing access token")
+    # JWKS fetches block; keep them off the event loop
+    return await asyncio.to_thread(verify_supabase_jwt, token)
+
+
+async def owns_chat(user_id: str, chat_id: Optional[str]) -> bool:
+    if not chat_id:
+        return False
+    context = await chat_contexts.get(chat_id)
+    return context is not None and str(context.get("user_id")) == user_id
+
+
+async def chat_owner(chat_id: str, user_id: str = Depends(current_user)) -> str:
+    """
+    Dependency for routes under /chats/{chat_id}: the caller's user id, if
+    they own the chat
+    """
+    # Same answer for someone else's chat as for a missing one
+    if not await owns_chat(user_id, chat_id):
+        raise HTTPException(status_code=404, detail="Chat not found")
+    return user_id
@@ -0,0 +1,149 @@
+"""Cancelling dispatched runs: ask the runner to stop, and make sure it does"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .scheduler import TERMINAL_STATUSES
+
+
+class RunCanceller:
+    """
+    Stops runs that are already executing. cancel() flags the run for its
+    runner, which interrupts the agent at its next turn boundary, terminates
+    the sandbox and records the run as cancelled with the transcript so far.
+
+    A background task then waits up to `grace` seconds for the run to reach
+    a terminal status. A runner that doesn't get there in time (stuck in a
+    long sandbox command, or already gone) is stopped from outside: `force`
+    cancels its Modal call and terminates its sandbox, and the run is marked
+    cancelled. Either way `release` is called as soon as the run is over, so
+    its scheduler slot is free within seconds.
+    """
+
+    def __init__(
+        self,
+        signal: Callable[[str], Awaitable[None]],
+        status: Callable[[str], Awaitable[Optional[str]]],
+        force: Callable[[Dict[str, Any]], Awaitable[None]],
+        release: Callable[[str, str], Awaitable[None]],
+        grace: float = 15.0,
+        poll_interval: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.signal = signal
+        self.status = status
+        self.force = force
+        self.release = release
+        self.grace = grace
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+        # Counters, useful for logging and benchmarks
+        self.requested = 0
+        self.stopped = 0
+        self.forced = 0
+
+    def pending(self, run_id: str) -> bool:
+        return run_id in self._tasks
+
+    async def cancel(self, run: Dict[str, Any]):
+        """Ask a runs row's runner to stop; returns once the request is recorded"""
+        run_id = run["id"]
+        await self.signal(run_id)
+        self.requested += 1
+        if run_id not in self._tasks:
+            task = asyncio.create_task(self._enforce(run))
+            self._tasks[run_id] = task
+            task.add_done_callback(lambda _: self._tasks.pop(run_id, None))
+
+    async def _enforce(self, run: Dict[str, Any]):
+        run_id = run["id"]
+        deadline = self.clock() + self.grace
+        try:
+            while self.clock() < deadline:
+                await asyncio.sleep(self.poll_interval)
+                status = await self.status(run_id)
+                if status in TERMINAL_STATUSES:
+                    self.stopped += 1
+                    await self.release(run_id, status)
+                    return
+            print(f"Run {run_id} did not stop within {self.grace:.0f}s of its cancel request; stopping it")
+            self.forced += 1
+            await self.force(run)
+            await self.release(run_id, "cancelled")
+        except Exception as e:
+            print(f"Failed to cancel run {run_id}: {str(e)}")
+
+    async def close(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+
+_cancel_store = None
+
+
+def _store():
+    global _cancel_store
+    if _cancel_store is None:
+        from modal import Dict as ModalDict
+        from config import RUN_CANCEL_DICT
+        _cancel_store = ModalDict.from_name(RUN_CANCEL_DICT, create_if_missing=True)
+    return _cancel_store
+
+
+async def _signal(run_id: str):
+    await asyncio.to_thread(lambda: _store().put(run_id, time.time()))
+
+
+async def _run_state(run_id: str) -> Optional[str]:
+    from .routers.runs import get_run_state
+    return await asyncio.to_thread(get_run_state, run_id)
+
+
+def _stop(run: Dict[str, Any]):
+    from modal import FunctionCall, Sandbox
+    from .routers.runs import mark_cancelled
+
+    if run.get("function_call_id"):
+        try:
+            FunctionCall.from_id(run["function_call_id"]).cancel(terminate_containers=True)
+        except Exception as e:
+            print(f"Failed to cancel call {run['function_call_id']}: {str(e)}")
+    if run.get("sandbox_id"):
+        try:
+            Sandbox.from_id(run["sandbox_id"]).terminate()
+        except Exception as e:
+            print(f"Failed to terminate sandbox {run['sandbox_id']}: {str(e)}")
+    try:
+        _store().pop(run["id"], None)
+    except Exception:
+        pass
+    mark_cancelled(run["id"])
+
+
+async def _force(run: Dict[str, Any]):
+    from .routers.runs import get_cancel_target
+    # Re-read: the runner may have leased its sandbox after the cancel request
+    target = await asyncio.to_thread(get_cancel_target, run["id"])
+    await asyncio.to_thread(_stop, target or run)
+
+
+async def _release(run_id: str, status: str):
+    from .scheduler import get_scheduler
+    scheduler = get_scheduler()
+    if scheduler is not None:
+        await scheduler.finished(run_id, status)
+
+
+_canceller: Optional[RunCanceller] = None
+
+
+def get_canceller() -> RunCanceller:
+    """Process-wide canceller for POST /runs/{id}/cancel"""
+    global _canceller
+    if _canceller is None:
+        from config import RUN_CANCEL_GRACE
+        _canceller = RunCanceller(_signal, _run_state, _force, _release, grace=RUN_CANCEL_GRACE)
+    return _canceller
@@ -0,0 +1,122 @@
+"""Async, cached lookup of the chat and owner details a follow-up run needs"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .services import services
+
+ChatContext = Dict[str, Any]
+
+
+async def fetch_chat_context(chat_id: str) -> Optional[ChatContext]:
+    """Chat row and owner's github_username in one round trip (get_chat_context RPC)"""
+    supabase = await services.async_supabase()
+    if not supabase:
+        raise RuntimeError("Supabase client not initialized")
+    result = await supabase.rpc("get_chat_context", {"p_chat_id": chat_id}).execute()
+    rows = result.data or []
+    return rows[0] if rows else None
+
+
+class ChatContextCache:
+    """
+    Read-through cache of chat context with a short TTL. Concurrent misses
+    for the same chat share one fetch. invalidate() is called when a Modal
+    function reports that it updated the chat, and run_finished() whenever
+    the API sees one of the chat's runs end (its terminal status event, a
+    run status read, the scheduler's reconcile), so a follow-up started
+    right after a run finishes sees the new snapshot and branch even if the
+    chat_updated event was lost; the TTL bounds staleness beyond that.
+    Chats that aren't found are not cached.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Awaitable[Optional[ChatContext]]] = fetch_chat_context,
+        ttl: float = 30.0,
+        max_entries: int = 10000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries: Dict[str, Tuple[float, ChatContext]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Bumped on invalidation so a fetch that started earlier isn't stored
+        self._generations: Dict[str, int] = {}
+        # Runs already reported finished, so polling a finished run doesn't
+        # keep emptying its chat's entry
+        self._finished_runs: "OrderedDict[str, None]" = OrderedDict()
+
+        # Counters, useful for logging and benchmarks
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+
+    async def get(self, chat_id: str) -> Optional[ChatContext]:
+        entry = self._entries.get(chat_id)
+        if entry is not None and self.clock() - entry[0] < self.ttl:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        inflight = self._inflight.get(chat_id)
+        if inflight is not None:
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # The task fetching it was cancelled, not this one: fetch again
+                return await self.get(chat_id)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[chat_id] = future
+        generation = self._generations.get(chat_id, 0)
+        try:
+            self.fetches += 1
+            context = await self.fetch(chat_id)
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters get the error; mark it retrieved for the no-waiter case
+            future.exception()
+            raise
+        except BaseException:
+            # Cancelled (or worse): release the waiters instead of leaving them hanging
+            future.cancel()
+            raise
+        finally:
+            self._inflight.pop(chat_id, None)
+
+        if context is not None and self._generations.get(chat_id, 0) == generation:
+            if len(self._entries) >= self.max_entries:
+                self._evict()
+            self._entries[chat_id] = (self.clock(), context)
+        future.set_result(context)
+        return context
+
+    def invalidate(self, chat_id: str):
+        self._entries.pop(chat_id, None)
+        self._generations[chat_id] = self._generations.get(chat_id, 0) + 1
+
+    def run_finished(self, chat_id: Optional[str], run_id: str):
+        """One of the chat's runs is over, so its writes to the chat are done; drops the entry once per run"""
+        if not chat_id or run_id in self._finished_runs:
+            return
+        self._finished_runs[run_id] = None
+        if len(self._finished_runs) > self.max_entries:
+            self._finished_runs.popitem(last=False)
+        self.invalidate(chat_id)
+
+    def _evict(self):
+        now = self.clock()
+        expired = [chat_id for chat_id, (stored_at, _) in self._entries.items() if now - stored_at >= self.ttl]
+        for chat_id in expired or list(self._entries)[: len(self._entries) // 2]:
+            del self._entries[chat_id]
+        # Generations only matter while a fetch is in flight
+        self._generations = {chat_id: gen for chat_id, gen in self._generations.items() if chat_id in self._inflight}
+
+
+chat_contexts = ChatContextCache()
@@ -0,0 +1,153 @@
+"""Idempotency keys and duplicate-run suppression for the endpoints that start runs"""
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# Longest Idempotency-Key header accepted
+MAX_KEY_LENGTH = 255
+
+# A run with one of these statuses is never handed out again for an
+# Idempotency-Key: repeating the request starts a new run
+NOT_REUSABLE = ("failed", "cancelled")
+
+# Without a key, only a run still in progress absorbs a repeat: the same
+# prompt sent again after its run finished is a new request
+IN_PROGRESS = ("queued", "running")
+
+
+class IdempotencyError(Exception):
+    """The key is malformed, or was already used for a different request"""
+
+
+def request_fingerprint(kind: str, body: Dict[str, Any]) -> str:
+    """
+    Hash of the client's request body, to recognise a repeated request.
+    Only what the client sent: values the server looks up (the chat's
+    snapshot, branch or session) change between retries of one request.
+    """
+    payload = json.dumps({"kind": kind, **body}, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class RunDeduplicator:
+    """
+    Returns the existing run for a repeated request instead of starting
+    another one.
+
+    With an Idempotency-Key the key names the request for `window`
+    seconds; reusing it for a different request is an error. Without one,
+    the request's fingerprint is used as the key for `duplicate_window`
+    seconds, which catches double clicks and client retries while the first
+    run is queued or running. Failed and cancelled runs are never reused.
+
+    Requests with the same key are serialized, so concurrent duplicates
+    start one run between them. Keys seen by this process are answered from
+    memory; after a restart, `find(kind, key, since)` looks them up in the
+    runs table until the windows have passed.
+    """
+
+    def __init__(
+        self,
+        find: Callable[[str, str, float], Awaitable[Optional[Dict[str, Any]]]],
+        status: Callable[[str], Awaitable[Optional[str]]],
+        window: float = 86400.0,
+        duplicate_window: float = 300.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.find = find
+        self.status = status
+        self.window = window
+        self.duplicate_window = duplicate_window
+        self.clock = clock
+        self.started_at = clock()
+        # (kind, key) -> (created_at, run_id, fingerprint)
+        self._recent: Dict[Tuple[str, str], Tuple[float, str, str]] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+
+        # Counters, useful for logging and benchmarks
+        self.reused = 0
+        self.created = 0
+
+    async def run_once(
+        self,
+        kind: str,
+        key: Optional[str],
+        fingerprint: str,
+        create: Callable[[str], Awaitable[str]],
+    ) -> Tuple[str, bool]:
+        """
+        The run for this request: (run_id, True) for an existing one, or
+        (create(stored_key), False) after starting a new one. `stored_key`
+        is what the run should be saved with for later lookups.
+        """
+        if key is not None and not 0 < len(key) <= MAX_KEY_LENGTH:
+            raise IdempotencyError(f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+        stored_key = key if key is not None else f"auto:{fingerprint}"
+        window = self.window if key is not None else self.duplicate_window
+        scope = (kind, stored_key)
+
+        async with self._locks.setdefault(scope, asyncio.Lock()):
+            existing = await self._existing(scope, window, key is not None)
+            if existing is not None:
+                run_id, existing_fingerprint = existing
+                if existing_fingerprint and existing_fingerprint != fingerprint:
+                    raise IdempotencyError("Idempotency-Key was already used for a different request")
+                self.reused += 1
+                return run_id, True
+
+            run_id = await create(stored_key)
+            self.created += 1
+            self._prune()
+            self._recent[scope] = (self.clock(), run_id, fingerprint)
+            return run_id, False
+
+    @staticmethod
+    def _reusable(status: Optional[str], keyed: bool) -> bool:
+        return status not in NOT_REUSABLE if keyed else status in IN_PROGRESS
+
+    async def _existing(self, scope: Tuple[str, str], window: float, keyed: bool) -> Optional[Tuple[str, str]]:
+        """(run_id, fingerprint) of a reusable run for the key, or None"""
+        now = self.clock()
+        recent = self._recent.get(scope)
+        if recent is not None and now - recent[0] < window:
+            created_at, run_id, fingerprint = recent
+            if not self._reusable(await self.status(run_id), keyed):
+                return None
+            return run_id, fingerprint
+        if now - self.started_at >= window:
+            # Anything within the window was created by this process and would be in memory
+            return None
+        row = await self.find(scope[0], scope[1], now - window)
+        if row is None or not self._reusable(row.get("status"), keyed):
+            return None
+        return row["id"], row.get("request_fingerprint")
+
+    def _prune(self):
+        now = self.clock()
+        longest = max(self.window, self.duplicate_window)
+        self._recent = {scope: entry for scope, entry in self._recent.items() if now - entry[0] < longest}
+        self._locks = {scope: lock for scope, lock in self._locks.items() if lock.locked() or scope in self._recent}
+
+
+async def _find_run(kind: str, key: str, since: float) -> Optional[Dict[str, Any]]:
+    from .routers.runs import find_run_by_key
+    return await asyncio.to_thread(find_run_by_key, kind, key, since)
+
+
+async def _run_state(run_id: str) -> Optional[str]:
+    from .routers.runs import get_run_state
+    return await asyncio.to_thread(get_run_state, run_id)
+
+
+_deduplicator: Optional[RunDeduplicator] = None
+
+
+def get_deduplicator() -> RunDeduplicator:
+    """Process-wide deduplicator for the run endpoints"""
+    global _deduplicator
+    if _deduplicator is None:
+        from config import IDEMPOTENCY_WINDOW, DUPLICATE_RUN_WINDOW
+        _deduplicator = RunDeduplicator(_find_run, _run_state, IDEMPOTENCY_WINDOW, DUPLICATE_RUN_WINDOW)
+    return _deduplicator
@@ -0,0 +1,87 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import Response
+from pydantic import BaseModel
+import gzip
+import threading
+import time
+from typing import Dict, List, Optional
+from ..auth import chat_owner
+
+router = APIRouter()
+
+DIFF_VOLUME = "tinygen-diff-artifacts"
+
+class DiffFile(BaseModel):
+    index: int
+    path: str
+    old_path: Optional[str] = None
+    added: int
+    deleted: int
+    binary: bool
+    patch_bytes: Optional[int] = None
+
+class DiffManifest(BaseModel):
+    id: str
+    base: str
+    tree: str
+    files: List[DiffFile]
+    totals: Dict[str, int]
+    diffstat: str
+
+_store = None
+_store_lock = threading.Lock()
+_last_reload = 0.0
+
+def _reload_volume():
+    # A missing artifact may have been committed since this container last
+    # looked; reload at most once every couple of seconds
+    global _last_reload
+    if time.monotonic() - _last_reload < 2:
+        return
+    _last_reload = time.monotonic()
+    try:
+        from modal import Volume
+        Volume.from_name(DIFF_VOLUME).reload()
+    except Exception as e:
+        print(f"Failed to reload diff artifacts: {str(e)}")
+
+def get_diff_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            from config import DIFF_ARTIFACT_ROOT
+            from diff_artifacts import DiffArtifactStore
+            _store = DiffArtifactStore(DIFF_ARTIFACT_ROOT, reload=_reload_volume)
+        return _store
+
+def _read(read, *args):
+    try:
+        return read(*args)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/chats/{chat_id}/diffs/{artifact_id}", response_model=DiffManifest, dependencies=[Depends(chat_owner)])
+def get_diff(chat_id: str, artifact_id: str):
+    """
+    Numstat and diffstat of a stored diff, for the chat's owner. Chat
+    messages with `is_diff` carry the artifact id in metadata.diff_artifact.id.
+    """
+    manifest = _read(get_diff_store().read_manifest, chat_id, artifact_id)
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="Diff not found")
+    return DiffManifest(**manifest)
+
+@router.get("/chats/{chat_id}/diffs/{artifact_id}/files/{index}", dependencies=[Depends(chat_owner)])
+def get_diff_file(chat_id: str, artifact_id: str, index: int, accept_encoding: Optional[str] = Header(None)):
+    """
+    Patch of one file of a stored diff, as text/x-diff. Sent compressed
+    as stored when the client accepts gzip.
+    """
+    patch = _read(get_diff_store().read_patch, chat_id, artifact_id, index)
+    if patch is None:
+        raise HTTPException(status_code=404, detail="Diff file not found")
+    headers = {"Cache-Control": "private, max-age=86400, immutable"}
+    if "gzip" in (accept_encoding or ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(patch, media_type="text/x-diff; charset=utf-8", headers=headers)
+    return Response(gzip.decompress(patch), media_type="text/x-diff; charset=utf-8", headers=headers)
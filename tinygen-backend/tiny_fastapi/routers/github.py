@@ -0,0 +1,35 @@
+from fastapi import APIRouter, HTTPException, Request
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+
+router = APIRouter()
+
+def verify_signature(body: bytes, signature: str, secret: str) -> bool:
+    """Check GitHub's X-Hub-Signature-256 header against the webhook secret"""
+    expected = "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature or "")
+
+@router.post("/github/webhook")
+async def github_webhook(request: Request):
+    """
+    Receive GitHub App webhooks and keep the installation index current
+    between full rebuilds.
+    """
+    body = await request.body()
+    
+    secret = os.getenv("GITHUB_WEBHOOK_SECRET")
+    if not secret:
+        raise HTTPException(status_code=503, detail="Webhook secret not configured")
+    if not verify_signature(body, request.headers.get("X-Hub-Signature-256", ""), secret):
+        raise HTTPException(status_code=401, detail="Invalid signature")
+    
+    event = request.headers.get("X-GitHub-Event", "")
+    payload = json.loads(body or b"{}")
+    
+    from installation_index import get_installation_index
+    updated = await asyncio.to_thread(get_installation_index().apply_webhook, event, payload)
+    
+    return {"ok": True, "event": event, "index_updated": updated}
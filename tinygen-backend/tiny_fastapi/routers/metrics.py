@@ -0,0 +1,70 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+from ..scheduler import get_scheduler
+
+router = APIRouter()
+
+# Request latency buckets (seconds); SSE streams count until their headers are sent
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_request_metrics = None
+# (read at, totals) of the counters published by the Modal functions
+_shared: Optional[Tuple[float, Dict[Tuple[str, str], float]]] = None
+
+
+def get_request_metrics():
+    """In-process metrics of this API container"""
+    global _request_metrics
+    if _request_metrics is None:
+        from metrics import Metrics
+        _request_metrics = Metrics()
+    return _request_metrics
+
+
+def observe_request(method: str, route: str, status: int, seconds: float):
+    get_request_metrics().observe(
+        "http_request_duration_seconds", seconds, buckets=LATENCY_BUCKETS,
+        method=method, route=route, status=str(status)
+    )
+
+
+def _read_shared() -> Dict[Tuple[str, str], float]:
+    from modal import Dict as ModalDict
+    from metrics import read_counters
+    from config import METRICS_DICT
+    return read_counters(ModalDict.from_name(METRICS_DICT, create_if_missing=True))
+
+
+async def shared_totals() -> Dict[Tuple[str, str], float]:
+    """Counters summed across the Modal functions' containers, re-read at most every SHARED_METRICS_TTL seconds"""
+    global _shared
+    from config import SHARED_METRICS_TTL
+    if _shared is None or time.monotonic() - _shared[0] >= SHARED_METRICS_TTL:
+        try:
+            _shared = (time.monotonic(), await asyncio.to_thread(_read_shared))
+        except Exception as e:
+            print(f"Failed to read shared metrics: {str(e)}")
+            if _shared is None:
+                return {}
+    return _shared[1]
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus metrics: request latency per route, the run queue's depth,
+    and what the Modal functions publish (run phase timings, sandbox pool
+    and snapshot counters)
+    """
+    from metrics import render_prometheus
+
+    totals = {**(await shared_totals()), **get_request_metrics().totals()}
+    gauges = {}
+    scheduler = get_scheduler()
+    if scheduler is not None:
+        for name, value in scheduler.depth().items():
+            gauges[(f"scheduler_{name}", "")] = value
+    return PlainTextResponse(render_prometheus(totals, gauges), media_type="text/plain; version=0.0.4")
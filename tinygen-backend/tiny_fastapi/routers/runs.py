@@ -0,0 +1,226 @@
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from ..auth import current_user, owns_chat
+from ..cancellation import get_canceller
+from ..chat_context import chat_contexts
+from ..scheduler import get_scheduler, TERMINAL_STATUSES
+from ..services import services
+
+router = APIRouter()
+
+RUN_COLUMNS = "id, chat_id, kind, status, phase, progress, result, error, created_at, updated_at, started_at, finished_at, cancel_requested_at"
+
+class RunStatus(BaseModel):
+    id: str
+    chat_id: Optional[str] = None
+    kind: str
+    status: str
+    phase: Optional[str] = None
+    progress: float = 0
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    # Set by POST /runs/{id}/cancel while the run is being stopped
+    cancel_requested_at: Optional[str] = None
+    # While queued by the scheduler: 1 = next to start, and the expected
+    # seconds until it does (None when it can't be estimated yet)
+    queue_position: Optional[int] = None
+    estimated_wait_seconds: Optional[float] = None
+
+class RunTiming(BaseModel):
+    phase: str
+    function: Optional[str] = None
+    started_at: str
+    seconds: float
+
+def _client():
+    # Service-role client: the runs table is written on behalf of users
+    client = services.service_supabase
+    if not client:
+        raise RuntimeError("Supabase service client not initialized")
+    return client
+
+def create_run(
+    kind: str,
+    chat_id: Optional[str],
+    params: Dict[str, Any],
+    idempotency_key: Optional[str] = None,
+    request_fingerprint: Optional[str] = None
+) -> str:
+    """Insert a queued run and return its id"""
+    result = _client().table('runs').insert({
+        'kind': kind,
+        'chat_id': chat_id,
+        'status': 'queued',
+        'params': params,
+        'idempotency_key': idempotency_key,
+        'request_fingerprint': request_fingerprint
+    }).execute()
+    return result.data[0]['id']
+
+def find_run_by_key(kind: str, idempotency_key: str, since: float) -> Optional[Dict[str, Any]]:
+    """Latest run of a kind started with this idempotency key since `since` (epoch seconds)"""
+    result = (
+        _client().table('runs')
+        .select('id, status, request_fingerprint')
+        .eq('kind', kind)
+        .eq('idempotency_key', idempotency_key)
+        .gte('created_at', datetime.fromtimestamp(since, timezone.utc).isoformat())
+        .order('created_at', desc=True)
+        .limit(1)
+        .execute()
+    )
+    rows = result.data or []
+    return rows[0] if rows else None
+
+def get_run_state(run_id: str) -> Optional[str]:
+    result = _client().table('runs').select('status').eq('id', run_id).execute()
+    rows = result.data or []
+    return rows[0]['status'] if rows else None
+
+def attach_call(run_id: str, function_call_id: str):
+    """Remember the Modal call backing a run (for cancellation and debugging)"""
+    _client().table('runs').update({
+        'function_call_id': function_call_id
+    }).eq('id', run_id).execute()
+
+def fail_run(run_id: str, error: str):
+    now = datetime.now(timezone.utc).isoformat()
+    _client().table('runs').update({
+        'status': 'failed',
+        'error': error,
+        'updated_at': now,
+        'finished_at': now
+    }).eq('id', run_id).execute()
+
+def request_cancel(run_id: str):
+    _client().table('runs').update({
+        'cancel_requested_at': datetime.now(timezone.utc).isoformat()
+    }).eq('id', run_id).execute()
+
+def mark_cancelled(run_id: str):
+    """Record a run stopped from outside its runner; a run that has already finished keeps its outcome"""
+    now = datetime.now(timezone.utc).isoformat()
+    (
+        _client().table('runs')
+        .update({'status': 'cancelled', 'error': 'Cancelled', 'updated_at': now, 'finished_at': now})
+        .eq('id', run_id)
+        .in_('status', ['queued', 'running'])
+        .execute()
+    )
+
+def get_cancel_target(run_id: str) -> Optional[Dict[str, Any]]:
+    """What has to be stopped to cancel a run: its Modal call and its sandbox"""
+    result = _client().table('runs').select('id, function_call_id, sandbox_id').eq('id', run_id).execute()
+    rows = result.data or []
+    return rows[0] if rows else None
+
+def get_runs(run_ids: List[str]) -> List[Dict[str, Any]]:
+    result = _client().table('runs').select(RUN_COLUMNS).in_('id', run_ids).execute()
+    rows = result.data or []
+    # Finished runs have written their chat; don't serve its old context
+    for row in rows:
+        if row['status'] in TERMINAL_STATUSES:
+            chat_contexts.run_finished(row.get('chat_id'), row['id'])
+    return rows
+
+def get_run_timings(run_id: str) -> List[Dict[str, Any]]:
+    result = (
+        _client().table('run_timings')
+        .select('phase, function, started_at, seconds')
+        .eq('run_id', run_id)
+        .order('started_at')
+        .execute()
+    )
+    return result.data or []
+
+def run_status(row: Dict[str, Any]) -> RunStatus:
+    """A runs row, plus its place in the scheduler's queue while it waits"""
+    scheduler = get_scheduler()
+    queue = scheduler.status(row['id']) if scheduler is not None and row['status'] == 'queued' else None
+    if queue is None:
+        return RunStatus(**row)
+    return RunStatus(
+        **row,
+        queue_position=queue['queue_position'],
+        estimated_wait_seconds=queue['estimated_wait_seconds']
+    )
+
+async def owned_runs(run_ids: List[str], user_id: str) -> List[Dict[str, Any]]:
+    """The runs among `run_ids` that belong to one of the user's chats"""
+    rows = await asyncio.to_thread(get_runs, run_ids)
+    return [row for row in rows if await owns_chat(user_id, row.get('chat_id'))]
+
+async def owned_run(run_id: str, user_id: str) -> Dict[str, Any]:
+    rows = await owned_runs([run_id], user_id)
+    # Someone else's run looks the same as a missing one
+    if not rows:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return rows[0]
+
+@router.get("/runs/{run_id}", response_model=RunStatus)
+async def get_run_status(run_id: str, user_id: str = Depends(current_user)):
+    """
+    Phase, progress and result of a background run. A run still waiting
+    for capacity also has its queue position and estimated wait.
+    """
+    return run_status(await owned_run(run_id, user_id))
+
+@router.get("/runs/{run_id}/timings", response_model=List[RunTiming])
+async def get_run_timing(run_id: str, user_id: str = Depends(current_user)):
+    """
+    Where a finished run's time went: one entry per timed step (token,
+    sandbox, gh_auth, fork, clone, index, agent, reflection, commit, push,
+    pr_create, snapshot) in the order they started
+    """
+    await owned_run(run_id, user_id)
+    return await asyncio.to_thread(get_run_timings, run_id)
+
+@router.get("/runs", response_model=List[RunStatus])
+async def get_runs_status(
+    ids: List[str] = Query(..., description="Run ids, repeated or comma-separated"),
+    user_id: str = Depends(current_user)
+):
+    """
+    Batch status lookup: /runs?ids=a&ids=b or /runs?ids=a,b
+    """
+    run_ids = [run_id for value in ids for run_id in value.split(",") if run_id]
+    if not run_ids:
+        return []
+    if len(run_ids) > 100:
+        raise HTTPException(status_code=400, detail="At most 100 run ids per request")
+    rows = {row['id']: row for row in await owned_runs(run_ids, user_id)}
+    # Keep the caller's order; unknown ids and other users' runs are left out
+    return [run_status(rows[run_id]) for run_id in run_ids if run_id in rows]
+
+@router.post("/runs/{run_id}/cancel", response_model=RunStatus)
+async def cancel_run(run_id: str, user_id: str = Depends(current_user)):
+    """
+    Cancel a run. A run still waiting in the queue is dropped before it
+    starts. A running one is interrupted at the agent's next turn, its
+    sandbox is terminated and the transcript so far is kept; until then the
+    response shows it running with cancel_requested_at set, for at most
+    TINYGEN_RUN_CANCEL_GRACE seconds before it is stopped from outside.
+    Cancelling a cancelled run is a no-op; a finished run can't be cancelled.
+    """
+    row = await owned_run(run_id, user_id)
+    if row['status'] == 'cancelled':
+        return run_status(row)
+    if row['status'] in TERMINAL_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Run already {row['status']}")
+
+    scheduler = get_scheduler()
+    if scheduler is not None and await scheduler.cancel(run_id):
+        await asyncio.to_thread(mark_cancelled, run_id)
+    else:
+        canceller = get_canceller()
+        if not canceller.pending(run_id):
+            await asyncio.to_thread(request_cancel, run_id)
+            await canceller.cancel(row)
+    return run_status((await asyncio.to_thread(get_runs, [run_id]))[0])
@@ -0,0 +1,84 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+import hmac
+import os
+from typing import Any, List, Optional
+from ..auth import chat_owner
+from ..chat_context import chat_contexts
+from ..scheduler import get_scheduler, TERMINAL_STATUSES
+from ..stream_hub import get_stream_hub
+
+router = APIRouter()
+
+class PublishedEvent(BaseModel):
+    event: str
+    data: Any = None
+    # Publisher-side sequence number, used to drop retried duplicates
+    seq: Optional[int] = None
+
+class PublishEventsRequest(BaseModel):
+    source: Optional[str] = None
+    events: List[PublishedEvent]
+
+class PublishEventsResponse(BaseModel):
+    published: int
+    subscribers: int
+
+def check_publish_token(authorization: Optional[str]):
+    token = os.getenv("TINYGEN_STREAM_TOKEN")
+    if not token:
+        raise HTTPException(status_code=503, detail="Stream publishing not configured")
+    if not hmac.compare_digest(authorization or "", f"Bearer {token}"):
+        raise HTTPException(status_code=401, detail="Invalid stream token")
+
+@router.post("/chats/{chat_id}/events", response_model=PublishEventsResponse)
+async def publish_chat_events(chat_id: str, request: PublishEventsRequest, authorization: Optional[str] = Header(None)):
+    """
+    Publish live events for a chat to its stream subscribers.
+    Called by the Modal functions while an agent runs. A `chat_updated`
+    event or a terminal `status` event drops the chat's cached context, and
+    a terminal `status` event also frees the run's slot in the scheduler.
+    """
+    check_publish_token(authorization)
+
+    hub = get_stream_hub()
+    scheduler = get_scheduler()
+    published = 0
+    for item in request.events:
+        if item.event == "chat_updated":
+            chat_contexts.invalidate(chat_id)
+        if item.event == "status" and isinstance(item.data, dict):
+            if item.data.get("run_id") and item.data.get("status") in TERMINAL_STATUSES:
+                chat_contexts.run_finished(chat_id, item.data["run_id"])
+                if scheduler is not None:
+                    await scheduler.finished(item.data["run_id"], item.data["status"])
+        if hub.publish(chat_id, item.event, item.data, request.source, item.seq) is not None:
+            published += 1
+
+    return PublishEventsResponse(published=published, subscribers=hub.subscriber_count(chat_id))
+
+@router.get("/chats/{chat_id}/stream", dependencies=[Depends(chat_owner)])
+async def stream_chat(
+    chat_id: str,
+    last_event_id: Optional[int] = Header(None),
+    last_event_id_param: Optional[int] = Query(None, alias="last_event_id")
+):
+    """
+    Server-Sent Events stream of live agent output for a chat, for its
+    owner only (Supabase access token in the Authorization header or the
+    access_token query parameter).
+    Reconnecting clients resume after the Last-Event-ID header (or the
+    last_event_id query parameter); a `reset` event means the gap can't be
+    replayed and the transcript should be reloaded from the messages table.
+    """
+    resume_from = last_event_id if last_event_id is not None else last_event_id_param
+
+    return StreamingResponse(
+        get_stream_hub().subscribe(chat_id, resume_from),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        }
+    )
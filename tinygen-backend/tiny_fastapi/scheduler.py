@@ -0,0 +1,542 @@
+"""Admission control for agent runs: a persistent queue with concurrency caps and fair ordering"""
+import asyncio
+import heapq
+import itertools
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+PRIORITY = "priority"
+STANDARD = "standard"
+
+# Short, interactive functions that go in the priority lane, ahead of
+# initial runs: a follow-up continues a chat the user is looking at, and
+# create-sandbox is what the user waits on before the first prompt
+PRIORITY_FUNCTIONS = ("run_followup_agent", "fork_and_clone_repo")
+
+# Expected seconds per function until enough runs have been observed
+DEFAULT_DURATIONS = {
+    "fork_and_clone_repo": 60.0,
+    "run_claude_agent": 600.0,
+    "run_followup_agent": 240.0,
+}
+
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+_GITHUB_REPO = re.compile(r"github\.com[/:]([^/]+)/([^/.]+?)(?:\.git)?/?$")
+
+
+def repo_key(repo_url: Optional[str]) -> Optional[str]:
+    """owner/repo of a GitHub URL, lowercased, for per-repo limits"""
+    match = _GITHUB_REPO.search((repo_url or "").strip())
+    return f"{match.group(1)}/{match.group(2)}".lower() if match else None
+
+
+def parse_weights(value: str) -> Dict[str, float]:
+    """"alice=2,bob=0.5" -> {"alice": 2.0, "bob": 0.5}; malformed items are skipped"""
+    weights = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        try:
+            if name.strip() and float(weight) > 0:
+                weights[name.strip().lower()] = float(weight)
+        except ValueError:
+            continue
+    return weights
+
+
+class QueuedRun:
+    """One admitted run: what to spawn, whose share it uses, and its place in the fair order"""
+
+    __slots__ = (
+        "run_id", "function_name", "kwargs", "user", "repo", "lane",
+        "cost", "start_tag", "finish_tag", "enqueued_at", "dispatched_at",
+    )
+
+    def __init__(
+        self,
+        run_id: str,
+        function_name: str,
+        kwargs: Dict[str, Any],
+        user: str,
+        repo: Optional[str] = None,
+        lane: str = STANDARD,
+        cost: float = 0.0,
+        start_tag: float = 0.0,
+        finish_tag: float = 0.0,
+        enqueued_at: float = 0.0,
+        dispatched_at: Optional[float] = None,
+    ):
+        self.run_id = run_id
+        self.function_name = function_name
+        self.kwargs = kwargs
+        self.user = user
+        self.repo = repo
+        self.lane = lane
+        self.cost = cost
+        self.start_tag = start_tag
+        self.finish_tag = finish_tag
+        self.enqueued_at = enqueued_at
+        self.dispatched_at = dispatched_at
+
+    @property
+    def dispatched(self) -> bool:
+        return self.dispatched_at is not None
+
+    def order(self) -> Tuple[int, float, float]:
+        return (0 if self.lane == PRIORITY else 1, self.start_tag, self.enqueued_at)
+
+    def to_row(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "QueuedRun":
+        return cls(**{name: row.get(name) for name in cls.__slots__ if name in row})
+
+
+class InMemoryQueueStore:
+    """Queue store for tests and simulations; `statuses` holds what the runs table would"""
+
+    def __init__(self):
+        self.rows: Dict[str, Dict[str, Any]] = {}
+        self.statuses: Dict[str, str] = {}
+
+    def load(self) -> List[QueuedRun]:
+        return [QueuedRun.from_row(row) for row in self.rows.values()]
+
+    def add(self, entry: QueuedRun):
+        self.rows[entry.run_id] = entry.to_row()
+
+    def mark_dispatched(self, run_id: str, dispatched_at: float):
+        if run_id in self.rows:
+            self.rows[run_id]["dispatched_at"] = dispatched_at
+
+    def remove(self, run_id: str):
+        self.rows.pop(run_id, None)
+
+    def run_statuses(self, run_ids: List[str]) -> Dict[str, str]:
+        return {run_id: self.statuses[run_id] for run_id in run_ids if run_id in self.statuses}
+
+
+class SupabaseQueueStore:
+    """The run_queue table, next to the runs it schedules (service role only)"""
+
+    def __init__(self, client_factory: Optional[Callable[[], Any]] = None):
+        self.client_factory = client_factory
+
+    @property
+    def client(self):
+        if self.client_factory is not None:
+            return self.client_factory()
+        from .services import services
+        client = services.service_supabase
+        if not client:
+            raise RuntimeError("Supabase service client not initialized")
+        return client
+
+    def load(self) -> List[QueuedRun]:
+        result = self.client.table("run_queue").select("*").execute()
+        return [QueuedRun.from_row(row) for row in result.data or []]
+
+    def add(self, entry: QueuedRun):
+        self.client.table("run_queue").upsert(entry.to_row()).execute()
+
+    def mark_dispatched(self, run_id: str, dispatched_at: float):
+        self.client.table("run_queue").update({"dispatched_at": dispatched_at}).eq("run_id", run_id).execute()
+
+    def remove(self, run_id: str):
+        self.client.table("run_queue").delete().eq("run_id", run_id).execute()
+
+    def run_statuses(self, run_ids: List[str]) -> Dict[str, str]:
+        if not run_ids:
+            return {}
+        result = self.client.table("runs").select("id, status").in_("id", run_ids).execute()
+        return {row["id"]: row["status"] for row in result.data or []}
+
+
+class Usage:
+    """Runs holding a slot: in total, per lane, per user and per repository"""
+
+    def __init__(self, entries: Iterable[QueuedRun] = ()):
+        self.running = 0
+        self.per_lane: Dict[str, int] = {}
+        self.per_user: Dict[str, int] = {}
+        self.per_repo: Dict[str, int] = {}
+        for entry in entries:
+            self.add(entry)
+
+    def add(self, entry: QueuedRun, count: int = 1):
+        self.running += count
+        self.per_lane[entry.lane] = self.per_lane.get(entry.lane, 0) + count
+        self.per_user[entry.user] = self.per_user.get(entry.user, 0) + count
+        if entry.repo:
+            self.per_repo[entry.repo] = self.per_repo.get(entry.repo, 0) + count
+
+    def remove(self, entry: QueuedRun):
+        self.add(entry, -1)
+
+
+class RunScheduler:
+    """
+    Sits between the agent endpoints and the Modal functions. Every run is
+    written to a persistent queue and spawned only when there is room:
+
+    - at most `max_running` runs at once, of which the standard lane may
+      hold all but `priority_reserve`, so a follow-up never waits for an
+      initial run to finish when the standard lane is full;
+    - at most `max_per_user` runs per user and `max_per_repo` per
+      repository (0 means no limit);
+    - within a lane, users are served by start-time fair queuing: each run
+      is tagged with its user's virtual start and finish time (expected
+      duration divided by the user's weight), and the lowest start tag goes
+      first, so a burst from one user is interleaved with everyone else's
+      runs instead of going ahead of them.
+
+    Capacity is returned when a run reports a terminal status (`finished`,
+    or the runs table on the periodic reconcile), or after
+    `max_run_seconds` if it never does; `on_finished` is then called with
+    the run's entry. The clock and the `dispatch` coroutine are injected, so the scheduler runs against a simulated
+    clock and fake workers as well.
+    """
+
+    def __init__(
+        self,
+        store,
+        dispatch: Callable[[QueuedRun], Awaitable[Any]],
+        max_running: int = 20,
+        max_per_user: int = 3,
+        max_per_repo: int = 0,
+        priority_reserve: int = 2,
+        weights: Optional[Dict[str, float]] = None,
+        durations: Optional[Dict[str, float]] = None,
+        max_run_seconds: float = 2100.0,
+        reconcile_interval: float = 15.0,
+        on_finished: Optional[Callable[[QueuedRun], Any]] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.store = store
+        self.dispatch = dispatch
+        self.max_running = max_running
+        self.max_per_user = max_per_user
+        self.max_per_repo = max_per_repo
+        self.priority_reserve = priority_reserve
+        self.weights = weights or {}
+        self.durations = {**DEFAULT_DURATIONS, **(durations or {})}
+        self.max_run_seconds = max_run_seconds
+        self.reconcile_interval = reconcile_interval
+        self.on_finished = on_finished
+        self.clock = clock
+
+        self.entries: Dict[str, QueuedRun] = {}
+        # Fair-queuing virtual time: the start tag of the latest dispatched run
+        self.virtual_time = 0.0
+        self.loaded = False
+        self._forecast: Dict[str, Dict[str, Any]] = {}
+        self._last_reconcile = 0.0
+        self._lock = asyncio.Lock()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Counters, useful for logging and benchmarks
+        self.submitted = 0
+        self.dispatched = 0
+        self.dispatch_errors = 0
+        self.completed = 0
+        self.expired = 0
+
+    def running(self) -> List[QueuedRun]:
+        return [entry for entry in self.entries.values() if entry.dispatched]
+
+    def queued(self) -> List[QueuedRun]:
+        return sorted((entry for entry in self.entries.values() if not entry.dispatched), key=QueuedRun.order)
+
+    def weight(self, user: str) -> float:
+        return self.weights.get(user.lower(), 1.0)
+
+    def duration(self, function_name: str) -> float:
+        return self.durations.get(function_name, DEFAULT_DURATIONS["run_claude_agent"])
+
+    def load(self):
+        """Take over the persisted queue (after a restart)"""
+        for entry in self.store.load():
+            self.entries.setdefault(entry.run_id, entry)
+        running = [entry.start_tag for entry in self.entries.values() if entry.dispatched]
+        queued = [entry.start_tag for entry in self.entries.values() if not entry.dispatched]
+        self.virtual_time = max(running) if running else min(queued, default=0.0)
+        self.loaded = True
+        self._update_forecast()
+
+    async def submit(
+        self,
+        run_id: str,
+        function_name: str,
+        kwargs: Dict[str, Any],
+        user: str,
+        repo: Optional[str] = None,
+    ) -> QueuedRun:
+        """Queue a run (persisted before this returns) and dispatch whatever now fits"""
+        user = (user or "anonymous").lower()
+        cost = self.duration(function_name)
+        previous = [entry.finish_tag for entry in self.entries.values() if entry.user == user]
+        start_tag = max([self.virtual_time, *previous])
+        entry = QueuedRun(
+            run_id,
+            function_name,
+            kwargs,
+            user,
+            repo,
+            PRIORITY if function_name in PRIORITY_FUNCTIONS else STANDARD,
+            cost,
+            start_tag,
+            start_tag + cost / self.weight(user),
+            self.clock(),
+        )
+        await asyncio.to_thread(self.store.add, entry)
+        self.entries[run_id] = entry
+        self.submitted += 1
+        await self.tick()
+        return entry
+
+    def _admits(self, entry: QueuedRun, usage: Usage) -> bool:
+        if usage.running >= self.max_running:
+            return False
+        if entry.lane != PRIORITY and usage.per_lane.get(entry.lane, 0) >= max(1, self.max_running - self.priority_reserve):
+            return False
+        if self.max_per_user and usage.per_user.get(entry.user, 0) >= self.max_per_user:
+            return False
+        if self.max_per_repo and entry.repo and usage.per_repo.get(entry.repo, 0) >= self.max_per_repo:
+            return False
+        return True
+
+    async def tick(self) -> int:
+        """Release finished runs, then dispatch queued runs in fair order while they fit"""
+        async with self._lock:
+            if not self.loaded:
+                try:
+                    await asyncio.to_thread(self.load)
+                except Exception as e:
+                    print(f"Failed to load the run queue: {str(e)}")
+            if self.clock() - self._last_reconcile >= self.reconcile_interval:
+                await self._reconcile()
+
+            dispatched = 0
+            usage = Usage(self.running())
+            for entry in self.queued():
+                if not self._admits(entry, usage):
+                    continue
+                if not await self._dispatch(entry):
+                    continue
+                dispatched += 1
+                usage.add(entry)
+            self._update_forecast()
+            return dispatched
+
+    async def _dispatch(self, entry: QueuedRun) -> bool:
+        entry.dispatched_at = self.clock()
+        self.virtual_time = max(self.virtual_time, entry.start_tag)
+        try:
+            await asyncio.to_thread(self.store.mark_dispatched, entry.run_id, entry.dispatched_at)
+            await self.dispatch(entry)
+        except Exception as e:
+            # The dispatcher records the failure on the run; drop it from the queue
+            print(f"Failed to dispatch run {entry.run_id}: {str(e)}")
+            self.dispatch_errors += 1
+            self.entries.pop(entry.run_id, None)
+            await self._remove(entry.run_id)
+            return False
+        self.dispatched += 1
+        return True
+
+    async def _remove(self, run_id: str):
+        try:
+            await asyncio.to_thread(self.store.remove, run_id)
+        except Exception as e:
+            print(f"Failed to remove run {run_id} from the queue: {str(e)}")
+
+    async def finished(self, run_id: str, status: Optional[str] = None):
+        """A run reached a terminal state: free its slot and learn its duration"""
+        entry = self.entries.pop(run_id, None)
+        if entry is None:
+            return
+        if entry.dispatched and status in ("succeeded", "failed"):
+            self.completed += 1
+            observed = self.clock() - entry.dispatched_at
+            # Exponentially weighted, so estimates follow changes in run length
+            self.durations[entry.function_name] = 0.8 * self.duration(entry.function_name) + 0.2 * observed
+        self._notify_finished(entry)
+        self.wake()
+        await self._remove(run_id)
+
+    def _notify_finished(self, entry: QueuedRun):
+        if self.on_finished is None:
+            return
+        try:
+            self.on_finished(entry)
+        except Exception as e:
+            print(f"on_finished failed for run {entry.run_id}: {str(e)}")
+
+    async def cancel(self, run_id: str) -> bool:
+        """Drop a run that is still waiting; False if it was already dispatched (or isn't queued here)"""
+        async with self._lock:
+            entry = self.entries.get(run_id)
+            if entry is None or entry.dispatched:
+                return False
+            self.entries.pop(run_id)
+            self._update_forecast()
+        await self._remove(run_id)
+        return True
+
+    async def _reconcile(self):
+        """Pick up terminal statuses the scheduler wasn't told about, and expire lost runs"""
+        self._last_reconcile = self.clock()
+        if not self.entries:
+            return
+        try:
+            statuses = await asyncio.to_thread(self.store.run_statuses, list(self.entries))
+        except Exception as e:
+            print(f"Failed to reconcile the run queue: {str(e)}")
+            return
+        now = self.clock()
+        for run_id, entry in list(self.entries.items()):
+            status = statuses.get(run_id)
+            if status in TERMINAL_STATUSES:
+                self.entries.pop(run_id, None)
+                if entry.dispatched and status != "cancelled":
+                    self.completed += 1
+                self._notify_finished(entry)
+                await self._remove(run_id)
+            elif entry.dispatched and now - entry.dispatched_at > self.max_run_seconds:
+                print(f"Run {run_id} has not finished after {self.max_run_seconds:.0f}s; releasing its slot")
+                self.expired += 1
+                self.entries.pop(run_id, None)
+                await self._remove(run_id)
+
+    def _update_forecast(self):
+        """
+        Queue position and estimated wait of every queued run, by replaying
+        the admission rules forward: running runs end after their expected
+        duration, and each end admits whatever fits next.
+        """
+        now = self.clock()
+        queued = self.queued()
+        running_entries = self.running()
+        usage = Usage(running_entries)
+        # (expected end, tie-breaker, run)
+        order = itertools.count()
+        ends: List[Tuple[float, int, QueuedRun]] = [
+            (max(now, entry.dispatched_at + self.duration(entry.function_name)), next(order), entry)
+            for entry in running_entries
+        ]
+        heapq.heapify(ends)
+
+        waits: Dict[str, Optional[float]] = {}
+        pending = list(queued)
+        t = now
+        while pending:
+            remaining = []
+            for entry in pending:
+                if self._admits(entry, usage):
+                    waits[entry.run_id] = t - now
+                    usage.add(entry)
+                    heapq.heappush(ends, (t + self.duration(entry.function_name), next(order), entry))
+                else:
+                    remaining.append(entry)
+            pending = remaining
+            if not pending or not ends:
+                break
+            t, _, ended = heapq.heappop(ends)
+            usage.remove(ended)
+
+        self._forecast = {
+            entry.run_id: {
+                "queue_position": position,
+                "estimated_wait_seconds": waits.get(entry.run_id),
+                "lane": entry.lane,
+            }
+            for position, entry in enumerate(queued, 1)
+        }
+
+    def status(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Queue position (1 is next) and estimated wait of a queued run, or None"""
+        return self._forecast.get(run_id)
+
+    def depth(self) -> Dict[str, int]:
+        queued = self.queued()
+        return {
+            "running": len(self.running()),
+            "queued": len(queued),
+            "queued_priority": sum(1 for entry in queued if entry.lane == PRIORITY),
+        }
+
+    def wake(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _loop(self, interval: float):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.tick()
+            except Exception as e:
+                print(f"Scheduler tick failed: {str(e)}")
+
+    def start(self, interval: float = 5.0) -> "RunScheduler":
+        """Tick on every wake-up and at least every `interval` seconds"""
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._loop(interval))
+        self.wake()
+        return self
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+async def spawn_queued_run(entry: QueuedRun):
+    """Production dispatcher: spawn the Modal function and attach the call to the run"""
+    from .services import services
+    from .routers.runs import attach_call, fail_run
+
+    try:
+        call = await services.spawn(entry.function_name, run_id=entry.run_id, **entry.kwargs)
+    except Exception as e:
+        await asyncio.to_thread(fail_run, entry.run_id, str(e))
+        raise
+    await asyncio.to_thread(attach_call, entry.run_id, call.object_id)
+
+
+_scheduler: Optional[RunScheduler] = None
+
+
+def get_scheduler() -> Optional[RunScheduler]:
+    """Process-wide scheduler, or None when runs are spawned directly (TINYGEN_SCHEDULER=0)"""
+    global _scheduler
+    from .chat_context import chat_contexts
+    from config import (
+        SCHEDULER_ENABLED, SCHEDULER_MAX_RUNNING, SCHEDULER_MAX_PER_USER, SCHEDULER_MAX_PER_REPO,
+        SCHEDULER_PRIORITY_RESERVE, SCHEDULER_USER_WEIGHTS,
+    )
+    if not SCHEDULER_ENABLED:
+        return None
+    if _scheduler is None:
+        _scheduler = RunScheduler(
+            SupabaseQueueStore(),
+            spawn_queued_run,
+            max_running=SCHEDULER_MAX_RUNNING,
+            max_per_user=SCHEDULER_MAX_PER_USER,
+            max_per_repo=SCHEDULER_MAX_PER_REPO,
+            priority_reserve=SCHEDULER_PRIORITY_RESERVE,
+            weights=parse_weights(SCHEDULER_USER_WEIGHTS),
+            # A finished run has written its chat (snapshot, branch, session)
+            on_finished=lambda entry: chat_contexts.run_finished(entry.kwargs.get("chat_id"), entry.run_id),
+        )
+    return _scheduler
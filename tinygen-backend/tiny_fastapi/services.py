@@ -0,0 +1,139 @@
+"""Lazily created clients and cached Modal function handles for the API"""
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+FUNCTIONS_APP = "tinygen-functions"
+
+
+class ServiceRegistry:
+    """
+    One place to get at the API's external services. Supabase clients and
+    Modal function handles are created on first use (the modal and supabase
+    imports alone cost about half a second of cold start) and then reused, so
+    the request path never repeats a Function.from_name lookup.
+
+    warm_up() does the same work ahead of time at startup and records how
+    long each piece took in `timings`.
+    """
+
+    def __init__(self, app_name: str = FUNCTIONS_APP):
+        self.app_name = app_name
+        self._functions: Dict[str, Any] = {}
+        self._clients: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._async_lock: Optional[asyncio.Lock] = None
+        # Seconds spent creating each client / resolving each function
+        self.timings: Dict[str, float] = {}
+
+    def _client(self, name: str, key_env: str):
+        client = self._clients.get(name)
+        if client is not None:
+            return client
+        with self._lock:
+            if name not in self._clients:
+                url = os.getenv("SUPABASE_URL")
+                key = os.getenv(key_env)
+                if not url or not key:
+                    return None
+                started = time.perf_counter()
+                from supabase import create_client
+                self._clients[name] = create_client(url, key)
+                self.timings[f"client:{name}"] = time.perf_counter() - started
+            return self._clients[name]
+
+    @property
+    def supabase(self):
+        """Anon-key client (subject to RLS), or None if not configured"""
+        return self._client("supabase", "SUPABASE_ANON_KEY")
+
+    @property
+    def service_supabase(self):
+        """Service-role client for tables written on behalf of users, or None"""
+        return self._client("service_supabase", "SUPABASE_SERVICE_ROLE_KEY")
+
+    async def async_supabase(self):
+        """Async anon-key client for handlers that shouldn't block the event loop, or None"""
+        client = self._clients.get("async_supabase")
+        if client is not None:
+            return client
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        async with self._async_lock:
+            if "async_supabase" not in self._clients:
+                url = os.getenv("SUPABASE_URL")
+                key = os.getenv("SUPABASE_ANON_KEY")
+                if not url or not key:
+                    return None
+                started = time.perf_counter()
+                from supabase import acreate_client
+                self._clients["async_supabase"] = await acreate_client(url, key)
+                self.timings["client:async_supabase"] = time.perf_counter() - started
+            return self._clients["async_supabase"]
+
+    def function(self, name: str):
+        """Handle to a deployed Modal function, resolved once"""
+        handle = self._functions.get(name)
+        if handle is None:
+            started = time.perf_counter()
+            from modal import Function
+            handle = Function.from_name(self.app_name, name)
+            with self._lock:
+                handle = self._functions.setdefault(name, handle)
+            self.timings.setdefault(f"function:{name}", time.perf_counter() - started)
+        return handle
+
+    def invalidate(self, name: str):
+        """Forget a function handle so the next call looks it up again"""
+        with self._lock:
+            self._functions.pop(name, None)
+
+    async def hydrate(self, name: str):
+        """Resolve a function handle against the server now instead of on first call"""
+        started = time.perf_counter()
+        await self.function(name).hydrate.aio()
+        self.timings[f"function:{name}"] = time.perf_counter() - started
+
+    async def spawn(self, name: str, **kwargs):
+        """
+        Spawn a Modal function. If the cached handle is stale (the app was
+        redeployed or the lookup failed) it is re-resolved and the spawn is
+        retried once.
+        """
+        from modal.exception import NotFoundError
+
+        try:
+            return await self.function(name).spawn.aio(**kwargs)
+        except NotFoundError:
+            self.invalidate(name)
+            return await self.function(name).spawn.aio(**kwargs)
+        except Exception:
+            # Don't keep a handle that may be broken; the next call re-resolves
+            self.invalidate(name)
+            raise
+
+    async def warm_up(self, functions=()) -> Dict[str, float]:
+        """Create clients and resolve function handles concurrently, with timings"""
+        started = time.perf_counter()
+
+        async def timed(coro):
+            try:
+                await coro
+            except Exception as e:
+                print(f"Warm-up step failed: {str(e)}")
+
+        await asyncio.gather(
+            timed(asyncio.to_thread(lambda: self.supabase)),
+            timed(asyncio.to_thread(lambda: self.service_supabase)),
+            timed(self.async_supabase()),
+            *(timed(self.hydrate(name)) for name in functions),
+        )
+        self.timings["warm_up"] = time.perf_counter() - started
+        breakdown = ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in sorted(self.timings.items()))
+        print(f"Services warmed up: {breakdown}")
+        return dict(self.timings)
+
+
+services = ServiceRegistry()
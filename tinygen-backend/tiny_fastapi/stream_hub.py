@@ -0,0 +1,203 @@
+"""In-process fan-out of live agent events to Server-Sent Events subscribers"""
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set
+
+
+class StreamEvent:
+    __slots__ = ("seq", "event", "data")
+
+    def __init__(self, seq: int, event: str, data: str):
+        self.seq = seq
+        self.event = event
+        # Pre-serialized JSON, encoded once for every subscriber
+        self.data = data
+
+    def encode(self) -> str:
+        return f"id: {self.seq}\nevent: {self.event}\ndata: {self.data}\n\n"
+
+
+class Subscription:
+    """One connected client: a bounded queue plus the last seq it was sent"""
+
+    def __init__(self, last_seq: int, max_queue: int):
+        self.queue: asyncio.Queue = asyncio.Queue(max_queue)
+        self.last_seq = last_seq
+        # Set when the client fell behind and its queue was dropped
+        self.lagged = False
+
+    def offer(self, event: StreamEvent):
+        if self.lagged:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Never block the publisher on a slow client: drop what is queued
+            # and let the subscriber catch up from the channel history
+            self.lagged = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class ChatChannel:
+    """Per-chat sequence counter, replay history and subscriber set"""
+
+    def __init__(self, history: int):
+        self.history: Deque[StreamEvent] = deque(maxlen=history)
+        self.last_seq = 0
+        self.subscribers: Set[Subscription] = set()
+        # Highest publisher-side sequence applied per source, so retried
+        # batches from a Modal function are not fanned out twice
+        self.source_seqs: Dict[str, int] = {}
+        self.touched_at = time.monotonic()
+
+    def publish(self, event: str, data: Any, source: Optional[str] = None, source_seq: Optional[int] = None) -> Optional[StreamEvent]:
+        if source is not None and source_seq is not None:
+            if source_seq <= self.source_seqs.get(source, 0):
+                return None
+            self.source_seqs[source] = source_seq
+
+        self.last_seq += 1
+        item = StreamEvent(self.last_seq, event, json.dumps(data, separators=(",", ":")))
+        self.history.append(item)
+        self.touched_at = time.monotonic()
+        for subscription in self.subscribers:
+            subscription.offer(item)
+        return item
+
+    def since(self, seq: int) -> Optional[List[StreamEvent]]:
+        """Buffered events after `seq`, or None if some of them were already evicted"""
+        if seq >= self.last_seq:
+            return []
+        if not self.history or self.history[0].seq > seq + 1:
+            return None
+        return [item for item in self.history if item.seq > seq]
+
+
+class StreamHub:
+    """
+    Fans events published for a chat out to every subscriber of that chat.
+
+    Each channel keeps the last `history` events so a reconnecting client can
+    resume from its Last-Event-ID. Subscribers read from bounded queues; a
+    client that falls `max_queue` events behind is caught up from history
+    instead of slowing down the publisher, and told to reload the transcript
+    (a `reset` event) if the history no longer covers the gap.
+
+    The hub lives in one process, so the API must run as a single container
+    for publishers and subscribers to meet.
+    """
+
+    def __init__(self, history: int = 1000, max_queue: int = 256, keepalive: float = 15.0, channel_ttl: float = 600.0):
+        self.history = history
+        self.max_queue = max_queue
+        self.keepalive = keepalive
+        self.channel_ttl = channel_ttl
+        self.channels: Dict[str, ChatChannel] = {}
+
+        # Counters, useful for logging and benchmarks
+        self.events_published = 0
+        self.duplicates_dropped = 0
+        self.lagged_subscribers = 0
+
+    def channel(self, chat_id: str) -> ChatChannel:
+        channel = self.channels.get(chat_id)
+        if channel is None:
+            self._prune()
+            channel = self.channels[chat_id] = ChatChannel(self.history)
+        return channel
+
+    def publish(self, chat_id: str, event: str, data: Any, source: Optional[str] = None, source_seq: Optional[int] = None) -> Optional[int]:
+        """Fan an event out to the chat's subscribers; returns its seq (None if a duplicate)"""
+        item = self.channel(chat_id).publish(event, data, source, source_seq)
+        if item is None:
+            self.duplicates_dropped += 1
+            return None
+        self.events_published += 1
+        return item.seq
+
+    def subscriber_count(self, chat_id: str) -> int:
+        channel = self.channels.get(chat_id)
+        return len(channel.subscribers) if channel else 0
+
+    async def subscribe(self, chat_id: str, last_event_id: Optional[int] = None) -> AsyncIterator[str]:
+        """Encoded SSE frames for a chat, starting after `last_event_id`"""
+        channel = self.channel(chat_id)
+        if last_event_id is None or last_event_id > channel.last_seq:
+            # New client, or an id from before this process started: only live events
+            start = channel.last_seq
+            replay: Optional[List[StreamEvent]] = []
+            if last_event_id is not None:
+                replay = None
+        else:
+            start = last_event_id
+            replay = channel.since(last_event_id)
+
+        subscription = Subscription(start, self.max_queue)
+        channel.subscribers.add(subscription)
+        try:
+            yield "retry: 2000\n\n"
+            if replay is None:
+                subscription.last_seq = channel.last_seq
+                yield self._reset(channel)
+            else:
+                for item in replay:
+                    subscription.last_seq = item.seq
+                    yield item.encode()
+
+            while True:
+                try:
+                    item = await asyncio.wait_for(subscription.queue.get(), self.keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                if item is None:
+                    # Fell behind: catch up from history, or ask for a reload
+                    self.lagged_subscribers += 1
+                    missed = channel.since(subscription.last_seq)
+                    subscription.lagged = False
+                    if missed is None:
+                        subscription.last_seq = channel.last_seq
+                        yield self._reset(channel)
+                        continue
+                    for missed_item in missed:
+                        subscription.last_seq = missed_item.seq
+                        yield missed_item.encode()
+                    continue
+
+                if item.seq <= subscription.last_seq:
+                    continue
+                subscription.last_seq = item.seq
+                yield item.encode()
+        finally:
+            channel.subscribers.discard(subscription)
+            channel.touched_at = time.monotonic()
+
+    def _reset(self, channel: ChatChannel) -> str:
+        """Tell the client its position is gone and to reload the stored transcript"""
+        return StreamEvent(channel.last_seq, "reset", json.dumps({"last_seq": channel.last_seq})).encode()
+
+    def _prune(self):
+        """Drop channels that have had no subscribers or events for channel_ttl"""
+        now = time.monotonic()
+        idle = [
+            chat_id for chat_id, channel in self.channels.items()
+            if not channel.subscribers and now - channel.touched_at > self.channel_ttl
+        ]
+        for chat_id in idle:
+            del self.channels[chat_id]
+
+
+_hub: Optional[StreamHub] = None
+
+
+def get_stream_hub() -> StreamHub:
+    """Process-wide hub shared by the publish and stream endpoints"""
+    global _hub
+    if _hub is None:
+        _hub = StreamHub()
+    return _hub